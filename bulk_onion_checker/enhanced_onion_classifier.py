@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+Bulk check and classify .onion addresses through a pool of Tor SOCKS proxies
+Usage: python enhanced_onion_classifier.py <addresses_file> [output_file]
+
+Settings (environment variables):
+    ONION_PROXIES        comma-separated SOCKS5 proxies (default 127.0.0.1:9050)
+    ONION_CONCURRENCY    checks in flight at once (default 256)
+    ONION_PROXY_STREAMS  open streams per proxy (default 16)
+    ONION_PROXY_BUILDS   new circuits being built per proxy (default 4)
+    ONION_CONNECT_TIMEOUT / ONION_READ_TIMEOUT / ONION_TOTAL_TIMEOUT  seconds (90 / 60 / 240)
+    ONION_CLASSIFY=0     only check reachability, skip title classification
+"""
+
+import asyncio
+import csv
+import os
+import sys
+from collections import Counter
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from onion_site_classifier import OnionChecker
+from tor_classifier import Proxy
+
+def read_addresses(filename):
+    """Read onion addresses from a text file (one per line)"""
+    try:
+        with open(filename, 'r', encoding='utf-8') as f:
+            return [line.strip() for line in f if line.strip() and not line.startswith('#')]
+    except FileNotFoundError:
+        print(f"File {filename} not found.")
+        return []
+
+def build_checker():
+    """Create an OnionChecker from the environment settings"""
+    streams = int(os.environ.get('ONION_PROXY_STREAMS', '16'))
+    builds = int(os.environ.get('ONION_PROXY_BUILDS', '4'))
+    proxies = [Proxy.parse(spec.strip(), max_streams=streams, max_circuit_builds=builds)
+               for spec in os.environ.get('ONION_PROXIES', '127.0.0.1:9050').split(',') if spec.strip()]
+
+    classifier = None
+    if os.environ.get('ONION_CLASSIFY', '1') != '0':
+        from common.model_registry import get_classifier
+        classifier = get_classifier("zero-shot")
+
+    return OnionChecker(
+        proxies,
+        classifier=classifier,
+        max_concurrency=int(os.environ.get('ONION_CONCURRENCY', '256')),
+        connect_timeout=float(os.environ.get('ONION_CONNECT_TIMEOUT', '90')),
+        read_timeout=float(os.environ.get('ONION_READ_TIMEOUT', '60')),
+        total_timeout=float(os.environ.get('ONION_TOTAL_TIMEOUT', '240'))
+    )
+
+async def process_addresses(checker, addresses, output_file=None):
+    """Check all addresses, printing and saving each result as it completes"""
+    fieldnames = ['address', 'status', 'http_status', 'title', 'category', 'confidence',
+                  'reason', 'proxy', 'attempts', 'elapsed']
+    summary = Counter()
+    categories = Counter()
+
+    csvfile = open(output_file, 'w', newline='', encoding='utf-8') if output_file else None
+    writer = csv.DictWriter(csvfile, fieldnames=fieldnames) if csvfile else None
+    if writer:
+        writer.writeheader()
+
+    try:
+        done = 0
+        async for result in checker.run(addresses):
+            done += 1
+            classification = result['classification']
+            category, confidence = '', ''
+            if isinstance(classification, dict):
+                category, confidence = classification['best_match'], classification['confidence']
+                categories[category] += 1
+
+            if result['status'] == 'reachable':
+                label = f"{category} ({confidence:.2f})" if category else "reachable"
+                print(f"{done:5d}. {result['address']} -> {label} - {result['title'][:60]}")
+            else:
+                print(f"{done:5d}. {result['address']} -> {result['status']} ({result['reason']})")
+            summary[result['status'] if result['status'] == 'reachable' else f"{result['status']}: {result['reason']}"] += 1
+
+            if writer:
+                writer.writerow({
+                    'address': result['address'],
+                    'status': result['status'],
+                    'http_status': result['http_status'] or '',
+                    'title': result['title'],
+                    'category': category,
+                    'confidence': confidence,
+                    'reason': result['reason'],
+                    'proxy': result['proxy'],
+                    'attempts': result['attempts'],
+                    'elapsed': f"{result['elapsed']:.1f}"
+                })
+    finally:
+        if csvfile:
+            csvfile.close()
+
+    print("\n" + "=" * 50)
+    print("SUMMARY")
+    print("=" * 50)
+    print(f"Total addresses: {sum(summary.values())}")
+    for status, count in summary.most_common():
+        print(f"  {status}: {count}")
+    if categories:
+        print("Categories:")
+        for category, count in categories.most_common():
+            print(f"  {category}: {count}")
+    if output_file:
+        print(f"\nResults saved to {output_file}")
+
+    return summary
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Usage: python enhanced_onion_classifier.py <addresses_file> [output_file]")
+        print("Example: ONION_PROXIES=127.0.0.1:9050,127.0.0.1:9052 python enhanced_onion_classifier.py onions.txt results.csv")
+        sys.exit(1)
+
+    addresses = read_addresses(sys.argv[1])
+    output_file = sys.argv[2] if len(sys.argv) > 2 else None
+
+    if addresses:
+        print("Onion Site Checker - Bulk Mode")
+        print(f"Checking {len(addresses)} addresses")
+        print("=" * 50)
+        asyncio.run(process_addresses(build_checker(), addresses, output_file))
@@ -0,0 +1,156 @@
+"""
+Bulk reachability checker and title classifier for .onion addresses.
+
+OnionChecker runs many checks concurrently through a ProxyPool (see
+tor_classifier.py), with long per-attempt timeouts, retries on a different
+proxy for transient circuit failures, and an overall deadline per address.
+Titles of reachable services are fed into batched zero-shot classification
+on a dedicated inference thread while the remaining checks keep running.
+Results are yielded in completion order; leaving the loop early cancels all
+checks still in flight.
+"""
+
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common.async_repl import MicroBatcher, zero_shot_batch_fn
+from tor_classifier import RETRYABLE, FetchError, Proxy, ProxyPool, fetch_title, normalize_onion_url
+
+# Define onion site categories
+onion_categories = [
+    "marketplace", "forum", "news", "blog", "search_engine", "hosting",
+    "cryptocurrency", "social_media", "email", "directory", "wiki", "other"
+]
+
+
+class OnionChecker:
+    """Checks onion addresses through a SOCKS proxy pool and classifies their titles"""
+
+    def __init__(self, proxies, classifier=None, categories=None, max_concurrency=256,
+                 connect_timeout=90, read_timeout=60, total_timeout=240, retries=2, batch_size=16):
+        self.pool = proxies if isinstance(proxies, ProxyPool) else ProxyPool(
+            [p if isinstance(p, Proxy) else Proxy.parse(p) for p in proxies])
+        self.classifier = classifier
+        self.categories = list(categories or onion_categories)
+        self.max_concurrency = max_concurrency
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.total_timeout = total_timeout
+        self.retries = retries
+        self.batch_size = batch_size
+        self._batcher = None
+
+    async def check(self, address):
+        """Check one address; returns a result dict"""
+        result = {
+            'address': address.strip(),
+            'url': '',
+            'status': 'invalid',
+            'http_status': None,
+            'title': '',
+            'reason': '',
+            'proxy': '',
+            'attempts': 0,
+            'elapsed': 0.0,
+            'classification': None
+        }
+
+        normalized = normalize_onion_url(address)
+        if normalized is None:
+            result['reason'] = 'invalid_address'
+            return result
+        url, host = normalized
+        result['url'] = url
+
+        start = time.monotonic()
+        tried = []
+        while result['attempts'] <= self.retries:
+            remaining = self.total_timeout - (time.monotonic() - start)
+            if remaining <= 0:
+                result['reason'] = 'total_timeout'
+                break
+
+            proxy = self.pool.choose(host, exclude=tried)
+            tried.append(proxy)
+            result['attempts'] += 1
+            result['proxy'] = repr(proxy)
+            try:
+                http_status, title = await asyncio.wait_for(
+                    fetch_title(proxy, url, host, self.connect_timeout, self.read_timeout), remaining)
+            except FetchError as e:
+                result['reason'] = e.reason
+                if e.reason not in RETRYABLE:
+                    break
+                continue
+            except asyncio.TimeoutError:
+                result['reason'] = 'total_timeout'
+                break
+
+            result.update(status='reachable', http_status=http_status, title=title or 'No title found', reason='')
+            break
+
+        if result['status'] != 'reachable':
+            result['status'] = 'unreachable'
+        result['elapsed'] = time.monotonic() - start
+
+        if result['status'] == 'reachable' and title and self.classifier is not None:
+            result['classification'] = await self.classify(title)
+        return result
+
+    async def classify(self, title):
+        """Classify a title, sharing a batch with other reachable sites"""
+        if self._batcher is None:
+            self._batcher = MicroBatcher(zero_shot_batch_fn(self.classifier), self.batch_size, max_wait=0.05)
+        try:
+            result = await self._batcher.submit(title, key=tuple(self.categories))
+            return {
+                'best_match': result['labels'][0],
+                'confidence': result['scores'][0],
+                'all_scores': dict(zip(result['labels'], result['scores']))
+            }
+        except Exception as e:
+            return f"Error classifying site: {str(e)}"
+
+    async def run(self, addresses):
+        """Check addresses with bounded concurrency, yielding results as they complete"""
+        inbox = asyncio.Queue(maxsize=self.max_concurrency * 2)
+        outbox = asyncio.Queue()
+
+        async def feed():
+            for address in addresses:
+                if address.strip():
+                    await inbox.put(address)
+            for _ in range(self.max_concurrency):
+                await inbox.put(None)
+
+        async def worker():
+            while True:
+                address = await inbox.get()
+                if address is None:
+                    return
+                await outbox.put(await self.check(address))
+
+        async def supervise():
+            try:
+                await asyncio.gather(feed(), *(worker() for _ in range(self.max_concurrency)))
+            finally:
+                await outbox.put(None)
+
+        supervisor = asyncio.create_task(supervise())
+        try:
+            while True:
+                result = await outbox.get()
+                if result is None:
+                    break
+                yield result
+            await supervisor
+        finally:
+            # Early exit by the caller cancels every check still in flight
+            supervisor.cancel()
+            await asyncio.gather(supervisor, return_exceptions=True)
+            if self._batcher is not None:
+                await self._batcher.close()
+                self._batcher = None
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Smoke test for the bulk onion checker against local stub SOCKS5 proxies
+Usage: python test_onion_checker.py
+
+No Tor needed: each stub proxy answers CONNECT requests itself, based on the
+first letter of the onion host:
+    a... -> serves a page with a title
+    d... -> replies 0xF0 (descriptor not found)
+    r... -> replies 0xF3 (rendezvous failed) on the first proxy only
+    t... -> never replies (connect timeout)
+"""
+
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from onion_site_classifier import OnionChecker
+from tor_classifier import Proxy, normalize_onion_url
+
+PAGE = (b"HTTP/1.1 200 OK\r\nContent-Type: text/html\r\n\r\n"
+        b"<html><head><title>Hidden Market &amp; Shop</title></head><body>" + b"x" * 100000)
+
+
+class KeywordClassifier:
+    """Stand-in for the zero-shot pipeline"""
+
+    def __call__(self, texts, candidate_labels, multi_label=False):
+        results = []
+        for text in texts if isinstance(texts, list) else [texts]:
+            best = "marketplace" if "market" in text.lower() else "other"
+            labels = [best] + [l for l in candidate_labels if l != best]
+            scores = [0.9] + [0.1 / (len(labels) - 1)] * (len(labels) - 1)
+            results.append({'sequence': text, 'labels': labels, 'scores': scores})
+        return results if isinstance(texts, list) else results[0]
+
+
+async def start_stub_proxy(name, log):
+    async def handle(reader, writer):
+        try:
+            await reader.readexactly((await reader.readexactly(2))[1])
+            writer.write(b'\x05\x02')
+            _, ulen = await reader.readexactly(2)
+            username = (await reader.readexactly(ulen)).decode()
+            plen = (await reader.readexactly(1))[0]
+            await reader.readexactly(plen)
+            writer.write(b'\x01\x00')
+
+            header = await reader.readexactly(4)
+            length = (await reader.readexactly(1))[0]
+            host = (await reader.readexactly(length)).decode()
+            await reader.readexactly(2)
+            log.append((name, host, username))
+
+            first = host[0]
+            if first == 't':
+                await asyncio.sleep(30)
+                return
+            if first == 'd' or (first == 'r' and name == 'first'):
+                writer.write(b'\x05' + bytes([0xF0 if first == 'd' else 0xF3]) + b'\x00\x01' + bytes(6))
+                return
+            writer.write(b'\x05\x00\x00\x01' + bytes(6))
+            await reader.readuntil(b'\r\n\r\n')
+            writer.write(PAGE)
+            await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError, asyncio.CancelledError):
+            pass
+        finally:
+            writer.close()
+
+    server = await asyncio.start_server(handle, '127.0.0.1', 0)
+    return server, server.sockets[0].getsockname()[1]
+
+
+def check(name, condition):
+    print(f"{'PASS' if condition else 'FAIL'}: {name}")
+    return condition
+
+
+async def main():
+    log = []
+    first, first_port = await start_stub_proxy('first', log)
+    second, second_port = await start_stub_proxy('second', log)
+
+    onion = lambda prefix: (prefix + 'b' * 56)[:56] + '.onion'
+    addresses = [onion('a'), onion('d'), onion('t'), 'not-an-onion.com', onion('a') + '/about', onion('r')]
+    addresses += [onion('a' + letter) for letter in 'cdefghij']
+
+    proxies = [Proxy('127.0.0.1', first_port), Proxy('127.0.0.1', second_port)]
+    checker = OnionChecker(proxies, classifier=KeywordClassifier(), max_concurrency=8,
+                           connect_timeout=0.5, read_timeout=2, total_timeout=5)
+
+    results = {}
+    async for result in checker.run(addresses):
+        results[result['address']] = result
+
+    ok = True
+    ok &= check("every address produced a result", len(results) == len(set(addresses)))
+    ok &= check("normalize_onion_url accepts bare hosts", normalize_onion_url(onion('a'))[0] == 'http://' + onion('a'))
+    good = results[onion('a')]
+    ok &= check("reachable site title parsed", good['status'] == 'reachable' and good['title'] == 'Hidden Market & Shop')
+    ok &= check("reachable site classified", good['classification']['best_match'] == 'marketplace')
+    ok &= check("path preserved", results[onion('a') + '/about']['url'].endswith('/about'))
+    ok &= check("descriptor error not retried",
+                results[onion('d')]['reason'] == 'onion_descriptor_not_found' and results[onion('d')]['attempts'] == 1)
+    ok &= check("timeout reported", results[onion('t')]['reason'] in ('connect_timeout', 'total_timeout'))
+    ok &= check("invalid address rejected", results['not-an-onion.com']['status'] == 'invalid')
+    rendezvous = results[onion('r')]
+    ok &= check("rendezvous failure retried on other proxy",
+                rendezvous['status'] == 'reachable' or rendezvous['attempts'] > 1)
+    ok &= check("hosts isolated by SOCKS username", all(host == user for _, host, user in log))
+
+    # Leaving the loop early cancels the remaining checks
+    slow = OnionChecker(proxies, max_concurrency=4, connect_timeout=5, total_timeout=10)
+    async for _ in slow.run([onion('a')] + [onion('t')] * 4):
+        break
+    await asyncio.sleep(0.1)
+    ok &= check("early exit cancels in-flight checks", all(p.active == 0 for p in proxies))
+
+    first.close()
+    second.close()
+    print("\nAll checks passed." if ok else "\nSome checks failed.")
+    return ok
+
+
+if __name__ == "__main__":
+    sys.exit(0 if asyncio.run(main()) else 1)
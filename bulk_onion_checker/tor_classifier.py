@@ -0,0 +1,278 @@
+"""
+Tor transport for the bulk onion checker.
+
+Fetches page titles from .onion addresses through a pool of SOCKS5 proxies
+(one or more Tor instances). Each proxy has its own concurrency limits:
+    max_streams        - open streams through the proxy at once
+    max_circuit_builds - connections to hosts the proxy has no circuit for yet;
+                         building a rendezvous circuit is the expensive part
+                         of reaching an onion service, so these are limited
+                         separately from streams over warm circuits
+
+Each host is pinned to one proxy and given its own SOCKS username
+(Tor's IsolateSOCKSAuth), so repeat requests to a host reuse its circuit
+while different hosts never share one. Reads stop as soon as the <title> has
+arrived instead of downloading the whole page.
+"""
+
+import asyncio
+import hashlib
+import html
+import re
+import ssl
+import time
+from urllib.parse import urlsplit
+
+# SOCKS5 reply codes, including Tor's extended onion service errors
+SOCKS_ERRORS = {
+    0x01: 'general_failure',
+    0x02: 'not_allowed',
+    0x03: 'network_unreachable',
+    0x04: 'host_unreachable',
+    0x05: 'connection_refused',
+    0x06: 'ttl_expired',
+    0x07: 'command_not_supported',
+    0x08: 'address_type_not_supported',
+    0xF0: 'onion_descriptor_not_found',
+    0xF1: 'onion_descriptor_invalid',
+    0xF2: 'onion_intro_failed',
+    0xF3: 'onion_rendezvous_failed',
+    0xF4: 'onion_client_auth_missing',
+    0xF5: 'onion_client_auth_invalid',
+    0xF6: 'onion_address_invalid',
+    0xF7: 'onion_intro_timed_out',
+}
+
+# Failures worth retrying through another proxy/circuit
+RETRYABLE = {'general_failure', 'ttl_expired', 'onion_intro_failed', 'onion_rendezvous_failed',
+             'onion_intro_timed_out', 'connect_timeout', 'proxy_error'}
+
+# Failures that count against the proxy's health rather than the host's
+PROXY_FAILURES = {'proxy_error', 'general_failure', 'connect_timeout'}
+
+# Tor retires circuits for new streams after 10 minutes (MaxCircuitDirtiness)
+CIRCUIT_LIFETIME = 600
+
+ONION_PATTERN = re.compile(r'^(?:[a-z2-7]{16}|[a-z2-7]{56})\.onion$')
+TITLE_PATTERN = re.compile(rb'<title[^>]*>(.*?)</title', re.IGNORECASE | re.DOTALL)
+
+USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; rv:115.0) Gecko/20100101 Firefox/115.0'
+
+
+class FetchError(Exception):
+    """A fetch failed; reason is a short machine-readable code"""
+
+    def __init__(self, reason, detail=''):
+        super().__init__(f"{reason}: {detail}" if detail else reason)
+        self.reason = reason
+
+
+def normalize_onion_url(address):
+    """Turn 'abc.onion', 'abc.onion/path' or a full URL into (url, host), or None if invalid"""
+    address = address.strip()
+    if not address:
+        return None
+    if '://' not in address:
+        address = 'http://' + address
+    parts = urlsplit(address)
+    host = (parts.hostname or '').lower()
+    if parts.scheme not in ('http', 'https') or not ONION_PATTERN.match(host):
+        return None
+    return parts._replace(netloc=parts.netloc.lower()).geturl(), host
+
+
+class Proxy:
+    """One SOCKS5 endpoint with its own stream and circuit-build limits"""
+
+    def __init__(self, host, port, username=None, password=None, max_streams=16, max_circuit_builds=4):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.streams = asyncio.Semaphore(max_streams)
+        self.circuit_builds = asyncio.Semaphore(max_circuit_builds)
+        self.warm_hosts = {}  # host -> time its circuit was built
+        self.active = 0
+        self.failures = 0
+        self.cooldown_until = 0.0
+
+    @classmethod
+    def parse(cls, spec, **limits):
+        """Parse 'host:port' or 'socks5://[user:pass@]host:port'"""
+        if '://' not in spec:
+            spec = 'socks5://' + spec
+        parts = urlsplit(spec)
+        return cls(parts.hostname or '127.0.0.1', parts.port or 9050, parts.username, parts.password, **limits)
+
+    def __repr__(self):
+        return f"{self.host}:{self.port}"
+
+    def is_warm(self, host):
+        """Whether this proxy probably still has a usable circuit to host"""
+        built = self.warm_hosts.get(host)
+        return built is not None and time.monotonic() - built < CIRCUIT_LIFETIME
+
+    def mark_warm(self, host):
+        now = time.monotonic()
+        self.warm_hosts[host] = now
+        if len(self.warm_hosts) > 10000:
+            self.warm_hosts = {h: t for h, t in self.warm_hosts.items() if now - t < CIRCUIT_LIFETIME}
+
+    def healthy(self):
+        return time.monotonic() >= self.cooldown_until
+
+    def record(self, ok):
+        """Track consecutive failures; back off a proxy that keeps failing"""
+        if ok:
+            self.failures = 0
+            return
+        self.failures += 1
+        if self.failures >= 5:
+            self.cooldown_until = time.monotonic() + min(300, 10 * 2 ** (self.failures - 5))
+
+
+class ProxyPool:
+    """Assigns hosts to proxies, keeping each host on the same proxy when possible"""
+
+    def __init__(self, proxies):
+        if not proxies:
+            raise ValueError("At least one SOCKS proxy is required")
+        self.proxies = list(proxies)
+
+    def choose(self, host, exclude=()):
+        candidates = [p for p in self.proxies if p not in exclude and p.healthy()]
+        if not candidates:
+            candidates = [p for p in self.proxies if p not in exclude] or self.proxies
+        # Stable host -> proxy mapping keeps circuits warm; fall back to least loaded
+        preferred = candidates[int(hashlib.sha1(host.encode()).hexdigest(), 16) % len(candidates)]
+        if preferred.active < min(c.active for c in candidates) + 8:
+            return preferred
+        return min(candidates, key=lambda p: p.active)
+
+
+async def socks5_connect(proxy, host, port, isolation_key, timeout):
+    """Open a stream to host:port through a SOCKS5 proxy"""
+    try:
+        reader, writer = await asyncio.wait_for(asyncio.open_connection(proxy.host, proxy.port), timeout)
+    except (OSError, asyncio.TimeoutError) as e:
+        raise FetchError('proxy_error', f"cannot reach proxy {proxy}: {e}")
+
+    try:
+        # Username/password auth doubles as Tor stream isolation
+        username = (proxy.username or isolation_key).encode()[:255]
+        password = (proxy.password or 'x').encode()[:255]
+        writer.write(b'\x05\x02\x00\x02')
+        await writer.drain()
+        version, method = await asyncio.wait_for(reader.readexactly(2), timeout)
+        if version != 5 or method == 0xFF:
+            raise FetchError('proxy_error', 'proxy rejected authentication methods')
+        if method == 0x02:
+            writer.write(b'\x01' + bytes([len(username)]) + username + bytes([len(password)]) + password)
+            await writer.drain()
+            _, status = await asyncio.wait_for(reader.readexactly(2), timeout)
+            if status != 0:
+                raise FetchError('proxy_error', 'proxy authentication failed')
+
+        # CONNECT by domain name so the proxy (Tor) resolves the onion address
+        encoded = host.encode('idna')
+        writer.write(b'\x05\x01\x00\x03' + bytes([len(encoded)]) + encoded + port.to_bytes(2, 'big'))
+        await writer.drain()
+        header = await asyncio.wait_for(reader.readexactly(4), timeout)
+        if header[1] != 0:
+            raise FetchError(SOCKS_ERRORS.get(header[1], 'proxy_error'), f"SOCKS reply 0x{header[1]:02x}")
+
+        address_type = header[3]
+        if address_type == 0x01:
+            await reader.readexactly(4 + 2)
+        elif address_type == 0x04:
+            await reader.readexactly(16 + 2)
+        else:
+            length = (await reader.readexactly(1))[0]
+            await reader.readexactly(length + 2)
+        return reader, writer
+    except asyncio.TimeoutError:
+        writer.close()
+        raise FetchError('connect_timeout', f"no SOCKS reply within {timeout}s")
+    except asyncio.IncompleteReadError:
+        writer.close()
+        raise FetchError('proxy_error', 'proxy closed the connection')
+    except FetchError:
+        writer.close()
+        raise
+
+
+async def read_title(reader, max_bytes, timeout):
+    """Read an HTTP response until the title is found; returns (status, title)"""
+    data = b''
+    deadline = time.monotonic() + timeout
+    while len(data) < max_bytes:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise FetchError('read_timeout', f"no title within {timeout}s")
+        try:
+            chunk = await asyncio.wait_for(reader.read(16384), remaining)
+        except asyncio.TimeoutError:
+            raise FetchError('read_timeout', f"no title within {timeout}s")
+        if not chunk:
+            break
+        data += chunk
+        if b'</title' in data.lower():
+            break  # Early cancellation: the rest of the page is not needed
+
+    head, _, body = data.partition(b'\r\n\r\n')
+    status_line = head.split(b'\r\n', 1)[0].decode('latin-1', 'replace')
+    try:
+        status = int(status_line.split()[1])
+    except (IndexError, ValueError):
+        raise FetchError('bad_response', status_line[:80])
+
+    match = TITLE_PATTERN.search(body)
+    title = html.unescape(match.group(1).decode('utf-8', 'replace')).strip() if match else ''
+    return status, ' '.join(title.split())
+
+
+async def fetch_title(proxy, url, host, connect_timeout=90, read_timeout=60, max_bytes=262144):
+    """Fetch one onion URL through a proxy; returns (status, title)"""
+    parts = urlsplit(url)
+    port = parts.port or (443 if parts.scheme == 'https' else 80)
+    path = parts.path or '/'
+    if parts.query:
+        path += '?' + parts.query
+
+    # Warm hosts already have a circuit on this proxy and skip the build limit
+    async with proxy.streams:
+        proxy.active += 1
+        try:
+            if proxy.is_warm(host):
+                reader, writer = await socks5_connect(proxy, host, port, host, connect_timeout)
+            else:
+                async with proxy.circuit_builds:
+                    reader, writer = await socks5_connect(proxy, host, port, host, connect_timeout)
+                proxy.mark_warm(host)
+
+            try:
+                if parts.scheme == 'https':
+                    # Onion services commonly use self-signed certificates
+                    context = ssl.create_default_context()
+                    context.check_hostname = False
+                    context.verify_mode = ssl.CERT_NONE
+                    await writer.start_tls(context, server_hostname=host)
+
+                request = (f"GET {path} HTTP/1.1\r\nHost: {host}\r\nUser-Agent: {USER_AGENT}\r\n"
+                           "Accept: text/html\r\nAccept-Encoding: identity\r\nConnection: close\r\n\r\n")
+                writer.write(request.encode('ascii', 'ignore'))
+                await writer.drain()
+                result = await read_title(reader, max_bytes, read_timeout)
+            finally:
+                writer.close()
+            proxy.record(True)
+            return result
+        except FetchError as e:
+            # Only failures that point at the proxy count against its health
+            if e.reason in PROXY_FAILURES:
+                proxy.record(False)
+            raise
+        except (OSError, ssl.SSLError) as e:
+            raise FetchError('connection_error', str(e))
+        finally:
+            proxy.active -= 1
@@ -0,0 +1,219 @@
+"""
+Asyncio core for the interactive classifiers.
+
+Requests are read without blocking, handled concurrently, and their results
+are printed (or yielded) as soon as each one completes. Classification calls
+from concurrent requests are coalesced by MicroBatcher into shared batches
+that run on a single dedicated inference thread, so network fetches and
+other I/O overlap with model inference. An optional LoadShedder
+(common/load_shedding.py) answers requests with a fast fallback when the
+queue is too deep for the model to answer in time.
+"""
+
+import asyncio
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+
+class MicroBatcher:
+    """Coalesces concurrent classification calls into shared micro-batches
+
+    batch_fn(key, items) runs on the inference thread and must return one
+    result per item. Only items submitted with the same key are batched
+    together (e.g. zero-shot texts that share a candidate label set).
+    With a shedder, requests that would miss its deadline get the shedder's
+    fallback result instead, and are rescored by batch_fn when idle if the
+    shedder asks for it.
+    """
+
+    def __init__(self, batch_fn, max_batch_size=16, max_wait=0.01, shedder=None):
+        self.batch_fn = batch_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.shedder = shedder
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='inference')
+        self._queue = None
+        self._worker = None
+        self._in_flight = 0
+
+    async def submit(self, item, key=None, tag=None):
+        """Queue one item for classification and wait for its result
+
+        tag identifies the item to the shedder's on_rescore callback.
+        """
+        if self._worker is None:
+            self._queue = asyncio.Queue()
+            self._worker = asyncio.create_task(self._run())
+
+        if self.shedder is not None:
+            backlog = self._queue.qsize() + self._in_flight
+            if self.shedder.overloaded(backlog, self.max_batch_size, self.max_wait):
+                return await self.shedder.answer(key, item, tag)
+            self.shedder.admitted += 1
+            estimate = self.shedder.estimate(backlog, self.max_batch_size, self.max_wait)
+            start = time.monotonic()
+
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((key, item, future))
+        result = await future
+        if self.shedder is not None:
+            self.shedder.answered(estimate, time.monotonic() - start)
+        return result
+
+    async def close(self):
+        """Finish queued work (including pending rescoring) and stop the inference thread"""
+        if self._worker is not None:
+            await self._queue.put(None)
+            await self._worker
+            self._worker = None
+        if self.shedder is not None:
+            while self.shedder.rescore_ready(force=True):
+                await self._rescore(asyncio.get_running_loop())
+        self._executor.shutdown(wait=True)
+
+    async def _rescore(self, loop):
+        """Score one batch of shed requests with the model"""
+        key, items, tags = self.shedder.take_rescore_batch(self.max_batch_size)
+        try:
+            results = await loop.run_in_executor(self._executor, self.batch_fn, key, items)
+        except Exception as e:
+            print(f"Error rescoring {len(items)} requests: {str(e)}")
+            return
+        self.shedder.rescored_batch(tags, results)
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        stopping = False
+
+        while not stopping:
+            # Spare capacity goes to rescoring shed requests, one batch at a time
+            if self.shedder is not None and self._queue.empty() and self.shedder.rescore_ready():
+                await self._rescore(loop)
+                continue
+            if self.shedder is not None and self.shedder.rescore_ready(force=True):
+                try:
+                    first = await asyncio.wait_for(self._queue.get(), self.shedder.rescore_after)
+                except asyncio.TimeoutError:
+                    continue
+            else:
+                first = await self._queue.get()
+            if first is None:
+                break
+
+            pending = [first]
+            deadline = loop.time() + self.max_wait
+            while len(pending) < self.max_batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    entry = await asyncio.wait_for(self._queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                if entry is None:
+                    stopping = True
+                    break
+                pending.append(entry)
+
+            groups = OrderedDict()
+            for key, item, future in pending:
+                groups.setdefault(key, []).append((item, future))
+
+            self._in_flight = len(pending)
+            for key, entries in groups.items():
+                items = [item for item, _ in entries]
+                start = time.perf_counter()
+                if self.shedder is not None:
+                    self.shedder.started(len(items))
+                try:
+                    results = await loop.run_in_executor(self._executor, self.batch_fn, key, items)
+                    if self.shedder is not None:
+                        self.shedder.observe(len(items), time.perf_counter() - start)
+                except Exception as e:
+                    if self.shedder is not None:
+                        self.shedder.observe(0, 0.0)
+                    for _, future in entries:
+                        if not future.done():
+                            future.set_exception(e)
+                    continue
+
+                for (_, future), result in zip(entries, results):
+                    if not future.done():
+                        future.set_result(result)
+                self._in_flight -= len(entries)
+            self._in_flight = 0
+
+
+def sentiment_batch_fn(classifier):
+    """Batch function for a sentiment-analysis pipeline"""
+    def run(key, texts):
+        return classifier(texts, batch_size=len(texts))
+    return run
+
+
+def zero_shot_batch_fn(classifier):
+    """Batch function for a zero-shot pipeline; the key is the label tuple"""
+    def run(key, texts):
+        results = classifier(texts, list(key))
+        return [results] if isinstance(results, dict) else results
+    return run
+
+
+async def read_input(prompt=''):
+    """Read one line from stdin without blocking the event loop
+
+    Returns None at end of input.
+    """
+    loop = asyncio.get_running_loop()
+    try:
+        return await loop.run_in_executor(None, input, prompt)
+    except EOFError:
+        return None
+
+
+async def run_repl(next_request, handle, max_pending=64):
+    """Read requests until next_request() returns None, handling each concurrently
+
+    handle(request) is responsible for reporting its own result; it is started
+    as soon as the request is read, so later input is accepted while earlier
+    requests are still being fetched or classified.
+    """
+    limiter = asyncio.Semaphore(max_pending)
+    pending = set()
+
+    def finished(task):
+        pending.discard(task)
+        limiter.release()
+        if not task.cancelled() and task.exception() is not None:
+            print(f"Error: {task.exception()}")
+
+    while True:
+        request = await next_request()
+        if request is None:
+            break
+
+        await limiter.acquire()
+        task = asyncio.create_task(handle(request))
+        pending.add(task)
+        task.add_done_callback(finished)
+
+    if pending:
+        await asyncio.gather(*pending, return_exceptions=True)
+
+
+async def stream_results(requests, handle, max_pending=64):
+    """Run handle() over requests concurrently, yielding results as they finish
+
+    Intended for embedding the classifiers in other tools; yields
+    (request, result) pairs in completion order.
+    """
+    limiter = asyncio.Semaphore(max_pending)
+
+    async def run(request):
+        async with limiter:
+            return request, await handle(request)
+
+    tasks = [asyncio.create_task(run(request)) for request in requests]
+    for task in asyncio.as_completed(tasks):
+        yield await task
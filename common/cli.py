@@ -0,0 +1,29 @@
+"""
+Command-line helpers shared by the scripts.
+
+The scripts parse sys.argv by hand: options are removed from the argument
+list with pop_option() and whatever is left are the positional arguments.
+read_lines() reads the corpus files the training scripts take.
+"""
+
+import random
+
+
+def pop_option(args, name, default=None):
+    """Remove '--name value' from args and return the value"""
+    if name not in args:
+        return default
+    index = args.index(name)
+    if index + 1 >= len(args):
+        raise ValueError(f"{name} needs a value")
+    value = args[index + 1]
+    del args[index:index + 2]
+    return value
+
+
+def read_lines(filename, max_lines=None):
+    """Unique non-empty lines in random (repeatable) order"""
+    with open(filename, 'r', encoding='utf-8') as f:
+        lines = list(dict.fromkeys(line.strip() for line in f if line.strip()))
+    random.Random(0).shuffle(lines)
+    return lines[:max_lines]
@@ -0,0 +1,352 @@
+"""
+CPU execution plan: how many processes, which CPUs and how many threads the models use.
+
+With PyTorch's defaults every process runs one intra-op thread per logical
+CPU. Several processes on one machine then oversubscribe the cores, SMT
+siblings compete for the same execution units, and on multi-socket machines
+threads read weights from the other socket's memory. The plan is made from:
+    - the CPUs this process may run on (affinity / cpuset),
+    - physical cores and their SMT siblings (/sys/devices/system/cpu),
+    - NUMA nodes (/sys/devices/system/node),
+    - the cgroup CPU quota (cpu.max, or cpu.cfs_quota_us on cgroup v1).
+The usable cores are split into one slot per process: by default a single
+process gets them all, and launchers that start several processes set
+CPU_PLAN_PROCESSES (coordinator.py --workers auto starts one per NUMA
+node). A slot holds whole cores of one node where it can (several slots
+share a node when there are more processes than nodes) and runs one
+intra-op thread per core and one inter-op thread. Cores left over by an
+uneven split go to the slots with free cores on their node. Under a quota
+the slots shrink so their threads fit in it.
+
+apply_plan() runs once per process, when the model registry is created. It
+claims a free slot (one lock file per slot, released when the process exits;
+CPU_PLAN_SLOT picks one), pins every thread of the process to the slot's
+CPUs, so model weights are allocated in that node's memory, and sets
+torch's thread counts and OMP_NUM_THREADS / MKL_NUM_THREADS for child
+processes. The plan is logged as one line on stderr.
+
+    CPU_PLAN=off          keep PyTorch's defaults (manual tuning)
+    CPU_PLAN_PROCESSES=N  plan for N processes running side by side
+    CPU_PLAN_SLOT=i       use slot i instead of claiming a free one
+    CPU_PLAN_SMT=1        also run threads on SMT siblings
+    CPU_PLAN_THREADS=N    at most N cores (intra-op threads) per process
+"""
+
+import hashlib
+import os
+import shutil
+import sys
+from collections import Counter
+
+SYS_CPU = '/sys/devices/system/cpu'
+SYS_NODE = '/sys/devices/system/node'
+CGROUP_ROOT = '/sys/fs/cgroup'
+PROC_CGROUP = '/proc/self/cgroup'
+SLOT_DIR = os.path.expanduser('~/.cache/bert-sentiment-tools/cpu_slots')
+
+
+def parse_cpu_list(text):
+    """'0-3,8,10-11' -> [0, 1, 2, 3, 8, 10, 11]"""
+    cpus = []
+    for part in (text or '').strip().split(','):
+        if part:
+            first, _, last = part.partition('-')
+            cpus.extend(range(int(first), int(last or first) + 1))
+    return cpus
+
+
+def format_cpu_list(cpus):
+    """[0, 1, 2, 3, 8] -> '0-3,8'"""
+    ranges = []
+    for cpu in sorted(cpus):
+        if ranges and cpu == ranges[-1][1] + 1:
+            ranges[-1][1] = cpu
+        else:
+            ranges.append([cpu, cpu])
+    return ','.join(str(a) if a == b else f"{a}-{b}" for a, b in ranges)
+
+
+def _read(path):
+    try:
+        with open(path, 'r') as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+
+def _plural(n, word):
+    return f"{n} {word}{'' if n == 1 else 's'}"
+
+
+def allowed_cpus():
+    """CPUs this process may run on"""
+    if hasattr(os, 'sched_getaffinity'):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+def _ancestors(root, path):
+    """root/path, its parents, ..., root"""
+    directory = os.path.join(root, path.strip('/'))
+    while True:
+        yield directory
+        if os.path.normpath(directory) == os.path.normpath(root):
+            return
+        directory = os.path.dirname(directory)
+
+
+def cgroup_quota(root=CGROUP_ROOT, proc_cgroup=PROC_CGROUP):
+    """CPUs allowed by the cgroup CPU quota (e.g. 2.5), or None without a quota
+
+    The smallest quota on the way from this process's cgroup up to the root
+    applies; cgroup v2 (cpu.max) is tried before v1 (cpu.cfs_quota_us).
+    """
+    paths = {}
+    for line in (_read(proc_cgroup) or '').splitlines():
+        parts = line.split(':', 2)
+        if len(parts) == 3:
+            for controller in parts[1].split(',') if parts[1] else ['']:
+                paths[controller] = parts[2]
+
+    quotas = []
+    for directory in _ancestors(root, paths.get('', '/')):
+        value = _read(os.path.join(directory, 'cpu.max'))
+        if value and not value.startswith('max'):
+            quota, _, period = value.partition(' ')
+            quotas.append(int(quota) / int(period or 100000))
+    if not quotas:
+        for mount in ('cpu', 'cpu,cpuacct'):
+            if not os.path.isdir(os.path.join(root, mount)):
+                continue
+            for directory in _ancestors(os.path.join(root, mount), paths.get('cpu', '/')):
+                quota = _read(os.path.join(directory, 'cpu.cfs_quota_us'))
+                period = _read(os.path.join(directory, 'cpu.cfs_period_us'))
+                if quota and period and int(quota) > 0:
+                    quotas.append(int(quota) / int(period))
+            break
+    return min(quotas) if quotas else None
+
+
+class CpuTopology:
+    """The CPUs this process may use, grouped into physical cores and NUMA nodes"""
+
+    def __init__(self, cpus=None, sys_cpu=SYS_CPU, sys_node=SYS_NODE, quota=None):
+        self.cpus = sorted(cpus) if cpus else allowed_cpus()
+        allowed = set(self.cpus)
+
+        cores, packages = {}, set()
+        for cpu in self.cpus:
+            topology = os.path.join(sys_cpu, f'cpu{cpu}', 'topology')
+            siblings = (_read(os.path.join(topology, 'core_cpus_list'))
+                        or _read(os.path.join(topology, 'thread_siblings_list')))
+            key = tuple(c for c in parse_cpu_list(siblings) if c in allowed) or (cpu,)
+            cores[key] = list(key)
+            packages.add(_read(os.path.join(topology, 'physical_package_id')) or '0')
+        # Each core is the sorted list of its sibling CPUs; the first one is its primary thread
+        self.cores = sorted(cores.values())
+        self.packages = len(packages)
+
+        nodes = {}
+        names = os.listdir(sys_node) if os.path.isdir(sys_node) else []
+        for name in names:
+            if name.startswith('node') and name[4:].isdigit():
+                node_cpus = [c for c in parse_cpu_list(_read(os.path.join(sys_node, name, 'cpulist'))) if c in allowed]
+                if node_cpus:
+                    nodes[int(name[4:])] = node_cpus
+        self.nodes = dict(sorted(nodes.items())) or {0: list(self.cpus)}
+        self.quota = quota
+
+    @classmethod
+    def detect(cls):
+        return cls(quota=cgroup_quota())
+
+    @property
+    def smt(self):
+        return max(len(core) for core in self.cores) > 1
+
+    def node_of(self, cpu):
+        for node, cpus in self.nodes.items():
+            if cpu in cpus:
+                return node
+        return None
+
+    def summary(self):
+        quota = f"quota {self.quota:g} CPUs" if self.quota else "no CPU quota"
+        smt = f" x{max(len(core) for core in self.cores)} SMT" if self.smt else ""
+        return (f"{_plural(len(self.cpus), 'CPU')}, {_plural(len(self.cores), 'core')}{smt}, "
+                f"{_plural(self.packages, 'socket')}, {_plural(len(self.nodes), 'NUMA node')}, {quota}")
+
+
+class ExecutionPlan:
+    """Slots of whole cores, one per process, with their thread counts"""
+
+    def __init__(self, topology, processes=None, smt=False, max_threads=None):
+        self.topology = topology
+        self.smt = smt and topology.smt
+        cores_by_node = {node: [] for node in topology.nodes}
+        for core in topology.cores:
+            cores_by_node.setdefault(topology.node_of(core[0]) or 0, []).append(core)
+
+        # Threads beyond the quota only get throttled
+        budget = len(topology.cores)
+        if topology.quota:
+            budget = max(1, min(budget, int(topology.quota)))
+        # A process does not know about others it was not told of, so it plans for itself alone
+        self.processes = max(1, min(processes or 1, budget))
+        per_process = max(1, budget // self.processes)
+        spare = budget - per_process * self.processes
+        if max_threads:
+            per_process, spare = max(1, min(per_process, max_threads)), 0
+
+        # Fill slots from the node with the most free cores, so consecutive slots alternate between nodes
+        free = {node: list(cores) for node, cores in cores_by_node.items()}
+        self.slots = []
+        for _ in range(self.processes):
+            node = max(free, key=lambda n: (len(free[n]), -n))
+            if len(free[node]) >= per_process:
+                cores, free[node] = free[node][:per_process], free[node][per_process:]
+            else:
+                node, cores = None, []
+                for n in sorted(free):
+                    need = per_process - len(cores)
+                    cores, free[n] = cores + free[n][:need], free[n][need:]
+            self.slots.append({'node': node, 'cores': cores})
+        # Hand out what an uneven split left, a core at a time, to slots with free cores on their node
+        while spare:
+            given = spare
+            for slot in self.slots:
+                nodes = [slot['node']] if slot['node'] is not None else sorted(free)
+                node = next((n for n in nodes if free[n]), None)
+                if spare and node is not None:
+                    slot['cores'].append(free[node].pop(0))
+                    spare -= 1
+            if spare == given:
+                break
+        self.interop_threads = 1
+
+    @staticmethod
+    def processes_per_node(topology):
+        """One process per NUMA node keeps each model's memory local, if every node has cores to spare"""
+        counts = Counter(topology.node_of(core[0]) or 0 for core in topology.cores)
+        return len(counts) if len(counts) > 1 and min(counts.values()) >= 2 else 1
+
+    @classmethod
+    def from_env(cls, topology=None, processes=None, per_node=False):
+        """Plan from the CPU_PLAN_* variables; per_node plans one process per NUMA node unless told otherwise"""
+        topology = topology or CpuTopology.detect()
+        processes = processes or os.environ.get('CPU_PLAN_PROCESSES')
+        if not processes and per_node:
+            processes = cls.processes_per_node(topology)
+        threads = os.environ.get('CPU_PLAN_THREADS')
+        return cls(topology, processes=int(processes) if processes else None,
+                   smt=os.environ.get('CPU_PLAN_SMT', '0') == '1', max_threads=int(threads) if threads else None)
+
+    def cpus(self, slot):
+        """CPUs of a slot: each core's primary thread, or all its siblings with SMT"""
+        cores = self.slots[slot]['cores']
+        return sorted(cpu for core in cores for cpu in (core if self.smt else core[:1]))
+
+    def intra_threads(self, slot):
+        return len(self.cpus(slot))
+
+    def key(self):
+        """Identifies the plan among lock files; processes with another view of the machine do not collide"""
+        text = f"{format_cpu_list(self.topology.cpus)}/{self.processes}/{self.smt}/{self.slots[0]['cores']}"
+        return hashlib.sha1(text.encode()).hexdigest()[:12]
+
+    def numa_command(self, slot):
+        """numactl prefix that binds a child process's CPUs and memory to the slot's node ([] if not useful)"""
+        node = self.slots[slot]['node']
+        if node is None or len(self.topology.nodes) < 2 or not shutil.which('numactl'):
+            return []
+        return ['numactl', f'--cpunodebind={node}', f'--membind={node}']
+
+    def summary(self, slot=0):
+        node = self.slots[slot]['node']
+        where = f"NUMA node {node}" if node is not None else "several NUMA nodes"
+        siblings = "with SMT siblings" if self.smt else "primary threads only" if self.topology.smt else ""
+        return (f"slot {slot + 1}/{self.processes} on {where}: CPUs {format_cpu_list(self.cpus(slot))} "
+                f"({_plural(len(self.slots[slot]['cores']), 'core')}{', ' + siblings if siblings else ''}), "
+                f"{self.intra_threads(slot)} intra-op / {self.interop_threads} inter-op threads "
+                f"[{self.topology.summary()}]")
+
+
+_slot_locks = []
+_applied = None
+
+
+def claim_slot(plan, slot=None):
+    """(slot, shared): a free slot of the plan, held by a lock file until this process exits
+
+    When every slot is taken the process shares one (shared=True), so the
+    log shows that two processes compete for the same cores.
+    """
+    try:
+        import fcntl
+        os.makedirs(SLOT_DIR, exist_ok=True)
+    except (ImportError, OSError):
+        return slot or 0, False
+    order = [slot] if slot is not None else range(len(plan.slots))
+    for index in order:
+        f = open(os.path.join(SLOT_DIR, f"{plan.key()}-{index}.lock"), 'w')
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            f.close()
+            continue
+        _slot_locks.append(f)
+        return index, False
+    return (slot if slot is not None else os.getpid() % len(plan.slots)), True
+
+
+def _thread_ids():
+    try:
+        return [int(tid) for tid in os.listdir('/proc/self/task')]
+    except OSError:
+        return [0]
+
+
+def apply_plan(plan=None, slot=None, log=True):
+    """Pin this process to a slot and set torch's thread counts; runs once, returns (plan, slot) or None"""
+    global _applied
+    if _applied is not None or os.environ.get('CPU_PLAN', 'auto') == 'off':
+        return _applied
+    import torch
+
+    plan = plan or ExecutionPlan.from_env()
+    if slot is None and os.environ.get('CPU_PLAN_SLOT'):
+        slot = int(os.environ['CPU_PLAN_SLOT']) % len(plan.slots)
+    slot, shared = claim_slot(plan, slot)
+    cpus = plan.cpus(slot)
+
+    # Threads started later inherit the affinity; pin the ones already running too
+    if hasattr(os, 'sched_setaffinity') and cpus != plan.topology.cpus:
+        for tid in _thread_ids():
+            try:
+                os.sched_setaffinity(tid, cpus)
+            except OSError:
+                pass
+    threads = plan.intra_threads(slot)
+    torch.set_num_threads(threads)
+    try:
+        torch.set_num_interop_threads(plan.interop_threads)
+    except RuntimeError:
+        pass  # fixed once inter-op work has started; the intra-op setting still applies
+    os.environ['OMP_NUM_THREADS'] = os.environ['MKL_NUM_THREADS'] = str(threads)
+
+    _applied = (plan, slot)
+    if log:
+        print(f"CPU plan: {plan.summary(slot)}"
+              + (" - shared with another process, all slots are taken" if shared else ""), file=sys.stderr)
+    return _applied
+
+
+def describe_plan():
+    """One line for logs and benchmark output: the applied plan, or PyTorch's own settings"""
+    import torch
+    if _applied is None:
+        return (f"CPU plan: off ({torch.get_num_threads()} intra-op / {torch.get_num_interop_threads()} "
+                f"inter-op threads, PyTorch defaults) [{CpuTopology.detect().summary()}]")
+    plan, slot = _applied
+    return f"CPU plan: {plan.summary(slot)}"
+
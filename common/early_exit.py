@@ -0,0 +1,248 @@
+"""
+Early-exit inference for the DistilBERT sentiment model.
+
+Small classification heads are attached to the [CLS] state after each
+intermediate transformer layer and trained offline to imitate the full
+model's output distribution on our own corpus (see
+sentiment_analysis/train_early_exit.py). At inference time a text stops at
+the first layer whose head is at least `threshold` confident; the remaining
+texts of the batch are compacted (exited rows removed, padding trimmed to
+the longest text still running) before the next layer, so confident inputs
+stop costing compute as soon as they exit. Texts that never pass the
+threshold go through every layer and get the model's own head, exactly as
+without early exit.
+
+Heads are saved together with a fingerprint of the encoder weights and
+refuse to load against a different checkpoint. Enable per model in
+models.json with "execution": "early_exit", "exit_heads" and
+"exit_threshold".
+"""
+
+import os
+from collections import Counter
+
+import torch
+from torch import nn
+
+from common.logit_cache import model_fingerprint
+from common.packing import block_diagonal_bias, distilbert_embed, distilbert_head, distilbert_layer
+
+DEFAULT_THRESHOLD = 0.95
+HEAD_HIDDEN_SIZE = 128
+
+
+class ExitHeads(nn.Module):
+    """One small classifier per intermediate layer (layers 1 .. n-1)"""
+
+    def __init__(self, n_layers, dim, num_labels, hidden_size=HEAD_HIDDEN_SIZE):
+        super().__init__()
+        self.heads = nn.ModuleList(
+            nn.Sequential(nn.Linear(dim, hidden_size), nn.Tanh(), nn.Linear(hidden_size, num_labels))
+            for _ in range(n_layers - 1))
+        self.fingerprint = None
+
+    def forward(self, layer_index, pooled):
+        return self.heads[layer_index](pooled)
+
+    @classmethod
+    def for_model(cls, model):
+        config = model.config
+        return cls(config.n_layers, config.dim, config.num_labels)
+
+    def save(self, path):
+        path = os.path.expanduser(path)
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        torch.save({'fingerprint': self.fingerprint, 'state': self.state_dict(),
+                    'shape': [len(self.heads) + 1, self.heads[0][0].in_features,
+                              self.heads[0][0].out_features, self.heads[0][2].out_features]}, path)
+
+    @classmethod
+    def load(cls, path, model):
+        """Load heads trained for this model's weights"""
+        data = torch.load(os.path.expanduser(path), map_location='cpu')
+        fingerprint = model_fingerprint(model)
+        if data['fingerprint'] != fingerprint:
+            raise ValueError(f"Exit heads in {path} were trained for different model weights")
+        n_layers, dim, hidden_size, num_labels = data['shape']
+        heads = cls(n_layers, dim, num_labels, hidden_size)
+        heads.load_state_dict(data['state'])
+        heads.fingerprint = fingerprint
+        heads.eval()
+        return heads
+
+
+def check_distilbert(model):
+    if getattr(model.config, 'model_type', None) != 'distilbert':
+        raise ValueError("Early exit is only implemented for DistilBERT sequence classification models")
+
+
+def encode(tokenizer, model, texts, device):
+    """Padded input ids, position ids and attention mask for a list of texts"""
+    max_length = min(tokenizer.model_max_length, model.config.max_position_embeddings)
+    encoded = tokenizer(list(texts), truncation=True, max_length=max_length, padding=True, return_tensors='pt')
+    input_ids = encoded['input_ids'].to(device)
+    attention_mask = encoded['attention_mask'].to(device)
+    position_ids = torch.arange(input_ids.shape[1], device=device).expand_as(input_ids)
+    return input_ids, position_ids, attention_mask
+
+
+def layer_features(model, tokenizer, texts, batch_size=32):
+    """[CLS] states after every intermediate layer and the full model's probabilities
+
+    Returns (features, targets) with shapes (texts, layers - 1, dim) and
+    (texts, labels), the training data for ExitHeads.
+    """
+    check_distilbert(model)
+    device = next(model.parameters()).device
+    layers = model.distilbert.transformer.layer
+    features, targets = [], []
+    with torch.inference_mode():
+        for start in range(0, len(texts), batch_size):
+            input_ids, position_ids, attention_mask = encode(tokenizer, model, texts[start:start + batch_size], device)
+            hidden = distilbert_embed(model, input_ids, position_ids)
+            bias = block_diagonal_bias(attention_mask, hidden.dtype)
+            states = []
+            for index, layer in enumerate(layers):
+                hidden = distilbert_layer(layer, hidden, bias)
+                if index < len(layers) - 1:
+                    states.append(hidden[:, 0])
+            features.append(torch.stack(states, dim=1).float().cpu())
+            targets.append(torch.softmax(distilbert_head(model, hidden[:, 0]).float(), dim=-1).cpu())
+    return torch.cat(features), torch.cat(targets)
+
+
+def train_exit_heads(model, features, targets, epochs=5, learning_rate=1e-3, batch_size=256, seed=0):
+    """Fit one head per intermediate layer to the full model's output distribution"""
+    torch.manual_seed(seed)
+    heads = ExitHeads.for_model(model)
+    optimizer = torch.optim.Adam(heads.parameters(), lr=learning_rate)
+    n_texts, n_heads = features.shape[0], features.shape[1]
+
+    heads.train()
+    for epoch in range(epochs):
+        order = torch.randperm(n_texts)
+        total = 0.0
+        for start in range(0, n_texts, batch_size):
+            batch = order[start:start + batch_size]
+            loss = 0.0
+            for layer_index in range(n_heads):
+                log_probs = torch.log_softmax(heads(layer_index, features[batch, layer_index]), dim=-1)
+                # Cross-entropy against the soft labels of the full model
+                loss = loss - (targets[batch] * log_probs).sum(dim=-1).mean()
+            optimizer.zero_grad()
+            loss.backward()
+            optimizer.step()
+            total += loss.item() * len(batch)
+        print(f"  Epoch {epoch + 1}/{epochs}: loss {total / max(n_texts, 1) / max(n_heads, 1):.4f} per head")
+
+    heads.eval()
+    heads.fingerprint = model_fingerprint(model)
+    return heads
+
+
+class EarlyExitClassifier:
+    """Sentiment classifier that stops each text at the first confident layer"""
+
+    def __init__(self, model, tokenizer, heads=None, threshold=DEFAULT_THRESHOLD, batch_size=32, device=-1):
+        check_distilbert(model)
+        self.model = model
+        self.tokenizer = tokenizer
+        self.heads = heads
+        self.threshold = threshold
+        self.batch_size = batch_size
+        self.device = torch.device('cpu' if device < 0 else f'cuda:{device}')
+        self.model.to(self.device)
+        self.model.eval()
+        if self.heads is not None:
+            self.heads.to(self.device)
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.exits = Counter()   # layer number (1-based) -> texts that stopped there
+
+    def __call__(self, inputs, **kwargs):
+        single = isinstance(inputs, str)
+        texts = [inputs] if single else list(inputs)
+        return self.classify(texts)
+
+    def classify(self, texts):
+        """One {'label', 'score'} dict per text, in input order"""
+        probs, _ = self.predict(texts)
+        scores, indices = probs.max(dim=-1)
+        id2label = self.model.config.id2label
+        return [{'label': id2label[int(i)], 'score': float(s)} for s, i in zip(scores, indices)]
+
+    def predict(self, texts, threshold=None):
+        """(probabilities, exit layer per text) for texts"""
+        threshold = self.threshold if threshold is None else threshold
+        probs = torch.zeros((len(texts), self.model.config.num_labels))
+        exit_layers = torch.zeros(len(texts), dtype=torch.long)
+
+        # Similar lengths share a batch, so trimming after exits removes real padding
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+        with torch.inference_mode():
+            for start in range(0, len(order), self.batch_size):
+                batch = order[start:start + self.batch_size]
+                batch_probs, batch_layers = self._run_batch([texts[i] for i in batch], threshold)
+                probs[batch] = batch_probs
+                exit_layers[batch] = batch_layers
+        self.exits.update(exit_layers.tolist())
+        return probs, exit_layers
+
+    def _run_batch(self, texts, threshold):
+        model = self.model
+        layers = model.distilbert.transformer.layer
+        input_ids, position_ids, attention_mask = encode(self.tokenizer, model, texts, self.device)
+        hidden = distilbert_embed(model, input_ids, position_ids)
+        active = torch.arange(len(texts), device=self.device)
+        probs = torch.zeros((len(texts), model.config.num_labels), device=self.device)
+        exit_layers = torch.zeros(len(texts), dtype=torch.long, device=self.device)
+
+        for index, layer in enumerate(layers):
+            hidden = distilbert_layer(layer, hidden, block_diagonal_bias(attention_mask, hidden.dtype))
+            if index == len(layers) - 1:
+                probs[active] = torch.softmax(distilbert_head(model, hidden[:, 0]).float(), dim=-1)
+                exit_layers[active] = index + 1
+                break
+            if self.heads is None:
+                continue
+
+            layer_probs = torch.softmax(self.heads(index, hidden[:, 0]).float(), dim=-1)
+            done = layer_probs.max(dim=-1).values >= threshold
+            if not done.any():
+                continue
+            probs[active[done]] = layer_probs[done]
+            exit_layers[active[done]] = index + 1
+            if done.all():
+                break
+
+            # Re-form the batch from the texts still running
+            keep = ~done
+            active = active[keep]
+            attention_mask = attention_mask[keep]
+            length = int(attention_mask.sum(dim=1).max())
+            attention_mask = attention_mask[:, :length]
+            hidden = hidden[keep, :length]
+
+        return probs.cpu(), exit_layers.cpu()
+
+    def average_layers(self):
+        """Mean number of transformer layers run per text so far"""
+        total = sum(self.exits.values())
+        return sum(layer * count for layer, count in self.exits.items()) / total if total else 0.0
+
+
+def load_early_exit(model, tokenizer, heads_path, threshold=DEFAULT_THRESHOLD, batch_size=32, device=-1):
+    """EarlyExitClassifier with heads from heads_path; runs every layer if the heads are missing"""
+    heads = None
+    if heads_path and os.path.exists(os.path.expanduser(heads_path)):
+        try:
+            heads = ExitHeads.load(heads_path, model)
+        except ValueError as e:
+            print(f"Warning: {str(e)}; running all layers (retrain with sentiment_analysis/train_early_exit.py)")
+    else:
+        print(f"Warning: exit heads {heads_path} not found, running all layers "
+              "(train them with sentiment_analysis/train_early_exit.py)")
+    return EarlyExitClassifier(model, tokenizer, heads, threshold, batch_size, device)
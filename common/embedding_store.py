@@ -0,0 +1,342 @@
+"""
+Persistent store of text embeddings with approximate nearest-neighbour search.
+
+Layout of a store directory:
+    meta.json    - dimension, row count, model name and label names
+    vectors.f16  - memory-mapped float16 matrix (rows grow in chunks)
+    items.tsv    - one line per row: id, label code, score, text
+    ivf.npz      - optional IVF index built with build_ivf_index()
+    hnsw.bin     - optional HNSW index (requires hnswlib)
+
+Rows are L2-normalised so similarity is the dot product. Searches use the
+IVF or HNSW index when one has been built and fall back to a chunked
+brute-force NumPy scan otherwise; rows added after an index was built are
+always scanned brute-force, so results stay current between rebuilds.
+"""
+
+import json
+import os
+from array import array
+
+import numpy as np
+
+try:
+    import hnswlib
+except ImportError:
+    hnswlib = None
+
+CHUNK_ROWS = 65536
+
+
+class EmbeddingStore:
+    """Append-only float16 embedding matrix with an id map"""
+
+    def __init__(self, directory, model=None):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self.meta_path = os.path.join(directory, 'meta.json')
+        self.vectors_path = os.path.join(directory, 'vectors.f16')
+        self.items_path = os.path.join(directory, 'items.tsv')
+
+        self.dim = None
+        self.count = 0
+        self.model = model
+        self.label_names = []
+        self.ids = {}
+        self.row_ids = []
+        self.labels = array('B')
+        self.scores = array('f')
+        self.offsets = array('q')
+        self._matrix = None
+        self._capacity = 0
+        self._index = None
+
+        if os.path.exists(self.meta_path):
+            self._open_existing()
+
+    def _open_existing(self):
+        with open(self.meta_path, 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        self.dim = meta['dim']
+        self.count = meta['count']
+        self.model = self.model or meta.get('model')
+        self.label_names = meta.get('labels', [])
+
+        # items.tsv may hold rows written after the last flush; meta.json is authoritative
+        offset = 0
+        with open(self.items_path, 'rb') as f:
+            for row, line in enumerate(f):
+                if row >= self.count:
+                    break
+                item_id, label, score, _ = line.decode('utf-8').split('\t', 3)
+                self.ids[item_id] = row
+                self.row_ids.append(item_id)
+                self.labels.append(int(label))
+                self.scores.append(float(score))
+                self.offsets.append(offset)
+                offset += len(line)
+        with open(self.items_path, 'ab') as f:
+            f.truncate(offset)
+        self._map(os.path.getsize(self.vectors_path) // (2 * self.dim))
+
+    def _map(self, capacity):
+        self._matrix = np.memmap(self.vectors_path, dtype=np.float16, mode='r+', shape=(capacity, self.dim))
+        self._capacity = capacity
+
+    def _ensure_capacity(self, rows):
+        if rows <= self._capacity:
+            return
+        capacity = max(rows, self._capacity * 2, CHUNK_ROWS)
+        if self._matrix is not None:
+            self._matrix.flush()
+            self._matrix = None
+        with open(self.vectors_path, 'ab') as f:
+            f.truncate(capacity * self.dim * 2)
+        self._map(capacity)
+
+    def __len__(self):
+        return self.count
+
+    def __contains__(self, item_id):
+        return item_id in self.ids
+
+    def vectors(self):
+        """Read-only view of the stored rows"""
+        if self._matrix is None:
+            return np.zeros((0, self.dim or 0), dtype=np.float16)
+        return self._matrix[:self.count]
+
+    def get(self, item_id):
+        """Return (label, score) for a stored id, or None"""
+        row = self.ids.get(item_id)
+        if row is None:
+            return None
+        return self.label_names[self.labels[row]], self.scores[row]
+
+    def text(self, row):
+        """Text stored for a row (read from disk, not kept in memory)"""
+        with open(self.items_path, 'rb') as f:
+            f.seek(self.offsets[row])
+            return f.readline().decode('utf-8').rstrip('\n').split('\t', 3)[3]
+
+    def add(self, item_ids, vectors, labels, scores, texts=None):
+        """Append rows; ids already in the store are skipped"""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if self.dim is None:
+            self.dim = vectors.shape[1]
+        elif vectors.shape[1] != self.dim:
+            raise ValueError(f"Expected {self.dim}-dimensional vectors, got {vectors.shape[1]}")
+
+        keep = [i for i, item_id in enumerate(item_ids) if item_id not in self.ids]
+        if not keep:
+            return
+        self._ensure_capacity(self.count + len(keep))
+
+        self._matrix[self.count:self.count + len(keep)] = vectors[keep].astype(np.float16)
+        with open(self.items_path, 'ab') as f:
+            for i in keep:
+                item_id = ' '.join(str(item_ids[i]).split())
+                text = ' '.join(str(texts[i] if texts is not None else item_ids[i]).split())
+                if labels[i] not in self.label_names:
+                    self.label_names.append(labels[i])
+                code = self.label_names.index(labels[i])
+
+                self.offsets.append(f.tell())
+                f.write(f"{item_id}\t{code}\t{scores[i]}\t{text}\n".encode('utf-8'))
+
+                self.ids[item_id] = self.count
+                self.row_ids.append(item_id)
+                self.labels.append(code)
+                self.scores.append(float(scores[i]))
+                self.count += 1
+
+    def flush(self):
+        """Write vectors and metadata to disk"""
+        if self._matrix is not None:
+            self._matrix.flush()
+        tmp_path = self.meta_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'dim': self.dim, 'count': self.count, 'model': self.model,
+                       'labels': self.label_names}, f)
+        os.replace(tmp_path, self.meta_path)
+
+    def search(self, queries, k=5, nprobe=8):
+        """Nearest stored rows for each query: lists of (id, label, score, similarity, row)"""
+        queries = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+        sims, rows = self.index().search(queries, k, nprobe=nprobe)
+        results = []
+        for sim_row, index_row in zip(sims, rows):
+            results.append([(self.row_ids[r], self.label_names[self.labels[r]], self.scores[r], float(s), int(r))
+                            for s, r in zip(sim_row, index_row) if r >= 0])
+        return results
+
+    def index(self):
+        """The search index for this store, opened once"""
+        if self._index is None:
+            self._index = open_index(self)
+        return self._index
+
+    def lookup_label(self, query, threshold=0.97):
+        """Reuse the label of a near-identical stored text, or return None"""
+        if not self.count:
+            return None
+        matches = self.search(query, k=1)[0]
+        if matches and matches[0][3] >= threshold:
+            return matches[0]
+        return None
+
+
+def _top_k(sims, rows, k):
+    """Keep the k highest similarities (sorted) from parallel arrays"""
+    if len(sims) > k:
+        keep = np.argpartition(-sims, k - 1)[:k]
+        sims, rows = sims[keep], rows[keep]
+    order = np.argsort(-sims)
+    return sims[order], rows[order]
+
+
+def _pad(sims, rows, k):
+    out_sims = np.full(k, -np.inf, dtype=np.float32)
+    out_rows = np.full(k, -1, dtype=np.int64)
+    out_sims[:len(sims)] = sims
+    out_rows[:len(rows)] = rows
+    return out_sims, out_rows
+
+
+class BruteForceIndex:
+    """Exact search by scanning the matrix in chunks"""
+
+    def __init__(self, store, start=0):
+        self.store = store
+        self.start = start
+
+    def candidates(self, query, k):
+        matrix = self.store.vectors()
+        best_sims = np.zeros(0, dtype=np.float32)
+        best_rows = np.zeros(0, dtype=np.int64)
+        for offset in range(self.start, len(matrix), CHUNK_ROWS):
+            chunk = np.asarray(matrix[offset:offset + CHUNK_ROWS], dtype=np.float32)
+            sims = chunk @ query
+            rows = np.arange(offset, offset + len(chunk))
+            best_sims, best_rows = _top_k(np.concatenate([best_sims, sims]),
+                                          np.concatenate([best_rows, rows]), k)
+        return best_sims, best_rows
+
+    def search(self, queries, k, nprobe=None):
+        results = [_pad(*self.candidates(q, k), k) for q in queries]
+        return np.stack([r[0] for r in results]), np.stack([r[1] for r in results])
+
+
+class IVFIndex:
+    """Inverted-file index: k-means coarse quantiser plus per-list scans"""
+
+    def __init__(self, store, centroids, list_offsets, list_rows, indexed_count):
+        self.store = store
+        self.centroids = centroids
+        self.list_offsets = list_offsets
+        self.list_rows = list_rows
+        self.indexed_count = indexed_count
+        self.tail = BruteForceIndex(store, start=indexed_count)
+
+    def search(self, queries, k, nprobe=8):
+        matrix = self.store.vectors()
+        out_sims, out_rows = [], []
+        for query in queries:
+            probes = np.argsort(-(self.centroids @ query))[:nprobe]
+            # Sorted row order keeps memmap reads sequential
+            rows = np.sort(np.concatenate([self.list_rows[self.list_offsets[p]:self.list_offsets[p + 1]] for p in probes]))
+            sims = np.asarray(matrix[rows], dtype=np.float32) @ query
+            tail_sims, tail_rows = self.tail.candidates(query, k)
+            sims, rows = _top_k(np.concatenate([sims, tail_sims]), np.concatenate([rows, tail_rows]), k)
+            padded = _pad(sims, rows, k)
+            out_sims.append(padded[0])
+            out_rows.append(padded[1])
+        return np.stack(out_sims), np.stack(out_rows)
+
+    @classmethod
+    def load(cls, store, path):
+        data = np.load(path)
+        return cls(store, data['centroids'], data['list_offsets'], data['list_rows'], int(data['indexed_count']))
+
+
+class HNSWIndex:
+    """Graph index backed by hnswlib"""
+
+    def __init__(self, store, index, indexed_count):
+        self.store = store
+        self.index = index
+        self.indexed_count = indexed_count
+        self.tail = BruteForceIndex(store, start=indexed_count)
+
+    def search(self, queries, k, nprobe=None):
+        self.index.set_ef(max(64, k * 4))
+        labels, distances = self.index.knn_query(queries, k=min(k, self.indexed_count))
+        out_sims, out_rows = [], []
+        for query, rows, dist in zip(queries, labels, distances):
+            tail_sims, tail_rows = self.tail.candidates(query, k)
+            sims, rows = _top_k(np.concatenate([1 - dist.astype(np.float32), tail_sims]),
+                                np.concatenate([rows.astype(np.int64), tail_rows]), k)
+            padded = _pad(sims, rows, k)
+            out_sims.append(padded[0])
+            out_rows.append(padded[1])
+        return np.stack(out_sims), np.stack(out_rows)
+
+
+def build_ivf_index(store, n_lists=None, sample_size=100000, iterations=10, seed=0):
+    """Cluster the stored rows with spherical k-means and save ivf.npz"""
+    matrix = store.vectors()
+    count = len(matrix)
+    if count == 0:
+        raise ValueError("Store is empty")
+    n_lists = n_lists or max(1, min(4096, int(np.sqrt(count))))
+    rng = np.random.default_rng(seed)
+
+    sample = np.asarray(matrix[np.sort(rng.choice(count, min(sample_size, count), replace=False))], dtype=np.float32)
+    centroids = sample[rng.choice(len(sample), min(n_lists, len(sample)), replace=False)]
+    for _ in range(iterations):
+        assignment = (sample @ centroids.T).argmax(axis=1)
+        for c in range(len(centroids)):
+            members = sample[assignment == c]
+            if len(members):
+                centroid = members.sum(axis=0)
+                centroids[c] = centroid / max(np.linalg.norm(centroid), 1e-12)
+
+    assignment = np.empty(count, dtype=np.int64)
+    for offset in range(0, count, CHUNK_ROWS):
+        chunk = np.asarray(matrix[offset:offset + CHUNK_ROWS], dtype=np.float32)
+        assignment[offset:offset + len(chunk)] = (chunk @ centroids.T).argmax(axis=1)
+
+    list_rows = np.argsort(assignment, kind='stable')
+    list_offsets = np.concatenate([[0], np.cumsum(np.bincount(assignment, minlength=len(centroids)))])
+    np.savez(os.path.join(store.directory, 'ivf.npz'), centroids=centroids, list_offsets=list_offsets,
+             list_rows=list_rows, indexed_count=count)
+    store._index = IVFIndex(store, centroids, list_offsets, list_rows, count)
+    return store._index
+
+
+def build_hnsw_index(store, m=16, ef_construction=200):
+    """Build an HNSW graph over the stored rows and save hnsw.bin"""
+    if hnswlib is None:
+        raise ImportError("hnswlib is not installed (pip install hnswlib)")
+    matrix = store.vectors()
+    index = hnswlib.Index(space='cosine', dim=store.dim)
+    index.init_index(max_elements=len(matrix), M=m, ef_construction=ef_construction)
+    for offset in range(0, len(matrix), CHUNK_ROWS):
+        chunk = np.asarray(matrix[offset:offset + CHUNK_ROWS], dtype=np.float32)
+        index.add_items(chunk, np.arange(offset, offset + len(chunk)))
+    index.save_index(os.path.join(store.directory, 'hnsw.bin'))
+    store._index = HNSWIndex(store, index, len(matrix))
+    return store._index
+
+
+def open_index(store):
+    """Use a built index when available, otherwise brute force"""
+    hnsw_path = os.path.join(store.directory, 'hnsw.bin')
+    ivf_path = os.path.join(store.directory, 'ivf.npz')
+    if hnswlib is not None and os.path.exists(hnsw_path):
+        index = hnswlib.Index(space='cosine', dim=store.dim)
+        index.load_index(hnsw_path)
+        return HNSWIndex(store, index, index.get_current_count())
+    if os.path.exists(ivf_path):
+        return IVFIndex.load(store, ivf_path)
+    return BruteForceIndex(store)
@@ -0,0 +1,267 @@
+"""
+Entity tagging and per-entity sentiment aggregation for headline files.
+
+Entities (companies) come from a JSON dictionary of names, aliases and
+tickers:
+    {"T": {"name": "AT&T Inc.", "aliases": ["AT&T", "AT & T"], "tickers": ["T"]}}
+
+All patterns are compiled into one Aho-Corasick automaton, so tagging a line
+is a single pass over its characters no matter how many entities the
+dictionary holds. Names and aliases match case-insensitively on word
+boundaries; tickers are case-sensitive and, when shorter than three letters,
+only match as "(T)" or "$T" so single-letter tickers do not fire on ordinary
+words.
+
+SentimentAggregates keeps running per-entity counts and mean signed scores
+per time bucket (hour, day, week, month or all), so results can be
+aggregated while a file is processed instead of grepping the CSV afterwards.
+"""
+
+import csv
+import json
+import re
+from collections import deque
+from datetime import datetime
+
+BUCKETS = ('hour', 'day', 'week', 'month', 'all')
+
+# Optional timestamp in front of a line: "2025-01-28<TAB>headline",
+# "2025-01-28 14:05 | headline", "2025-01-28T14:05:00Z<TAB>headline"
+TIMESTAMP_PATTERN = re.compile(
+    r'^(\d{4}-\d{2}-\d{2}(?:[T ]\d{2}:\d{2}(?::\d{2}(?:\.\d+)?)?(?:Z|[+-]\d{2}:?\d{2})?)?)\s*(?:\t|\|)\s*')
+
+
+class AhoCorasick:
+    """Multi-pattern string matcher; matching is linear in the text length"""
+
+    def __init__(self):
+        self.goto = [{}]
+        self.fail = [0]
+        self.output = [[]]
+        self.patterns = []
+        self._built = False
+
+    def add(self, pattern, value):
+        """Add a pattern (already normalised by the caller) with a payload"""
+        node = 0
+        for char in pattern:
+            next_node = self.goto[node].get(char)
+            if next_node is None:
+                next_node = len(self.goto)
+                self.goto[node][char] = next_node
+                self.goto.append({})
+                self.fail.append(0)
+                self.output.append([])
+            node = next_node
+        self.output[node].append(len(self.patterns))
+        self.patterns.append((pattern, value))
+        self._built = False
+
+    def build(self):
+        """Compute failure links breadth-first; outputs inherit their suffixes' matches"""
+        queue = deque(self.goto[0].values())
+        for node in queue:
+            self.fail[node] = 0
+        while queue:
+            node = queue.popleft()
+            for char, child in self.goto[node].items():
+                queue.append(child)
+                state = self.fail[node]
+                while state and char not in self.goto[state]:
+                    state = self.fail[state]
+                self.fail[child] = self.goto[state].get(char, 0)
+                self.output[child] = self.output[child] + self.output[self.fail[child]]
+        self._built = True
+
+    def iter_matches(self, text):
+        """Yield (start, end, pattern_index) for every occurrence of every pattern"""
+        if not self._built:
+            self.build()
+        goto, fail, output, patterns = self.goto, self.fail, self.output, self.patterns
+        node = 0
+        for end, char in enumerate(text, 1):
+            while node and char not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(char, 0)
+            for index in output[node]:
+                yield end - len(patterns[index][0]), end, index
+
+    def __len__(self):
+        return len(self.patterns)
+
+
+def _fold(text):
+    """Lowercase without changing the length, so match offsets stay valid"""
+    lowered = text.lower()
+    if len(lowered) == len(text):
+        return lowered
+    return ''.join(c.lower() if len(c.lower()) == 1 else c for c in text)
+
+
+def _is_word_char(char):
+    return char.isalnum() or char == '_'
+
+
+class EntityTagger:
+    """Tags lines with the ids of entities they mention"""
+
+    def __init__(self, entities):
+        self.names = {}
+        self._folded = AhoCorasick()     # names and aliases, case-insensitive
+        self._exact = AhoCorasick()      # tickers, case-sensitive
+        for entity_id, entry in entities.items():
+            if isinstance(entry, str):
+                entry = {'name': entry}
+            self.names[entity_id] = entry.get('name', entity_id)
+            for alias in {entry.get('name', entity_id), *entry.get('aliases', [])}:
+                if alias.strip():
+                    self._folded.add(_fold(alias.strip()), entity_id)
+            for ticker in entry.get('tickers', []):
+                for form in (f"({ticker})", f"${ticker}", f"({ticker}.", f":{ticker})", f": {ticker})"):
+                    self._exact.add(form, entity_id)
+                if len(ticker) >= 3:
+                    self._exact.add(ticker, entity_id)
+        self._folded.build()
+        self._exact.build()
+
+    @classmethod
+    def from_file(cls, path):
+        """Load an entity dictionary (JSON object, or a list of entries with an 'id')"""
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        if isinstance(data, list):
+            data = {entry['id']: entry for entry in data}
+        return cls(data)
+
+    def __len__(self):
+        return len(self.names)
+
+    def tag(self, text):
+        """Sorted ids of the entities mentioned in text"""
+        found = set()
+        self._collect(self._folded, _fold(text), text, found)
+        self._collect(self._exact, text, text, found)
+        return sorted(found)
+
+    @staticmethod
+    def _collect(automaton, haystack, text, found):
+        for start, end, index in automaton.iter_matches(haystack):
+            pattern, entity_id = automaton.patterns[index]
+            if entity_id in found:
+                continue
+            # Only enforce word boundaries where the pattern itself starts/ends with a word character
+            if _is_word_char(pattern[0]) and start > 0 and _is_word_char(text[start - 1]):
+                continue
+            if _is_word_char(pattern[-1]) and end < len(text) and _is_word_char(text[end]):
+                continue
+            found.add(entity_id)
+
+
+def split_timestamp(line):
+    """Return (timestamp or None, text) for a line with an optional timestamp prefix"""
+    match = TIMESTAMP_PATTERN.match(line)
+    if not match:
+        return None, line
+    value = match.group(1).replace('Z', '+00:00')
+    try:
+        timestamp = datetime.fromisoformat(value)
+    except ValueError:
+        return None, line
+    return timestamp, line[match.end():]
+
+
+def bucket_key(timestamp, bucket):
+    """Label of the time bucket a timestamp falls in"""
+    if timestamp is None or bucket == 'all':
+        return 'all'
+    if bucket == 'hour':
+        return timestamp.strftime('%Y-%m-%dT%H:00')
+    if bucket == 'day':
+        return timestamp.strftime('%Y-%m-%d')
+    if bucket == 'week':
+        year, week, _ = timestamp.isocalendar()
+        return f"{year}-W{week:02d}"
+    return timestamp.strftime('%Y-%m')
+
+
+class SentimentAggregates:
+    """Running per-entity, per-time-bucket sentiment counts"""
+
+    def __init__(self, bucket='day'):
+        if bucket not in BUCKETS:
+            raise ValueError(f"Unknown bucket '{bucket}'. Choose from: {', '.join(BUCKETS)}")
+        self.bucket = bucket
+        self.cells = {}  # (entity_id, bucket label) -> [count, positive, negative, signed score sum]
+
+    def add(self, entities, label, score, timestamp=None):
+        """Count one analysed line for every entity it mentions"""
+        if not entities:
+            return
+        key_bucket = bucket_key(timestamp, self.bucket)
+        positive = label.upper().startswith('POS')
+        negative = label.upper().startswith('NEG')
+        signed = score if positive else -score if negative else 0.0
+        for entity_id in entities:
+            cell = self.cells.get((entity_id, key_bucket))
+            if cell is None:
+                cell = self.cells[(entity_id, key_bucket)] = [0, 0, 0, 0.0]
+            cell[0] += 1
+            cell[1] += positive
+            cell[2] += negative
+            cell[3] += signed
+
+    def merge(self, other):
+        """Fold another aggregate (e.g. from a parallel worker) into this one"""
+        for key, (count, positive, negative, signed) in other.cells.items():
+            cell = self.cells.setdefault(key, [0, 0, 0, 0.0])
+            cell[0] += count
+            cell[1] += positive
+            cell[2] += negative
+            cell[3] += signed
+
+    def rows(self, names=None):
+        """One dict per (entity, bucket), ordered by entity then bucket"""
+        names = names or {}
+        rows = []
+        for (entity_id, key_bucket), (count, positive, negative, signed) in sorted(self.cells.items()):
+            rows.append({
+                'entity': entity_id,
+                'name': names.get(entity_id, entity_id),
+                'bucket': key_bucket,
+                'mentions': count,
+                'positive': positive,
+                'negative': negative,
+                'positive_share': positive / count,
+                'mean_score': signed / count
+            })
+        return rows
+
+    def totals(self):
+        """Per-entity [count, positive, negative, signed] over all buckets"""
+        totals = {}
+        for (entity_id, _), cell in self.cells.items():
+            total = totals.setdefault(entity_id, [0, 0, 0, 0.0])
+            for i, value in enumerate(cell):
+                total[i] += value
+        return totals
+
+    def write_csv(self, filename, names=None):
+        """Save the aggregates to a CSV file"""
+        fieldnames = ['entity', 'name', 'bucket', 'mentions', 'positive', 'negative', 'positive_share', 'mean_score']
+        with open(filename, 'w', newline='', encoding='utf-8') as csvfile:
+            writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
+            writer.writeheader()
+            for row in self.rows(names):
+                writer.writerow(dict(row, positive_share=f"{row['positive_share']:.4f}",
+                                     mean_score=f"{row['mean_score']:.4f}"))
+
+    def print_summary(self, names=None, top=20):
+        """Print the most mentioned entities with their overall sentiment"""
+        names = names or {}
+        totals = sorted(self.totals().items(), key=lambda item: item[1][0], reverse=True)
+        if not totals:
+            print("No entities mentioned.")
+            return
+        print(f"{'Entity':<30} {'Mentions':>8} {'Positive':>9} {'Negative':>9} {'Mean score':>11}")
+        for entity_id, (count, positive, negative, signed) in totals[:top]:
+            print(f"{names.get(entity_id, entity_id)[:30]:<30} {count:>8} {positive:>9} {negative:>9} {signed / count:>11.2f}")
@@ -0,0 +1,324 @@
+"""
+Shared HTTP client for the web scraping scripts.
+
+One HttpClient (get_client()) is shared by every fetch in the process:
+    - a pooled keep-alive session (requests with an HTTPAdapter sized for
+      the fetch workers), or an httpx client with HTTP/2 multiplexing when
+      httpx and h2 are installed (WEBSITE_HTTP2=auto|1|0)
+    - an in-process DNS cache (WEBSITE_DNS_TTL seconds, 0 disables) in front
+      of urllib3's connection factory, so repeat hosts skip the resolver;
+      httpx connections are multiplexed and rarely need a lookup anyway
+    - gzip/deflate decoding, plus brotli and zstd when the brotli /
+      zstandard packages are installed (only decodable encodings are
+      advertised in Accept-Encoding)
+    - limits on the size of response headers (WEBSITE_MAX_HEADER_BYTES) and
+      of the decoded body (WEBSITE_MAX_BODY_BYTES); bodies are streamed and
+      reading stops at the limit, or earlier at a caller's stop marker
+      (scrape_title stops once </title> has arrived)
+    - timing of every request (time to headers, total) and running totals
+      in client.stats
+
+scrape_title() is the page-title scraper the website classifiers share.
+"""
+
+import ipaddress
+import os
+import random
+import re
+import socket
+import threading
+import time
+
+import requests
+import urllib3
+from bs4 import BeautifulSoup
+from requests.adapters import HTTPAdapter
+from urllib3.util import connection as urllib3_connection
+
+try:
+    import h2  # noqa: F401  (httpx needs it for HTTP/2)
+    import httpx
+except ImportError:
+    httpx = None
+
+TIMEOUT = float(os.environ.get('WEBSITE_TIMEOUT', '10'))
+POOL_SIZE = int(os.environ.get('WEBSITE_HTTP_POOL', '16'))
+HTTP2 = os.environ.get('WEBSITE_HTTP2', 'auto')
+DNS_TTL = float(os.environ.get('WEBSITE_DNS_TTL', '300'))
+MAX_BODY_BYTES = int(os.environ.get('WEBSITE_MAX_BODY_BYTES', str(1024 * 1024)))
+MAX_HEADER_BYTES = int(os.environ.get('WEBSITE_MAX_HEADER_BYTES', str(64 * 1024)))
+
+# Random pause before each scrape to be respectful to servers, "min,max" (or one value) in seconds
+FETCH_DELAY = [float(x) for x in os.environ.get('WEBSITE_FETCH_DELAY', '1,3').split(',')]
+
+READ_CHUNK = 16384
+# Unread bodies up to this size are drained after an early stop so the connection can be reused
+DRAIN_BYTES = 65536
+
+# Headers to mimic a real browser
+BROWSER_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
+    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
+    'Accept-Language': 'en-US,en;q=0.5',
+    'Accept-Encoding': urllib3.util.request.ACCEPT_ENCODING.replace(',', ', '),
+    'Connection': 'keep-alive',
+    'Upgrade-Insecure-Requests': '1',
+}
+
+TITLE_END = re.compile(rb'</title\s*>', re.IGNORECASE)
+
+
+class ResponseTooLarge(IOError):
+    """Response headers exceeded the configured limit"""
+
+
+class DNSCache:
+    """getaddrinfo results per (host, port), kept for ttl seconds; failures are not cached"""
+
+    def __init__(self, ttl=DNS_TTL):
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def resolve(self, host, port):
+        key = (host, port)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry[0] > now:
+                self.hits += 1
+                return entry[1]
+        addresses = socket.getaddrinfo(host, port, 0, socket.SOCK_STREAM)
+        with self._lock:
+            self.misses += 1
+            self._entries[key] = (now + self.ttl, addresses)
+        return addresses
+
+
+_dns_cache = None
+_create_connection = urllib3_connection.create_connection
+_connections = {'opened': 0}
+_connections_lock = threading.Lock()
+
+
+def _is_ip(host):
+    try:
+        ipaddress.ip_address(host)
+        return True
+    except ValueError:
+        return False
+
+
+def _cached_create_connection(address, *args, **kwargs):
+    """urllib3's create_connection, resolving through the DNS cache"""
+    with _connections_lock:
+        _connections['opened'] += 1
+    host, port = address
+    if _dns_cache is None or _is_ip(host):
+        return _create_connection(address, *args, **kwargs)
+    error = None
+    for _, _, _, _, sockaddr in _dns_cache.resolve(host, port):
+        try:
+            return _create_connection((sockaddr[0], port), *args, **kwargs)
+        except OSError as e:
+            error = e
+    raise error or OSError(f"no addresses for {host}")
+
+
+def install_dns_cache(ttl=DNS_TTL):
+    """Route new urllib3 (requests) connections through a process-wide DNS cache"""
+    global _dns_cache
+    if _dns_cache is None:
+        _dns_cache = DNSCache(ttl)
+    urllib3_connection.create_connection = _cached_create_connection
+    return _dns_cache
+
+
+class FetchResult:
+    """A fetched response: status, headers, (possibly truncated) decoded body and timing"""
+
+    def __init__(self, url, status, reason, headers, content, truncated, http_version, timing):
+        self.url = url
+        self.status_code = status
+        self.reason = reason
+        self.headers = headers
+        self.content = content
+        self.truncated = truncated
+        self.http_version = http_version
+        self.timing = timing
+
+    def raise_for_status(self):
+        if 400 <= self.status_code < 600:
+            kind = 'Client' if self.status_code < 500 else 'Server'
+            raise requests.HTTPError(f"{self.status_code} {kind} Error: {self.reason} for url: {self.url}")
+
+
+class FetchStats:
+    """Running totals over all requests of a client"""
+
+    def __init__(self):
+        self.requests = 0
+        self.errors = 0
+        self.bytes = 0
+        self.truncated = 0
+        self.versions = {}
+        self.header_times = []
+        self.total_times = []
+        self._lock = threading.Lock()
+
+    def record(self, result=None, error=False):
+        with self._lock:
+            self.requests += 1
+            if error or result is None:
+                self.errors += 1
+                return
+            self.bytes += len(result.content)
+            self.truncated += result.truncated
+            self.versions[result.http_version] = self.versions.get(result.http_version, 0) + 1
+            self.header_times.append(result.timing['headers'])
+            self.total_times.append(result.timing['total'])
+
+    def percentile(self, values, q):
+        values = sorted(values)
+        return values[min(int(q * len(values)), len(values) - 1)] if values else 0.0
+
+
+def _check_headers(headers, limit):
+    size = sum(len(name) + len(value) + 4 for name, value in headers.items())
+    if size > limit:
+        raise ResponseTooLarge(f"response headers are {size} bytes (limit {limit})")
+
+
+def _read_body(chunks, max_bytes, stop_at):
+    """Read decoded chunks up to max_bytes or until stop_at matches; returns (body, stopped early)"""
+    body = bytearray()
+    for chunk in chunks:
+        searched = max(len(body) - 32, 0)
+        body += chunk
+        if len(body) >= max_bytes:
+            return bytes(body[:max_bytes]), True
+        if stop_at is not None and stop_at.search(body, searched):
+            return bytes(body), True
+    return bytes(body), False
+
+
+class HttpClient:
+    """Pooled HTTP client; get() streams a response with the limits above"""
+
+    def __init__(self, pool_size=POOL_SIZE, timeout=TIMEOUT, max_body_bytes=MAX_BODY_BYTES,
+                 max_header_bytes=MAX_HEADER_BYTES, http2=HTTP2, dns_ttl=DNS_TTL):
+        self.timeout = timeout
+        self.max_body_bytes = max_body_bytes
+        self.max_header_bytes = max_header_bytes
+        self.stats = FetchStats()
+        if http2 == '1' and httpx is None:
+            print("Warning: WEBSITE_HTTP2=1 needs httpx and h2 (pip install 'httpx[http2]'); using HTTP/1.1")
+        self.http2 = httpx is not None and http2 != '0'
+
+        if self.http2:
+            limits = httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size)
+            self._client = httpx.Client(http2=True, headers=BROWSER_HEADERS, timeout=timeout,
+                                        limits=limits, follow_redirects=True)
+        else:
+            if dns_ttl > 0:
+                install_dns_cache(dns_ttl)
+            self._session = requests.Session()
+            self._session.headers.update(BROWSER_HEADERS)
+            adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+            self._session.mount('http://', adapter)
+            self._session.mount('https://', adapter)
+
+    def summary(self):
+        """One line: requests, new connections, DNS cache, bytes and latency percentiles"""
+        stats = self.stats
+        parts = [f"{stats.requests} requests ({stats.errors} failed)"]
+        if not self.http2:
+            parts.append(f"{_connections['opened']} connections opened")
+        if _dns_cache is not None and not self.http2:
+            parts.append(f"DNS cache {_dns_cache.hits} hits / {_dns_cache.misses} lookups")
+        parts.append(f"{stats.bytes / 1024:.0f} KiB read ({stats.truncated} stopped early)")
+        parts.extend(f"{version}: {n}" for version, n in sorted(stats.versions.items()))
+        parts.append(f"headers p50 {stats.percentile(stats.header_times, 0.5):.2f}s "
+                     f"p95 {stats.percentile(stats.header_times, 0.95):.2f}s")
+        parts.append(f"total p50 {stats.percentile(stats.total_times, 0.5):.2f}s "
+                     f"p95 {stats.percentile(stats.total_times, 0.95):.2f}s")
+        return "HTTP: " + ', '.join(parts)
+
+    def get(self, url, stop_at=None, max_bytes=None):
+        """GET url; stop_at is a compiled bytes regex after which reading stops"""
+        max_bytes = max_bytes or self.max_body_bytes
+        try:
+            result = self._get_httpx(url, stop_at, max_bytes) if self.http2 else self._get_requests(url, stop_at, max_bytes)
+        except Exception:
+            self.stats.record(error=True)
+            raise
+        self.stats.record(result)
+        return result
+
+    def _get_requests(self, url, stop_at, max_bytes):
+        start = time.perf_counter()
+        with self._session.get(url, timeout=self.timeout, stream=True) as response:
+            headers_time = time.perf_counter() - start
+            _check_headers(response.headers, self.max_header_bytes)
+            body, truncated = _read_body(response.iter_content(READ_CHUNK), max_bytes, stop_at)
+            if truncated:
+                self._drain(response)
+            version = {10: 'HTTP/1.0', 11: 'HTTP/1.1'}.get(response.raw.version, 'HTTP')
+            timing = {'headers': headers_time, 'total': time.perf_counter() - start}
+            return FetchResult(response.url, response.status_code, response.reason, response.headers,
+                               body, truncated, version, timing)
+
+    def _drain(self, response):
+        """After an early stop, read a small remainder so the connection goes back to the pool"""
+        try:
+            remaining = int(response.headers.get('Content-Length', -1)) - response.raw.tell()
+        except ValueError:
+            return
+        if 0 <= remaining <= DRAIN_BYTES:
+            response.raw.drain_conn()
+            response.raw.release_conn()
+
+    def _get_httpx(self, url, stop_at, max_bytes):
+        start = time.perf_counter()
+        with self._client.stream('GET', url) as response:
+            headers_time = time.perf_counter() - start
+            _check_headers(response.headers, self.max_header_bytes)
+            body, truncated = _read_body(response.iter_bytes(READ_CHUNK), max_bytes, stop_at)
+            timing = {'headers': headers_time, 'total': time.perf_counter() - start}
+            return FetchResult(str(response.url), response.status_code, response.reason_phrase, response.headers,
+                               body, truncated, response.http_version, timing)
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    """The process-wide HttpClient, created on first use"""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = HttpClient()
+        return _client
+
+
+def scrape_title(url, client=None):
+    """Scrape the title from a given URL"""
+    try:
+        time.sleep(random.uniform(FETCH_DELAY[0], FETCH_DELAY[-1]))
+
+        # Only the start of the page is read: reading stops once </title> has arrived
+        response = (client or get_client()).get(url, stop_at=TITLE_END)
+        response.raise_for_status()
+
+        soup = BeautifulSoup(response.content, 'html.parser')
+        title_tag = soup.find('title')
+
+        if title_tag:
+            return title_tag.get_text().strip()
+        else:
+            return "No title found"
+    except Exception as e:
+        return f"Error scraping title: {str(e)}"
@@ -0,0 +1,535 @@
+"""
+Run several analysis jobs in one process, sharing the loaded models.
+
+A job file (JSON) lists what to run:
+    {
+        "workers": 2,
+        "jobs": [
+            {"name": "headlines", "task": "sentiment",
+             "input": "headlines.txt", "output": "out/headlines_sentiment.csv"},
+            {"name": "topics", "task": "zero-shot", "model": "zero-shot-fast",
+             "input": "headlines.txt", "output": "out/headlines_topics.csv",
+             "labels": ["politics", "business", "sports"]}
+        ]
+    }
+
+Each job has a task (see TASKS), an input file with one text or URL per
+line, an output CSV and optionally a models.json "model" (default per task),
+"labels" (a list, a comma-separated string or a file with one label per
+line), "threshold" (multi-label), "hypothesis_template", "batch_size"
+(lines per batch, default 64) and "prefilter" (false scores every line).
+Relative paths are read from the job file's directory.
+
+Jobs run the same stages as the scripts they replace. sentiment is
+analyze_file.py: prefiltered lines go to <stem>.skipped.csv. websites is
+batch_website_classifier.py: known domains come from the domain index (and
+newly classified hosts are added to it), titles are prefiltered and
+WEBSITE_CLASSIFIER_BACKEND=student (or "backend": "student") uses the
+distilled student instead of a model. multi-label writes the CSV of
+multi_label_batch.py. The embedding store is not used by jobs.
+
+Every model named by a job is loaded once, before any work starts. Jobs are
+then cut into batches and run on one pool of JOB_WORKERS threads (default 2,
+or "workers" in the job file). A model runs one batch at a time; when it is
+free it takes the next batch of the job with the most estimated work left:
+input bytes x labels per line x model size, rescaled by each job's measured
+speed once its first batch is done. Long jobs start first and all jobs end
+close together. Website jobs fetch their next batch of pages while the model
+works on the current one.
+"""
+
+import csv
+import json
+import os
+import sys
+import time
+from collections import Counter
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import torch
+
+from common.cpu_plan import describe_plan
+from common.model_registry import get_registry
+from common.pipeline_runtime import classifier_stages, prefilter_stage
+from common.prefilter import get_prefilter, skipped_path, write_skipped
+from common.website_student import CLASSIFIER_BACKEND, WEBSITE_CATEGORIES, get_student
+from common.zero_shot import HYPOTHESIS_TEMPLATE, classify_unique, parse_labels
+
+JOB_WORKERS = int(os.environ.get('JOB_WORKERS', '2'))
+BATCH_SIZE = 64
+FETCH_WORKERS = int(os.environ.get('WEBSITE_FETCH_WORKERS', '4'))
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Stands in for a model name in websites jobs that use the distilled student
+STUDENT_MODEL = 'website-student'
+
+
+def read_text_lines(path):
+    """Records of the non-blank lines of a file"""
+    with open(path, 'r', encoding='utf-8') as f:
+        number = 0
+        for line in f:
+            text = line.strip()
+            if text:
+                number += 1
+                yield {'line_number': number, 'text': text, 'bytes': len(line.encode('utf-8'))}
+
+
+def read_url_lines(path):
+    """Records of the URLs in a file (blank lines and # comments are left out)"""
+    for record in read_text_lines(path):
+        if not record['text'].startswith('#'):
+            record.update(number=record['line_number'], url=record.pop('text'), title='', skip_reason='')
+            yield record
+
+
+def website_pipeline():
+    """batch_website_classifier.py, whose stages the websites jobs run"""
+    scripts = os.path.join(REPO_ROOT, 'web_scraping')
+    if scripts not in sys.path:
+        sys.path.insert(0, scripts)
+    import batch_website_classifier
+    return batch_website_classifier
+
+
+def classify_texts(job, classifier, texts, multi_label=False):
+    """Zero-shot results for texts against the job's labels, one model call per unique text"""
+    return classify_unique(classifier, texts, job.labels, hypothesis_template=job.template, multi_label=multi_label)
+
+
+def run_sentiment(job, classifier, records):
+    if job.stages is None:
+        job.stages = classifier_stages(classifier, tokenizer_workers=1)
+        if job.prefilter:
+            job.stages.insert(0, prefilter_stage(get_prefilter("sentiment")))
+    item = records
+    for stage in job.stages:
+        item = stage.fn(item)
+    return records
+
+
+def run_zero_shot(job, classifier, records):
+    for record, result in zip(records, classify_texts(job, classifier, [r['text'] for r in records])):
+        record['label'], record['score'] = result['labels'][0], result['scores'][0]
+    return records
+
+
+def run_multi_label(job, classifier, records):
+    results = classify_texts(job, classifier, [r['text'] for r in records], multi_label=True)
+    for record, result in zip(records, results):
+        record['kept'] = [(label, score) for label, score in zip(result['labels'], result['scores'])
+                          if score >= job.threshold]
+    return records
+
+
+def fetch_titles(job, records):
+    """Answer known domains from the index, else scrape and prefilter the titles, on the fetch threads"""
+    pipeline = website_pipeline()
+    if job.fetch_pool is None:
+        from domain_index import RecheckPolicy, get_index
+        job.index = get_index()
+        job.fetch = pipeline.fetch_stage(job.index, RecheckPolicy.from_env(),
+                                         pipeline.title_prefilter if job.prefilter else None)
+        job.fetch_pool = ThreadPoolExecutor(FETCH_WORKERS, thread_name_prefix=f'{job.name}-fetch')
+    # One URL per call, so a slow site only holds up its own fetch thread
+    list(job.fetch_pool.map(lambda record: job.fetch([record]), records))
+    return records
+
+
+def run_websites(job, classifier, records):
+    pipeline = website_pipeline()
+    pipeline.classify_stage(classifier=classifier, backend=job.backend)(records)
+    if job.index is not None:
+        for record in records:
+            pipeline.learn(job.index, record)
+    return records
+
+
+def sentiment_row(record):
+    if record.get('skip_reason'):
+        return None, []
+    if 'error' in record:
+        return [record['line_number'], 'Error', 0.0, record['text']], ['Error']
+    return [record['line_number'], record['label'], record['score'], record['text']], [record['label']]
+
+
+def zero_shot_row(record):
+    return [record['line_number'], record['label'], record['score'], record['text']], [record['label']]
+
+
+def multi_label_row(record):
+    labels = ';'.join(f"{label}:{score:.4f}" for label, score in record['kept'])
+    return [record['line_number'], labels, record['text']], [label for label, _ in record['kept']]
+
+
+def website_row(record):
+    label, score, _, _ = website_pipeline().outcome(record)
+    return [record['url'], record['title'], label, score, record['skip_reason'] if label == 'Skipped' else ''], [label]
+
+
+# read: input records, prepare: optional step run ahead of the model, run: the model step,
+# row: (CSV row, labels to count) of a finished record; a None row is a prefiltered line for <stem>.skipped.csv
+TASKS = {
+    'sentiment': {'model': 'sentiment', 'labels': None, 'read': read_text_lines, 'prepare': None,
+                  'run': run_sentiment, 'row': sentiment_row,
+                  'columns': ['line_number', 'sentiment', 'confidence', 'text']},
+    'zero-shot': {'model': 'zero-shot', 'labels': None, 'read': read_text_lines, 'prepare': None,
+                  'run': run_zero_shot, 'row': zero_shot_row,
+                  'columns': ['line_number', 'label', 'confidence', 'text']},
+    'multi-label': {'model': 'zero-shot', 'labels': None, 'read': read_text_lines, 'prepare': None,
+                    'run': run_multi_label, 'row': multi_label_row,
+                    'columns': ['line_number', 'labels', 'text']},
+    'websites': {'model': 'zero-shot', 'labels': WEBSITE_CATEGORIES, 'read': read_url_lines,
+                 'prepare': fetch_titles, 'run': run_websites, 'row': website_row,
+                 'columns': ['url', 'title', 'category', 'confidence', 'skip_reason']},
+}
+
+
+def read_labels(value, base_dir):
+    """Labels from a list, a comma-separated string or a file with one label per line"""
+    if value is None or isinstance(value, list):
+        return value
+    path = os.path.join(base_dir, value)
+    if os.path.isfile(path):
+        with open(path, 'r', encoding='utf-8') as f:
+            return [line.strip() for line in f if line.strip()]
+    return parse_labels(value)
+
+
+class Job:
+    """One entry of the job file, with its progress and metrics"""
+
+    def __init__(self, spec, base_dir, batch_size=BATCH_SIZE):
+        self.name = spec.get('name') or os.path.splitext(os.path.basename(spec.get('input', '')))[0]
+        if spec.get('task') not in TASKS:
+            raise ValueError(f"job '{self.name}': unknown task '{spec.get('task')}' (use {', '.join(TASKS)})")
+        for key in ('input', 'output'):
+            if not spec.get(key):
+                raise ValueError(f"job '{self.name}': no \"{key}\" given")
+        self.task_name = spec['task']
+        self.task = TASKS[self.task_name]
+        self.backend = spec.get('backend', CLASSIFIER_BACKEND) if self.task_name == 'websites' else None
+        self.model = STUDENT_MODEL if self.backend == 'student' else spec.get('model', self.task['model'])
+        self.input = os.path.join(base_dir, spec['input'])
+        self.output = os.path.join(base_dir, spec['output'])
+        self.labels = read_labels(spec.get('labels'), base_dir) or self.task['labels']
+        if self.task_name in ('zero-shot', 'multi-label') and not self.labels:
+            raise ValueError(f"job '{self.name}': the {self.task_name} task needs \"labels\"")
+        self.threshold = float(spec.get('threshold', 0.5))
+        self.template = spec.get('hypothesis_template', HYPOTHESIS_TEMPLATE)
+        self.batch_size = int(spec.get('batch_size', batch_size))
+        self.prefilter = bool(spec.get('prefilter', True))
+        if not os.path.isfile(self.input):
+            raise ValueError(f"job '{self.name}': input file '{self.input}' not found")
+        self.size = os.path.getsize(self.input)
+
+        self.stages = None
+        self.fetch = None
+        self.fetch_pool = None
+        self.index = None         # domain index of a websites job
+        self.skipped = []         # (line index, text, reason) of prefiltered sentiment lines
+        self.ready = None         # batch prepared ahead, waiting for the model
+        self.preparing = False
+        self.running = False
+        self.exhausted = False
+        self.error = None
+        self.read_bytes = 0
+        self.done_bytes = 0
+        self.lines = 0
+        self.batches = 0
+        self.seconds = 0.0        # model time of finished batches
+        self.prepare_seconds = 0.0
+        self.counts = Counter()
+        self.started = self.finished = None
+        self._records = None
+        self._file = None
+        self._writer = None
+
+    @property
+    def pairs(self):
+        """Model inputs per line: one per label for the zero-shot tasks"""
+        return len(self.labels) if self.labels else 1
+
+    @property
+    def active(self):
+        return self.finished is None
+
+    def open(self):
+        os.makedirs(os.path.dirname(os.path.abspath(self.output)), exist_ok=True)
+        self._file = open(self.output, 'w', newline='', encoding='utf-8')
+        self._writer = csv.writer(self._file)
+        self._writer.writerow(self.task['columns'])
+        self._records = self.task['read'](self.input)
+
+    def next_batch(self):
+        """The next batch_size input records ([] once the input is used up)"""
+        batch = []
+        if not self.exhausted:
+            for record in self._records:
+                batch.append(record)
+                self.read_bytes += record['bytes']
+                if len(batch) >= self.batch_size:
+                    break
+            else:
+                self.exhausted = True
+        return batch
+
+    def write(self, records, seconds):
+        for record in records:
+            row, labels = self.task['row'](record)
+            if row is None:
+                self.skipped.append((record['line_number'] - 1, record['text'], record['skip_reason']))
+                continue
+            self._writer.writerow(row)
+            self.counts.update(labels)
+        self._file.flush()
+        self.lines += len(records)
+        self.batches += 1
+        self.seconds += seconds
+        self.done_bytes += sum(r['bytes'] for r in records)
+
+    def fail(self, error):
+        self.error = str(error)
+        self.exhausted = True
+        self.ready = None
+
+    def close(self):
+        self.finished = time.monotonic()
+        if self._file is not None:
+            self._file.close()
+        if self.fetch_pool is not None:
+            self.fetch_pool.shutdown()
+        if self.skipped:
+            write_skipped(self.skipped, skipped_path(self.output))
+        if self.index is not None and self.index.dirty:
+            self.index.save()
+
+    def metrics(self, start):
+        return {
+            'name': self.name,
+            'task': self.task_name,
+            'model': self.model,
+            'input': self.input,
+            'output': self.output,
+            'status': 'failed' if self.error else 'done',
+            'error': self.error,
+            'lines': self.lines,
+            'batches': self.batches,
+            'compute_seconds': round(self.seconds, 3),
+            'fetch_seconds': round(self.prepare_seconds, 3),
+            'lines_per_second': round(self.lines / self.seconds, 1) if self.seconds else None,
+            'started_at': round((self.started or start) - start, 3),
+            'finished_at': round((self.finished or start) - start, 3),
+            'labels': dict(self.counts.most_common()),
+            'skipped': dict(Counter(reason for _, _, reason in self.skipped).most_common())
+        }
+
+
+def load_jobs(path):
+    """(jobs, settings) of a job file"""
+    with open(path, 'r', encoding='utf-8') as f:
+        config = json.load(f)
+    base_dir = os.path.dirname(os.path.abspath(path))
+    batch_size = int(config.get('batch_size', BATCH_SIZE))
+    jobs = [Job(spec, base_dir, batch_size) for spec in config.get('jobs', [])]
+    registry = get_registry()
+    for job in jobs:
+        try:
+            if job.model == STUDENT_MODEL:
+                get_student()
+            else:
+                registry.spec(job.model)
+        except KeyError as e:
+            raise ValueError(f"job '{job.name}': {e.args[0]}")
+        except FileNotFoundError as e:
+            raise ValueError(f"job '{job.name}': {e}")
+    names = Counter(job.name for job in jobs)
+    outputs = Counter(os.path.abspath(job.output) for job in jobs)
+    duplicates = [name for name, n in names.items() if n > 1] + [out for out, n in outputs.items() if n > 1]
+    if duplicates:
+        raise ValueError(f"job names and outputs must be unique: {', '.join(duplicates)}")
+    settings = {key: value for key, value in config.items() if key != 'jobs'}
+    return jobs, settings
+
+
+class Scheduler:
+    """Remaining-work estimates: prior cost per byte, rescaled by measured speed"""
+
+    def __init__(self, jobs, model_sizes):
+        self.jobs = jobs
+        self.model_sizes = model_sizes
+
+    def unit_cost(self, job):
+        """Prior cost of one input byte: labels per line x model size in MB"""
+        return job.pairs * max(self.model_sizes[job.model], 1) / 2 ** 20
+
+    def seconds_per_unit(self, job):
+        if job.done_bytes:
+            return job.seconds / (job.done_bytes * self.unit_cost(job))
+        measured = [j for j in self.jobs if j.done_bytes]
+        if not measured:
+            return 1.0
+        return sum(j.seconds for j in measured) / sum(j.done_bytes * self.unit_cost(j) for j in measured)
+
+    def remaining(self, job):
+        """Estimated seconds of model time left for a job"""
+        return max(job.size - job.read_bytes, 0) * self.unit_cost(job) * self.seconds_per_unit(job)
+
+    def order(self, jobs):
+        return sorted(jobs, key=self.remaining, reverse=True)
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - start
+
+
+def load_models(jobs):
+    """Load every model the jobs name, once; returns name -> {'classifier', 'key', 'locks', 'size', 'seconds'}"""
+    registry = get_registry()
+    models = {}
+    for name in dict.fromkeys(job.model for job in jobs):
+        start = time.perf_counter()
+        if name == STUDENT_MODEL:
+            student = get_student()
+            models[name] = {'classifier': None, 'key': (name,), 'locks': {(name,)},
+                            'size': student.weights.nbytes, 'seconds': time.perf_counter() - start}
+            print(f"Loaded the website student ({student.weights.nbytes / 2 ** 20:.0f} MB)")
+            continue
+        classifier = registry.get(name)
+        key, size = registry.checkpoint(name)
+        spec = registry.spec(name)
+        # A batch holds its weights and its tokenizer, which other entries may share
+        locks = {key, ('tokenizer', spec.get('tokenizer', spec['model']))}
+        models[name] = {'classifier': classifier, 'key': key, 'locks': locks, 'size': size,
+                        'seconds': time.perf_counter() - start}
+        shared = [other for other, model in models.items() if model['key'] == key and other != name]
+        print(f"Loaded {name} ({size / 2 ** 20:.0f} MB) in {models[name]['seconds']:.1f}s"
+              + (f", sharing weights with {', '.join(shared)}" if shared else ""))
+    # The runner keeps its own references, so a tight memory budget cannot make a model load twice
+    evicted = [name for name in models if name != STUDENT_MODEL and name not in registry.loaded()]
+    if evicted:
+        print(f"Warning: memory_budget_mb is smaller than the jobs' models; "
+              f"{', '.join(evicted)} stay loaded for this run anyway")
+    return models
+
+
+def run_jobs(jobs, workers=JOB_WORKERS):
+    """Run the jobs on one shared worker pool; returns the run metrics"""
+    workers = max(1, workers)
+    start = time.monotonic()
+    models = load_models(jobs)
+    load_seconds = time.monotonic() - start
+    # Concurrent batches split the CPU plan's threads instead of each claiming all of them
+    plan = describe_plan()
+    threads = max(1, torch.get_num_threads() // workers)
+    torch.set_num_threads(threads)
+    scheduler = Scheduler(jobs, {name: model['size'] for name, model in models.items()})
+
+    print(f"\n{len(jobs)} jobs on {workers} workers ({threads} torch threads each), largest first:")
+    for job in scheduler.order(jobs):
+        labels = f"  x {len(job.labels)} labels" if job.labels else ""
+        print(f"  {job.name:<20} {job.task_name:<12} {job.model:<20} {job.size / 2 ** 20:>8.1f} MB input{labels}")
+    print("=" * 60)
+
+    for job in jobs:
+        job.open()
+    prefetching = sum(1 for job in jobs if job.task['prepare'])
+    pool = ThreadPoolExecutor(workers + prefetching, thread_name_prefix='job')
+    futures = {}
+    busy = set()
+    run_start = time.monotonic()
+
+    def finish(job):
+        job.close()
+        status = f"failed: {job.error}" if job.error else f"{job.lines} lines"
+        print(f"[{time.monotonic() - run_start:7.1f}s] {job.name} finished ({status})")
+
+    try:
+        while True:
+            for job in jobs:
+                if (job.active and job.task['prepare'] and job.ready is None and not job.preparing
+                        and not job.exhausted):
+                    batch = job.next_batch()
+                    if batch:
+                        job.preparing = True
+                        job.started = job.started or time.monotonic()
+                        futures[pool.submit(timed, job.task['prepare'], job, batch)] = ('prepare', job)
+
+            running = sum(1 for kind, _ in futures.values() if kind == 'run')
+            for job in scheduler.order([job for job in jobs if job.active and not job.running]):
+                locks = models[job.model]['locks']
+                if running >= workers or busy & locks:
+                    continue
+                if job.task['prepare']:
+                    batch, job.ready = job.ready, None
+                else:
+                    batch = job.next_batch()
+                if not batch:
+                    continue
+                busy |= locks
+                job.running = True
+                job.started = job.started or time.monotonic()
+                classifier = models[job.model]['classifier']
+                futures[pool.submit(timed, job.task['run'], job, classifier, batch)] = ('run', job)
+                running += 1
+
+            for job in jobs:
+                if job.active and job.exhausted and not job.running and not job.preparing and job.ready is None:
+                    finish(job)
+            if not futures:
+                break
+
+            done, _ = wait(futures, return_when=FIRST_COMPLETED)
+            for future in done:
+                kind, job = futures.pop(future)
+                if kind == 'run':
+                    job.running = False
+                    busy -= models[job.model]['locks']
+                else:
+                    job.preparing = False
+                try:
+                    records, seconds = future.result()
+                except Exception as e:
+                    job.fail(e)
+                    continue
+                if job.error:
+                    continue
+                if kind == 'run':
+                    job.write(records, seconds)
+                else:
+                    job.ready = records
+                    job.prepare_seconds += seconds
+    finally:
+        pool.shutdown(cancel_futures=True)
+        for job in jobs:
+            if job.active:
+                job.fail(job.error or "interrupted")
+                job.close()
+
+    wall = time.monotonic() - start
+    compute = sum(job.seconds for job in jobs)
+    return {
+        'workers': workers,
+        'torch_threads': threads,
+        'cpu_plan': plan,
+        'wall_seconds': round(wall, 3),
+        'model_load_seconds': round(load_seconds, 3),
+        'compute_seconds': round(compute, 3),
+        'models': {name: {'mb': round(model['size'] / 2 ** 20, 1), 'load_seconds': round(model['seconds'], 3)}
+                   for name, model in models.items()},
+        'jobs': [job.metrics(run_start) for job in jobs]
+    }
+
+
+def print_metrics(metrics):
+    print(f"\n{'job':<20}  {'lines':>7}  {'batches':>7}  {'compute':>8}  {'lines/s':>8}  {'done at':>8}  status")
+    for job in metrics['jobs']:
+        speed = f"{job['lines_per_second']:,.0f}" if job['lines_per_second'] else '-'
+        print(f"{job['name']:<20}  {job['lines']:>7}  {job['batches']:>7}  {job['compute_seconds']:>7.1f}s  "
+              f"{speed:>8}  {job['finished_at']:>7.1f}s  {job['status']}")
+    running = metrics['wall_seconds'] - metrics['model_load_seconds']
+    print(f"\nWall time {metrics['wall_seconds']:.1f}s: {metrics['model_load_seconds']:.1f}s loading "
+          f"{len(metrics['models'])} models once, {running:.1f}s running {metrics['compute_seconds']:.1f}s "
+          f"of batch compute on {metrics['workers']} workers")
@@ -0,0 +1,422 @@
+"""
+Load shedding for the sentiment path: a fast lexicon fallback for bursts.
+
+When headlines arrive faster than DistilBERT can score them, latency grows
+without bound. A LoadShedder sits in front of a MicroBatcher (see
+common/async_repl.py) and decides, per request, whether the model can still
+answer in time:
+
+    - queue depth: requests already waiting (plus the batch in flight) are
+      at or above max_queue
+    - deadline slack: the rest of the batch the model is running, the
+      batcher's collection window (max_wait) and the batches ahead of the
+      request, its own included and counted as full, at the measured seconds
+      per item would push the answer past `deadline` seconds. A batch that is
+      taking longer than that raises the estimate for the ones behind it,
+      and the latency admitted requests actually see (event loop and thread
+      contention included) rescales the estimate for the next ones.
+
+If either is true the request is answered at once by a LexiconScorer, in the
+usual {'label': 'POSITIVE'|'NEGATIVE', 'score': ...} format plus
+'model': 'fallback'. With rescore on, shed requests are queued and scored by
+the model once there has been no shedding for `rescore_after` seconds and
+the batcher is idle; on_rescore(tag, result) receives the model's answer
+(the tag given to MicroBatcher.submit, or the item itself).
+
+The LexiconScorer is a logistic model over word unigrams and bigrams. A batch
+is scored without a Python loop over its tokens: token boundaries and
+64-bit token hashes are computed with NumPy over the batch's UTF-8 bytes,
+hashes are looked up in the sorted lexicon, and unigram and bigram weights
+are summed per line with bincount.
+Weights come from SENTIMENT_LEXICON, else the lexicon distilled from the full
+model by sentiment_analysis/train_fallback.py, else the small hand-written
+sentiment_lexicon.json in the repository root.
+
+SENTIMENT_SHED_DEADLINE, SENTIMENT_SHED_MAX_QUEUE and
+SENTIMENT_RESCORE_AFTER override the defaults (0.5s, 1000 requests, 2s).
+"""
+
+import asyncio
+import json
+import os
+import re
+import time
+from collections import deque
+
+import numpy as np
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SEED_LEXICON_PATH = os.path.join(REPO_ROOT, 'sentiment_lexicon.json')
+TRAINED_LEXICON_PATH = '~/.cache/bert-sentiment-tools/sentiment_lexicon.json'
+
+DEADLINE = float(os.environ.get('SENTIMENT_SHED_DEADLINE', '0.5'))
+MAX_QUEUE = int(os.environ.get('SENTIMENT_SHED_MAX_QUEUE', '1000'))
+RESCORE_AFTER = float(os.environ.get('SENTIMENT_RESCORE_AFTER', '2'))
+
+# A token is a run of ASCII letters/digits and non-ASCII characters, with apostrophes allowed inside
+TOKEN_PATTERN = re.compile(r"(?:[a-z0-9]|[^\x00-\x7f])+(?:'(?:[a-z0-9]|[^\x00-\x7f])+)*")
+WORD_BYTES = np.zeros(256, dtype=bool)
+WORD_BYTES[[ord(c) for c in 'abcdefghijklmnopqrstuvwxyz0123456789']] = True
+WORD_BYTES[128:] = True
+APOSTROPHE, NEWLINE = ord("'"), ord('\n')
+
+# Tokens are identified by a 64-bit polynomial hash of their bytes (arithmetic wraps mod 2**64)
+HASH_BASE = np.uint64(0x100000001B3)
+HASH_BASE_INVERSE = np.uint64(pow(int(HASH_BASE), -1, 2 ** 64))
+# Short tokens have small hashes; multiplying spreads them over the top bits used as table slots
+SLOT_MIX = np.uint64(0x9E3779B97F4A7C15)
+
+
+def normalize(text):
+    return text.lower().replace('\u2019', "'")
+
+
+def tokenize(text):
+    """Lowercased word tokens, as the lexicon sees them"""
+    return TOKEN_PATTERN.findall(normalize(text))
+
+
+def lexicon_path():
+    """SENTIMENT_LEXICON, else the trained lexicon if there is one, else the bundled seed"""
+    path = os.environ.get('SENTIMENT_LEXICON')
+    if path:
+        return os.path.expanduser(path)
+    trained = os.path.expanduser(TRAINED_LEXICON_PATH)
+    return trained if os.path.exists(trained) else SEED_LEXICON_PATH
+
+
+_power_tables = {}
+
+
+def _powers(base, n):
+    """base**0 .. base**(n-1) mod 2**64; tables are kept and grown for later batches"""
+    table = _power_tables.get(int(base))
+    if table is None or len(table) < n:
+        size = max(n, 2 * len(table) if table is not None else 1 << 16)
+        table = np.full(size, base, dtype=np.uint64)
+        table[0] = 1
+        with np.errstate(over='ignore'):
+            table = np.cumprod(table, dtype=np.uint64)
+        _power_tables[int(base)] = table
+    return table[:n]
+
+
+def token_hashes(texts):
+    """(hash of every token, line index of every token) for a batch, tokenized as tokenize() does
+
+    Works on the UTF-8 bytes of the whole batch at once: token boundaries come
+    from a byte class table, and each token's hash from prefix sums, so no
+    Python code runs per token.
+    """
+    data = np.frombuffer(normalize('\n'.join(texts)).encode('utf-8'), dtype=np.uint8)
+    if not len(data):
+        return np.zeros(0, dtype=np.uint64), np.zeros(0, dtype=np.int64)
+    # Word flags padded with a non-word byte on both sides
+    word = np.zeros(len(data) + 2, dtype=bool)
+    np.take(WORD_BYTES, data, out=word[1:-1])
+    # Apostrophes only count between two word characters ("isn't", not "'quoted'")
+    word[1:-1] |= (data == APOSTROPHE) & word[:-2] & word[2:]
+    # Token starts and ends alternate in the list of flag changes
+    changes = np.flatnonzero(word[1:] != word[:-1])
+    starts, ends = changes[0::2], changes[1::2]
+
+    with np.errstate(over='ignore'):
+        prefix = np.zeros(len(data) + 1, dtype=np.uint64)
+        np.cumsum(data * _powers(HASH_BASE, len(data)), out=prefix[1:])
+        hashes = (prefix[ends] - prefix[starts]) * _powers(HASH_BASE_INVERSE, len(data))[starts]
+    lines = np.searchsorted(np.flatnonzero(data == NEWLINE), starts)
+    return hashes, lines
+
+
+class LexiconScorer:
+    """Vectorized unigram/bigram logistic scorer with the sentiment pipeline's output format"""
+
+    def __init__(self, unigrams, bigrams=None, bias=0.0, labels=('NEGATIVE', 'POSITIVE')):
+        self.labels = labels
+        self.bias = float(bias)
+        bigrams = bigrams or {}
+        # Every word of a bigram needs an id, even without a unigram weight of its own
+        words = set(unigrams)
+        for bigram in bigrams:
+            words.update(bigram.split())
+        words = sorted(words)
+        hashes, _ = token_hashes(words)
+        if len(hashes) != len(words) or len(np.unique(hashes)) != len(words):
+            raise ValueError("lexicon entries must be single tokens without hash collisions")
+        # Id 0 is the unknown token
+        self.words = [None] + words
+        ids = {word: index for index, word in enumerate(self.words)}
+        self._build_table(hashes)
+        self.weights = np.zeros(len(self.words), dtype=np.float32)
+        for word, weight in unigrams.items():
+            self.weights[ids[word]] = weight
+
+        size = len(self.words)
+        codes = {}
+        for bigram, weight in bigrams.items():
+            first, second = bigram.split()
+            codes[ids[first] * size + ids[second]] = weight
+        order = sorted(codes)
+        self.bigram_codes = np.array(order, dtype=np.int64)
+        self.bigram_weights = np.array([codes[code] for code in order], dtype=np.float32)
+
+    def _build_table(self, hashes):
+        """Open-addressing table from token hash to id, indexed by the mixed hash's top bits"""
+        bits = max(10, int(len(hashes) * 4).bit_length())
+        self.shift = np.uint64(64 - bits)
+        self.mask = (1 << bits) - 1
+        self.table_keys = np.zeros(1 << bits, dtype=np.uint64)
+        self.table_ids = np.zeros(1 << bits, dtype=np.int64)
+        self.max_probe = 0
+        homes = self._home_slots(hashes).tolist()
+        for index, (value, slot) in enumerate(zip(hashes.tolist(), homes), start=1):
+            probe = 0
+            while self.table_ids[(slot + probe) & self.mask]:
+                probe += 1
+            self.table_keys[(slot + probe) & self.mask] = value
+            self.table_ids[(slot + probe) & self.mask] = index
+            self.max_probe = max(self.max_probe, probe)
+
+    def _home_slots(self, hashes):
+        with np.errstate(over='ignore'):
+            return ((hashes * SLOT_MIX) >> self.shift).astype(np.int64)
+
+    @classmethod
+    def load(cls, path=None):
+        path = path or lexicon_path()
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        scorer = cls(data.get('unigrams', {}), data.get('bigrams', {}), data.get('bias', 0.0),
+                     tuple(data.get('labels', ('NEGATIVE', 'POSITIVE'))))
+        scorer.path = path
+        return scorer
+
+    def save(self, path):
+        path = os.path.expanduser(path)
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        size = len(self.words)
+        data = {
+            'labels': list(self.labels),
+            'bias': round(self.bias, 4),
+            'unigrams': {self.words[i]: round(float(w), 4) for i, w in enumerate(self.weights) if w},
+            'bigrams': {f"{self.words[int(c) // size]} {self.words[int(c) % size]}": round(float(w), 4)
+                        for c, w in zip(self.bigram_codes, self.bigram_weights)}
+        }
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, indent=1, sort_keys=True)
+
+    def __len__(self):
+        return int(np.count_nonzero(self.weights)) + len(self.bigram_codes)
+
+    def token_ids(self, texts):
+        """(token ids, line index of each token); unknown tokens are 0"""
+        hashes, lines = token_hashes(texts)
+        home = self._home_slots(hashes)
+        ids = np.zeros(len(hashes), dtype=np.int64)
+        for probe in range(self.max_probe + 1):
+            slots = (home + probe) & self.mask
+            found = self.table_keys[slots] == hashes
+            ids[found] = self.table_ids[slots[found]]
+        return ids, lines
+
+    def logits(self, texts):
+        """Log-odds of the second label for each text"""
+        if not texts:
+            return np.zeros(0, dtype=np.float32)
+        # Line breaks inside a text would be read as the start of the next one
+        ids, lines = self.token_ids([text.replace('\n', ' ') if '\n' in text else text for text in texts])
+        totals = np.bincount(lines, weights=self.weights[ids], minlength=len(texts))
+        if len(self.bigram_codes) and len(ids) > 1:
+            codes = ids[:-1] * len(self.words) + ids[1:]
+            slots = np.searchsorted(self.bigram_codes, codes)
+            slots[slots == len(self.bigram_codes)] = 0
+            # Pairs of known words on the same line only
+            found = (self.bigram_codes[slots] == codes) & (lines[:-1] == lines[1:])
+            totals += np.bincount(lines[1:][found], weights=self.bigram_weights[slots[found]],
+                                  minlength=len(texts))
+        return (totals + self.bias).astype(np.float32)
+
+    def __call__(self, texts):
+        """One {'label', 'score', 'model': 'fallback'} dict per text"""
+        if isinstance(texts, str):
+            texts = [texts]
+        positive = 1.0 / (1.0 + np.exp(-self.logits(texts)))
+        negative_label, positive_label = self.labels
+        return [{'label': positive_label, 'score': p, 'model': 'fallback'} if p >= 0.5 else
+                {'label': negative_label, 'score': 1.0 - p, 'model': 'fallback'}
+                for p in positive.tolist()]
+
+
+def train_lexicon(texts, targets, min_count=3, max_bigrams=20000, epochs=200, l2=1e-4, labels=('NEGATIVE', 'POSITIVE')):
+    """Fit a LexiconScorer to the model's P(second label) for each text
+
+    Features are words and adjacent word pairs seen at least min_count times
+    (at most max_bigrams pairs). The logistic loss against the model's soft
+    targets is minimized with full-batch Adagrad over a sparse (line,
+    feature) list, so training stays fast on tens of thousands of lines.
+    """
+    tokens = [tokenize(text) for text in texts]
+    counts = {}
+    for words in tokens:
+        for word in set(words):
+            counts[word] = counts.get(word, 0) + 1
+    vocab = {word: i for i, word in enumerate(sorted(w for w, n in counts.items() if n >= min_count))}
+
+    pair_counts = {}
+    for words in tokens:
+        for pair in set(zip(words, words[1:])):
+            if pair[0] in vocab and pair[1] in vocab:
+                pair_counts[pair] = pair_counts.get(pair, 0) + 1
+    pairs = sorted((p for p, n in pair_counts.items() if n >= min_count), key=lambda p: -pair_counts[p])
+    pairs = {pair: len(vocab) + i for i, pair in enumerate(sorted(pairs[:max_bigrams]))}
+
+    rows, columns = [], []
+    for row, words in enumerate(tokens):
+        features = [vocab[w] for w in words if w in vocab]
+        features += [pairs[p] for p in zip(words, words[1:]) if p in pairs]
+        rows.extend([row] * len(features))
+        columns.extend(features)
+    rows = np.array(rows, dtype=np.int64)
+    columns = np.array(columns, dtype=np.int64)
+    targets = np.asarray(targets, dtype=np.float64)
+    n_features = len(vocab) + len(pairs)
+
+    weights = np.zeros(n_features)
+    bias = float(np.log(max(targets.mean(), 1e-6) / max(1 - targets.mean(), 1e-6)))
+    history = np.full(n_features, 1e-8)
+    bias_history = 1e-8
+    rate = 0.5
+    for _ in range(epochs):
+        z = np.bincount(rows, weights=weights[columns], minlength=len(texts)) + bias
+        error = 1.0 / (1.0 + np.exp(-z)) - targets
+        gradient = np.bincount(columns, weights=error[rows], minlength=n_features) / len(texts) + l2 * weights
+        history += gradient ** 2
+        weights -= rate * gradient / np.sqrt(history)
+        bias_gradient = float(error.mean())
+        bias_history += bias_gradient ** 2
+        bias -= rate * bias_gradient / np.sqrt(bias_history)
+
+    words = {i: w for w, i in vocab.items()}
+    unigrams = {words[i]: float(weights[i]) for i in range(len(vocab)) if abs(weights[i]) > 1e-3}
+    bigrams = {f"{a} {b}": float(weights[i]) for (a, b), i in pairs.items() if abs(weights[i]) > 1e-3}
+    return LexiconScorer(unigrams, bigrams, bias, labels)
+
+
+class LoadShedder:
+    """Admission control for a MicroBatcher: answers with the fallback when the model would be late"""
+
+    def __init__(self, fallback=None, deadline=DEADLINE, max_queue=MAX_QUEUE, rescore=False,
+                 rescore_after=RESCORE_AFTER, on_rescore=None):
+        self.fallback = fallback or LexiconScorer.load()
+        self.deadline = deadline
+        self.max_queue = max_queue
+        self.rescore = rescore
+        self.rescore_after = rescore_after
+        self.on_rescore = on_rescore
+        self.seconds_per_item = None
+        self.latency_scale = 1.0
+        self.admitted = 0
+        self.shed = 0
+        self.rescored = 0
+        self.last_shed = float('-inf')
+        self._waiting = []
+        self._to_rescore = deque()
+        self._running = None      # (items, start) of the batch the model is running
+
+    def started(self, items):
+        """A batch of `items` requests went to the model"""
+        self._running = (items, time.monotonic())
+
+    def observe(self, items, seconds):
+        """Record how long the model took for a batch (moving average per item)"""
+        self._running = None
+        if not items:
+            return
+        per_item = seconds / items
+        if self.seconds_per_item is None:
+            self.seconds_per_item = per_item
+        else:
+            self.seconds_per_item = 0.8 * self.seconds_per_item + 0.2 * per_item
+
+    def answered(self, estimate, seconds):
+        """Record the latency an admitted request saw against its estimate (moving average of the ratio)"""
+        if estimate > 0:
+            self.latency_scale = 0.9 * self.latency_scale + 0.1 * seconds / estimate
+
+    def projected_latency(self, backlog, batch_size=1, max_wait=0.0):
+        """Seconds until a request joining `backlog` requests (running or waiting) would be answered"""
+        return self.latency_scale * self.estimate(backlog, batch_size, max_wait)
+
+    def estimate(self, backlog, batch_size=1, max_wait=0.0):
+        """projected_latency() from the batch timings alone"""
+        if self.seconds_per_item is None:
+            return 0.0
+        per_item, running, left = self.seconds_per_item, 0, 0.0
+        if self._running is not None:
+            running, start = self._running
+            elapsed = time.monotonic() - start
+            # A slow batch shows the model is slower now than the average says
+            per_item = max(per_item, elapsed / running)
+            left = max(0.0, running * per_item - elapsed)
+        batch_size = max(1, batch_size)
+        batches = -(-(max(0, backlog - running) + 1) // batch_size)
+        return left + max_wait + batches * batch_size * per_item
+
+    def overloaded(self, backlog, batch_size=1, max_wait=0.0):
+        """True if a request joining `backlog` requests would miss the deadline"""
+        if self.max_queue and backlog >= self.max_queue:
+            return True
+        return bool(self.deadline and self.projected_latency(backlog, batch_size, max_wait) > self.deadline)
+
+    async def answer(self, key, item, tag=None):
+        """Fallback result for a shed request; requests shed together are scored in one batch"""
+        self.shed += 1
+        self.last_shed = time.monotonic()
+        if self.rescore:
+            self._to_rescore.append((key, item, item if tag is None else tag))
+        future = asyncio.get_running_loop().create_future()
+        self._waiting.append((item, future))
+        if len(self._waiting) == 1:
+            asyncio.get_running_loop().call_soon(self._score_waiting)
+        return await future
+
+    def _score_waiting(self):
+        waiting, self._waiting = self._waiting, []
+        try:
+            results = self.fallback([item for item, _ in waiting])
+        except Exception as e:
+            for _, future in waiting:
+                future.set_exception(e)
+            return
+        for (_, future), result in zip(waiting, results):
+            future.set_result(result)
+
+    def rescore_ready(self, force=False):
+        """Shed requests are waiting and load has been low for rescore_after seconds"""
+        return bool(self._to_rescore) and (force or time.monotonic() - self.last_shed >= self.rescore_after)
+
+    def take_rescore_batch(self, size):
+        """(key, items, tags) of up to `size` shed requests that share the first one's key"""
+        key = self._to_rescore[0][0]
+        items, tags = [], []
+        while self._to_rescore and len(items) < size and self._to_rescore[0][0] == key:
+            _, item, tag = self._to_rescore.popleft()
+            items.append(item)
+            tags.append(tag)
+        return key, items, tags
+
+    def rescored_batch(self, tags, results):
+        self.rescored += len(tags)
+        if self.on_rescore is not None:
+            for tag, result in zip(tags, results):
+                self.on_rescore(tag, result)
+
+    def summary(self):
+        total = self.admitted + self.shed
+        share = self.shed / total if total else 0.0
+        text = f"{self.admitted} scored by the model, {self.shed} by the fallback ({share:.1%})"
+        if self.rescore:
+            text += f", {self.rescored} rescored"
+        return text
@@ -0,0 +1,200 @@
+"""
+Pair-level cache of zero-shot NLI logits.
+
+The zero-shot pipeline runs one NLI pass per (text, label) pair. This module
+stores the entailment and contradiction logits of every pair in SQLite, keyed
+by model fingerprint, hypothesis and text hash. Label scores are recomputed
+from the cached logits on every call (softmax across labels, or per-label
+entailment vs contradiction for multi_label), so adding a label to a list
+only runs the passes for the new label while the other scores stay exactly
+what a full re-run would give.
+
+Enable it per model in models.json:
+    "zero-shot": {"task": "zero-shot-classification", "model": "...",
+                  "logit_cache": "~/.cache/bert-sentiment-tools/zero_shot_logits.sqlite"}
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+
+import torch
+
+from common.zero_shot import (HYPOTHESIS_TEMPLATE, entailment_ids, format_result,
+                              label_scores, parse_labels)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS pair_logits (
+    model TEXT NOT NULL,
+    hypothesis TEXT NOT NULL,
+    text_hash TEXT NOT NULL,
+    entailment REAL NOT NULL,
+    contradiction REAL NOT NULL,
+    PRIMARY KEY (model, text_hash, hypothesis)
+) WITHOUT ROWID
+"""
+
+
+def text_hash(text):
+    """Hash of the exact text; unlike text_id() whitespace is significant here"""
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+
+# Elements hashed per weight tensor; enough to tell fine-tunes apart without reading every weight
+FINGERPRINT_SAMPLE = 1024
+
+
+def model_fingerprint(model):
+    """Identifies the weights that produced cached logits
+
+    Hashes every parameter's name, shape and dtype and the raw bytes of
+    evenly spaced elements, so loading a large model does not mean reading
+    (or copying) all of its weights.
+    """
+    digest = hashlib.sha1(json.dumps({
+        'model': getattr(model.config, '_name_or_path', ''),
+        'label2id': model.config.label2id
+    }, sort_keys=True).encode('utf-8'))
+    with torch.no_grad():
+        for name, param in model.named_parameters():
+            flat = param.detach().reshape(-1)
+            if flat.numel() > FINGERPRINT_SAMPLE:
+                flat = flat[torch.linspace(0, flat.numel() - 1, FINGERPRINT_SAMPLE).long()]
+            digest.update(f"{name}:{tuple(param.shape)}:{param.dtype}".encode('utf-8'))
+            digest.update(flat.contiguous().view(torch.uint8).numpy().tobytes())
+    return digest.hexdigest()[:16]
+
+
+class LogitCache:
+    """SQLite store of (entailment, contradiction) logits per (model, hypothesis, text)"""
+
+    def __init__(self, path):
+        self.path = os.path.expanduser(path)
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # Shared with the inference thread of the async scripts, so guard with a lock
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.execute(SCHEMA)
+        self._lock = threading.Lock()
+
+    def get_many(self, model, text_hashes, hypotheses):
+        """Cached logits as {(text_hash, hypothesis): (entailment, contradiction)}"""
+        wanted = set(hypotheses)
+        found = {}
+        text_hashes = list(dict.fromkeys(text_hashes))
+        with self._lock:
+            for start in range(0, len(text_hashes), 500):
+                chunk = text_hashes[start:start + 500]
+                rows = self._conn.execute(
+                    f"SELECT text_hash, hypothesis, entailment, contradiction FROM pair_logits "
+                    f"WHERE model = ? AND text_hash IN ({','.join('?' * len(chunk))})",
+                    [model] + chunk)
+                for row_hash, hypothesis, entailment, contradiction in rows:
+                    if hypothesis in wanted:
+                        found[(row_hash, hypothesis)] = (entailment, contradiction)
+        return found
+
+    def put_many(self, model, rows):
+        """Store (text_hash, hypothesis, entailment, contradiction) rows"""
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO pair_logits (model, text_hash, hypothesis, entailment, contradiction) "
+                "VALUES (?, ?, ?, ?, ?)",
+                [(model,) + tuple(row) for row in rows])
+
+    def count(self, model=None):
+        """Number of cached pairs, optionally for one model"""
+        with self._lock:
+            if model is None:
+                return self._conn.execute("SELECT COUNT(*) FROM pair_logits").fetchone()[0]
+            return self._conn.execute("SELECT COUNT(*) FROM pair_logits WHERE model = ?", (model,)).fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class CachedZeroShotClassifier:
+    """Zero-shot classifier that only runs NLI passes for uncached (text, label) pairs
+
+    Wraps a transformers zero-shot pipeline or a StaticShapeClassifier and is
+    called the same way.
+    """
+
+    def __init__(self, classifier, cache, batch_size=16):
+        self.classifier = classifier
+        self.model = classifier.model
+        self.tokenizer = classifier.tokenizer
+        self.cache = cache if isinstance(cache, LogitCache) else LogitCache(cache)
+        self.batch_size = batch_size
+        self.fingerprint = model_fingerprint(self.model)
+        self.entailment_id, self.contradiction_id = entailment_ids(self.model.config)
+        self.hits = 0
+        self.misses = 0
+
+    def __call__(self, sequences, candidate_labels, hypothesis_template=HYPOTHESIS_TEMPLATE,
+                 multi_label=False, **kwargs):
+        single = isinstance(sequences, str)
+        texts = [sequences] if single else list(sequences)
+        results = self.zero_shot(texts, parse_labels(candidate_labels), hypothesis_template, multi_label)
+        return results[0] if single else results
+
+    def zero_shot(self, texts, labels, hypothesis_template=HYPOTHESIS_TEMPLATE, multi_label=False):
+        """Pipeline-style results, computing only the pairs missing from the cache"""
+        hypotheses = [hypothesis_template.format(label) for label in labels]
+        hashes = [text_hash(text) for text in texts]
+        logits = self.cache.get_many(self.fingerprint, hashes, hypotheses)
+
+        missing = {}
+        for text, h in zip(texts, hashes):
+            for hypothesis in hypotheses:
+                if (h, hypothesis) not in logits and (h, hypothesis) not in missing:
+                    missing[(h, hypothesis)] = text
+        self.hits += len(texts) * len(hypotheses) - len(missing)
+        self.misses += len(missing)
+
+        if missing:
+            computed = self._compute(list(missing.items()))
+            logits.update(computed)
+            self.cache.put_many(self.fingerprint, [(h, hyp, e, c) for (h, hyp), (e, c) in computed.items()])
+
+        results = []
+        for text, h in zip(texts, hashes):
+            pairs = [logits[(h, hypothesis)] for hypothesis in hypotheses]
+            scores = label_scores([e for e, _ in pairs], [c for _, c in pairs], multi_label)
+            results.append(format_result(text, labels, scores))
+        return results
+
+    def hit_rate(self):
+        """Fraction of pairs served from the cache so far"""
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def _compute(self, pairs):
+        # pairs: [((text_hash, hypothesis), text)]
+        computed = {}
+        for start in range(0, len(pairs), self.batch_size):
+            chunk = pairs[start:start + self.batch_size]
+            rows = self._logits([text for _, text in chunk], [hyp for (_, hyp), _ in chunk]).float().tolist()
+            for (key, _), row in zip(chunk, rows):
+                computed[key] = (row[self.entailment_id], row[self.contradiction_id])
+        return computed
+
+    def _logits(self, premises, hypotheses):
+        max_length = min(self.tokenizer.model_max_length, 512)
+        if hasattr(self.classifier, 'logits'):
+            # StaticShapeClassifier: keep its bucketed/compiled execution
+            encodings = [self.tokenizer(p, h, truncation='only_first', max_length=max_length)['input_ids']
+                         for p, h in zip(premises, hypotheses)]
+            return self.classifier.logits(encodings)
+
+        device = next(self.model.parameters()).device
+        inputs = self.tokenizer(premises, hypotheses, padding=True, truncation='only_first',
+                                max_length=max_length, return_tensors='pt')
+        with torch.inference_mode():
+            return self.model(**{k: v.to(device) for k, v in inputs.items()}).logits
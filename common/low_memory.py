@@ -0,0 +1,220 @@
+"""
+Low-memory checkpoints for the zero-shot models on small CPU boxes.
+
+facebook/bart-large-mnli holds ~1.6 GB of fp32 weights and every script
+loads a private copy. build_compact_model() writes a compact checkpoint
+once, and load_compact_model() loads it cheaply:
+
+    - weights are stored as bfloat16 (or float16), half the bytes
+    - the token embedding is pruned to the token ids that occur in a corpus
+      (plus special tokens and the label hypotheses); unseen tokens map to
+      the unknown token. The tokenizer is unchanged: a forward pre-hook
+      translates its ids to the pruned rows
+    - weights are loaded with torch.load(mmap=True) straight into the model
+      (assign=True), so they stay backed by the page cache and processes
+      loading the same checkpoint share one physical copy
+    - compute_dtype 'float32' (default) upcasts weights layer by layer as
+      they are used, so results stay close to the fp32 model; 'native'
+      computes in the storage dtype (faster where the CPU supports bf16,
+      less accurate). Logits are always returned as float32
+
+Checkpoint directory:
+    config.json        - model config with the pruned vocab_size
+    weights.pt         - state dict in the storage dtype
+    buffers.pt         - buffers left out of the state dict (e.g. DistilBERT's position_ids)
+    low_memory.json    - source model, dtype, vocabulary size before and after
+    token_map.pt       - int32 map from tokenizer ids to pruned rows
+
+Build and compare against the fp32 model with
+zero_shot_classification/compact_zero_shot.py.
+"""
+
+import json
+import os
+
+import torch
+import torch.nn.functional as F
+from torch import nn
+from transformers import AutoConfig, AutoModelForSequenceClassification
+
+DEFAULT_TEMPLATE = "This example is {}."
+STORAGE_DTYPES = {'bfloat16': torch.bfloat16, 'float16': torch.float16}
+
+
+def collect_token_ids(tokenizer, texts, labels=(), template=DEFAULT_TEMPLATE, batch_size=1000):
+    """Token ids used by texts and label hypotheses, plus every special token"""
+    ids = set(tokenizer.all_special_ids)
+    hypotheses = [template.format(label) for label in labels]
+    texts = list(texts) + hypotheses
+    for start in range(0, len(texts), batch_size):
+        for row in tokenizer(texts[start:start + batch_size], truncation=True)['input_ids']:
+            ids.update(row)
+    return ids
+
+
+def _embedding_modules(model):
+    """Every nn.Embedding sharing the input embedding's weight (BART ties three)"""
+    weight = model.get_input_embeddings().weight
+    return [m for m in model.modules() if isinstance(m, nn.Embedding) and m.weight.data_ptr() == weight.data_ptr()]
+
+
+def prune_vocabulary(model, keep_ids, unk_id):
+    """Cut the input embedding down to keep_ids; returns the old->new id map"""
+    old_size = model.get_input_embeddings().weight.shape[0]
+    keep = sorted(i for i in set(keep_ids) | {unk_id} if 0 <= i < old_size)
+    token_map = torch.full((old_size,), keep.index(unk_id), dtype=torch.int32)
+    token_map[keep] = torch.arange(len(keep), dtype=torch.int32)
+
+    modules = _embedding_modules(model)
+    weight = nn.Parameter(modules[0].weight.data[keep].clone())
+    for module in modules:
+        module.weight = weight
+        module.num_embeddings = len(keep)
+        if module.padding_idx is not None:
+            module.padding_idx = int(token_map[module.padding_idx])
+
+    # Special token ids in the config (pad, eos, decoder start, ...) move with their rows
+    config = model.config
+    for name, value in list(config.to_dict().items()):
+        if name.endswith('_token_id') and isinstance(value, int) and 0 <= value < old_size:
+            setattr(config, name, int(token_map[value]))
+    config.vocab_size = len(keep)
+    return token_map
+
+
+def build_compact_model(model_name, out_dir, texts, labels=(), dtype='bfloat16', template=DEFAULT_TEMPLATE,
+                        tokenizer=None, revision=None):
+    """Write a pruned, reduced-precision checkpoint of model_name to out_dir; returns its metadata"""
+    from transformers import AutoTokenizer
+    tokenizer = tokenizer or AutoTokenizer.from_pretrained(model_name)
+    model = AutoModelForSequenceClassification.from_pretrained(model_name, revision=revision)
+    model.eval()
+
+    old_size = model.get_input_embeddings().weight.shape[0]
+    keep_ids = collect_token_ids(tokenizer, texts, labels, template)
+    token_map = prune_vocabulary(model, keep_ids, tokenizer.unk_token_id)
+
+    # Tied embeddings share storage in the state dict, so torch.save writes them once
+    model.to(STORAGE_DTYPES[dtype])
+    os.makedirs(out_dir, exist_ok=True)
+    model.config.save_pretrained(out_dir)
+    state = model.state_dict()
+    torch.save(state, os.path.join(out_dir, 'weights.pt'))
+    torch.save({name: buffer for name, buffer in model.named_buffers() if name not in state},
+               os.path.join(out_dir, 'buffers.pt'))
+    torch.save(token_map, os.path.join(out_dir, 'token_map.pt'))
+
+    meta = {
+        'model': model_name,
+        'revision': revision,
+        'dtype': dtype,
+        'template': template,
+        'vocab_size': old_size,
+        'kept_tokens': int(model.config.vocab_size),
+        'weights_mb': round(os.path.getsize(os.path.join(out_dir, 'weights.pt')) / 1024 ** 2, 1)
+    }
+    with open(os.path.join(out_dir, 'low_memory.json'), 'w', encoding='utf-8') as f:
+        json.dump(meta, f, indent=2)
+    return meta
+
+
+def _upcast_linear(module):
+    def forward(x):
+        bias = module.bias.float() if module.bias is not None else None
+        return F.linear(x, module.weight.float(), bias)
+    module.forward = forward
+
+
+def _upcast_layer_norm(module):
+    def forward(x):
+        return F.layer_norm(x, module.normalized_shape, module.weight.float(), module.bias.float(), module.eps)
+    module.forward = forward
+
+
+def _float_output(module, args, output):
+    return output.float()
+
+
+def _remap_input_ids(token_map):
+    def hook(module, args, kwargs):
+        input_ids = kwargs.get('input_ids')
+        if input_ids is not None:
+            kwargs['input_ids'] = token_map[input_ids].to(input_ids.dtype)
+        elif args:
+            args = (token_map[args[0]].to(args[0].dtype),) + tuple(args[1:])
+        return args, kwargs
+    return hook
+
+
+def load_compact_model(path, compute_dtype='float32'):
+    """Load a checkpoint written by build_compact_model with memory-mapped weights"""
+    path = os.path.expanduser(path)
+    with open(os.path.join(path, 'low_memory.json'), 'r', encoding='utf-8') as f:
+        meta = json.load(f)
+    config = AutoConfig.from_pretrained(path)
+
+    # Build the module tree without allocating weights, then point it at the mapped file
+    with torch.device('meta'):
+        model = AutoModelForSequenceClassification.from_config(config)
+    state = torch.load(os.path.join(path, 'weights.pt'), mmap=True, weights_only=True)
+    model.load_state_dict(state, strict=False, assign=True)
+    buffers_path = os.path.join(path, 'buffers.pt')
+    if os.path.exists(buffers_path):
+        # Non-persistent buffers are not in the state dict; setattr keeps them non-persistent
+        for name, buffer in torch.load(buffers_path, weights_only=True).items():
+            module_name, _, buffer_name = name.rpartition('.')
+            setattr(model.get_submodule(module_name), buffer_name, buffer)
+    missing = [name for name, tensor in list(model.named_parameters()) + list(model.named_buffers())
+               if tensor.is_meta]
+    if missing:
+        raise ValueError(f"{path}: weights.pt has no values for {', '.join(missing[:5])} "
+                         f"(rebuild it with zero_shot_classification/compact_zero_shot.py)")
+    model.eval()
+
+    token_map = torch.load(os.path.join(path, 'token_map.pt'), weights_only=True).long()
+    model.register_forward_pre_hook(_remap_input_ids(token_map), with_kwargs=True)
+
+    if compute_dtype == 'float32':
+        for module in model.modules():
+            if isinstance(module, nn.Linear):
+                _upcast_linear(module)
+            elif isinstance(module, nn.LayerNorm):
+                _upcast_layer_norm(module)
+            elif isinstance(module, nn.Embedding):
+                module.register_forward_hook(_float_output)
+    elif compute_dtype != 'native':
+        raise ValueError(f"compute_dtype must be 'float32' or 'native', not '{compute_dtype}'")
+
+    # Pipelines and the logit cache expect float32 logits
+    model.register_forward_hook(lambda module, args, output: _float_logits(output))
+    model.low_memory = meta
+    return model
+
+
+def _float_logits(output):
+    output.logits = output.logits.float()
+    return output
+
+
+def memory_usage():
+    """Resident memory of this process in MB: rss, pss (shared pages split between processes), shared, private"""
+    usage = {}
+    try:
+        with open('/proc/self/smaps_rollup', 'r') as f:
+            for line in f:
+                key, _, value = line.partition(':')
+                if value.strip().endswith('kB'):
+                    usage[key] = int(value.split()[0]) / 1024
+        return {
+            'rss': usage.get('Rss', 0.0),
+            'pss': usage.get('Pss', 0.0),
+            'shared': usage.get('Shared_Clean', 0.0) + usage.get('Shared_Dirty', 0.0),
+            'private': usage.get('Private_Clean', 0.0) + usage.get('Private_Dirty', 0.0)
+        }
+    except OSError:
+        # No /proc (macOS, Windows): peak RSS is the best available figure
+        import resource
+        import sys
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        rss = peak / 1024 ** 2 if sys.platform == 'darwin' else peak / 1024
+        return {'rss': rss, 'pss': rss, 'shared': 0.0, 'private': rss}
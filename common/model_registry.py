@@ -0,0 +1,279 @@
+"""
+Shared model registry for the sentiment, zero-shot and web scraping scripts.
+
+Models are looked up by name in models.json (or the file named by the
+MODEL_REGISTRY_CONFIG environment variable), loaded on first use and kept in
+an LRU cache bounded by a memory budget. Registry entries that point at the
+same checkpoint share one copy of the tokenizer and weights.
+
+Usage:
+    from common.model_registry import get_classifier
+    classifier = get_classifier("sentiment")
+"""
+
+import gc
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import torch
+from transformers import AutoModelForSequenceClassification, AutoTokenizer, pipeline
+
+from common.cpu_plan import apply_plan
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_CONFIG_PATH = os.path.join(REPO_ROOT, 'models.json')
+
+# Used when models.json is missing; entries in the file are merged over these
+DEFAULT_CONFIG = {
+    'device': 'auto',
+    'memory_budget_mb': 4096,
+    'idle_timeout_seconds': 900,
+    'models': {
+        'sentiment': {
+            'task': 'sentiment-analysis',
+            'model': 'distilbert/distilbert-base-uncased-finetuned-sst-2-english'
+        },
+        'zero-shot': {
+            'task': 'zero-shot-classification',
+            'model': 'facebook/bart-large-mnli'
+        }
+    }
+}
+
+# Tasks whose weights can be loaded once and shared between pipelines
+SHARED_MODEL_CLASSES = {
+    'sentiment-analysis': AutoModelForSequenceClassification,
+    'text-classification': AutoModelForSequenceClassification,
+    'zero-shot-classification': AutoModelForSequenceClassification,
+}
+
+
+def load_config(path=None):
+    """Read the registry config, falling back to the built-in defaults"""
+    path = path or os.environ.get('MODEL_REGISTRY_CONFIG', DEFAULT_CONFIG_PATH)
+    config = dict(DEFAULT_CONFIG)
+    config['models'] = dict(DEFAULT_CONFIG['models'])
+
+    if os.path.exists(path):
+        with open(path, 'r', encoding='utf-8') as f:
+            user_config = json.load(f)
+        config['models'].update(user_config.pop('models', {}))
+        config.update(user_config)
+
+    return config
+
+
+def resolve_device(device):
+    """Turn the config 'device' value into a pipeline device index"""
+    if device == 'auto':
+        return 0 if torch.cuda.is_available() else -1
+    return int(device)
+
+
+def model_size_bytes(model):
+    """Approximate memory held by a model's parameters and buffers"""
+    tensors = list(model.parameters()) + list(model.buffers())
+    return sum(t.numel() * t.element_size() for t in tensors)
+
+
+class ModelRegistry:
+    """Loads models by name and keeps them in a memory-budgeted LRU"""
+
+    def __init__(self, config=None):
+        config = config or load_config()
+        self.specs = config['models']
+        self.device = resolve_device(config.get('device', 'auto'))
+        self.memory_budget = int(config.get('memory_budget_mb', 4096)) * 1024 * 1024
+        self.idle_timeout = config.get('idle_timeout_seconds')
+
+        self._lock = threading.RLock()
+        self._pipelines = OrderedDict()  # name -> {'pipeline', 'checkpoint', 'last_used'}
+        self._checkpoints = {}           # checkpoint key -> {'model', 'size', 'users'}
+        self._tokenizers = {}            # tokenizer name -> tokenizer
+
+    def names(self):
+        """Return the model names available in the config"""
+        return list(self.specs)
+
+    def spec(self, name):
+        """Return the config entry for a model name"""
+        if name not in self.specs:
+            raise KeyError(f"Unknown model '{name}'. Known models: {', '.join(self.specs)}")
+        return self.specs[name]
+
+    def get(self, name):
+        """Return the pipeline for a model name, loading it if needed"""
+        with self._lock:
+            self.evict_idle()
+
+            entry = self._pipelines.get(name)
+            if entry is None:
+                entry = self._load(name)
+                self._pipelines[name] = entry
+
+            self._pipelines.move_to_end(name)
+            entry['last_used'] = time.monotonic()
+            self._enforce_budget(keep=name)
+            return entry['pipeline']
+
+    def memory_in_use(self):
+        """Bytes held by all loaded checkpoints"""
+        with self._lock:
+            return sum(c['size'] for c in self._checkpoints.values())
+
+    def checkpoint(self, name):
+        """(checkpoint key, bytes) behind a loaded model; entries sharing weights share the key"""
+        with self._lock:
+            entry = self._pipelines.get(name)
+            if entry is None or entry['checkpoint'] is None:
+                model = getattr(entry and entry['pipeline'], 'model', None)
+                return (name,), model_size_bytes(model) if model is not None else 0
+            return entry['checkpoint'], self._checkpoints[entry['checkpoint']]['size']
+
+    def loaded(self):
+        """Names of currently loaded models, least recently used first"""
+        with self._lock:
+            return list(self._pipelines)
+
+    def evict(self, name):
+        """Drop a model from the registry and free unshared weights"""
+        with self._lock:
+            entry = self._pipelines.pop(name, None)
+            if entry is None:
+                return
+
+            key = entry['checkpoint']
+            if key is not None:
+                checkpoint = self._checkpoints[key]
+                checkpoint['users'].discard(name)
+                if not checkpoint['users']:
+                    del self._checkpoints[key]
+
+            del entry
+            gc.collect()
+            if torch.cuda.is_available():
+                torch.cuda.empty_cache()
+
+    def evict_idle(self):
+        """Evict models that have not been used within the idle timeout"""
+        if not self.idle_timeout:
+            return
+
+        now = time.monotonic()
+        with self._lock:
+            for name, entry in list(self._pipelines.items()):
+                if now - entry['last_used'] > self.idle_timeout:
+                    self.evict(name)
+
+    def _enforce_budget(self, keep):
+        # Evict least recently used models until the budget fits; the model
+        # just requested is never evicted, even if it alone exceeds the budget
+        while self.memory_in_use() > self.memory_budget:
+            victims = [name for name in self._pipelines if name != keep]
+            if not victims:
+                break
+            self.evict(victims[0])
+
+    def _load_low_memory(self, spec):
+        """Compact checkpoint from compact_zero_shot.py, or None (with a warning) if it is missing"""
+        from common.low_memory import load_compact_model
+        path = os.path.expanduser(spec['low_memory'])
+        if not os.path.exists(os.path.join(path, 'low_memory.json')):
+            print(f"Warning: no compact checkpoint at {path} "
+                  f"(build it with zero_shot_classification/compact_zero_shot.py); loading the full model")
+            return None
+        return load_compact_model(path, spec.get('compute_dtype', 'float32'))
+
+    def _load(self, name):
+        spec = self.spec(name)
+        task = spec['task']
+        model_class = SHARED_MODEL_CLASSES.get(task)
+
+        if model_class is None:
+            # Unknown task: let transformers load everything itself
+            return {
+                'pipeline': pipeline(task, model=spec['model'], device=self.device),
+                'checkpoint': None,
+                'last_used': time.monotonic()
+            }
+
+        key = (spec['model'], spec.get('revision'))
+        if spec.get('low_memory'):
+            key += (spec['low_memory'], spec.get('compute_dtype', 'float32'))
+        checkpoint = self._checkpoints.get(key)
+        if checkpoint is None:
+            model = self._load_low_memory(spec) if spec.get('low_memory') else None
+            if model is None:
+                model = model_class.from_pretrained(spec['model'], revision=spec.get('revision'))
+            model.eval()
+            checkpoint = {'model': model, 'size': model_size_bytes(model), 'users': set()}
+            self._checkpoints[key] = checkpoint
+        checkpoint['users'].add(name)
+
+        tokenizer_name = spec.get('tokenizer', spec['model'])
+        tokenizer = self._tokenizers.get(tokenizer_name)
+        if tokenizer is None:
+            tokenizer = AutoTokenizer.from_pretrained(tokenizer_name)
+            self._tokenizers[tokenizer_name] = tokenizer
+
+        if spec.get('execution') == 'static':
+            from common.static_shapes import StaticShapeClassifier
+            classifier = StaticShapeClassifier(
+                checkpoint['model'], tokenizer, task,
+                buckets=spec.get('buckets'),
+                batch_size=spec.get('batch_size', 8),
+                backend=spec.get('backend', 'torchscript'),
+                device=self.device
+            )
+        elif spec.get('execution') == 'packed':
+            from common.packing import DEFAULT_PACK_LENGTH, PackedClassifier
+            classifier = PackedClassifier(
+                checkpoint['model'], tokenizer,
+                pack_length=spec.get('pack_length', DEFAULT_PACK_LENGTH),
+                batch_size=spec.get('batch_size', 16),
+                device=self.device
+            )
+        elif spec.get('execution') == 'early_exit':
+            from common.early_exit import DEFAULT_THRESHOLD, load_early_exit
+            classifier = load_early_exit(
+                checkpoint['model'], tokenizer, spec.get('exit_heads'),
+                threshold=spec.get('exit_threshold', DEFAULT_THRESHOLD),
+                batch_size=spec.get('batch_size', 32),
+                device=self.device
+            )
+        else:
+            classifier = pipeline(task, model=checkpoint['model'], tokenizer=tokenizer, device=self.device)
+
+        if spec.get('logit_cache') and task == 'zero-shot-classification':
+            from common.logit_cache import CachedZeroShotClassifier
+            classifier = CachedZeroShotClassifier(classifier, spec['logit_cache'],
+                                                  batch_size=spec.get('batch_size', 16))
+
+        return {
+            'pipeline': classifier,
+            'checkpoint': key,
+            'last_used': time.monotonic()
+        }
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_registry():
+    """Return the process-wide registry, creating it on first use"""
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            # Threads and CPU affinity are fixed before the first model is loaded (see common/cpu_plan.py)
+            apply_plan()
+            _registry = ModelRegistry()
+        return _registry
+
+
+def get_classifier(name):
+    """Return the pipeline registered under a model name"""
+    return get_registry().get(name)
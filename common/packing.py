@@ -0,0 +1,185 @@
+"""
+Packed execution of short texts for the DistilBERT sentiment model.
+
+With ordinary batching every text gets its own row, padded to the longest
+text in the batch. Headlines are 10-30 tokens, so much of that compute is
+padding. PackedClassifier instead concatenates several tokenized texts
+(each keeping its own [CLS] ... [SEP]) into one row of up to pack_length
+tokens and runs the encoder with:
+    - a block-diagonal attention mask, so tokens only attend within their own text
+    - position ids that restart at 0 for every text
+    - classification pooling at each text's own [CLS] position
+Because no token can see another text, results match unpacked execution up
+to floating point noise, while far fewer padding tokens are processed.
+
+The encoder forward is reimplemented from the DistilBERT layer weights
+(embeddings, q/k/v/out projections, FFN, layer norms), since the regular
+forward only takes a 2D padding mask. Enable it per model in models.json
+with "execution": "packed" (and optionally "pack_length").
+"""
+
+import torch
+import torch.nn.functional as F
+
+DEFAULT_PACK_LENGTH = 128
+
+
+def pack_lengths(lengths, pack_length):
+    """Group item indices into rows of at most pack_length tokens (first-fit decreasing)
+
+    Items longer than pack_length get a row of their own.
+    """
+    rows = []   # [total length, [indices]]
+    for index in sorted(range(len(lengths)), key=lambda i: lengths[i], reverse=True):
+        length = lengths[index]
+        for row in rows:
+            if row[0] + length <= pack_length:
+                row[0] += length
+                row[1].append(index)
+                break
+        else:
+            rows.append([length, [index]])
+    return [indices for _, indices in rows]
+
+
+def build_packed_batch(encodings, rows, pad_id=0):
+    """Tensors for a batch of packed rows
+
+    Returns input_ids, position_ids, segment_ids (0 marks padding) and the
+    (row, offset) of every item's [CLS] token, keyed by item index.
+    """
+    width = max(sum(len(encodings[i]) for i in row) for row in rows)
+    input_ids = torch.full((len(rows), width), pad_id, dtype=torch.long)
+    position_ids = torch.zeros((len(rows), width), dtype=torch.long)
+    segment_ids = torch.zeros((len(rows), width), dtype=torch.long)
+    cls_positions = {}
+
+    for r, row in enumerate(rows):
+        offset = 0
+        for segment, index in enumerate(row, 1):
+            ids = encodings[index]
+            end = offset + len(ids)
+            input_ids[r, offset:end] = torch.tensor(ids, dtype=torch.long)
+            position_ids[r, offset:end] = torch.arange(len(ids))
+            segment_ids[r, offset:end] = segment
+            cls_positions[index] = (r, offset)
+            offset = end
+    return input_ids, position_ids, segment_ids, cls_positions
+
+
+def block_diagonal_bias(segment_ids, dtype=torch.float32):
+    """Additive attention bias of shape (rows, 1, L, L): 0 within a segment, -inf elsewhere
+
+    Padding tokens may attend to themselves only, which keeps their softmax
+    finite without letting them touch any real token.
+    """
+    same_segment = (segment_ids[:, :, None] == segment_ids[:, None, :]) & (segment_ids[:, None, :] != 0)
+    length = segment_ids.shape[1]
+    same_segment |= torch.eye(length, dtype=torch.bool, device=segment_ids.device)
+    bias = torch.zeros(same_segment.shape, dtype=dtype, device=segment_ids.device)
+    bias.masked_fill_(~same_segment, torch.finfo(dtype).min)
+    return bias.unsqueeze(1)
+
+
+def distilbert_embed(model, input_ids, position_ids):
+    """Word plus position embeddings of a DistilBERT model"""
+    embeddings = model.distilbert.embeddings
+    hidden = embeddings.word_embeddings(input_ids) + embeddings.position_embeddings(position_ids)
+    return embeddings.LayerNorm(hidden)
+
+
+def distilbert_layer(layer, hidden, attention_bias):
+    """One DistilBERT transformer block with an additive (rows, 1, L, L) attention bias"""
+    rows, length, dim = hidden.shape
+    attention = layer.attention
+    heads = attention.n_heads
+    head_dim = dim // heads
+
+    def split_heads(x):
+        return x.view(rows, length, heads, head_dim).transpose(1, 2)
+
+    context = F.scaled_dot_product_attention(
+        split_heads(attention.q_lin(hidden)),
+        split_heads(attention.k_lin(hidden)),
+        split_heads(attention.v_lin(hidden)),
+        attn_mask=attention_bias)
+    context = attention.out_lin(context.transpose(1, 2).reshape(rows, length, dim))
+    hidden = layer.sa_layer_norm(context + hidden)
+
+    ffn = layer.ffn
+    return layer.output_layer_norm(ffn.lin2(ffn.activation(ffn.lin1(hidden))) + hidden)
+
+
+def distilbert_head(model, pooled):
+    """Classification logits from [CLS] hidden states"""
+    return model.classifier(torch.relu(model.pre_classifier(pooled)))
+
+
+def distilbert_packed_hidden(model, input_ids, position_ids, attention_bias):
+    """Run a DistilBERT encoder with explicit position ids and a full attention bias"""
+    hidden = distilbert_embed(model, input_ids, position_ids)
+    for layer in model.distilbert.transformer.layer:
+        hidden = distilbert_layer(layer, hidden, attention_bias)
+    return hidden
+
+
+class PackedClassifier:
+    """Sentiment classifier that packs several short texts into each sequence"""
+
+    def __init__(self, model, tokenizer, pack_length=DEFAULT_PACK_LENGTH, batch_size=16, device=-1):
+        if getattr(model.config, 'model_type', None) != 'distilbert':
+            raise ValueError("Packed execution is only implemented for DistilBERT sequence classification models")
+        self.model = model
+        self.tokenizer = tokenizer
+        self.pack_length = pack_length
+        self.batch_size = batch_size
+        self.device = torch.device('cpu' if device < 0 else f'cuda:{device}')
+        self.model.to(self.device)
+        self.model.eval()
+        self.stats = {'tokens': 0, 'padded_tokens': 0}
+
+    def __call__(self, inputs, **kwargs):
+        single = isinstance(inputs, str)
+        texts = [inputs] if single else list(inputs)
+        return self.classify(texts)
+
+    def classify(self, texts):
+        """One {'label', 'score'} dict per text, in input order"""
+        probs = torch.softmax(self.logits(texts).float(), dim=-1)
+        scores, indices = probs.max(dim=-1)
+        id2label = self.model.config.id2label
+        return [{'label': id2label[int(i)], 'score': float(s)} for s, i in zip(scores, indices)]
+
+    def logits(self, texts):
+        """Classification logits for texts, computed from packed rows"""
+        max_length = min(self.tokenizer.model_max_length, self.model.config.max_position_embeddings)
+        encodings = self.tokenizer(list(texts), truncation=True, max_length=max_length)['input_ids']
+        rows = pack_lengths([len(ids) for ids in encodings], self.pack_length)
+        pad_id = self.tokenizer.pad_token_id or 0
+
+        outputs = [None] * len(encodings)
+        with torch.inference_mode():
+            for start in range(0, len(rows), self.batch_size):
+                batch_rows = rows[start:start + self.batch_size]
+                input_ids, position_ids, segment_ids, cls_positions = build_packed_batch(encodings, batch_rows, pad_id)
+                self.stats['tokens'] += int((segment_ids != 0).sum())
+                self.stats['padded_tokens'] += segment_ids.numel()
+
+                bias = block_diagonal_bias(segment_ids.to(self.device), next(self.model.parameters()).dtype)
+                hidden = distilbert_packed_hidden(self.model, input_ids.to(self.device),
+                                                  position_ids.to(self.device), bias)
+
+                indices = list(cls_positions)
+                row_index = torch.tensor([cls_positions[i][0] for i in indices], device=self.device)
+                offsets = torch.tensor([cls_positions[i][1] for i in indices], device=self.device)
+                logits = distilbert_head(self.model, hidden[row_index, offsets])
+                for index, row in zip(indices, logits):
+                    outputs[index] = row
+
+        return torch.stack(outputs) if outputs else torch.zeros((0, self.model.config.num_labels))
+
+    def padding_ratio(self):
+        """Share of processed positions that were padding"""
+        if not self.stats['padded_tokens']:
+            return 0.0
+        return 1 - self.stats['tokens'] / self.stats['padded_tokens']
@@ -0,0 +1,338 @@
+"""
+Staged producer/consumer runtime for the file analyzers.
+
+A run is split into stages that execute concurrently on their own threads:
+
+    reader -> [stage 1 workers] -> [stage 2 workers] -> ... -> writer
+
+The reader groups input items into chunks, every stage transforms whole
+chunks (e.g. tokenize, run the model, fetch a page), and the writer (the
+calling thread) receives the chunks back in input order. Stages are
+connected by bounded queues, so a fast reader blocks instead of loading a
+whole file ahead of a slow model, and while the inference thread runs a
+forward pass the tokenizer workers are already preparing the next chunks.
+
+If any stage raises, every thread stops and run_pipeline raises
+PipelineError naming the stage (the original exception is chained). Ctrl+C
+stops the workers the same way before KeyboardInterrupt propagates.
+
+PIPELINE_CHUNK_SIZE, PIPELINE_QUEUE_SIZE and PIPELINE_TOKENIZER_WORKERS
+override the defaults (64 items per chunk, 4 chunks per queue, 2 tokenizer
+threads).
+
+Per-line printing is slow on big files, so scripts pick an output mode:
+    lines     print every result (the old behaviour)
+    progress  one self-updating progress line on stderr
+    quiet     nothing until the summary
+    auto      lines for small inputs, progress otherwise
+"""
+
+import os
+import queue
+import sys
+import threading
+import time
+
+import torch
+from transformers import TextClassificationPipeline
+
+OUTPUT_MODES = ('auto', 'lines', 'progress', 'quiet')
+AUTO_LINES_LIMIT = 200
+
+# Items per chunk, chunks buffered between stages, and tokenizer threads
+CHUNK_SIZE = int(os.environ.get('PIPELINE_CHUNK_SIZE', '64'))
+QUEUE_SIZE = int(os.environ.get('PIPELINE_QUEUE_SIZE', '4'))
+TOKENIZER_WORKERS = int(os.environ.get('PIPELINE_TOKENIZER_WORKERS', '2'))
+
+_DONE = object()
+
+
+class PipelineError(RuntimeError):
+    """A stage failed; the original exception is available as __cause__"""
+
+    def __init__(self, stage, error):
+        super().__init__(f"Pipeline stage '{stage}' failed: {error}")
+        self.stage = stage
+        self.error = error
+
+
+class _Stopped(Exception):
+    """Raised inside a worker when another thread has failed"""
+
+
+class Stage:
+    """One pipeline step: fn(chunk) -> chunk, run by `workers` threads"""
+
+    def __init__(self, name, fn, workers=1):
+        self.name = name
+        self.fn = fn
+        self.workers = workers
+        self.busy_seconds = 0.0
+
+
+def resolve_output_mode(mode, total=None):
+    """Turn 'auto' into 'lines' or 'progress' depending on the input size"""
+    if mode not in OUTPUT_MODES:
+        raise ValueError(f"unknown output mode '{mode}' (use {', '.join(OUTPUT_MODES)})")
+    if mode != 'auto':
+        return mode
+    return 'lines' if total is not None and total <= AUTO_LINES_LIMIT else 'progress'
+
+
+class Progress:
+    """Single-line progress display on stderr, redrawn at most every `interval` seconds"""
+
+    def __init__(self, total=None, unit='lines', enabled=True, interval=0.2, stream=None):
+        self.total = total
+        self.unit = unit
+        self.enabled = enabled
+        self.interval = interval
+        self.stream = stream or sys.stderr
+        self.count = 0
+        self.start = time.monotonic()
+        self._drawn = 0.0
+
+    def update(self, n=1):
+        self.count += n
+        now = time.monotonic()
+        if self.enabled and now - self._drawn >= self.interval:
+            self._drawn = now
+            self._draw(now)
+
+    def _draw(self, now):
+        rate = self.count / max(now - self.start, 1e-9)
+        if self.total:
+            done = min(self.count / self.total, 1.0)
+            bar = '#' * int(done * 30)
+            text = f"[{bar:<30}] {done:6.1%}  {self.count:,}/{self.total:,} {self.unit}"
+        else:
+            text = f"{self.count:,} {self.unit}"
+        self.stream.write(f"\r  {text}  ({rate:,.0f} {self.unit}/s)")
+        self.stream.flush()
+
+    def close(self):
+        if self.enabled:
+            self._draw(time.monotonic())
+            self.stream.write("\n")
+            self.stream.flush()
+
+
+def chunked(items, size):
+    """Lists of up to `size` consecutive items"""
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def run_pipeline(items, stages, sink, chunk_size=CHUNK_SIZE, queue_size=QUEUE_SIZE, progress=None):
+    """Run items through stages on worker threads, feeding finished chunks to sink in input order
+
+    items may be any iterable (a generator reading a file keeps memory flat).
+    sink(chunk) runs on the calling thread. Returns the number of items
+    processed; per-stage busy time is left on each Stage.
+    """
+    stop = threading.Event()
+    errors = []
+    error_lock = threading.Lock()
+    queues = [queue.Queue(maxsize=queue_size) for _ in range(len(stages) + 1)]
+
+    def fail(stage_name, error):
+        with error_lock:
+            if not errors:
+                errors.append((stage_name, error))
+        stop.set()
+
+    def put(q, item):
+        while True:
+            try:
+                q.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                if stop.is_set():
+                    raise _Stopped()
+
+    def get(q):
+        while True:
+            try:
+                return q.get(timeout=0.1)
+            except queue.Empty:
+                if stop.is_set():
+                    raise _Stopped()
+
+    def consumers(index):
+        """Number of threads reading queues[index]"""
+        return stages[index].workers if index < len(stages) else 1
+
+    def reader():
+        try:
+            for seq, chunk in enumerate(chunked(items, chunk_size)):
+                put(queues[0], (seq, chunk))
+            for _ in range(consumers(0)):
+                put(queues[0], _DONE)
+        except _Stopped:
+            pass
+        except Exception as e:
+            fail('read', e)
+
+    def worker(index, remaining):
+        stage = stages[index]
+        try:
+            while True:
+                item = get(queues[index])
+                if item is _DONE:
+                    break
+                seq, chunk = item
+                start = time.perf_counter()
+                chunk = stage.fn(chunk)
+                stage.busy_seconds += time.perf_counter() - start
+                put(queues[index + 1], (seq, chunk))
+            # The last worker of a stage to finish tells the next stage
+            with remaining['lock']:
+                remaining['count'] -= 1
+                last = remaining['count'] == 0
+            if last:
+                for _ in range(consumers(index + 1)):
+                    put(queues[index + 1], _DONE)
+        except _Stopped:
+            pass
+        except Exception as e:
+            fail(stage.name, e)
+
+    threads = [threading.Thread(target=reader, name='pipeline-read', daemon=True)]
+    for index, stage in enumerate(stages):
+        remaining = {'count': stage.workers, 'lock': threading.Lock()}
+        for n in range(stage.workers):
+            threads.append(threading.Thread(target=worker, args=(index, remaining),
+                                            name=f"pipeline-{stage.name}-{n}", daemon=True))
+    for thread in threads:
+        thread.start()
+
+    # Writer: restore input order, since parallel workers may finish out of order
+    processed = 0
+    pending = {}
+    next_seq = 0
+    try:
+        while True:
+            item = get(queues[-1])
+            if item is _DONE:
+                break
+            seq, chunk = item
+            pending[seq] = chunk
+            while next_seq in pending:
+                chunk = pending.pop(next_seq)
+                next_seq += 1
+                sink(chunk)
+                processed += len(chunk)
+                if progress is not None:
+                    progress.update(len(chunk))
+    except _Stopped:
+        pass
+    except BaseException:
+        # Sink failures and Ctrl+C: stop the workers, then let the error propagate
+        stop.set()
+        for thread in threads:
+            thread.join()
+        raise
+    finally:
+        if progress is not None:
+            progress.close()
+
+    for thread in threads:
+        thread.join()
+    if errors:
+        stage_name, error = errors[0]
+        raise PipelineError(stage_name, error) from error
+    return processed
+
+
+def classifier_stages(classifier, tokenizer_workers=TOKENIZER_WORKERS, text_key='text', classify_fn=None):
+    """Tokenize and inference stages for a text classification model
+
+    Chunks are lists of record dicts. Records with a truthy 'skip_reason'
+    pass through untouched; the others get the classifier's result keys
+    ('label', 'score', ...), or 'error' if classifying that record failed. Regular transformers pipelines are
+    split so tokenization runs on `tokenizer_workers` threads and only the
+    forward pass runs on the inference thread; other classifiers (static,
+    packed, early exit, or a custom classify_fn(texts)) tokenize internally
+    and run entirely on the inference thread.
+    """
+    model = getattr(classifier, 'model', None)
+    tokenizer = getattr(classifier, 'tokenizer', None)
+    # Same post-processing as the pipeline: softmax over two or more single-label classes
+    split = (classify_fn is None and isinstance(classifier, TextClassificationPipeline)
+             and model.config.num_labels > 1
+             and model.config.problem_type in (None, 'single_label_classification'))
+    classify_fn = classify_fn or (lambda texts: classifier(texts, truncation=True))
+
+    def active(records):
+        return [r for r in records if not r.get('skip_reason')]
+
+    def tokenize(records):
+        todo = active(records)
+        if not todo:
+            return records, todo, None
+        max_length = min(tokenizer.model_max_length, getattr(model.config, 'max_position_embeddings', 512))
+        encoded = tokenizer([r[text_key] for r in todo], truncation=True, max_length=max_length,
+                            padding=True, return_tensors='pt')
+        return records, todo, encoded
+
+    def infer_split(item):
+        records, todo, encoded = item
+        if not todo:
+            return records
+        try:
+            with torch.inference_mode():
+                device = next(model.parameters()).device
+                logits = model(**{k: v.to(device) for k, v in encoded.items()}).logits
+                scores, indices = torch.softmax(logits.float(), dim=-1).max(dim=-1)
+            for record, score, index in zip(todo, scores.tolist(), indices.tolist()):
+                record['label'] = model.config.id2label[index]
+                record['score'] = score
+        except Exception:
+            classify_each(todo)
+        return records
+
+    def infer_whole(records):
+        todo = active(records)
+        if not todo:
+            return records
+        try:
+            results = classify_fn([r[text_key] for r in todo])
+            for record, result in zip(todo, results):
+                record.update(result)
+        except Exception:
+            classify_each(todo)
+        return records
+
+    def classify_each(records):
+        """Retry one record at a time so a bad line only fails itself"""
+        for record in records:
+            try:
+                record.update(classify_fn([record[text_key]])[0])
+            except Exception as e:
+                record['error'] = str(e)
+
+    if split:
+        return [Stage('tokenize', tokenize, workers=tokenizer_workers), Stage('inference', infer_split)]
+    return [Stage('inference', infer_whole)]
+
+
+def prefilter_stage(prefilter, text_key='text'):
+    """Stage that marks records rejected by a Prefilter with their 'skip_reason'"""
+    def apply(records):
+        for record, reason in zip(records, prefilter.reasons([r[text_key] for r in records])):
+            if reason:
+                record['skip_reason'] = reason
+        return records
+    return Stage('prefilter', apply)
+
+
+def print_stage_times(stages, elapsed):
+    """One line with the wall time and how busy each stage was"""
+    busy = ', '.join(f"{stage.name} {stage.busy_seconds:.1f}s" for stage in stages)
+    print(f"Time: {elapsed:.1f}s ({busy})")
@@ -0,0 +1,216 @@
+"""
+Cheap pre-inference filter for lines that are not worth sending to a model.
+
+Rejects empty or near-empty lines, lines that are mostly digits/symbols
+(URLs, tickers, prices), boilerplate, and text the English models cannot
+handle (non-Latin scripts, or Latin-script text whose function words point
+at another language). Character-class statistics for a whole batch of lines
+are computed in one NumPy pass; the language check only looks at a small
+stopword list per language.
+
+Rules live in prefilter.json (or the file named by the PREFILTER_CONFIG
+environment variable), with one profile per kind of input, e.g. "sentiment"
+for the file analyzers and "website-title" for scraped titles:
+    {"sentiment": {"min_letters": 3, "deny_patterns": {"url_only": "^https?://\\\\S+$"}}}
+
+Deny patterns are case-sensitive; use (?i) for case-insensitive ones.
+Every rejected line gets a short reason code: empty, too_short,
+non_language, non_latin_script, non_english, denylist, or the name of the
+deny pattern that matched.
+
+Usage:
+    from common.prefilter import get_prefilter
+    kept, skipped = get_prefilter("sentiment").split(lines)
+"""
+
+import csv
+import json
+import os
+import re
+from collections import Counter
+
+import numpy as np
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_CONFIG_PATH = os.path.join(REPO_ROOT, 'prefilter.json')
+
+DEFAULT_RULES = {
+    'min_letters': 3,
+    'min_letter_ratio': 0.4,
+    'max_non_latin_ratio': 0.3,
+    'languages': ['en'],
+    'deny_patterns': {},
+    'denylist': []
+}
+
+# Character classes
+SPACE, LETTER, DIGIT, PUNCT, OTHER_LETTER = range(5)
+N_CLASSES = 5
+
+
+def _latin1_table():
+    table = np.full(256, PUNCT, dtype=np.int64)
+    for code in range(256):
+        char = chr(code)
+        if char.isspace():
+            table[code] = SPACE
+        elif char.isdigit():
+            table[code] = DIGIT
+        elif char.isalpha():
+            table[code] = LETTER
+    return table
+
+
+LATIN1_CLASSES = _latin1_table()
+
+# Small function-word lists; a line is only called non-English when another
+# language clearly wins, so headlines with no function words pass through
+STOPWORDS = {
+    'en': "the a an and or but is are was were be been to of in on at for with by from this that it "
+          "its i you he she we they my your not no do does did have has had will would can could so very",
+    'es': "el la los las que y en un una por para con es del al lo como muy pero su sus está son más "
+          "también porque cuando este esta",
+    'fr': "le la les des et est une un du pour dans pas que qui sur avec ce il je très au aux mais "
+          "sont été cette elle nous vous",
+    'de': "der die das und ist nicht ein eine mit zu den von für auf ich sie es sehr auch wir dem "
+          "sind war aber oder wie",
+    'pt': "o os as um uma não com para que é do da dos das em muito mas foi são está também pelo pela",
+    'it': "il lo gli le di che è e un una per con non sono molto della del questo questa ma anche più",
+    'nl': "de het een en van is niet op te dat met voor zijn ook heel maar aan deze naar",
+}
+_ENGLISH = set(STOPWORDS['en'].split())
+STOPWORD_SETS = {lang: set(words.split()) - (_ENGLISH if lang != 'en' else set())
+                 for lang, words in STOPWORDS.items()}
+
+WORD_PATTERN = re.compile(r"[^\W\d_]+(?:'[^\W\d_]+)?")
+
+
+def load_config(path=None):
+    """Read the prefilter profiles; a missing file means default rules only"""
+    path = path or os.environ.get('PREFILTER_CONFIG', DEFAULT_CONFIG_PATH)
+    if not os.path.exists(path):
+        return {}
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def char_class_counts(lines):
+    """Per-line counts of each character class, as an (n_lines, N_CLASSES) array"""
+    encoded = [line.encode('utf-32-le') for line in lines]
+    lengths = np.fromiter((len(b) // 4 for b in encoded), dtype=np.int64, count=len(encoded))
+    codes = np.frombuffer(b''.join(encoded), dtype='<u4').astype(np.int64)
+
+    classes = np.full(codes.shape, OTHER_LETTER, dtype=np.int64)
+    latin1 = codes < 256
+    classes[latin1] = LATIN1_CLASSES[codes[latin1]]
+    # Latin Extended letters count as Latin
+    classes[(codes >= 0x100) & (codes < 0x250)] = LETTER
+    # Typographic punctuation, currency, arrows, symbols and emoji are not letters
+    symbols = (((codes >= 0x2000) & (codes < 0x2c00)) | ((codes >= 0x3000) & (codes < 0x3040)) |
+               ((codes >= 0xfe00) & (codes < 0xfe70)) | (codes >= 0x1f000))
+    classes[symbols] = PUNCT
+
+    line_ids = np.repeat(np.arange(len(lines)), lengths)
+    counts = np.bincount(line_ids * N_CLASSES + classes, minlength=len(lines) * N_CLASSES)
+    return counts.reshape(len(lines), N_CLASSES)
+
+
+def guess_language(text):
+    """Best-guess language code from stopword hits ('en' unless another clearly wins)"""
+    words = [w.lower() for w in WORD_PATTERN.findall(text)]
+    if not words:
+        return 'en'
+    hits = {lang: sum(1 for w in words if w in stopwords) for lang, stopwords in STOPWORD_SETS.items()}
+    best = max(hits, key=hits.get)
+    if best != 'en' and hits[best] >= 2 and hits[best] > hits['en']:
+        return best
+    return 'en'
+
+
+def _normalize(text):
+    return ' '.join(re.sub(r'[^\w\s]', ' ', text.lower()).split())
+
+
+class Prefilter:
+    """Decides which lines are worth sending to a model"""
+
+    def __init__(self, rules=None):
+        rules = dict(DEFAULT_RULES, **(rules or {}))
+        self.min_letters = rules['min_letters']
+        self.min_letter_ratio = rules['min_letter_ratio']
+        self.max_non_latin_ratio = rules['max_non_latin_ratio']
+        self.languages = set(rules['languages'] or [])
+        self.deny_patterns = [(name, re.compile(pattern))
+                              for name, pattern in rules['deny_patterns'].items()]
+        self.denylist = {_normalize(item) for item in rules['denylist']}
+
+    def reasons(self, lines):
+        """Reason code for each line, or None if the line should be scored"""
+        lines = [line.strip() for line in lines]
+        if not lines:
+            return []
+
+        counts = char_class_counts(lines)
+        letters = counts[:, LETTER] + counts[:, OTHER_LETTER]
+        visible = counts.sum(axis=1) - counts[:, SPACE]
+        letter_ratio = letters / np.maximum(visible, 1)
+        non_latin_ratio = counts[:, OTHER_LETTER] / np.maximum(letters, 1)
+
+        # Later assignments win, so the most basic reason is reported
+        reasons = np.full(len(lines), None, dtype=object)
+        if 'en' in self.languages:
+            reasons[non_latin_ratio > self.max_non_latin_ratio] = 'non_latin_script'
+        reasons[letter_ratio < self.min_letter_ratio] = 'non_language'
+        reasons[letters < self.min_letters] = 'too_short'
+        reasons[visible == 0] = 'empty'
+
+        # Regex, denylist and language rules only run on lines that passed the statistics
+        for i in [i for i, reason in enumerate(reasons) if reason is None]:
+            reasons[i] = self._rule_reason(lines[i])
+        return reasons.tolist()
+
+    def _rule_reason(self, line):
+        for name, pattern in self.deny_patterns:
+            if pattern.search(line):
+                return name
+        if self.denylist and _normalize(line) in self.denylist:
+            return 'denylist'
+        if self.languages and guess_language(line) not in self.languages:
+            return 'non_english' if self.languages == {'en'} else 'unsupported_language'
+        return None
+
+    def split(self, lines):
+        """Return (kept, skipped): kept is [(index, line)], skipped is [(index, line, reason)]"""
+        kept, skipped = [], []
+        for i, (line, reason) in enumerate(zip(lines, self.reasons(lines))):
+            if reason is None:
+                kept.append((i, line))
+            else:
+                skipped.append((i, line, reason))
+        return kept, skipped
+
+
+def get_prefilter(profile, config_path=None):
+    """Return a Prefilter for a named profile in prefilter.json"""
+    return Prefilter(load_config(config_path).get(profile))
+
+
+def skipped_path(output_file):
+    """Where to write skipped lines for a given results file"""
+    base, _ = os.path.splitext(output_file)
+    return f"{base}.skipped.csv"
+
+
+def write_skipped(skipped, filename, line_numbers=None):
+    """Save skipped lines with their reason codes to a CSV file"""
+    with open(filename, 'w', newline='', encoding='utf-8') as csvfile:
+        writer = csv.writer(csvfile)
+        writer.writerow(['line_number', 'reason', 'text'])
+        for index, line, reason in skipped:
+            writer.writerow([line_numbers[index] if line_numbers else index + 1, reason, line])
+
+
+def summarize_skipped(skipped):
+    """One-line count of skipped lines by reason"""
+    counts = Counter(reason for _, _, reason in skipped)
+    return ', '.join(f"{reason}: {count}" for reason, count in counts.most_common())
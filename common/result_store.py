@@ -0,0 +1,390 @@
+"""
+Columnar result store for the file analyzers.
+
+A list of per-line dicts costs several hundred bytes per row (the dict, boxed
+floats, a copy of the line and, for websites, an all_scores dict).
+ResultStore keeps one NumPy array per column instead:
+
+    id        int32    line (or URL) number
+    label     uint8    code into store.labels ('POSITIVE', 'news', 'Error', ...)
+    score     float32  confidence of the label (float16 with score_dtype)
+    scores    float16  optional dense matrix, one column per score label (zero-shot)
+    <text>    int64 byte offset + int32 byte length per text column
+    <code>    uint8    code into a small vocabulary (skip reasons, origins, ...)
+
+Text columns point into the input file (memory-mapped when read back) if the
+reader supplies byte offsets, so lines are never copied; other text (page
+titles, text blocks) is appended to one UTF-8 arena per column. Arrays grow
+in chunks of CHUNK_ROWS. A sentiment row costs 21 bytes plus arena text.
+
+Summaries (counts, score means, top rows) and filters are vectorized, and
+ResultWriter streams rows straight from the columns to CSV or Parquet
+(requires pyarrow).
+"""
+
+import csv
+import mmap
+import os
+
+import numpy as np
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
+
+CHUNK_ROWS = 65536
+
+
+def numbered_lines(path):
+    """Yield (line number, text, byte offset, byte length) for the non-blank lines of a UTF-8 file
+
+    Line numbers count non-blank lines; text is stripped and the offsets
+    locate exactly that text in the file.
+    """
+    with open(path, 'rb') as f:
+        number = 0
+        position = 0
+        for raw in f:
+            start = position
+            position += len(raw)
+            line = raw.decode('utf-8')
+            text = line.strip()
+            if not text:
+                continue
+            number += 1
+            lead = len(line) - len(line.lstrip())
+            offset = start + (len(line[:lead].encode('utf-8')) if lead else 0)
+            yield number, text, offset, len(text.encode('utf-8'))
+
+
+class Vocabulary:
+    """Category names and their uint8 codes, assigned in order of first use"""
+
+    def __init__(self, names=()):
+        self.names = []
+        self.codes = {}
+        for name in names:
+            self.code(name)
+
+    def code(self, name):
+        code = self.codes.get(name)
+        if code is None:
+            if len(self.names) > 255:
+                raise ValueError(f"more than 256 categories (adding '{name}')")
+            code = self.codes[name] = len(self.names)
+            self.names.append(name)
+        return code
+
+    def encode(self, names):
+        return np.fromiter((self.code(name) for name in names), dtype=np.uint8, count=len(names))
+
+    def __len__(self):
+        return len(self.names)
+
+
+class TextColumn:
+    """Where the bytes of a text column live: a source file or an in-memory arena"""
+
+    def __init__(self, source=None):
+        self.source = source
+        self.arena = bytearray()
+        self._file = None
+        self._map = None
+
+    def store(self, values):
+        """Offsets and lengths for a chunk of values
+
+        values are (offset, length) pairs into the source file, or strings
+        when the column has no source (they are copied to the arena).
+        """
+        if self.source is not None:
+            pairs = np.asarray(values, dtype=np.int64).reshape(-1, 2)
+            return pairs[:, 0], pairs[:, 1]
+        offsets = np.empty(len(values), dtype=np.int64)
+        lengths = np.empty(len(values), dtype=np.int64)
+        for i, value in enumerate(values):
+            data = value.encode('utf-8')
+            offsets[i] = len(self.arena)
+            lengths[i] = len(data)
+            self.arena += data
+        return offsets, lengths
+
+    def buffer(self):
+        if self.source is None:
+            return self.arena
+        if self._map is None:
+            self._file = open(self.source, 'rb')
+            if os.fstat(self._file.fileno()).st_size == 0:
+                return b''
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        return self._map
+
+    def get(self, offset, length):
+        return self.buffer()[offset:offset + length].decode('utf-8')
+
+    def nbytes(self):
+        return len(self.arena)
+
+    def close(self):
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+class ResultStore:
+    """Append-only columns of results; see the module docstring for the layout"""
+
+    def __init__(self, labels=(), score_labels=None, score_dtype=np.float32,
+                 text_columns=('text',), code_columns=(), sources=None):
+        self.labels = Vocabulary(labels)
+        self.score_labels = list(score_labels) if score_labels else None
+        self.texts = {name: TextColumn((sources or {}).get(name)) for name in text_columns}
+        self.codes = {name: Vocabulary() for name in code_columns}
+        self.count = 0
+        self._capacity = 0
+
+        self._dtypes = {'id': (np.int32, ()), 'label': (np.uint8, ()), 'score': (np.dtype(score_dtype), ())}
+        if self.score_labels:
+            self._dtypes['scores'] = (np.float16, (len(self.score_labels),))
+        for name in self.texts:
+            self._dtypes[f'{name}_offset'] = (np.int64, ())
+            self._dtypes[f'{name}_length'] = (np.int32, ())
+        for name in self.codes:
+            self._dtypes[name] = (np.uint8, ())
+        self._arrays = {name: np.zeros((0,) + shape, dtype=dtype) for name, (dtype, shape) in self._dtypes.items()}
+
+    def _ensure_capacity(self, rows):
+        if rows <= self._capacity:
+            return
+        capacity = max(rows, self._capacity * 2, CHUNK_ROWS)
+        capacity = -(-capacity // CHUNK_ROWS) * CHUNK_ROWS
+        for name, (dtype, shape) in self._dtypes.items():
+            grown = np.zeros((capacity,) + shape, dtype=dtype)
+            grown[:self.count] = self._arrays[name][:self.count]
+            self._arrays[name] = grown
+        self._capacity = capacity
+
+    def append(self, ids, labels, scores, score_matrix=None, **columns):
+        """Add a chunk of rows; returns the index of its first row
+
+        labels and code columns are given as names, text columns as strings
+        or (offset, length) pairs (see TextColumn.store), score_matrix as
+        rows of len(score_labels) values (NaN where a score is unknown).
+        """
+        n = len(ids)
+        start = self.count
+        if n == 0:
+            return start
+        self._ensure_capacity(start + n)
+        stop = start + n
+        self._arrays['id'][start:stop] = ids
+        self._arrays['label'][start:stop] = self.labels.encode(labels)
+        self._arrays['score'][start:stop] = scores
+        if self.score_labels:
+            self._arrays['scores'][start:stop] = np.nan if score_matrix is None else score_matrix
+        for name, column in self.texts.items():
+            offsets, lengths = column.store(columns[name])
+            self._arrays[f'{name}_offset'][start:stop] = offsets
+            self._arrays[f'{name}_length'][start:stop] = lengths
+        for name, vocabulary in self.codes.items():
+            self._arrays[name][start:stop] = vocabulary.encode(columns.get(name) or [''] * n)
+        self.count = stop
+        return start
+
+    def __len__(self):
+        return self.count
+
+    def column(self, name):
+        """View of a numeric column ('id', 'label', 'score', 'scores' or a code column)"""
+        return self._arrays[name][:self.count]
+
+    def text(self, row, name='text'):
+        offset = int(self._arrays[f'{name}_offset'][row])
+        return self.texts[name].get(offset, int(self._arrays[f'{name}_length'][row]))
+
+    def values(self, name, start=0, stop=None):
+        """Python values of a column for rows start..stop: names for labels and codes, strings for text"""
+        stop = self.count if stop is None else min(stop, self.count)
+        if name == 'label':
+            return [self.labels.names[code] for code in self._arrays['label'][start:stop].tolist()]
+        if name in self.codes:
+            return [self.codes[name].names[code] for code in self._arrays[name][start:stop].tolist()]
+        if name in self.texts:
+            buffer = self.texts[name].buffer()
+            offsets = self._arrays[f'{name}_offset'][start:stop].tolist()
+            lengths = self._arrays[f'{name}_length'][start:stop].tolist()
+            return [buffer[o:o + n].decode('utf-8') for o, n in zip(offsets, lengths)]
+        return self._arrays[name][start:stop].tolist()
+
+    def row(self, row):
+        """One row as a dict (for printing; use the columns for bulk work)"""
+        names = ['id', 'label', 'score'] + list(self.texts) + list(self.codes)
+        values = {name: self.values(name, row, row + 1)[0] for name in names}
+        if self.score_labels:
+            values['scores'] = {label: float(score) for label, score in zip(self.score_labels, self.column('scores')[row])
+                                if not np.isnan(score)}
+        return values
+
+    def __iter__(self):
+        for row in range(self.count):
+            yield self.row(row)
+
+    def mask(self, label=None, exclude=(), min_score=None, **codes):
+        """Boolean row mask: label (name or list of names), labels to exclude, a minimum score, code column values"""
+        mask = np.ones(self.count, dtype=bool)
+        if label is not None:
+            mask &= np.isin(self.column('label'), self._label_codes([label] if isinstance(label, str) else label))
+        if exclude:
+            mask &= ~np.isin(self.column('label'), self._label_codes(exclude))
+        if min_score is not None:
+            mask &= self.column('score') >= min_score
+        for name, value in codes.items():
+            code = self.codes[name].codes.get(value)
+            mask &= self.column(name) == code if code is not None else False
+        return mask
+
+    def _label_codes(self, names):
+        return [self.labels.codes[name] for name in names if name in self.labels.codes]
+
+    def filter(self, mask):
+        """New store with the selected rows; text columns share their source and arena"""
+        selected = ResultStore(score_labels=self.score_labels, score_dtype=self._dtypes['score'][0],
+                               text_columns=(), code_columns=())
+        selected.labels = self.labels
+        selected.texts = self.texts
+        selected.codes = self.codes
+        selected._dtypes = self._dtypes
+        selected._arrays = {name: self.column(name)[mask] for name in self._dtypes}
+        selected.count = selected._capacity = len(selected._arrays['id'])
+        return selected
+
+    def counts(self, name='label', mask=None):
+        """Rows per label (or per code of a code column), most common first"""
+        vocabulary = self.labels if name == 'label' else self.codes[name]
+        codes = self.column(name) if mask is None else self.column(name)[mask]
+        counts = np.bincount(codes, minlength=len(vocabulary))
+        return {vocabulary.names[code]: int(counts[code]) for code in np.argsort(-counts, kind='stable') if counts[code]}
+
+    def mean_scores(self):
+        """Mean score per label"""
+        codes, scores = self.column('label'), self.column('score').astype(np.float64)
+        sums = np.bincount(codes, weights=scores, minlength=len(self.labels))
+        counts = np.bincount(codes, minlength=len(self.labels))
+        return {self.labels.names[code]: float(sums[code] / counts[code]) for code in range(len(self.labels)) if counts[code]}
+
+    def top(self, n=1, label=None):
+        """Row indices with the highest scores (optionally for one label), best first"""
+        rows = np.flatnonzero(self.mask(label=label)) if label is not None else np.arange(self.count)
+        if not len(rows):
+            return rows
+        scores = self.column('score')[rows]
+        n = min(n, len(rows))
+        best = np.argpartition(-scores, n - 1)[:n]
+        return rows[best[np.argsort(-scores[best], kind='stable')]]
+
+    def nbytes(self):
+        """Memory used by the stored rows (column arrays up to count, plus arenas)"""
+        columns = sum(self.column(name).nbytes for name in self._dtypes)
+        return columns + sum(column.nbytes() for column in self.texts.values())
+
+    def close(self):
+        for column in self.texts.values():
+            column.close()
+
+
+class ResultWriter:
+    """Streams the rows of a ResultStore to CSV, or to Parquet for *.parquet paths
+
+    columns is a list of (output name, store column) pairs; 'scores' expands
+    to one column per score label. write() appends the rows added since the
+    last call, so a pipeline sink can append a chunk and write it at once.
+    Parquet rows are buffered in the store and written in row groups.
+    """
+
+    def __init__(self, path, store, columns):
+        self.path = path
+        self.store = store
+        self.columns = columns
+        self.written = 0
+        self.parquet = path.endswith('.parquet')
+        self._file = None
+        self._writer = None
+        if self.parquet:
+            if pq is None:
+                raise ImportError("Parquet output requires pyarrow (pip install pyarrow)")
+        else:
+            self._file = open(path, 'w', newline='', encoding='utf-8')
+            self._writer = csv.writer(self._file)
+            self._writer.writerow(self._header())
+
+    def _header(self):
+        header = []
+        for name, column in self.columns:
+            header.extend(self.store.score_labels if column == 'scores' else [name])
+        return header
+
+    def write(self, final=False):
+        """Write pending rows; Parquet waits for a full row group unless final"""
+        stop = len(self.store)
+        if self.parquet:
+            while stop - self.written >= CHUNK_ROWS or (final and stop > self.written):
+                end = min(self.written + CHUNK_ROWS, stop)
+                self._write_parquet(self.written, end)
+                self.written = end
+            return
+        for start in range(self.written, stop, CHUNK_ROWS):
+            end = min(start + CHUNK_ROWS, stop)
+            values = []
+            for _, column in self.columns:
+                if column == 'scores':
+                    values.extend(self.store.column('scores')[start:end].astype(np.float32).T.tolist())
+                else:
+                    values.append(self.store.values(column, start, end))
+            self._writer.writerows(zip(*values))
+        self.written = stop
+
+    def _write_parquet(self, start, stop):
+        store = self.store
+        names, arrays = [], []
+        for name, column in self.columns:
+            if column == 'scores':
+                for label, scores in zip(store.score_labels, store.column('scores')[start:stop].astype(np.float32).T):
+                    names.append(label)
+                    arrays.append(pa.array(scores, type=pa.float32(), from_pandas=True))
+                continue
+            names.append(name)
+            if column == 'label' or column in store.codes:
+                vocabulary = store.labels if column == 'label' else store.codes[column]
+                indices = pa.array(store.column(column)[start:stop].astype(np.int16))
+                arrays.append(pa.DictionaryArray.from_arrays(indices, pa.array(vocabulary.names, type=pa.string())))
+            elif column in store.texts:
+                arrays.append(pa.array(store.values(column, start, stop), type=pa.string()))
+            elif column == 'score':
+                arrays.append(pa.array(store.column('score')[start:stop].astype(np.float32)))
+            else:
+                arrays.append(pa.array(store.column(column)[start:stop]))
+        table = pa.Table.from_arrays(arrays, names=names)
+        if self._writer is None:
+            self._writer = pq.ParquetWriter(self.path, table.schema)
+        else:
+            # Later chunks may have grown a vocabulary; keep the first schema's types
+            table = table.cast(self._writer.schema)
+        self._writer.write_table(table)
+
+    def close(self):
+        self.write(final=True)
+        if self.parquet:
+            if self._writer is None:
+                # No rows: still write a file with the column names
+                empty = pa.Table.from_arrays([pa.array([], type=pa.string()) for _ in self._header()],
+                                             names=self._header())
+                pq.write_table(empty, self.path)
+            else:
+                self._writer.close()
+        elif self._file is not None:
+            self._file.close()
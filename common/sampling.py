@@ -0,0 +1,128 @@
+"""
+Sampling and interval estimates for corpus-level label shares.
+
+Lines are streamed once into per-stratum reservoirs (uniform samples of
+fixed size, whatever the file length) while the size of every stratum is
+counted. Reservoir contents are shuffled, so classifying any prefix of a
+reservoir is still a uniform sample of its stratum; that is what lets the
+estimator stop early once the interval is narrow enough.
+
+Label shares are estimated per stratum and combined with the stratum sizes
+as weights. Intervals use the Wilson score interval for a single stratum and
+a normal approximation over the strata otherwise (with the finite population
+correction, so a stratum that is fully classified adds no uncertainty).
+"""
+
+import math
+import random
+from statistics import NormalDist
+
+
+class Reservoir:
+    """Uniform random sample of fixed capacity from a stream (Algorithm R)"""
+
+    def __init__(self, capacity, rng=None):
+        self.capacity = capacity
+        self.rng = rng or random.Random()
+        self.items = []
+        self.seen = 0
+
+    def add(self, item):
+        self.seen += 1
+        if len(self.items) < self.capacity:
+            self.items.append(item)
+            return
+        slot = self.rng.randrange(self.seen)
+        if slot < self.capacity:
+            self.items[slot] = item
+
+
+class StratifiedReservoir:
+    """One reservoir per stratum, created as new strata appear"""
+
+    def __init__(self, capacity, seed=None):
+        self.capacity = capacity
+        self.rng = random.Random(seed)
+        self.strata = {}
+
+    def add(self, stratum, item):
+        reservoir = self.strata.get(stratum)
+        if reservoir is None:
+            reservoir = self.strata[stratum] = Reservoir(self.capacity, self.rng)
+        reservoir.add(item)
+
+    def population(self):
+        """Number of stream items seen per stratum"""
+        return {name: reservoir.seen for name, reservoir in self.strata.items()}
+
+    def shuffled(self):
+        """Reservoir contents per stratum in random order"""
+        samples = {}
+        for name, reservoir in self.strata.items():
+            items = list(reservoir.items)
+            self.rng.shuffle(items)
+            samples[name] = items
+        return samples
+
+
+def z_value(confidence):
+    """Two-sided normal quantile for a confidence level (0.95 -> 1.96)"""
+    return NormalDist().inv_cdf((1 + confidence) / 2)
+
+
+def wilson_interval(successes, n, z=1.96):
+    """Wilson score interval for a binomial proportion"""
+    if n == 0:
+        return 0.0, 0.0, 1.0
+    p = successes / n
+    denominator = 1 + z * z / n
+    centre = (p + z * z / (2 * n)) / denominator
+    half_width = z * math.sqrt(p * (1 - p) / n + z * z / (4 * n * n)) / denominator
+    return p, max(0.0, centre - half_width), min(1.0, centre + half_width)
+
+
+def stratified_proportion(population, successes, sampled, z=1.96):
+    """Estimate a share from per-stratum counts; returns (estimate, low, high)
+
+    population, successes and sampled are dicts keyed by stratum. Strata that
+    have not been sampled yet are left out of the weights.
+    """
+    strata = [h for h in population if sampled.get(h)]
+    if not strata:
+        return 0.0, 0.0, 1.0
+    if len(strata) == 1:
+        h = strata[0]
+        p, low, high = wilson_interval(successes[h], sampled[h], z)
+        fpc = math.sqrt(max(0.0, 1 - sampled[h] / population[h]))
+        return p, p - (p - low) * fpc, p + (high - p) * fpc
+
+    total = sum(population[h] for h in strata)
+    estimate = variance = 0.0
+    for h in strata:
+        weight = population[h] / total
+        n = sampled[h]
+        p = successes[h] / n
+        # Smoothed share for the variance so 0/n strata still count as uncertain
+        p_smoothed = (successes[h] + 1) / (n + 2)
+        fpc = max(0.0, 1 - n / population[h])
+        estimate += weight * p
+        variance += weight * weight * p_smoothed * (1 - p_smoothed) / n * fpc
+    half_width = z * math.sqrt(variance)
+    return estimate, max(0.0, estimate - half_width), min(1.0, estimate + half_width)
+
+
+def allocate(population, taken, available, size):
+    """Split the next round of `size` samples across strata in proportion to their size
+
+    Every stratum with items left gets at least one, so small strata are
+    never starved; strata that have run out are skipped.
+    """
+    open_strata = [h for h in population if taken.get(h, 0) < available.get(h, 0)]
+    if not open_strata:
+        return {}
+    total = sum(population[h] for h in open_strata)
+    allocation = {}
+    for h in open_strata:
+        share = max(1, round(size * population[h] / total))
+        allocation[h] = min(share, available[h] - taken.get(h, 0))
+    return allocation
@@ -0,0 +1,232 @@
+"""
+Static-shape execution for the sentiment and zero-shot models.
+
+Dynamic padding gives every batch a different shape, which stops graph
+compilers from reusing their work. StaticShapeClassifier pads inputs to a
+small fixed set of sequence-length buckets (and batch sizes to powers of
+two), so each shape is compiled or traced once and reused for every batch
+that lands in it. Compiled artifacts are cached on disk across runs.
+
+Backends:
+    eager        - bucketed padding only
+    torchscript  - model traced once with torch.jit and saved to the cache
+                   (the saved artifact carries its own copy of the weights)
+    compile      - torch.compile with one static graph per bucket shape;
+                   inductor's on-disk cache lives under the same cache dir
+
+The classifier is a drop-in replacement for the transformers pipelines used
+by the scripts; enable it per model in models.json with
+"execution": "static".
+"""
+
+import hashlib
+import json
+import os
+
+import torch
+import transformers
+
+from common.zero_shot import (HYPOTHESIS_TEMPLATE, entailment_ids, format_result,
+                              label_scores, nli_pairs, parse_labels)
+
+DEFAULT_BUCKETS = (16, 32, 64, 128, 256)
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'bert-sentiment-tools', 'compiled')
+BACKENDS = ('eager', 'torchscript', 'compile')
+
+
+class _LogitsModule(torch.nn.Module):
+    """Wraps a sequence classification model so it returns a plain tensor"""
+
+    def __init__(self, model):
+        super().__init__()
+        self.model = model
+
+    def forward(self, input_ids, attention_mask):
+        return self.model(input_ids=input_ids, attention_mask=attention_mask, return_dict=False)[0]
+
+
+def batch_bucket(size, max_batch_size):
+    """Round a batch size up to the next power of two (capped)"""
+    bucket = 1
+    while bucket < size and bucket < max_batch_size:
+        bucket *= 2
+    return min(bucket, max_batch_size)
+
+
+class StaticShapeClassifier:
+    """Runs a classification model on fixed (batch, sequence) bucket shapes"""
+
+    def __init__(self, model, tokenizer, task, buckets=None, batch_size=8,
+                 backend='torchscript', cache_dir=None, device=-1):
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown backend '{backend}'. Choose from: {', '.join(BACKENDS)}")
+
+        self.model = model
+        self.tokenizer = tokenizer
+        self.task = task
+        self.buckets = tuple(sorted(buckets or DEFAULT_BUCKETS))
+        self.batch_size = batch_size
+        self.backend = backend
+        self.cache_dir = cache_dir or DEFAULT_CACHE_DIR
+        self.device = torch.device('cpu' if device < 0 else f'cuda:{device}')
+        self.model.to(self.device)
+        self.model.eval()
+
+        self._runner = None
+        self._shapes_seen = set()
+
+    # Pipeline-compatible entry point
+
+    def __call__(self, inputs, candidate_labels=None, hypothesis_template=HYPOTHESIS_TEMPLATE,
+                 multi_label=False, **kwargs):
+        single = isinstance(inputs, str)
+        texts = [inputs] if single else list(inputs)
+
+        if self.task == 'zero-shot-classification':
+            if candidate_labels is None:
+                raise ValueError("candidate_labels is required for zero-shot classification")
+            results = self.zero_shot(texts, parse_labels(candidate_labels), hypothesis_template, multi_label)
+            return results[0] if single else results
+
+        results = self.classify(texts)
+        return results if not single else results[:1]
+
+    def classify(self, texts):
+        """Sentiment/text classification: one {'label', 'score'} dict per text"""
+        encodings = [self._encode(text) for text in texts]
+        probs = torch.softmax(self.logits(encodings).float(), dim=-1)
+        scores, indices = probs.max(dim=-1)
+        id2label = self.model.config.id2label
+        return [{'label': id2label[int(i)], 'score': float(s)} for s, i in zip(scores, indices)]
+
+    def zero_shot(self, texts, labels, hypothesis_template=HYPOTHESIS_TEMPLATE, multi_label=False):
+        """Zero-shot classification with the same scoring as the pipeline"""
+        pairs = nli_pairs(texts, labels, hypothesis_template)
+        encodings = [self._encode(premise, hypothesis) for premise, hypothesis in pairs]
+        logits = self.logits(encodings).float().tolist()
+
+        entailment_id, contradiction_id = entailment_ids(self.model.config)
+        results = []
+        for i, text in enumerate(texts):
+            rows = logits[i * len(labels):(i + 1) * len(labels)]
+            scores = label_scores([row[entailment_id] for row in rows],
+                                  [row[contradiction_id] for row in rows], multi_label)
+            results.append(format_result(text, labels, scores))
+        return results
+
+    # Bucketed execution
+
+    def bucket_for(self, length):
+        """Smallest bucket that fits a sequence, or None if it overflows all buckets"""
+        for bucket in self.buckets:
+            if length <= bucket:
+                return bucket
+        return None
+
+    def logits(self, encodings):
+        """Run token id lists through the model, routed to their bucket shapes"""
+        groups = {}
+        for index, ids in enumerate(encodings):
+            groups.setdefault(self.bucket_for(len(ids)), []).append(index)
+
+        outputs = [None] * len(encodings)
+        with torch.inference_mode():
+            for bucket, indices in groups.items():
+                for start in range(0, len(indices), self.batch_size):
+                    chunk = indices[start:start + self.batch_size]
+                    rows = [encodings[i] for i in chunk]
+                    if bucket is None:
+                        # Longer than every bucket: run with dynamic padding
+                        logits = self._run_eager(rows, max(len(ids) for ids in rows))
+                    else:
+                        logits = self._run_static(rows, bucket)
+                    for row, index in enumerate(chunk):
+                        outputs[index] = logits[row]
+
+        return torch.stack(outputs)
+
+    def warmup(self):
+        """Compile every bucket shape up front instead of on first use"""
+        ids = self._encode("warmup")
+        size = 1
+        while True:
+            for bucket in self.buckets:
+                self._run_static([ids] * size, bucket)
+            if size >= self.batch_size:
+                break
+            size = batch_bucket(size + 1, self.batch_size)
+
+    def _encode(self, text, text_pair=None):
+        max_length = min(self.tokenizer.model_max_length, 512)
+        truncation = 'only_first' if text_pair is not None else True
+        return self.tokenizer(text, text_pair, truncation=truncation, max_length=max_length)['input_ids']
+
+    def _pad(self, rows, length, batch):
+        pad_id = self.tokenizer.pad_token_id or 0
+        input_ids = torch.full((batch, length), pad_id, dtype=torch.long)
+        attention_mask = torch.zeros((batch, length), dtype=torch.long)
+        # Filler rows repeat the first row so models that inspect special
+        # tokens (e.g. BART's eos pooling) see well-formed input
+        for i in range(batch):
+            ids = rows[i] if i < len(rows) else rows[0]
+            input_ids[i, :len(ids)] = torch.tensor(ids, dtype=torch.long)
+            attention_mask[i, :len(ids)] = 1
+        return input_ids.to(self.device), attention_mask.to(self.device)
+
+    def _run_eager(self, rows, length):
+        input_ids, attention_mask = self._pad(rows, length, len(rows))
+        return self.model(input_ids=input_ids, attention_mask=attention_mask).logits
+
+    def _run_static(self, rows, bucket):
+        batch = batch_bucket(len(rows), self.batch_size)
+        input_ids, attention_mask = self._pad(rows, bucket, batch)
+        self._shapes_seen.add((batch, bucket))
+        return self._get_runner(input_ids, attention_mask)(input_ids, attention_mask)[:len(rows)]
+
+    def _get_runner(self, input_ids, attention_mask):
+        if self._runner is not None:
+            return self._runner
+
+        module = _LogitsModule(self.model).eval()
+        if self.backend == 'eager':
+            self._runner = module
+        elif self.backend == 'compile':
+            os.environ.setdefault('TORCHINDUCTOR_CACHE_DIR', os.path.join(self.cache_dir, 'inductor'))
+            self._runner = torch.compile(module, dynamic=False)
+        else:
+            self._runner = self._load_or_trace(module, input_ids, attention_mask)
+        return self._runner
+
+    def _load_or_trace(self, module, input_ids, attention_mask):
+        path = os.path.join(self.cache_dir, f"{self.cache_key()}.pt")
+        if os.path.exists(path):
+            return torch.jit.load(path, map_location=self.device)
+
+        traced = torch.jit.trace(module, (input_ids, attention_mask), check_trace=False)
+        os.makedirs(self.cache_dir, exist_ok=True)
+        # Write to a temporary name first so concurrent runs never load a partial file
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        torch.jit.save(traced, tmp_path)
+        os.replace(tmp_path, path)
+        return traced
+
+    def cache_key(self):
+        """Identifies the compiled artifact for this model, task and runtime"""
+        config = self.model.config.to_dict()
+        with torch.no_grad():
+            weights = sum(float(p.double().sum()) for p in self.model.parameters())
+        fingerprint = json.dumps({
+            'model': getattr(self.model.config, '_name_or_path', ''),
+            'config': config,
+            'weights': repr(weights),
+            'task': self.task,
+            'device': str(self.device),
+            'torch': torch.__version__,
+            'transformers': transformers.__version__
+        }, sort_keys=True, default=str)
+        name = os.path.basename(str(config.get('_name_or_path', 'model')).rstrip('/')) or 'model'
+        return f"{name}-{hashlib.sha1(fingerprint.encode('utf-8')).hexdigest()[:12]}"
+
+    def shapes_seen(self):
+        """(batch, sequence) shapes executed so far"""
+        return sorted(self._shapes_seen)
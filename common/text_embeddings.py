@@ -0,0 +1,109 @@
+"""
+Pooled encoder embeddings for the sentiment and zero-shot models.
+
+Embeddings are the attention-masked mean of the encoder's last hidden state,
+L2-normalised so cosine similarity is a dot product. For sentiment models
+classify_and_embed() returns the embedding from the same forward pass that
+produces the label, so persisting it costs no extra inference. For BART the
+encoder runs on the text alone, once per text instead of once per label.
+"""
+
+import hashlib
+
+import numpy as np
+import torch
+
+
+def mean_pool(hidden, attention_mask):
+    """Average token vectors, ignoring padding"""
+    mask = attention_mask.unsqueeze(-1).to(hidden.dtype)
+    return (hidden * mask).sum(dim=1) / mask.sum(dim=1).clamp(min=1)
+
+
+def normalize(vectors):
+    """L2-normalise the rows of a float array"""
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+def encoder_of(model):
+    """Return the module that produces token representations for a text"""
+    if getattr(model.config, 'is_encoder_decoder', False):
+        return model.get_encoder()
+    return model.base_model
+
+
+def _batches(tokenizer, texts, batch_size, device):
+    max_length = min(tokenizer.model_max_length, 512)
+    for start in range(0, len(texts), batch_size):
+        batch = texts[start:start + batch_size]
+        inputs = tokenizer(batch, padding=True, truncation=True, max_length=max_length, return_tensors='pt')
+        yield batch, {k: v.to(device) for k, v in inputs.items()}
+
+
+def encode_texts(model, tokenizer, texts, batch_size=16):
+    """Encoder-only pass: one normalised embedding row per text"""
+    device = next(model.parameters()).device
+    encoder = encoder_of(model)
+    rows = []
+    with torch.inference_mode():
+        for _, inputs in _batches(tokenizer, list(texts), batch_size, device):
+            hidden = encoder(input_ids=inputs['input_ids'], attention_mask=inputs['attention_mask'])[0]
+            rows.append(mean_pool(hidden, inputs['attention_mask']).float().cpu().numpy())
+    if not rows:
+        return np.zeros((0, model.config.hidden_size), dtype=np.float32)
+    return normalize(np.concatenate(rows))
+
+
+def classify_and_embed(model, tokenizer, texts, batch_size=16):
+    """Classify texts and return (results, embeddings) from the same forward pass"""
+    device = next(model.parameters()).device
+    id2label = model.config.id2label
+    results, rows = [], []
+    with torch.inference_mode():
+        for _, inputs in _batches(tokenizer, list(texts), batch_size, device):
+            outputs = model(**inputs, output_hidden_states=True)
+            probs = torch.softmax(outputs.logits.float(), dim=-1)
+            scores, indices = probs.max(dim=-1)
+            results.extend({'label': id2label[int(i)], 'score': float(s)} for s, i in zip(scores, indices))
+            rows.append(mean_pool(outputs.hidden_states[-1], inputs['attention_mask']).float().cpu().numpy())
+    if not rows:
+        return results, np.zeros((0, model.config.hidden_size), dtype=np.float32)
+    return results, normalize(np.concatenate(rows))
+
+
+def text_id(text):
+    """Stable id for a text, used to find exact repeats in an embedding store"""
+    return hashlib.sha1(' '.join(text.split()).encode('utf-8')).hexdigest()
+
+
+def classify_with_store(classifier, texts, store, batch_size=16):
+    """Sentiment results for texts, reusing stored labels for exact repeats
+
+    New texts are classified in batches and their embeddings (from the same
+    forward pass) are appended to the store. Reused results carry
+    'reused': True.
+    """
+    ids = [text_id(t) for t in texts]
+    results = [None] * len(texts)
+    new = {}
+    for i, item_id in enumerate(ids):
+        stored = store.get(item_id)
+        if stored is not None:
+            results[i] = {'label': stored[0], 'score': stored[1], 'reused': True}
+        else:
+            new.setdefault(item_id, []).append(i)
+
+    if new:
+        first = [indices[0] for indices in new.values()]
+        new_results, vectors = classify_and_embed(classifier.model, classifier.tokenizer,
+                                                  [texts[i] for i in first], batch_size)
+        for indices, result in zip(new.values(), new_results):
+            for i in indices:
+                results[i] = result
+        store.add([ids[i] for i in first], vectors,
+                  [r['label'] for r in new_results], [r['score'] for r in new_results],
+                  [texts[i] for i in first])
+        store.flush()
+
+    return results
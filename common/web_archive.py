@@ -0,0 +1,286 @@
+"""
+Offline page sources for the website classifiers: WARC archives and saved HTML.
+
+iter_pages(paths) walks files and directories and yields one record per HTML
+page, reading only the start of each page (WEBSITE_ARCHIVE_HEAD_BYTES,
+default 256 KiB):
+    - .warc and .warc.gz files: 'response' records with a 2xx HTML payload,
+      and 'resource' records of HTML files. The URL is WARC-Target-URI.
+      Requests, metadata, redirects, images and other records are skipped
+      with a seek, without being copied into memory
+    - .html, .htm and .xhtml files (optionally .gz), e.g. a directory of
+      saved pages. The URL comes from the page itself (the "saved from url"
+      comment browsers write, <link rel="canonical"> or og:url), else the
+      file:// path
+
+HTML parsing is CPU-bound and holds the GIL, so PageParser runs
+parse_pages() in a process pool (WEBSITE_PARSE_WORKERS processes, default
+one per CPU this process may run on, counted when the pool starts so a CPU
+plan slot is respected; 0 parses in the calling thread). Workers decode chunked
+transfer and gzip/deflate content encodings (brotli if installed) and
+extract the title and meta description with BeautifulSoup, the same way
+scrape_title() reads live pages.
+"""
+
+import gzip
+import multiprocessing
+import os
+import re
+import zlib
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+from bs4 import BeautifulSoup
+
+from common.cpu_plan import allowed_cpus
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+HEAD_BYTES = int(os.environ.get('WEBSITE_ARCHIVE_HEAD_BYTES', str(256 * 1024)))
+# Parse processes; unset means one per CPU in this process's affinity when the pool starts
+PARSE_WORKERS = os.environ.get('WEBSITE_PARSE_WORKERS')
+
+WARC_SUFFIXES = ('.warc', '.warc.gz')
+HTML_SUFFIXES = ('.html', '.htm', '.xhtml', '.html.gz', '.htm.gz', '.xhtml.gz')
+
+STATUS_LINE = re.compile(rb'HTTP/\d(?:\.\d)?\s+(\d{3})')
+HEAD_END = re.compile(rb'</head\s*>', re.IGNORECASE)
+TITLE_END = re.compile(rb'</title\s*>', re.IGNORECASE)
+SAVED_FROM = re.compile(rb'<!--\s*saved from url=\(\d+\)(\S+?)\s*-->', re.IGNORECASE)
+CHARSET = re.compile(r'charset\s*=\s*["\']?([\w.:-]+)', re.IGNORECASE)
+
+PARSE_ERROR = "Error parsing page"
+
+
+def _skip(f, n):
+    """Move past n bytes (gzip files decompress forward, but nothing is kept)"""
+    if n > 0:
+        f.seek(n, os.SEEK_CUR)
+
+
+def _http_headers(head):
+    headers = {}
+    for line in head.split(b'\n')[1:]:
+        name, sep, value = line.partition(b':')
+        if sep:
+            headers[name.strip().lower().decode('latin-1')] = value.strip().decode('latin-1')
+    return headers
+
+
+def _split_http(data):
+    """(status line and headers, body) of a raw HTTP response"""
+    for separator in (b'\r\n\r\n', b'\n\n'):
+        head, sep, body = data.partition(separator)
+        if sep:
+            return head, body
+    return data, b''
+
+
+def iter_warc(path, stats):
+    """Page records of one WARC file"""
+    opener = gzip.open if path.endswith('.gz') else open
+    with opener(path, 'rb') as f:
+        while True:
+            line = f.readline()
+            if not line:
+                return
+            if not line.strip():
+                continue
+            if not line.startswith(b'WARC/'):
+                raise ValueError(f"{path}: expected a WARC record, found {line[:40]!r}")
+            headers = {}
+            for line in iter(f.readline, b''):
+                if not line.strip():
+                    break
+                name, _, value = line.partition(b':')
+                headers[name.strip().lower()] = value.strip()
+            length = int(headers.get(b'content-length', b'0'))
+            kind = headers.get(b'warc-type', b'')
+            stats['records'] += 1
+
+            if kind == b'resource' and b'html' not in headers.get(b'content-type', b'').lower():
+                kind = b''
+            if kind not in (b'response', b'resource'):
+                _skip(f, length)
+                continue
+
+            data = f.read(min(length, HEAD_BYTES))
+            _skip(f, length - len(data))
+            if kind == b'response':
+                head, _ = _split_http(data)
+                status = STATUS_LINE.match(head)
+                if not status or not status.group(1).startswith(b'2'):
+                    stats['not_2xx'] += 1
+                    continue
+                content_type = _http_headers(head).get('content-type', 'text/html').lower()
+                if 'html' not in content_type:
+                    stats['not_html'] += 1
+                    continue
+            stats['pages'] += 1
+            url = headers.get(b'warc-target-uri', b'').decode('utf-8', 'replace').strip('<>')
+            yield {'url': url, 'kind': 'http' if kind == b'response' else 'html', 'data': data}
+
+
+def read_html_file(path, stats):
+    """Page record of one saved HTML file"""
+    opener = gzip.open if path.endswith('.gz') else open
+    with opener(path, 'rb') as f:
+        data = f.read(HEAD_BYTES)
+    stats['records'] += 1
+    stats['pages'] += 1
+    return {'url': 'file://' + os.path.abspath(path), 'kind': 'file', 'data': data}
+
+
+def _archive_files(path):
+    if not os.path.isdir(path):
+        yield path
+        return
+    for root, dirs, files in os.walk(path):
+        dirs.sort()
+        for name in sorted(files):
+            if name.lower().endswith(WARC_SUFFIXES + HTML_SUFFIXES):
+                yield os.path.join(root, name)
+
+
+def iter_pages(paths, stats=None):
+    """Page records ({'url', 'kind', 'data'}) of WARC files, HTML files and directories of either
+
+    stats (a Counter) receives records read, pages yielded and the reasons
+    other records were left out.
+    """
+    stats = stats if stats is not None else Counter()
+    for path in paths:
+        for name in _archive_files(path):
+            if '.warc' in name.lower():
+                yield from iter_warc(name, stats)
+            else:
+                yield read_html_file(name, stats)
+
+
+def dechunk(body):
+    """Body of a chunked transfer encoding; a truncated last chunk is kept as far as it goes"""
+    out = bytearray()
+    pos = 0
+    while True:
+        end = body.find(b'\r\n', pos)
+        if end < 0:
+            break
+        try:
+            size = int(body[pos:end].split(b';')[0].strip(), 16)
+        except ValueError:
+            break
+        if size == 0:
+            break
+        out += body[end + 2:end + 2 + size]
+        pos = end + 2 + size + 2
+        if pos >= len(body):
+            break
+    return bytes(out)
+
+
+def decode_body(body, encoding):
+    """Undo a content encoding; partial (truncated) streams decode as far as they go"""
+    encoding = encoding.strip().lower()
+    if encoding in ('', 'identity'):
+        return body
+    if encoding in ('gzip', 'x-gzip', 'deflate'):
+        # wbits 47 reads gzip and zlib headers; some servers send raw deflate
+        for wbits in (47, -15):
+            try:
+                return zlib.decompressobj(wbits).decompress(body)
+            except zlib.error:
+                continue
+        raise ValueError(f"undecodable {encoding} body")
+    if encoding == 'br' and brotli is not None:
+        decompressor = brotli.Decompressor()
+        return decompressor.process(body)
+    raise ValueError(f"unsupported content encoding '{encoding}'")
+
+
+def http_payload(data):
+    """(HTML bytes, charset or None) of a raw HTTP response record"""
+    head, body = _split_http(data)
+    headers = _http_headers(head)
+    if 'chunked' in headers.get('transfer-encoding', '').lower():
+        body = dechunk(body)
+    body = decode_body(body, headers.get('content-encoding', ''))
+    charset = CHARSET.search(headers.get('content-type', ''))
+    return body, charset.group(1) if charset else None
+
+
+def page_info(html, charset=None):
+    """Title, meta description and self-declared URL of a page"""
+    # The head holds all three; a title placed after </head> is still read
+    ends = [m.end() for m in (HEAD_END.search(html), TITLE_END.search(html)) if m]
+    if ends:
+        html = html[:max(ends)]
+    soup = BeautifulSoup(html, 'html.parser', from_encoding=charset)
+
+    title_tag = soup.find('title')
+    title = title_tag.get_text().strip() if title_tag else "No title found"
+
+    description = ''
+    for attrs in ({'name': re.compile('^description$', re.I)}, {'property': 'og:description'}):
+        tag = soup.find('meta', attrs=attrs)
+        if tag and tag.get('content'):
+            description = ' '.join(tag['content'].split())
+            break
+
+    url = None
+    saved_from = SAVED_FROM.search(html[:4096])
+    canonical = soup.find('link', rel='canonical')
+    og_url = soup.find('meta', property='og:url')
+    if saved_from:
+        url = saved_from.group(1).decode('utf-8', 'replace')
+    elif canonical and canonical.get('href', '').startswith('http'):
+        url = canonical['href']
+    elif og_url and og_url.get('content', '').startswith('http'):
+        url = og_url['content']
+    return title, description, url
+
+
+def parse_pages(records):
+    """Runs in a worker process: [(url, kind, data)] -> [{'url', 'title', 'description'}]"""
+    results = []
+    for url, kind, data in records:
+        try:
+            html, charset = http_payload(data) if kind == 'http' else (data, None)
+            title, description, page_url = page_info(html, charset)
+            # Saved files name their origin inside the page; WARC records already carry the URL
+            if kind == 'file' and page_url:
+                url = page_url
+        except Exception as e:
+            title, description = f"{PARSE_ERROR}: {str(e)}", ''
+        results.append({'url': url, 'title': title, 'description': description})
+    return results
+
+
+class PageParser:
+    """Pipeline stage function: parses chunks of page records in a process pool"""
+
+    def __init__(self, workers=None):
+        if workers is None:
+            workers = int(PARSE_WORKERS) if PARSE_WORKERS else len(allowed_cpus())
+        self.workers = workers
+        self._pool = None
+        if workers > 0:
+            # Forked workers start at once; spawned ones would re-import the calling script and its models
+            methods = multiprocessing.get_all_start_methods()
+            context = multiprocessing.get_context('fork') if 'fork' in methods else None
+            self._pool = ProcessPoolExecutor(workers, mp_context=context)
+            # Start the workers now, before the pipeline's threads exist
+            self._pool.submit(int).result()
+
+    def __call__(self, records):
+        raw = [(r['url'], r['kind'], r.pop('data')) for r in records]
+        parsed = self._pool.submit(parse_pages, raw).result() if self._pool else parse_pages(raw)
+        for record, info in zip(records, parsed):
+            record.update(info)
+        return records
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown(cancel_futures=True)
@@ -0,0 +1,189 @@
+"""
+Lightweight student model for website categorization.
+
+A hashed n-gram softmax classifier trained to imitate the BART zero-shot
+teacher on a corpus of titles (see web_scraping/distill_website_classifier.py).
+It runs in microseconds per title on CPU with no transformer at inference time.
+
+The website scripts pick the teacher or the student through
+WEBSITE_CLASSIFIER_BACKEND and classify titles with classify_website().
+"""
+
+import os
+import re
+import zlib
+
+import numpy as np
+
+from common.web_archive import PARSE_ERROR
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_STUDENT_PATH = os.path.join(REPO_ROOT, 'web_scraping', 'website_student.npz')
+
+TOKEN_PATTERN = re.compile(r"\w+")
+
+
+def title_features(title, n_features):
+    """Hash word unigrams, word bigrams and character trigrams of a title"""
+    words = TOKEN_PATTERN.findall(title.lower())
+    grams = ['w:' + w for w in words]
+    grams += ['b:' + a + ' ' + b for a, b in zip(words, words[1:])]
+    for w in words:
+        padded = f"<{w}>"
+        grams += ['c:' + padded[i:i + 3] for i in range(len(padded) - 2)]
+
+    if not grams:
+        return np.zeros(0, dtype=np.int64)
+    return np.array([zlib.crc32(g.encode('utf-8')) % n_features for g in grams], dtype=np.int64)
+
+
+class HashedNgramStudent:
+    """Softmax regression over hashed n-gram features"""
+
+    def __init__(self, categories, n_features=2 ** 18):
+        self.categories = list(categories)
+        self.n_features = n_features
+        self.weights = np.zeros((n_features, len(self.categories)), dtype=np.float32)
+        self.bias = np.zeros(len(self.categories), dtype=np.float32)
+
+    def _logits(self, feature_lists):
+        rows = np.repeat(np.arange(len(feature_lists)), [len(f) for f in feature_lists])
+        flat = np.concatenate(feature_lists) if feature_lists else np.zeros(0, dtype=np.int64)
+        logits = np.tile(self.bias, (len(feature_lists), 1))
+        np.add.at(logits, rows, self.weights[flat])
+        return logits, rows, flat
+
+    def fit(self, titles, teacher_scores, epochs=8, batch_size=256, learning_rate=0.5, l2=1e-6, seed=0):
+        """Train on teacher score distributions (soft targets), using Adagrad"""
+        targets = np.asarray(teacher_scores, dtype=np.float32)
+        features = [title_features(t, self.n_features) for t in titles]
+        weight_acc = np.full_like(self.weights, 1e-8)
+        bias_acc = np.full_like(self.bias, 1e-8)
+        rng = np.random.default_rng(seed)
+
+        for _ in range(epochs):
+            order = rng.permutation(len(features))
+            for start in range(0, len(order), batch_size):
+                batch = order[start:start + batch_size]
+                logits, rows, flat = self._logits([features[i] for i in batch])
+                probs = softmax(logits)
+                grad = (probs - targets[batch]) / len(batch)
+
+                weight_grad = grad[rows]
+                unique, inverse = np.unique(flat, return_inverse=True)
+                summed = np.zeros((len(unique), grad.shape[1]), dtype=np.float32)
+                np.add.at(summed, inverse, weight_grad)
+                summed += l2 * self.weights[unique]
+
+                weight_acc[unique] += summed ** 2
+                self.weights[unique] -= learning_rate * summed / np.sqrt(weight_acc[unique])
+
+                bias_grad = grad.sum(axis=0)
+                bias_acc += bias_grad ** 2
+                self.bias -= learning_rate * bias_grad / np.sqrt(bias_acc)
+
+        return self
+
+    def predict_scores(self, titles):
+        """Return an (n_titles, n_categories) matrix of probabilities"""
+        features = [title_features(t, self.n_features) for t in titles]
+        logits, _, _ = self._logits(features)
+        return softmax(logits)
+
+    def classify(self, titles):
+        """Pipeline-style results: labels sorted by score for each title"""
+        single = isinstance(titles, str)
+        scores = self.predict_scores([titles] if single else list(titles))
+        results = []
+        for title, row in zip([titles] if single else titles, scores):
+            order = np.argsort(-row)
+            results.append({
+                'sequence': title,
+                'labels': [self.categories[i] for i in order],
+                'scores': [float(row[i]) for i in order]
+            })
+        return results[0] if single else results
+
+    def save(self, path=DEFAULT_STUDENT_PATH):
+        """Save the student to a compressed .npz file"""
+        np.savez_compressed(path, weights=self.weights, bias=self.bias,
+                            categories=np.array(self.categories), n_features=self.n_features)
+
+    @classmethod
+    def load(cls, path=DEFAULT_STUDENT_PATH):
+        """Load a student saved with save()"""
+        data = np.load(path)
+        student = cls([str(c) for c in data['categories']], int(data['n_features']))
+        student.weights = data['weights']
+        student.bias = data['bias']
+        return student
+
+
+def softmax(logits):
+    """Row-wise softmax"""
+    shifted = logits - logits.max(axis=1, keepdims=True)
+    exps = np.exp(shifted)
+    return exps / exps.sum(axis=1, keepdims=True)
+
+
+_students = {}
+
+
+def get_student(path=None):
+    """Load a student once per process"""
+    path = path or os.environ.get('WEBSITE_STUDENT_PATH', DEFAULT_STUDENT_PATH)
+    if path not in _students:
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"Student model '{path}' not found. Train one with distill_website_classifier.py")
+        _students[path] = HashedNgramStudent.load(path)
+    return _students[path]
+
+
+# Categories the website scripts classify titles into
+WEBSITE_CATEGORIES = [
+    "news", "entertainment", "shopping", "social_media",
+    "educational", "blog", "government", "business",
+    "technology", "sports", "health", "travel"
+]
+
+# Titles that report a failed fetch or parse rather than describe a page
+ERROR_TITLES = ('Error scraping title', 'No title found', PARSE_ERROR)
+
+# Classifier backend: "zero-shot" (BART teacher) or "student" (distilled, see distill_website_classifier.py)
+CLASSIFIER_BACKEND = os.environ.get('WEBSITE_CLASSIFIER_BACKEND', 'zero-shot')
+
+
+def zero_shot_classifier(backend=None):
+    """The registry's zero-shot pipeline, or None when the student backend is selected"""
+    if (backend or CLASSIFIER_BACKEND) == 'student':
+        return None
+    from common.model_registry import get_classifier
+    return get_classifier("zero-shot")
+
+
+def classify_titles(titles, backend=None, batch_size=None, classifier=None):
+    """Pipeline-style result for a title, or a list of them for a list of titles
+
+    classifier replaces the registry's "zero-shot" entry for the zero-shot backend.
+    """
+    if (backend or CLASSIFIER_BACKEND) == 'student':
+        return get_student().classify(titles)
+    kwargs = {'batch_size': batch_size} if batch_size else {}
+    return (classifier or zero_shot_classifier(backend))(titles, WEBSITE_CATEGORIES, **kwargs)
+
+
+def build_classification(result):
+    """Turn a pipeline-style result into the classification dict"""
+    return {
+        'best_match': result['labels'][0],
+        'confidence': result['scores'][0],
+        'all_scores': dict(zip(result['labels'], result['scores']))
+    }
+
+
+def classify_website(title, backend=None, classifier=None):
+    """Classify website type based on its title; returns the classification dict or an error string"""
+    try:
+        return build_classification(classify_titles(title, backend, classifier=classifier))
+    except Exception as e:
+        return f"Error classifying website: {str(e)}"
@@ -0,0 +1,276 @@
+"""
+Lease-based work queue for running one job as shards on several machines.
+
+A coordinator publishes a job as a list of shards (small JSON payloads,
+usually pointing at a shard file on shared storage). Workers claim a shard,
+which leases it to them for `lease_seconds`; while working they heartbeat
+to extend the lease, and finally complete it with a JSON result (output
+path and a mergeable summary). If a worker dies, its lease expires and the
+next claim hands the shard to another worker. A shard that fails
+`max_attempts` times is marked failed instead of being retried forever.
+
+Backends are chosen by URL (WORK_QUEUE_URL):
+    sqlite:///shared/jobs.sqlite   SQLite file /shared/jobs.sqlite (a plain
+                                   path works too); fine on one machine or
+                                   a shared filesystem with working locks
+Real brokers plug in by subclassing WorkQueue and adding the class to
+BACKENDS under their URL scheme.
+"""
+
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+from collections import Counter
+
+DEFAULT_QUEUE_URL = 'sqlite://' + os.path.expanduser('~/.cache/bert-sentiment-tools/work_queue.sqlite')
+DEFAULT_LEASE_SECONDS = 120
+DEFAULT_MAX_ATTEMPTS = 3
+
+STATES = ('pending', 'leased', 'done', 'failed')
+
+
+class WorkQueue:
+    """Interface every queue backend implements
+
+    Shards are dicts with 'job', 'shard_id', 'payload', 'state', 'worker',
+    'lease_expires', 'attempts', 'result' and 'error'. Every method that
+    takes a worker only succeeds while that worker holds the lease, so a
+    worker whose lease was taken over cannot complete the shard twice.
+    """
+
+    def publish(self, job, payloads, max_attempts=DEFAULT_MAX_ATTEMPTS):
+        """Add shards 0..n-1 of a job; returns the number published"""
+        raise NotImplementedError
+
+    def claim(self, job, worker, lease_seconds=DEFAULT_LEASE_SECONDS):
+        """Lease the next pending (or expired) shard of a job to worker, or return None"""
+        raise NotImplementedError
+
+    def heartbeat(self, job, shard_id, worker, lease_seconds=DEFAULT_LEASE_SECONDS):
+        """Extend a lease; False if the worker no longer holds it"""
+        raise NotImplementedError
+
+    def complete(self, job, shard_id, worker, result):
+        """Mark a leased shard done with a JSON-serializable result"""
+        raise NotImplementedError
+
+    def fail(self, job, shard_id, worker, error):
+        """Give a shard back after an error; it is retried until max_attempts"""
+        raise NotImplementedError
+
+    def reap(self, job):
+        """Mark expired leases that used up their attempts as failed; returns how many"""
+        raise NotImplementedError
+
+    def shards(self, job):
+        """All shards of a job, ordered by shard_id"""
+        raise NotImplementedError
+
+    def jobs(self):
+        """Names of all published jobs"""
+        raise NotImplementedError
+
+    def status(self, job):
+        """Shard counts per state; leases past their expiry count as 'expired'"""
+        now = time.time()
+        counts = Counter({state: 0 for state in STATES})
+        for shard in self.shards(job):
+            if shard['state'] == 'leased' and shard['lease_expires'] < now:
+                counts['expired'] += 1
+            else:
+                counts[shard['state']] += 1
+        return counts
+
+    def finished(self, job):
+        """True when every shard is done or failed"""
+        counts = self.status(job)
+        return sum(counts.values()) > 0 and counts['done'] + counts['failed'] == sum(counts.values())
+
+
+class SQLiteWorkQueue(WorkQueue):
+    """WorkQueue stored in one SQLite file; claims are serialized with BEGIN IMMEDIATE"""
+
+    def __init__(self, path):
+        self.path = os.path.expanduser(path)
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('''
+            CREATE TABLE IF NOT EXISTS shards (
+                job TEXT NOT NULL,
+                shard_id INTEGER NOT NULL,
+                payload TEXT NOT NULL,
+                state TEXT NOT NULL DEFAULT 'pending',
+                worker TEXT,
+                lease_expires REAL NOT NULL DEFAULT 0,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                max_attempts INTEGER NOT NULL,
+                result TEXT,
+                error TEXT,
+                updated REAL NOT NULL,
+                PRIMARY KEY (job, shard_id)
+            )''')
+
+    def _transaction(self, fn):
+        with self._lock:
+            self._conn.execute('BEGIN IMMEDIATE')
+            try:
+                value = fn(self._conn)
+            except BaseException:
+                self._conn.execute('ROLLBACK')
+                raise
+            self._conn.execute('COMMIT')
+            return value
+
+    def publish(self, job, payloads, max_attempts=DEFAULT_MAX_ATTEMPTS):
+        now = time.time()
+        rows = [(job, shard_id, json.dumps(payload), max_attempts, now) for shard_id, payload in enumerate(payloads)]
+
+        def insert(conn):
+            if conn.execute('SELECT 1 FROM shards WHERE job = ? LIMIT 1', (job,)).fetchone():
+                raise ValueError(f"Job '{job}' already exists")
+            conn.executemany('INSERT INTO shards (job, shard_id, payload, max_attempts, updated) '
+                             'VALUES (?, ?, ?, ?, ?)', rows)
+            return len(rows)
+        return self._transaction(insert)
+
+    def _reap(self, conn, job, now):
+        cursor = conn.execute("UPDATE shards SET state = 'failed', error = COALESCE(error, 'lease expired'), "
+                              "updated = ? WHERE job = ? AND state = 'leased' AND lease_expires < ? "
+                              "AND attempts >= max_attempts", (now, job, now))
+        return cursor.rowcount
+
+    def reap(self, job):
+        return self._transaction(lambda conn: self._reap(conn, job, time.time()))
+
+    def claim(self, job, worker, lease_seconds=DEFAULT_LEASE_SECONDS):
+        def take(conn):
+            now = time.time()
+            # Expired leases that used up their attempts become failed rather than retried
+            self._reap(conn, job, now)
+            row = conn.execute("SELECT shard_id FROM shards WHERE job = ? AND "
+                               "(state = 'pending' OR (state = 'leased' AND lease_expires < ?)) "
+                               "ORDER BY shard_id LIMIT 1", (job, now)).fetchone()
+            if row is None:
+                return None
+            conn.execute("UPDATE shards SET state = 'leased', worker = ?, lease_expires = ?, "
+                         "attempts = attempts + 1, updated = ? WHERE job = ? AND shard_id = ?",
+                         (worker, now + lease_seconds, now, job, row[0]))
+            return row[0]
+
+        shard_id = self._transaction(take)
+        return None if shard_id is None else self._shard(job, shard_id)
+
+    def _update_leased(self, job, shard_id, worker, assignments, values):
+        def update(conn):
+            cursor = conn.execute(f"UPDATE shards SET {assignments}, updated = ? "
+                                  "WHERE job = ? AND shard_id = ? AND worker = ? AND state = 'leased'",
+                                  values + (time.time(), job, shard_id, worker))
+            return cursor.rowcount == 1
+        return self._transaction(update)
+
+    def heartbeat(self, job, shard_id, worker, lease_seconds=DEFAULT_LEASE_SECONDS):
+        return self._update_leased(job, shard_id, worker, 'lease_expires = ?', (time.time() + lease_seconds,))
+
+    def complete(self, job, shard_id, worker, result):
+        return self._update_leased(job, shard_id, worker, "state = 'done', result = ?, error = NULL",
+                                   (json.dumps(result),))
+
+    def fail(self, job, shard_id, worker, error):
+        return self._update_leased(
+            job, shard_id, worker,
+            "state = CASE WHEN attempts >= max_attempts THEN 'failed' ELSE 'pending' END, error = ?, lease_expires = 0",
+            (str(error),))
+
+    def _row_to_shard(self, row):
+        keys = ('job', 'shard_id', 'payload', 'state', 'worker', 'lease_expires', 'attempts', 'result', 'error')
+        shard = dict(zip(keys, row))
+        shard['payload'] = json.loads(shard['payload'])
+        shard['result'] = json.loads(shard['result']) if shard['result'] else None
+        return shard
+
+    def _shard(self, job, shard_id):
+        with self._lock:
+            row = self._conn.execute('SELECT job, shard_id, payload, state, worker, lease_expires, attempts, result, '
+                                     'error FROM shards WHERE job = ? AND shard_id = ?', (job, shard_id)).fetchone()
+        return self._row_to_shard(row) if row else None
+
+    def shards(self, job):
+        with self._lock:
+            rows = self._conn.execute('SELECT job, shard_id, payload, state, worker, lease_expires, attempts, result, '
+                                      'error FROM shards WHERE job = ? ORDER BY shard_id', (job,)).fetchall()
+        return [self._row_to_shard(row) for row in rows]
+
+    def jobs(self):
+        with self._lock:
+            return [row[0] for row in self._conn.execute('SELECT DISTINCT job FROM shards ORDER BY job')]
+
+
+BACKENDS = {'sqlite': SQLiteWorkQueue}
+
+
+def get_work_queue(url=None):
+    """Open the queue named by url, WORK_QUEUE_URL or the default local SQLite file"""
+    url = url or os.environ.get('WORK_QUEUE_URL', DEFAULT_QUEUE_URL)
+    scheme, sep, location = url.partition('://')
+    if not sep:
+        scheme, location = 'sqlite', url
+    backend = BACKENDS.get(scheme)
+    if backend is None:
+        raise ValueError(f"No work queue backend for '{scheme}://' (known: {', '.join(sorted(BACKENDS))})")
+    return backend(location)
+
+
+def worker_name():
+    """Identifies this process in leases: host:pid"""
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+class Heartbeat:
+    """Background thread that keeps a shard's lease alive while it is processed"""
+
+    def __init__(self, queue, job, shard_id, worker, lease_seconds=DEFAULT_LEASE_SECONDS):
+        self.queue = queue
+        self.args = (job, shard_id, worker, lease_seconds)
+        self.interval = max(lease_seconds / 3, 0.1)
+        self.lost = False
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='lease-heartbeat', daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                if not self.queue.heartbeat(*self.args):
+                    self.lost = True
+                    return
+            except Exception:
+                # A missed heartbeat is retried next interval; the lease has slack
+                continue
+
+
+def merge_summaries(summaries):
+    """Add up shard summaries: numbers are summed, dicts merged recursively"""
+    merged = {}
+    for summary in summaries:
+        for key, value in summary.items():
+            if isinstance(value, dict):
+                merged[key] = merge_summaries([merged.get(key, {}), value])
+            elif isinstance(value, (int, float)) and not isinstance(value, bool):
+                merged[key] = merged.get(key, 0) + value
+            else:
+                merged.setdefault(key, value)
+    return merged
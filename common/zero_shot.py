@@ -0,0 +1,80 @@
+"""
+Helpers for running zero-shot classification as explicit NLI passes.
+
+The transformers zero-shot pipeline scores every (text, label) pair as a
+premise/hypothesis pair and turns the entailment logits into label scores.
+These helpers reproduce that so the pairs can be batched, padded or cached
+by the callers while giving the same scores as the pipeline.
+"""
+
+import math
+
+HYPOTHESIS_TEMPLATE = "This example is {}."
+
+
+def parse_labels(candidate_labels):
+    """Accept labels as a list or a comma-separated string, like the pipeline"""
+    if isinstance(candidate_labels, str):
+        candidate_labels = [label.strip() for label in candidate_labels.split(',') if label.strip()]
+    return list(candidate_labels)
+
+
+def entailment_ids(config):
+    """Return (entailment_id, contradiction_id) for an NLI model config"""
+    entailment_id = -1
+    for label, index in config.label2id.items():
+        if label.lower().startswith('entail'):
+            entailment_id = index
+            break
+    contradiction_id = -1 if entailment_id == 0 else 0
+    return entailment_id, contradiction_id
+
+
+def nli_pairs(texts, labels, hypothesis_template=HYPOTHESIS_TEMPLATE):
+    """Build the (premise, hypothesis) pairs for every text and label"""
+    return [(text, hypothesis_template.format(label)) for text in texts for label in labels]
+
+
+def softmax(values):
+    """Numerically stable softmax over a list of floats"""
+    top = max(values)
+    exps = [math.exp(v - top) for v in values]
+    total = sum(exps)
+    return [e / total for e in exps]
+
+
+def label_scores(entail_logits, contradiction_logits, multi_label=False):
+    """Turn per-label NLI logits for one text into label scores
+
+    With multi_label each label is scored independently (entailment vs
+    contradiction); otherwise entailment logits are softmaxed across labels.
+    """
+    if multi_label or len(entail_logits) == 1:
+        return [softmax([c, e])[1] for e, c in zip(entail_logits, contradiction_logits)]
+    return softmax(list(entail_logits))
+
+
+def classify_unique(classifier, texts, labels, batch_size=32, **kwargs):
+    """Pipeline results for a list of texts, one model call per unique text
+
+    Texts are run shortest first so each NLI batch pads to a similar length.
+    kwargs (multi_label, hypothesis_template) go to the pipeline.
+    """
+    if not texts:
+        return []  # the pipeline rejects an empty batch
+    unique = sorted(set(texts), key=len)
+    results = classifier(unique, labels, batch_size=batch_size, **kwargs)
+    if isinstance(results, dict):
+        results = [results]
+    by_text = dict(zip(unique, results))
+    return [by_text[text] for text in texts]
+
+
+def format_result(text, labels, scores):
+    """Build a pipeline-style result dict with labels sorted by score"""
+    ranked = sorted(zip(labels, scores), key=lambda pair: pair[1], reverse=True)
+    return {
+        'sequence': text,
+        'labels': [label for label, _ in ranked],
+        'scores': [score for _, score in ranked]
+    }
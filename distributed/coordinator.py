@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+"""
+Split a file analysis into shards, publish them to the work queue and merge the results
+Usage:
+    python coordinator.py submit <job> <task> <input_file> [--shard-lines 10000] [--job-dir DIR]
+    python coordinator.py status <job>
+    python coordinator.py merge <job> <output_file>
+    python coordinator.py run <job> <task> <input_file> <output_file> [--shard-lines 10000] [--job-dir DIR] [--workers N|auto]
+
+Tasks: sentiment (lines of text, as analyze_file.py) and websites (URLs, as
+batch_website_classifier.py). Shard files and shard outputs are written to
+the job directory (default jobs/<job>, or WORK_JOBS_DIR/<job>), which must be
+on storage every worker can reach. Start workers on any number of machines
+with `python worker.py --job <job>`; the queue is WORK_QUEUE_URL (see
+common/work_queue.py). `run` submits, optionally starts N local workers
+(auto: one per NUMA node, or CPU_PLAN_PROCESSES; see common/cpu_plan.py), waits until
+every shard is done or failed and merges the outputs:
+    <output_file>               shard CSVs concatenated in input order
+    <stem>.skipped.csv          skipped lines of all shards (sentiment);
+                                merged.csv gives merged.skipped.csv
+    <output_file>.summary.json  shard summaries added up
+"""
+
+import csv
+import json
+import os
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common.work_queue import get_work_queue, merge_summaries
+from common.cpu_plan import ExecutionPlan
+from common.prefilter import skipped_path
+from common.cli import pop_option
+
+TASKS = ('sentiment', 'websites')
+POLL_SECONDS = float(os.environ.get("WORK_POLL_SECONDS", "5"))
+
+def job_directory(job, job_dir=None):
+    return os.path.abspath(job_dir or os.path.join(os.environ.get('WORK_JOBS_DIR', 'jobs'), job))
+
+def split_input(input_file, shard_dir, shard_lines):
+    """Write the non-blank lines of input_file into shard files; returns [(path, first line offset, lines)]"""
+    os.makedirs(shard_dir, exist_ok=True)
+    shards = []
+    out = None
+    offset = 0
+    with open(input_file, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            if out is None or shards[-1][2] >= shard_lines:
+                if out is not None:
+                    out.close()
+                path = os.path.join(shard_dir, f"{len(shards):05d}.txt")
+                out = open(path, 'w', encoding='utf-8')
+                shards.append([path, offset, 0])
+            out.write(line + '\n')
+            shards[-1][2] += 1
+            offset += 1
+    if out is not None:
+        out.close()
+    return [tuple(shard) for shard in shards]
+
+def submit(job, task, input_file, shard_lines=10000, job_dir=None, queue=None):
+    """Split input_file and publish one shard per file"""
+    queue = queue or get_work_queue()
+    job_dir = job_directory(job, job_dir)
+    try:
+        shards = split_input(input_file, os.path.join(job_dir, 'shards'), shard_lines)
+    except FileNotFoundError:
+        print(f"Error: File '{input_file}' not found.")
+        return 0
+
+    payloads = [{'task': task, 'input': path, 'offset': offset, 'lines': lines,
+                 'output_dir': os.path.join(job_dir, 'outputs')} for path, offset, lines in shards]
+    published = queue.publish(job, payloads)
+    print(f"Job {job}: published {published} {task} shards ({sum(p['lines'] for p in payloads)} lines) from {input_file}")
+    return published
+
+def print_status(job, queue):
+    counts = queue.status(job)
+    shards = queue.shards(job)
+    total = sum(counts.values())
+    print(f"Job {job}: {counts['done']}/{total} done, {counts['leased']} running, {counts['pending']} pending, "
+          f"{counts['expired']} expired leases, {counts['failed']} failed")
+    for shard in shards:
+        if shard['state'] == 'failed':
+            print(f"  shard {shard['shard_id']} failed after {shard['attempts']} attempts: {shard['error']}")
+    return counts
+
+def merge_csv(parts, output_file):
+    """Concatenate shard CSVs, shifting each part's line_number column by its offset"""
+    header = None
+    rows = 0
+    with open(output_file, 'w', newline='', encoding='utf-8') as out:
+        writer = csv.writer(out)
+        for path, offset in parts:
+            if not os.path.exists(path):
+                continue
+            with open(path, 'r', newline='', encoding='utf-8') as f:
+                reader = csv.reader(f)
+                part_header = next(reader, None)
+                if part_header is None:
+                    continue
+                if header is None:
+                    header = part_header
+                    writer.writerow(header)
+                column = header.index('line_number') if 'line_number' in header else None
+                for row in reader:
+                    if column is not None:
+                        row[column] = str(int(row[column]) + offset)
+                    writer.writerow(row)
+                    rows += 1
+    return rows
+
+def merge(job, output_file, queue=None):
+    """Combine the outputs and summaries of every finished shard"""
+    queue = queue or get_work_queue()
+    shards = queue.shards(job)
+    if not shards:
+        print(f"Error: no job named '{job}'.")
+        return None
+
+    done = [s for s in shards if s['state'] == 'done']
+    missing = len(shards) - len(done)
+    parts = [(s['result']['output'], s['payload']['offset']) for s in done]
+    rows = merge_csv(parts, output_file)
+    skipped_rows = merge_csv([(skipped_path(path), offset) for path, offset in parts], skipped_path(output_file))
+    if not skipped_rows:
+        os.remove(skipped_path(output_file))
+
+    summary = merge_summaries(s['result']['summary'] for s in done)
+    summary['shards'] = {'done': len(done), 'missing': missing}
+    with open(f"{output_file}.summary.json", 'w', encoding='utf-8') as f:
+        json.dump(summary, f, indent=2, sort_keys=True)
+
+    print(f"Merged {len(done)} of {len(shards)} shards: {rows} rows in {output_file}")
+    if skipped_rows:
+        print(f"Skipped lines: {skipped_rows} in {skipped_path(output_file)}")
+    for key in ('labels', 'categories', 'skipped'):
+        if summary.get(key):
+            print(f"  {key}: " + ", ".join(f"{k}: {v}" for k, v in sorted(summary[key].items(), key=lambda kv: -kv[1])))
+    if missing:
+        print(f"Warning: {missing} shards did not finish; their lines are missing from {output_file}")
+    return summary
+
+def start_local_workers(job, count, job_dir=None):
+    """Start worker processes on this machine, logging to <job_dir>/worker-N.log
+
+    Each worker gets its own slot of the CPU plan (common/cpu_plan.py): its
+    own cores, and with numactl installed, its own NUMA node's memory.
+    """
+    worker = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'worker.py')
+    job_dir = job_directory(job, job_dir)
+    plan = ExecutionPlan.from_env(processes=count) if os.environ.get('CPU_PLAN', 'auto') != 'off' else None
+    processes = []
+    for n in range(count):
+        env = dict(os.environ, CPU_PLAN_PROCESSES=str(count), CPU_PLAN_SLOT=str(n))
+        numa = plan.numa_command(n) if plan is not None and n < plan.processes else []
+        with open(os.path.join(job_dir, f"worker-{n}.log"), 'a', encoding='utf-8') as log:
+            processes.append(subprocess.Popen(numa + [sys.executable, '-u', worker, '--job', job],
+                                              stdout=log, stderr=subprocess.STDOUT, env=env))
+    print(f"Started {count} local workers (logs in {job_dir})")
+    if plan is not None:
+        for n in range(min(count, plan.processes)):
+            print(f"  worker-{n}: {plan.summary(n).split(' [')[0]}")
+    return processes
+
+def run(job, task, input_file, output_file, shard_lines=10000, job_dir=None, workers=0):
+    """Submit (unless already submitted), wait for all shards, then merge"""
+    queue = get_work_queue()
+    if job not in queue.jobs() and not submit(job, task, input_file, shard_lines, job_dir, queue):
+        return None
+
+    processes = start_local_workers(job, workers, job_dir) if workers else []
+    if not processes:
+        print(f"Waiting for workers: python distributed/worker.py --job {job}")
+    try:
+        while not queue.finished(job):
+            time.sleep(POLL_SECONDS)
+            queue.reap(job)
+            print_status(job, queue)
+    finally:
+        for process in processes:
+            process.wait()
+
+    return merge(job, output_file, queue)
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    try:
+        shard_lines = int(pop_option(args, '--shard-lines', 10000))
+        job_dir = pop_option(args, '--job-dir')
+        workers = pop_option(args, '--workers', '0')
+        workers = ExecutionPlan.from_env(per_node=True).processes if workers == 'auto' else int(workers)
+    except ValueError as e:
+        print(f"Error: {str(e)}")
+        args = []
+
+    needed = {'submit': 4, 'status': 2, 'merge': 3, 'run': 5}
+    command = args[0] if args else None
+    if command not in needed or len(args) < needed[command] or (command in ('submit', 'run') and args[2] not in TASKS):
+        print(__doc__.split('Usage:')[1].split('Tasks:')[0].rstrip())
+        print(f"Tasks: {', '.join(TASKS)}")
+        sys.exit(1)
+
+    if command == 'submit':
+        submit(args[1], args[2], args[3], shard_lines, job_dir)
+    elif command == 'status':
+        print_status(args[1], get_work_queue())
+    elif command == 'merge':
+        merge(args[1], args[2])
+    else:
+        run(args[1], args[2], args[3], args[4], shard_lines, job_dir, workers)
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Run every job of a job file in one process, loading each model once
+Usage: python run_jobs.py <job_file> [--workers N] [--metrics FILE] [--only NAME[,NAME...]]
+
+The job file lists each job's task (sentiment, zero-shot, multi-label or
+websites), input, output, model and labels; see common/job_runner.py for
+the format and distributed/nightly_jobs.json for an example. Batches of all
+jobs share one pool of --workers threads (default "workers" from the job
+file, else JOB_WORKERS), the job with the most work left going first.
+
+Each job writes its own CSV. Per-job and run metrics (lines, batches, model
+time, lines/sec, finish time, label counts, model load times) are printed
+and saved to --metrics (default "metrics" from the job file, else
+<job_file>.metrics.json).
+"""
+
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common.job_runner import JOB_WORKERS, load_jobs, print_metrics, run_jobs
+from common.cli import pop_option
+
+def run_job_file(job_file, workers=None, metrics_file=None, only=None):
+    """Run the jobs of a job file; returns the run metrics"""
+    try:
+        jobs, settings = load_jobs(job_file)
+    except FileNotFoundError:
+        print(f"Error: File '{job_file}' not found.")
+        return None
+    except (ValueError, KeyError) as e:
+        print(f"Error in {job_file}: {str(e)}")
+        return None
+
+    if only:
+        unknown = set(only) - {job.name for job in jobs}
+        if unknown:
+            print(f"Error: no job named {', '.join(sorted(unknown))} in {job_file}")
+            return None
+        jobs = [job for job in jobs if job.name in only]
+    if not jobs:
+        print("No jobs to run.")
+        return None
+
+    workers = workers or int(settings.get('workers', JOB_WORKERS))
+    base_dir = os.path.dirname(os.path.abspath(job_file))
+    metrics_file = metrics_file or (os.path.join(base_dir, settings['metrics']) if settings.get('metrics')
+                                    else os.path.splitext(job_file)[0] + '.metrics.json')
+
+    print(f"Job runner - {len(jobs)} jobs from {job_file}")
+    print("=" * 60)
+    metrics = run_jobs(jobs, workers)
+    print_metrics(metrics)
+
+    with open(metrics_file, 'w', encoding='utf-8') as f:
+        json.dump(metrics, f, indent=2)
+    print(f"\nMetrics saved to {metrics_file}")
+    for job in metrics['jobs']:
+        if job['status'] == 'done':
+            print(f"  {job['name']}: {job['output']}")
+    return metrics
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    try:
+        workers = pop_option(args, '--workers')
+        workers = int(workers) if workers else None
+        metrics_file = pop_option(args, '--metrics')
+        only = pop_option(args, '--only')
+        only = [name.strip() for name in only.split(',') if name.strip()] if only else None
+    except ValueError as e:
+        print(f"Error: {str(e)}")
+        args = []
+
+    if len(args) != 1:
+        print("Usage: python run_jobs.py <job_file> [--workers N] [--metrics FILE] [--only NAME[,NAME...]]")
+        print("Example: python run_jobs.py nightly_jobs.json --workers 2")
+        sys.exit(1)
+
+    metrics = run_job_file(args[0], workers, metrics_file, only)
+    if metrics is None or any(job['status'] != 'done' for job in metrics['jobs']):
+        sys.exit(1)
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Claim and process shards from the work queue until the job is finished
+Usage: python worker.py [--job JOB] [--lease 120] [--poll 5]
+
+Run one worker per machine (or several, if cores allow) against the same
+queue (WORK_QUEUE_URL) and job directory. Each shard is leased while it is
+processed and the lease is extended by a heartbeat; if this process dies,
+the lease expires and another worker picks the shard up. Without --job the
+worker serves every job in the queue. It exits once all shards are done or
+failed; while other workers still hold leases it keeps polling, in case
+one of them dies and its shard needs a retry.
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common.work_queue import DEFAULT_LEASE_SECONDS, Heartbeat, get_work_queue, worker_name
+from common.cli import pop_option
+
+REPO_ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+def run_sentiment(input_file, output_file):
+    """Sentiment of every line, as analyze_file.py"""
+    sys.path.insert(0, os.path.join(REPO_ROOT, 'sentiment_analysis'))
+    from analyze_file import analyze_sentiment_file
+    summary = analyze_sentiment_file(input_file, output_file, output_mode='quiet')
+    if summary is None:
+        raise RuntimeError(f"sentiment analysis of {input_file} failed")
+    return summary
+
+def run_websites(input_file, output_file):
+    """Category of every URL, as batch_website_classifier.py"""
+    os.environ.setdefault('WEBSITE_OUTPUT', 'quiet')
+    sys.path.insert(0, os.path.join(REPO_ROOT, 'web_scraping'))
+    from batch_website_classifier import process_urls, read_urls_from_file
+    results = process_urls(read_urls_from_file(input_file), output_file)
+    skipped = results.mask(label='Skipped')
+    return {
+        'lines': len(results),
+        'categories': results.counts(mask=~skipped),
+        'skipped': results.counts('skip_reason', mask=skipped),
+        'known_domains': int(results.mask(origin='index').sum())
+    }
+
+TASKS = {
+    'sentiment': run_sentiment,
+    'websites': run_websites
+}
+
+def process_shard(queue, shard, worker, lease_seconds):
+    """Run one leased shard; returns True if its result was recorded"""
+    job, shard_id, payload = shard['job'], shard['shard_id'], shard['payload']
+    os.makedirs(payload['output_dir'], exist_ok=True)
+    # One output per attempt, so a worker that lost its lease never overwrites the retry's file
+    output_file = os.path.join(payload['output_dir'], f"{shard_id:05d}.attempt{shard['attempts']}.csv")
+    print(f"[{worker}] {job} shard {shard_id}: {payload['lines']} lines (attempt {shard['attempts']})")
+
+    start = time.monotonic()
+    with Heartbeat(queue, job, shard_id, worker, lease_seconds) as heartbeat:
+        try:
+            summary = TASKS[payload['task']](payload['input'], output_file)
+        except Exception as e:
+            print(f"[{worker}] {job} shard {shard_id} failed: {str(e)}")
+            queue.fail(job, shard_id, worker, e)
+            return False
+
+    summary['seconds'] = round(time.monotonic() - start, 3)
+    if heartbeat.lost or not queue.complete(job, shard_id, worker, {'output': output_file, 'summary': summary}):
+        print(f"[{worker}] {job} shard {shard_id}: lease lost, result discarded")
+        return False
+    print(f"[{worker}] {job} shard {shard_id} done in {summary['seconds']:.1f}s")
+    return True
+
+def work(job=None, lease_seconds=DEFAULT_LEASE_SECONDS, poll_seconds=5):
+    """Process shards until every job served by this worker is finished"""
+    queue = get_work_queue()
+    worker = worker_name()
+    completed = 0
+    while True:
+        jobs = [job] if job else queue.jobs()
+        shard = None
+        for name in jobs:
+            shard = queue.claim(name, worker, lease_seconds)
+            if shard is not None:
+                break
+        if shard is not None:
+            completed += process_shard(queue, shard, worker, lease_seconds)
+            continue
+        if all(queue.finished(name) for name in jobs):
+            break
+        time.sleep(poll_seconds)
+    print(f"[{worker}] finished: {completed} shards completed")
+    return completed
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    try:
+        job = pop_option(args, '--job')
+        lease_seconds = float(pop_option(args, '--lease', DEFAULT_LEASE_SECONDS))
+        poll_seconds = float(pop_option(args, '--poll', 5))
+    except ValueError as e:
+        print(f"Error: {str(e)}")
+        print("Usage: python worker.py [--job JOB] [--lease 120] [--poll 5]")
+        sys.exit(1)
+
+    work(job, lease_seconds, poll_seconds)
@@ -1,15 +1,11 @@
-from transformers import pipeline
-import torch
+import os
+import sys
 
-# Quantization for Even Less VRAM: Reduce to ~0.3GB with 8-bit ints
-device = 0 if torch.cuda.is_available() else -1  # 0 = GPU, -1 = CPU
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common.model_registry import get_classifier
 
-# For the pipeline, we need to pass the quantization config differently
-classifier = pipeline(
-    "sentiment-analysis",
-    model="distilbert/distilbert-base-uncased-finetuned-sst-2-english",
-    device=device
-)
+# Quantization for Even Less VRAM: Reduce to ~0.3GB with 8-bit ints
+classifier = get_classifier("sentiment")
 
 print("Model loaded successfully!")
 
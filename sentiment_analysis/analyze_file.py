@@ -1,110 +1,191 @@
 #!/usr/bin/env python3
 """
 Simple script to analyze sentiment of lines in any text file
-Usage: python analyze_file.py <input_file> [output_file]
+Usage: python analyze_file.py <input_file> [output_file] [--store DIR] [--no-prefilter] [--progress | --quiet]
+
+An output_file ending in .parquet is written as Parquet (requires pyarrow),
+anything else as CSV.
+
+Lines that are not worth scoring (URLs, tickers, boilerplate, non-English
+text; see prefilter.json) are skipped before the model runs and written with
+their reason to <output_file>.skipped.csv. --no-prefilter scores every line.
+
+--store DIR persists the embedding of every analyzed line to an embedding
+store and reuses stored labels for lines seen in earlier runs.
+
+The file is streamed through a staged pipeline (reading, prefilter,
+tokenization, inference and CSV writing overlap; see
+common/pipeline_runtime.py). Every result is printed for small files; larger
+files show a progress line instead. --progress or --quiet choose explicitly.
 """
 
 import sys
-from transformers import pipeline
-import torch
-import csv
+import os
+import time
+from collections import Counter
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common.model_registry import get_classifier
+from common.embedding_store import EmbeddingStore
+from common.text_embeddings import classify_with_store
+from common.prefilter import get_prefilter, skipped_path, summarize_skipped, write_skipped
+from common.pipeline_runtime import (PipelineError, Progress, classifier_stages, prefilter_stage,
+                                     print_stage_times, resolve_output_mode, run_pipeline)
+from common.result_store import ResultStore, ResultWriter, numbered_lines
+from common.cli import pop_option
+
+OUTPUT_COLUMNS = [('line_number', 'id'), ('sentiment', 'label'), ('confidence', 'score'), ('text', 'text')]
+
+def read_numbered_lines(input_file):
+    """Yield a record per non-blank line; line numbers count non-blank lines"""
+    for number, line, offset, length in numbered_lines(input_file):
+        yield {'line_number': number, 'text': line, 'offset': offset, 'length': length}
+
+def count_lines(input_file):
+    """Number of non-blank lines in a file"""
+    with open(input_file, 'r', encoding='utf-8') as f:
+        return sum(1 for line in f if line.strip())
+
+def analyze_sentiment_file(input_file, output_file=None, store_dir=None, prefilter=True, output_mode='auto'):
+    """Analyze sentiment for each line in a text file; returns label and skip counts"""
 
-def analyze_sentiment_file(input_file, output_file=None):
-    """Analyze sentiment for each line in a text file"""
-    
     # Load the sentiment analysis model
-    device = 0 if torch.cuda.is_available() else -1
-    classifier = pipeline(
-        "sentiment-analysis",
-        model="distilbert/distilbert-base-uncased-finetuned-sst-2-english",
-        device=device
-    )
-    
+    classifier = get_classifier("sentiment")
+
     try:
-        # Read lines from input file
-        with open(input_file, 'r', encoding='utf-8') as f:
-            lines = [line.strip() for line in f.readlines() if line.strip()]
+        total_lines = count_lines(input_file)
     except FileNotFoundError:
         print(f"Error: File '{input_file}' not found.")
         return
     except Exception as e:
         print(f"Error reading file: {str(e)}")
         return
-    
-    print(f"Analyzing sentiment for {len(lines)} lines from {input_file}")
+
+    output_mode = resolve_output_mode(output_mode, total_lines)
+    print(f"Analyzing sentiment for {total_lines} lines from {input_file}")
     print("=" * 60)
-    
-    results = []
-    
-    for i, line in enumerate(lines, 1):
+
+    # With an embedding store, reuse labels of lines seen before and save new embeddings
+    store = None
+    if store_dir:
         try:
-            # Analyze sentiment for this line
-            result = classifier(line)[0]
-            label = result['label']
-            score = result['score']
-            
-            print(f"{i:3d}. {label} ({score:.2f}) - {line[:60]}{'...' if len(line) > 60 else ''}")
-            
-            results.append({
-                'line_number': i,
-                'text': line,
-                'sentiment': label,
-                'confidence': score
-            })
-            
+            store = EmbeddingStore(store_dir, model="sentiment")
         except Exception as e:
-            print(f"{i:3d}. ERROR - {line[:60]}{'...' if len(line) > 60 else ''}")
-            print(f"     Error: {str(e)}")
-            
-            results.append({
-                'line_number': i,
-                'text': line,
-                'sentiment': 'Error',
-                'confidence': 0.0,
-                'error': str(e)
-            })
-    
-    # Save to CSV if output file specified
+            print(f"Error using embedding store: {str(e)}")
+    classify_fn = (lambda texts: classify_with_store(classifier, texts, store)) if store is not None else None
+
+    stages = classifier_stages(classifier, classify_fn=classify_fn)
+    if prefilter:
+        stages.insert(0, prefilter_stage(get_prefilter("sentiment")))
+
+    # Results are kept as compact columns; the text stays in the input file as byte offsets
+    results = ResultStore(sources={'text': input_file})
+    skipped = []
+    reused = 0
+    try:
+        writer = ResultWriter(output_file, results, OUTPUT_COLUMNS) if output_file else None
+    except Exception as e:
+        print(f"Error opening output file: {str(e)}")
+        return
+
+    def write_results(records):
+        nonlocal reused
+        ids, labels, scores, texts = [], [], [], []
+        for record in records:
+            i, line = record['line_number'], record['text']
+            if record.get('skip_reason'):
+                # Line numbers refer to the non-blank lines of the input, before filtering
+                skipped.append((i - 1, line, record['skip_reason']))
+                continue
+
+            preview = f"{line[:60]}{'...' if len(line) > 60 else ''}"
+            if 'error' in record:
+                label, score = 'Error', 0.0
+                if output_mode == 'lines':
+                    print(f"{i:3d}. ERROR - {preview}")
+                    print(f"     Error: {record['error']}")
+            else:
+                label, score = record['label'], record['score']
+                reused += bool(record.get('reused'))
+                if output_mode == 'lines':
+                    print(f"{i:3d}. {label} ({score:.2f}) - {preview}")
+
+            ids.append(i)
+            labels.append(label)
+            scores.append(score)
+            texts.append((record['offset'], record['length']))
+        results.append(ids, labels, scores, text=texts)
+        if writer:
+            writer.write()
+
+    start = time.monotonic()
+    progress = Progress(total_lines, enabled=output_mode == 'progress')
+    try:
+        run_pipeline(read_numbered_lines(input_file), stages, write_results, progress=progress)
+    except PipelineError as e:
+        print(f"Error: {str(e)}")
+        return
+    finally:
+        if writer:
+            writer.close()
+        results.close()
+
     if output_file:
-        try:
-            with open(output_file, 'w', newline='', encoding='utf-8') as csvfile:
-                fieldnames = ['line_number', 'sentiment', 'confidence', 'text']
-                writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-                
-                writer.writeheader()
-                for result in results:
-                    # Only write the main fields to CSV
-                    writer.writerow({
-                        'line_number': result['line_number'],
-                        'sentiment': result['sentiment'],
-                        'confidence': result['confidence'],
-                        'text': result['text']
-                    })
-            
-            print(f"\nResults saved to {output_file}")
-        except Exception as e:
-            print(f"Error saving to CSV: {str(e)}")
-    
+        print(f"\nResults saved to {output_file}")
+
+    if skipped:
+        print(f"Skipped {len(skipped)} lines ({summarize_skipped(skipped)})")
+        if output_file:
+            try:
+                write_skipped(skipped, skipped_path(output_file))
+                print(f"Skipped lines saved to {skipped_path(output_file)}")
+            except Exception as e:
+                print(f"Error saving skipped lines: {str(e)}")
+
+    if store is not None:
+        print(f"Embedding store {store_dir}: {reused} lines reused, {len(store)} stored")
+
     # Provide summary
-    valid_results = [r for r in results if r['sentiment'] != 'Error']
-    if valid_results:
-        positive_count = sum(1 for r in valid_results if r['sentiment'] == 'POSITIVE')
-        negative_count = sum(1 for r in valid_results if r['sentiment'] == 'NEGATIVE')
-        total_count = len(valid_results)
-        
+    counts = Counter(results.counts())
+    total_count = sum(n for label, n in counts.items() if label != 'Error')
+    if total_count:
+        positive_count = counts['POSITIVE']
+        negative_count = counts['NEGATIVE']
+
         print(f"\nSUMMARY:")
-        print(f"  Total lines: {len(results)}")
+        print(f"  Total lines: {sum(counts.values()) + len(skipped)}")
+        if skipped:
+            print(f"  Skipped by prefilter: {len(skipped)}")
         print(f"  Successful analyses: {total_count}")
         print(f"  Positive sentiment: {positive_count} ({positive_count/total_count*100:.1f}%)")
         print(f"  Negative sentiment: {negative_count} ({negative_count/total_count*100:.1f}%)")
+        print_stage_times(stages, time.monotonic() - start)
+
+    # Counts only, so summaries of several runs (e.g. shards) can be added up
+    return {
+        'lines': sum(counts.values()) + len(skipped),
+        'labels': dict(counts),
+        'skipped': dict(Counter(reason for _, _, reason in skipped)),
+        'reused': reused
+    }
 
 if __name__ == "__main__":
-    if len(sys.argv) < 2:
-        print("Usage: python analyze_file.py <input_file> [output_file]")
-        print("Example: python analyze_file.py sample_news.txt results.csv")
+    args = sys.argv[1:]
+    prefilter = '--no-prefilter' not in args
+    output_mode = 'quiet' if '--quiet' in args else 'progress' if '--progress' in args else 'auto'
+    args = [arg for arg in args if arg not in ('--no-prefilter', '--quiet', '--progress')]
+    try:
+        store_dir = pop_option(args, '--store')
+    except ValueError as e:
+        print(f"Error: {str(e)}")
+        args = []
+
+    if len(args) < 1:
+        print("Usage: python analyze_file.py <input_file> [output_file] [--store DIR] [--no-prefilter] [--progress | --quiet]")
+        print("Example: python analyze_file.py sample_news.txt results.csv --store embeddings/")
         sys.exit(1)
-    
-    input_file = sys.argv[1]
-    output_file = sys.argv[2] if len(sys.argv) > 2 else None
-    
-    analyze_sentiment_file(input_file, output_file)
\ No newline at end of file
+
+    input_file = args[0]
+    output_file = args[1] if len(args) > 1 else None
+
+    analyze_sentiment_file(input_file, output_file, store_dir, prefilter, output_mode)
@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+Check the CPU plan against other thread and process layouts
+Usage: python benchmark_cpu_plan.py [input_file] [--model sentiment] [--lines 1000] [--plan]
+
+Every layout runs in fresh processes, started side by side and timed on the
+same lines, and the total lines/sec of its processes is reported:
+    - the plan (common/cpu_plan.py): its processes, threads and CPUs
+    - PyTorch's defaults, one process and several side by side
+    - the plan for several processes (one per NUMA node), squeezed into
+      one process, with SMT siblings, and with 1, 2, 4, ... threads
+The last column shows how close each layout comes to the best one, so the
+plan can be checked for near-peak throughput on a machine without tuning
+by hand. --plan only prints the plan for this machine.
+"""
+
+import json
+import os
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common.cpu_plan import ExecutionPlan, format_cpu_list
+from common.cli import pop_option
+
+def measure_process(input_file, model_name, max_lines):
+    """Child process: load the model, wait for 'go', then classify the lines once"""
+    from common.model_registry import get_classifier
+    from common.cpu_plan import describe_plan
+    with open(input_file, 'r', encoding='utf-8') as f:
+        lines = [line.strip() for line in f if line.strip()][:max_lines]
+    classifier = get_classifier(model_name)
+    classifier(lines[:32], batch_size=32, truncation=True)
+
+    print(json.dumps({'ready': True}), flush=True)
+    sys.stdin.readline()
+    start = time.perf_counter()
+    classifier(lines, batch_size=32, truncation=True)
+    seconds = time.perf_counter() - start
+
+    import torch
+    print(json.dumps({
+        'lines_per_sec': len(lines) / seconds,
+        'threads': torch.get_num_threads(),
+        'cpus': format_cpu_list(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else '',
+        'plan': describe_plan()
+    }), flush=True)
+
+def run_layout(envs, input_file, model_name, max_lines):
+    """Start one process per environment, time them together; returns their results"""
+    script = os.path.abspath(__file__)
+    processes = [subprocess.Popen([sys.executable, script, input_file, '--measure', '--model', model_name,
+                                   '--lines', str(max_lines)],
+                                  stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                                  text=True, env=dict(os.environ, **env))
+                 for env in envs]
+    try:
+        for process in processes:
+            for line in process.stdout:
+                if line.startswith('{"ready"'):
+                    break
+            else:
+                raise RuntimeError("measuring process failed (run with --measure to see its error)")
+        for process in processes:
+            process.stdin.write('go\n')
+            process.stdin.flush()
+        results = [json.loads(process.stdout.readline()) for process in processes]
+        for process in processes:
+            process.wait()
+        return results
+    finally:
+        for process in processes:
+            if process.poll() is None:
+                process.kill()
+
+def layouts(plan):
+    """(name, [env per process]) of every layout to compare"""
+    planned = [{'CPU_PLAN_PROCESSES': str(plan.processes), 'CPU_PLAN_SLOT': str(slot)}
+               for slot in range(plan.processes)]
+    side_by_side = max(2, plan.processes)
+    result = [
+        (f"plan ({plan.processes} x {plan.intra_threads(0)} threads)", planned),
+        ("PyTorch defaults, 1 process", [{'CPU_PLAN': 'off'}]),
+        (f"PyTorch defaults, {side_by_side} processes", [{'CPU_PLAN': 'off'}] * side_by_side),
+    ]
+    if plan.processes != side_by_side:
+        result.append((f"plan for {side_by_side} processes",
+                       [{'CPU_PLAN_PROCESSES': str(side_by_side), 'CPU_PLAN_SLOT': str(slot)}
+                        for slot in range(side_by_side)]))
+    per_node = ExecutionPlan.processes_per_node(plan.topology)
+    if per_node not in (plan.processes, side_by_side):
+        result.append((f"plan, one process per NUMA node ({per_node})",
+                       [{'CPU_PLAN_PROCESSES': str(per_node), 'CPU_PLAN_SLOT': str(slot)} for slot in range(per_node)]))
+    if plan.processes > 1:
+        result.append(("plan, 1 process", [{'CPU_PLAN_PROCESSES': '1'}]))
+    if plan.topology.smt and not plan.smt:
+        result.append(("plan with SMT siblings", [dict(env, CPU_PLAN_SMT='1') for env in planned]))
+    threads = 1
+    while threads < plan.intra_threads(0):
+        result.append((f"plan, {threads} thread{'s' if threads > 1 else ''} per process",
+                       [dict(env, CPU_PLAN_THREADS=str(threads)) for env in planned]))
+        threads *= 2
+    return result
+
+def print_plan(plan):
+    print(f"Machine: {plan.topology.summary()}")
+    for slot in range(plan.processes):
+        print(f"  {plan.summary(slot).split(' [')[0]}")
+
+def benchmark(input_file, model_name="sentiment", max_lines=1000):
+    """Throughput of the plan and the other layouts"""
+    if not os.path.exists(input_file):
+        print(f"Error: File '{input_file}' not found.")
+        return None
+    plan = ExecutionPlan.from_env()
+    print_plan(plan)
+    print(f"\nBenchmarking {model_name} on {max_lines} lines of {input_file} per process")
+    print("=" * 60)
+    print(f"{'layout':<36}  {'procs':>5}  {'threads':>7}  {'CPUs':<14}  {'lines/sec':>9}")
+
+    rows = []
+    for name, envs in layouts(plan):
+        results = run_layout(envs, input_file, model_name, max_lines)
+        rate = sum(r['lines_per_sec'] for r in results)
+        cpus = ' | '.join(r['cpus'] for r in results)
+        rows.append((name, rate))
+        print(f"{name:<36}  {len(results):>5}  {results[0]['threads']:>7}  {cpus[:14]:<14}  {rate:>9.1f}")
+
+    best = max(rate for _, rate in rows)
+    print(f"\nPlan: {rows[0][1]:.1f} lines/sec, {rows[0][1] / best:.0%} of the best layout "
+          f"({max(rows, key=lambda row: row[1])[0]})")
+    return rows
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    measure = '--measure' in args
+    plan_only = '--plan' in args
+    args = [arg for arg in args if arg not in ('--measure', '--plan')]
+    try:
+        model_name = pop_option(args, '--model', 'sentiment')
+        max_lines = int(pop_option(args, '--lines', 1000))
+    except ValueError as e:
+        print(f"Error: {str(e)}")
+        sys.exit(1)
+
+    if plan_only:
+        print_plan(ExecutionPlan.from_env())
+        sys.exit(0)
+
+    input_file = args[0] if args else os.path.join(os.path.dirname(os.path.abspath(__file__)), 'sample_news.txt')
+    if measure:
+        measure_process(input_file, model_name, max_lines)
+    else:
+        benchmark(input_file, model_name, max_lines)
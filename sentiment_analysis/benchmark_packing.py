@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+Compare the regular sentiment pipeline with packed execution of short texts
+Usage: python benchmark_packing.py [input_file] [model_name] [packed_model_name]
+"""
+
+import sys
+import os
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common.model_registry import get_classifier
+from common.cpu_plan import describe_plan
+from common.packing import pack_lengths
+
+def time_classifier(classifier, lines, batch_size=16, repeats=3):
+    """Return (lines per second, results) for the best of several runs"""
+    best = None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        results = classifier(lines, batch_size=batch_size)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return len(lines) / best, results
+
+def benchmark(input_file, model_name="sentiment", packed_model_name="sentiment-packed"):
+    """Benchmark padded batches against packed sequences on one file"""
+
+    try:
+        with open(input_file, 'r', encoding='utf-8') as f:
+            lines = [line.strip() for line in f if line.strip()]
+    except FileNotFoundError:
+        print(f"Error: File '{input_file}' not found.")
+        return
+
+    padded = get_classifier(model_name)
+    packed = get_classifier(packed_model_name)
+    lengths = [len(ids) for ids in packed.tokenizer(lines, truncation=True)['input_ids']]
+    tokens = sum(lengths)
+
+    print(f"Benchmarking {len(lines)} lines ({tokens} tokens) from {input_file}")
+    print(describe_plan())
+    print("=" * 60)
+
+    # One untimed pass each so first-call allocations are not measured
+    padded(lines[:16])
+    packed(lines[:16])
+
+    padded_rate, padded_results = time_classifier(padded, lines)
+    packed.stats = {'tokens': 0, 'padded_tokens': 0}
+    packed_rate, packed_results = time_classifier(packed, lines)
+
+    matches = sum(1 for a, b in zip(padded_results, packed_results) if a['label'] == b['label'])
+    max_delta = max(abs(a['score'] - b['score']) for a, b in zip(padded_results, packed_results))
+    lines_per_row = len(lines) / len(pack_lengths(lengths, packed.pack_length))
+
+    print(f"Padded batches: {padded_rate * tokens / len(lines):9.1f} tokens/sec ({padded_rate:.1f} lines/sec)")
+    print(f"Packed rows:    {packed_rate * tokens / len(lines):9.1f} tokens/sec ({packed_rate:.1f} lines/sec, "
+          f"{packed_rate / padded_rate:.2f}x)")
+    print(f"Label agreement: {matches}/{len(lines)} (max score delta {max_delta:.2e})")
+    print(f"Packing: {lines_per_row:.1f} lines per row, {packed.padding_ratio():.1%} padding "
+          f"(pack length {packed.pack_length})")
+
+if __name__ == "__main__":
+    input_file = sys.argv[1] if len(sys.argv) > 1 else os.path.join(os.path.dirname(os.path.abspath(__file__)), 'sample_news.txt')
+    model_name = sys.argv[2] if len(sys.argv) > 2 else "sentiment"
+    packed_model_name = sys.argv[3] if len(sys.argv) > 3 else "sentiment-packed"
+
+    benchmark(input_file, model_name, packed_model_name)
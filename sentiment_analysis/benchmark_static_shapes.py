@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""
+Compare the regular sentiment pipeline with static-shape bucketed execution
+Usage: python benchmark_static_shapes.py [input_file] [model_name] [static_model_name]
+"""
+
+import sys
+import os
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common.model_registry import get_classifier
+from common.cpu_plan import describe_plan
+
+def time_classifier(classifier, lines, batch_size=8, repeats=3):
+    """Return (lines per second, results) for the best of several runs"""
+    best = None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        results = classifier(lines, batch_size=batch_size)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return len(lines) / best, results
+
+def benchmark(input_file, model_name="sentiment", static_model_name="sentiment-static"):
+    """Benchmark dynamic padding against static bucket shapes on one file"""
+    
+    try:
+        with open(input_file, 'r', encoding='utf-8') as f:
+            lines = [line.strip() for line in f if line.strip()]
+    except FileNotFoundError:
+        print(f"Error: File '{input_file}' not found.")
+        return
+    
+    dynamic = get_classifier(model_name)
+    static = get_classifier(static_model_name)
+    
+    print(f"Benchmarking {len(lines)} lines from {input_file}")
+    print(describe_plan())
+    print("=" * 60)
+    
+    # Compile/trace every bucket shape before timing
+    start = time.perf_counter()
+    static.warmup()
+    print(f"Static shapes compiled in {time.perf_counter() - start:.1f}s ({static.backend})")
+    
+    dynamic_rate, dynamic_results = time_classifier(dynamic, lines)
+    static_rate, static_results = time_classifier(static, lines)
+    
+    matches = sum(1 for a, b in zip(dynamic_results, static_results) if a['label'] == b['label'])
+    max_delta = max(abs(a['score'] - b['score']) for a, b in zip(dynamic_results, static_results))
+    
+    print(f"Dynamic padding: {dynamic_rate:8.1f} lines/sec")
+    print(f"Static buckets:  {static_rate:8.1f} lines/sec ({static_rate / dynamic_rate:.2f}x)")
+    print(f"Label agreement: {matches}/{len(lines)} (max score delta {max_delta:.2e})")
+    print(f"Shapes compiled: {', '.join(f'{b}x{l}' for b, l in static.shapes_seen())}")
+
+if __name__ == "__main__":
+    input_file = sys.argv[1] if len(sys.argv) > 1 else os.path.join(os.path.dirname(os.path.abspath(__file__)), 'sample_news.txt')
+    model_name = sys.argv[2] if len(sys.argv) > 2 else "sentiment"
+    static_model_name = sys.argv[3] if len(sys.argv) > 3 else "sentiment-static"
+    
+    benchmark(input_file, model_name, static_model_name)
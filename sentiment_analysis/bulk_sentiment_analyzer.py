@@ -1,13 +1,11 @@
-from transformers import pipeline
-import torch
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common.model_registry import get_classifier
 
 # Load the sentiment analysis model
-device = 0 if torch.cuda.is_available() else -1
-classifier = pipeline(
-    "sentiment-analysis",
-    model="distilbert/distilbert-base-uncased-finetuned-sst-2-english",
-    device=device
-)
+classifier = get_classifier("sentiment")
 
 def analyze_sentiment_lines(text_block):
     """Analyze sentiment for each line in a text block"""
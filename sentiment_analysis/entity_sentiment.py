@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Per-company sentiment from an existing results CSV
+Usage: python entity_sentiment.py <results_csv> [output_csv] [--entities FILE] [--bucket day]
+
+Reads the CSV written by file_based_sentiment_analyzer.py or analyze_file.py
+(columns sentiment, confidence, text; an optional timestamp column, or a
+timestamp prefix in the text), tags every row with the entities from
+entities.json and aggregates sentiment per entity and time bucket
+(hour, day, week, month or all). Rows are streamed, so files with millions
+of lines are fine.
+"""
+
+import csv
+import os
+import sys
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common.entity_tagger import BUCKETS, EntityTagger, SentimentAggregates, split_timestamp
+from common.cli import pop_option
+
+DEFAULT_ENTITIES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'entities.json')
+
+def parse_timestamp(value):
+    """Parse an ISO timestamp column value, or return None"""
+    try:
+        return datetime.fromisoformat(value.strip().replace('Z', '+00:00')) if value else None
+    except ValueError:
+        return None
+
+def aggregate_results(results_file, output_file=None, entities_file=DEFAULT_ENTITIES, bucket='day'):
+    """Tag and aggregate every row of a results CSV"""
+    try:
+        tagger = EntityTagger.from_file(entities_file)
+    except Exception as e:
+        print(f"Error loading entities from {entities_file}: {str(e)}")
+        return None
+
+    aggregates = SentimentAggregates(bucket)
+    rows = tagged = 0
+    start = time.monotonic()
+
+    try:
+        with open(results_file, 'r', newline='', encoding='utf-8') as f:
+            for row in csv.DictReader(f):
+                if row.get('sentiment') in (None, '', 'Error'):
+                    continue
+                timestamp, text = split_timestamp(row.get('text', ''))
+                timestamp = parse_timestamp(row.get('timestamp')) or timestamp
+                entities = tagger.tag(text)
+                aggregates.add(entities, row['sentiment'], float(row.get('confidence') or 0.0), timestamp)
+                rows += 1
+                tagged += bool(entities)
+                if rows % 1000000 == 0:
+                    print(f"  {rows:,} rows ({rows / (time.monotonic() - start):,.0f} rows/s)")
+    except FileNotFoundError:
+        print(f"Error: File '{results_file}' not found.")
+        return None
+
+    print(f"Tagged {tagged:,} of {rows:,} rows with {len(tagger)} entities")
+    print("=" * 50)
+    aggregates.print_summary(tagger.names)
+
+    if output_file:
+        aggregates.write_csv(output_file, tagger.names)
+        print(f"\nEntity aggregates saved to {output_file}")
+    return aggregates
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    try:
+        entities_file = pop_option(args, '--entities', DEFAULT_ENTITIES)
+        bucket = pop_option(args, '--bucket', 'day')
+    except ValueError as e:
+        print(f"Error: {str(e)}")
+        args, bucket = [], None
+
+    if len(args) < 1 or bucket not in BUCKETS:
+        print("Usage: python entity_sentiment.py <results_csv> [output_csv] [--entities FILE] [--bucket day]")
+        print(f"Buckets: {', '.join(BUCKETS)}")
+        print("Example: python entity_sentiment.py news_sentiment_results.csv by_company.csv --bucket week")
+        sys.exit(1)
+
+    aggregate_results(args[0], args[1] if len(args) > 1 else None, entities_file, bucket)
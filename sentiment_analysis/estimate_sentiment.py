@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""
+Estimate the sentiment mix of a large text file from a sample
+Usage: python estimate_sentiment.py <input_file> [options]
+
+Instead of labelling every line, the file is streamed once into random
+samples (one per stratum), only sampled lines are classified, and the share
+of each sentiment is reported with a confidence interval. Sampling stops as
+soon as every interval is narrower than --target-width.
+
+Options:
+    --strata none|length|source  stratify by line length (default) or by the
+                                 source column ("source<TAB>text" lines)
+    --target-width W             stop when every interval is at most W wide (default 0.02, i.e. +/-1%)
+    --confidence C               confidence level of the intervals (default 0.95)
+    --max-sample N               lines kept per stratum (default 20000)
+    --batch-size N               lines per inference batch (default 64)
+    --seed N                     random seed, for repeatable estimates
+"""
+
+import os
+import sys
+import time
+from collections import Counter
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common.model_registry import get_classifier
+from common.sampling import StratifiedReservoir, allocate, stratified_proportion, z_value
+from common.cli import pop_option
+
+LENGTH_BUCKETS = ((8, 'short (<8 words)'), (16, 'medium (8-15 words)'), (32, 'long (16-31 words)'))
+MIN_SAMPLE = 100
+
+def length_stratum(text):
+    """Length bucket of a line, by word count"""
+    words = len(text.split())
+    for limit, name in LENGTH_BUCKETS:
+        if words < limit:
+            return name
+    return 'very long (32+ words)'
+
+def sample_file(input_file, strata='length', max_sample=20000, seed=None):
+    """Stream the file into per-stratum reservoirs"""
+    sampler = StratifiedReservoir(max_sample, seed)
+    with open(input_file, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            if strata == 'source':
+                source, _, text = line.partition('\t')
+                stratum, line = (source, text) if text else ('(none)', line)
+            elif strata == 'length':
+                stratum = length_stratum(line)
+            else:
+                stratum = 'all'
+            sampler.add(stratum, line)
+    return sampler
+
+def label_intervals(population, counts, sampled, z, labels=()):
+    """{label: (estimate, low, high)} for the model's labels and any others seen so far"""
+    labels = sorted(set(labels) | {label for stratum_counts in counts.values() for label in stratum_counts})
+    return {label: stratified_proportion(population, {h: counts[h][label] for h in population}, sampled, z)
+            for label in labels}
+
+def estimate_sentiment(input_file, strata='length', target_width=0.02, confidence=0.95,
+                       max_sample=20000, batch_size=64, seed=None):
+    """Classify a growing random sample until the intervals are narrow enough"""
+    start = time.monotonic()
+    try:
+        sampler = sample_file(input_file, strata, max_sample, seed)
+    except FileNotFoundError:
+        print(f"Error: File '{input_file}' not found.")
+        return None
+
+    population = sampler.population()
+    total_lines = sum(population.values())
+    if not total_lines:
+        print("No lines to analyze.")
+        return None
+
+    samples = sampler.shuffled()
+    available = {h: len(items) for h, items in samples.items()}
+    taken = {h: 0 for h in population}
+    counts = {h: Counter() for h in population}
+    z = z_value(confidence)
+
+    print(f"Estimating sentiment of {total_lines:,} lines in {input_file} ({time.monotonic() - start:.1f}s to sample)")
+    print(f"Strata ({strata}): " + ", ".join(f"{h}: {n:,}" for h, n in sorted(population.items())))
+    print(f"Target: {confidence:.0%} intervals at most {target_width:.3f} wide")
+    print("=" * 60)
+
+    classifier = get_classifier("sentiment")
+    model = getattr(classifier, 'model', None)
+    model_labels = list(model.config.id2label.values()) if model is not None else []
+    intervals = {}
+    while True:
+        allocation = allocate(population, taken, available, batch_size * 4)
+        if not allocation:
+            break
+
+        batch = [(h, text) for h, n in allocation.items() for text in samples[h][taken[h]:taken[h] + n]]
+        for h, n in allocation.items():
+            taken[h] += n
+        results = classifier([text for _, text in batch], batch_size=batch_size, truncation=True)
+        for (h, _), result in zip(batch, results):
+            counts[h][result['label']] += 1
+
+        intervals = label_intervals(population, counts, taken, z, model_labels)
+        classified = sum(taken.values())
+        width = max(high - low for _, low, high in intervals.values())
+        shares = ", ".join(f"{label} {estimate:.1%}" for label, (estimate, _, _) in intervals.items())
+        print(f"  {classified:6,} sampled: {shares} (interval width {width:.3f})")
+        if classified >= MIN_SAMPLE and width <= target_width:
+            break
+
+    classified = sum(taken.values())
+    print("\n" + "=" * 60)
+    print("ESTIMATE")
+    print("=" * 60)
+    print(f"Lines in file: {total_lines:,}")
+    print(f"Lines classified: {classified:,} ({classified / total_lines:.2%} of the file)")
+    for label, (estimate, low, high) in intervals.items():
+        print(f"{label} sentiment: {estimate:.1%} ({confidence:.0%} CI {low:.1%} - {high:.1%}), "
+              f"about {estimate * total_lines:,.0f} lines")
+    if intervals and max(high - low for _, low, high in intervals.values()) > target_width:
+        print(f"Note: sample exhausted before reaching width {target_width}; raise --max-sample for tighter intervals")
+    print(f"Time: {time.monotonic() - start:.1f}s")
+
+    return {'lines': total_lines, 'classified': classified, 'estimates': intervals}
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    try:
+        strata = pop_option(args, '--strata', 'length')
+        target_width = float(pop_option(args, '--target-width', 0.02))
+        confidence = float(pop_option(args, '--confidence', 0.95))
+        max_sample = int(pop_option(args, '--max-sample', 20000))
+        batch_size = int(pop_option(args, '--batch-size', 64))
+        seed = pop_option(args, '--seed')
+        seed = int(seed) if seed is not None else None
+        if strata not in ('none', 'length', 'source'):
+            raise ValueError(f"unknown strata '{strata}'")
+    except ValueError as e:
+        print(f"Error: {str(e)}")
+        args = []
+
+    if len(args) < 1:
+        print("Usage: python estimate_sentiment.py <input_file> [--strata none|length|source] [--target-width 0.02] "
+              "[--confidence 0.95] [--max-sample 20000] [--batch-size 64] [--seed N]")
+        print("Example: python estimate_sentiment.py headlines.txt --target-width 0.01")
+        sys.exit(1)
+
+    estimate_sentiment(args[0], strata, target_width, confidence, max_sample, batch_size, seed)
@@ -1,69 +1,169 @@
-from transformers import pipeline
-import torch
-import csv
 import sys
+import os
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common.model_registry import get_classifier
+from common.prefilter import get_prefilter, skipped_path, summarize_skipped, write_skipped
+from common.entity_tagger import EntityTagger, SentimentAggregates, split_timestamp
+from common.pipeline_runtime import (PipelineError, Progress, Stage, classifier_stages, prefilter_stage,
+                                     print_stage_times, resolve_output_mode, run_pipeline)
+from common.result_store import ResultStore, ResultWriter, numbered_lines
 
 # Load the sentiment analysis model
-device = 0 if torch.cuda.is_available() else -1
-classifier = pipeline(
-    "sentiment-analysis",
-    model="distilbert/distilbert-base-uncased-finetuned-sst-2-english",
-    device=device
-)
+classifier = get_classifier("sentiment")
+
+# Skip lines not worth scoring (URLs, tickers, boilerplate, non-English); SENTIMENT_PREFILTER=0 disables
+prefilter = get_prefilter("sentiment") if os.environ.get('SENTIMENT_PREFILTER', '1') != '0' else None
+
+# Per-line output: auto (every line for small inputs, a progress line otherwise), lines, progress or quiet
+OUTPUT_MODE = os.environ.get('SENTIMENT_OUTPUT', 'auto')
+
+# Columns of the results file (.parquet output needs pyarrow, anything else is CSV)
+OUTPUT_COLUMNS = [('line_number', 'id'), ('sentiment', 'label'), ('confidence', 'score'),
+                  ('entities', 'entities'), ('text', 'text')]
+
+# Tag lines with the companies they mention (tickers, names, aliases) and aggregate
+# sentiment per company; SENTIMENT_ENTITIES=0 disables, SENTIMENT_TIME_BUCKET sets hour/day/week/month/all
+ENTITIES_FILE = os.environ.get('SENTIMENT_ENTITIES', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'entities.json'))
+TIME_BUCKET = os.environ.get('SENTIMENT_TIME_BUCKET', 'day')
+entity_tagger = EntityTagger.from_file(ENTITIES_FILE) if ENTITIES_FILE != '0' and os.path.exists(ENTITIES_FILE) else None
+
+def tag_entities(records):
+    """Pipeline stage: add the entities each scored record mentions"""
+    for record in records:
+        if not record.get('skip_reason'):
+            record['entities'] = entity_tagger.tag(record['text']) if entity_tagger else []
+    return records
+
+def report_entities(aggregates, output_file=None):
+    """Print per-entity sentiment and save the time-bucketed aggregates"""
+    if entity_tagger is None:
+        return
+    
+    print("\n" + "=" * 50)
+    print(f"SENTIMENT BY ENTITY ({len(entity_tagger)} entities, {TIME_BUCKET} buckets)")
+    print("=" * 50)
+    aggregates.print_summary(entity_tagger.names)
+    
+    if output_file:
+        entities_file = f"{os.path.splitext(output_file)[0]}.entities.csv"
+        try:
+            aggregates.write_csv(entities_file, entity_tagger.names)
+            print(f"\nEntity aggregates saved to {entities_file}")
+        except Exception as e:
+            print(f"Error saving entity aggregates: {str(e)}")
+
+def analyze_numbered_lines(numbered_lines, total, output_file=None, source=None):
+    """Stream (line_number, line) pairs through the sentiment pipeline
+
+    Reading, prefiltering, entity tagging, tokenization, inference and
+    writing run as overlapping stages (see common/pipeline_runtime.py).
+    With a source file the pairs also carry the line's byte offset and
+    length, and the results refer to the text there instead of copying it.
+    Returns the results as a ResultStore.
+    """
+    output_mode = resolve_output_mode(OUTPUT_MODE, total)
+    
+    def records():
+        for item in numbered_lines:
+            i, line = item[0], item[1]
+            timestamp, text = split_timestamp(line)
+            record = {'line_number': i, 'text': text, 'timestamp': timestamp}
+            if source is not None:
+                # The text is a suffix of the line; skip the timestamp's bytes
+                prefix = len(line[:len(line) - len(text)].encode('utf-8'))
+                record['location'] = (item[2] + prefix, item[3] - prefix)
+            yield record
+    
+    stages = [Stage('entities', tag_entities)] + classifier_stages(classifier)
+    if prefilter is not None:
+        stages.insert(0, prefilter_stage(prefilter))
+    
+    results = ResultStore(text_columns=('text', 'entities'), sources={'text': source})
+    skipped = []
+    aggregates = SentimentAggregates(TIME_BUCKET)
+    try:
+        writer = ResultWriter(output_file, results, OUTPUT_COLUMNS) if output_file else None
+    except Exception as e:
+        print(f"Error opening output file: {str(e)}")
+        return results
+    
+    def write_results(chunk):
+        ids, labels, scores, texts, entities = [], [], [], [], []
+        for record in chunk:
+            i, line = record['line_number'], record['text']
+            if record.get('skip_reason'):
+                skipped.append((i - 1, line, record['skip_reason']))
+                continue
+            
+            if 'error' in record:
+                label, score, tags = 'Error', 0.0, []
+                if output_mode == 'lines':
+                    print(f"{i:2d}. {line[:70]}{'...' if len(line) > 70 else ''}")
+                    print(f"    Error: {record['error']}")
+            else:
+                label, score, tags = record['label'], record['score'], record['entities']
+                aggregates.add(tags, label, score, record['timestamp'])
+                if output_mode == 'lines':
+                    print(f"{i:2d}. {line[:70]}{'...' if len(line) > 70 else ''}")
+                    print(f"    Sentiment: {label} (confidence: {score:.2f})" + (f" [{', '.join(tags)}]" if tags else ""))
+            
+            ids.append(i)
+            labels.append(label)
+            scores.append(score)
+            texts.append(record['location'] if source is not None else line)
+            entities.append(';'.join(tags))
+        results.append(ids, labels, scores, text=texts, entities=entities)
+        if writer:
+            writer.write()
+    
+    start = time.monotonic()
+    progress = Progress(total, enabled=output_mode == 'progress')
+    try:
+        run_pipeline(records(), stages, write_results, progress=progress)
+    except PipelineError as e:
+        print(f"Error: {str(e)}")
+    finally:
+        if writer:
+            writer.close()
+    
+    if output_file:
+        print(f"\nResults saved to {output_file}")
+    
+    if skipped:
+        # Line numbers in the skipped file refer to the input, before filtering
+        print(f"Skipped {len(skipped)} lines ({summarize_skipped(skipped)})")
+        if output_file:
+            try:
+                write_skipped(skipped, skipped_path(output_file))
+                print(f"Skipped lines saved to {skipped_path(output_file)}")
+            except Exception as e:
+                print(f"Error saving skipped lines: {str(e)}")
+    
+    print_stage_times(stages, time.monotonic() - start)
+    report_entities(aggregates, output_file)
+    
+    return results
 
 def analyze_sentiment_from_file(input_file, output_file=None):
     """Analyze sentiment for each line in a text file"""
     
     try:
-        # Read lines from input file
+        # Count lines first; the file itself is streamed through the pipeline
         with open(input_file, 'r', encoding='utf-8') as f:
-            lines = [line.strip() for line in f.readlines() if line.strip()]
+            total = sum(1 for line in f if line.strip())
     except FileNotFoundError:
         print(f"Error: File '{input_file}' not found.")
-        return []
+        return ResultStore()
     except Exception as e:
         print(f"Error reading file: {str(e)}")
-        return []
+        return ResultStore()
     
-    print(f"Sentiment Analysis for {len(lines)} Lines")
+    print(f"Sentiment Analysis for {total} Lines")
     print("=" * 50)
     
-    results = []
-    
-    for i, line in enumerate(lines, 1):
-        try:
-            # Analyze sentiment for this line
-            result = classifier(line)[0]
-            label = result['label']
-            score = result['score']
-            
-            print(f"{i:2d}. {line[:70]}{'...' if len(line) > 70 else ''}")
-            print(f"    Sentiment: {label} (confidence: {score:.2f})")
-            
-            results.append({
-                'line_number': i,
-                'text': line,
-                'sentiment': label,
-                'confidence': score
-            })
-            
-        except Exception as e:
-            print(f"{i:2d}. {line[:70]}{'...' if len(line) > 70 else ''}")
-            print(f"    Error: {str(e)}")
-            
-            results.append({
-                'line_number': i,
-                'text': line,
-                'sentiment': 'Error',
-                'confidence': 0.0,
-                'error': str(e)
-            })
-    
-    # Save to CSV if output file specified
-    if output_file:
-        save_results_to_csv(results, output_file)
-    
-    return results
+    return analyze_numbered_lines(numbered_lines(input_file), total, output_file, source=input_file)
 
 def analyze_sentiment_from_text(text_block, output_file=None):
     """Analyze sentiment for each line in a text block"""
@@ -74,78 +174,23 @@ def analyze_sentiment_from_text(text_block, output_file=None):
     print(f"Sentiment Analysis for {len(lines)} Lines")
     print("=" * 50)
     
-    results = []
-    
-    for i, line in enumerate(lines, 1):
-        if line.strip():  # Skip empty lines
-            try:
-                # Analyze sentiment for this line
-                result = classifier(line)[0]
-                label = result['label']
-                score = result['score']
-                
-                print(f"{i:2d}. {line[:70]}{'...' if len(line) > 70 else ''}")
-                print(f"    Sentiment: {label} (confidence: {score:.2f})")
-                
-                results.append({
-                    'line_number': i,
-                    'text': line,
-                    'sentiment': label,
-                    'confidence': score
-                })
-                
-            except Exception as e:
-                print(f"{i:2d}. {line[:70]}{'...' if len(line) > 70 else ''}")
-                print(f"    Error: {str(e)}")
-                
-                results.append({
-                    'line_number': i,
-                    'text': line,
-                    'sentiment': 'Error',
-                    'confidence': 0.0,
-                    'error': str(e)
-                })
-    
-    # Save to CSV if output file specified
-    if output_file:
-        save_results_to_csv(results, output_file)
-    
-    return results
-
-def save_results_to_csv(results, output_file):
-    """Save results to a CSV file"""
-    try:
-        with open(output_file, 'w', newline='', encoding='utf-8') as csvfile:
-            fieldnames = ['line_number', 'sentiment', 'confidence', 'text']
-            writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-            
-            writer.writeheader()
-            for result in results:
-                # Only write the main fields to CSV
-                writer.writerow({
-                    'line_number': result['line_number'],
-                    'sentiment': result['sentiment'],
-                    'confidence': result['confidence'],
-                    'text': result['text']
-                })
-        
-        print(f"\nResults saved to {output_file}")
-    except Exception as e:
-        print(f"Error saving to CSV: {str(e)}")
+    numbered_lines = [(i, line.strip()) for i, line in enumerate(lines, 1) if line.strip()]  # Skip empty lines
+    return analyze_numbered_lines(numbered_lines, len(numbered_lines), output_file)
 
 def summarize_results(results):
     """Provide a summary of sentiment analysis results"""
     
     # Filter out error results
-    valid_results = [r for r in results if r['sentiment'] != 'Error']
+    valid = results.mask(exclude=['Error'])
+    total_count = int(valid.sum())
     
-    if not valid_results:
+    if not total_count:
         print("\nNo valid results to summarize.")
         return
     
-    positive_count = sum(1 for r in valid_results if r['sentiment'] == 'POSITIVE')
-    negative_count = sum(1 for r in valid_results if r['sentiment'] == 'NEGATIVE')
-    total_count = len(valid_results)
+    counts = results.counts()
+    positive_count = counts.get('POSITIVE', 0)
+    negative_count = counts.get('NEGATIVE', 0)
     
     print("\n" + "=" * 50)
     print("SUMMARY")
@@ -156,13 +201,15 @@ def summarize_results(results):
     print(f"Positive sentiment: {positive_count} ({positive_count/total_count*100:.1f}%)")
     print(f"Negative sentiment: {negative_count} ({negative_count/total_count*100:.1f}%)")
     
-    # Show most positive and most negative
-    if valid_results:
-        most_positive = max(valid_results, key=lambda x: x['confidence'] if x['sentiment'] == 'POSITIVE' else -1)
-        most_negative = max(valid_results, key=lambda x: x['confidence'] if x['sentiment'] == 'NEGATIVE' else -1)
-        
-        print(f"\nMost positive: \"{most_positive['text'][:50]}...\" ({most_positive['confidence']:.2f})")
-        print(f"Most negative: \"{most_negative['text'][:50]}...\" ({most_negative['confidence']:.2f})")
+    # Show most positive and most negative (the first valid line if a label never occurs)
+    def most(label):
+        rows = results.top(1, label=label)
+        return rows[0] if len(rows) else valid.argmax()
+    
+    most_positive, most_negative = most('POSITIVE'), most('NEGATIVE')
+    scores = results.column('score')
+    print(f"\nMost positive: \"{results.text(most_positive)[:50]}...\" ({scores[most_positive]:.2f})")
+    print(f"Most negative: \"{results.text(most_negative)[:50]}...\" ({scores[most_negative]:.2f})")
 
 # Sample text data
 sample_text = """Here is What to Know Beyond Why AT&T Inc. (T) is a Trending Stock
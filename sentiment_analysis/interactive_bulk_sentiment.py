@@ -1,53 +1,53 @@
-from transformers import pipeline
-import torch
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common.model_registry import get_classifier
+from common.async_repl import MicroBatcher, read_input, run_repl, sentiment_batch_fn
 
 # Load the sentiment analysis model
-device = 0 if torch.cuda.is_available() else -1
-classifier = pipeline(
-    "sentiment-analysis",
-    model="distilbert/distilbert-base-uncased-finetuned-sst-2-english",
-    device=device
-)
+classifier = get_classifier("sentiment")
 
-def interactive_sentiment_analyzer():
-    """Interactive sentiment analyzer for multi-line text input"""
+async def interactive_sentiment_analyzer_async():
+    """Analyze each line as soon as it is entered, printing results as they complete"""
     
     print("Interactive Bulk Sentiment Analyzer")
     print("Enter multiple lines of text (one per line)")
+    print("Each line is analyzed in the background while you keep typing")
     print("Press Enter twice to finish input")
     print("=" * 50)
     
-    lines = []
-    while True:
-        line = input(f"Line {len(lines) + 1}: ")
-        if line == "" and lines and lines[-1] == "":
-            # Two consecutive empty lines - finish input
-            lines.pop()  # Remove the last empty line
-            break
-        elif line == "" and not lines:
-            # First line is empty - continue
-            continue
-        else:
-            lines.append(line)
-    
-    if not lines:
-        print("No text entered.")
-        return
-    
-    print(f"\nAnalyzing {len(lines)} lines...")
-    print("=" * 50)
-    
+    batcher = MicroBatcher(sentiment_batch_fn(classifier))
     results = []
+    state = {'count': 0, 'previous_empty': False}
     
-    for i, line in enumerate(lines, 1):
+    async def next_line():
+        while True:
+            line = await read_input(f"Line {state['count'] + 1}: ")
+            if line is None:
+                return None
+            if line == "":
+                if state['previous_empty']:
+                    # Two consecutive empty lines - finish input
+                    return None
+                # First line is empty - continue
+                state['previous_empty'] = bool(state['count'])
+                continue
+            state['previous_empty'] = False
+            state['count'] += 1
+            return state['count'], line
+    
+    async def analyze_line(request):
+        i, line = request
         try:
-            # Analyze sentiment for this line
-            result = classifier(line)[0]
+            # Analyze sentiment for this line; concurrent lines share a batch
+            result = await batcher.submit(line)
             label = result['label']
             score = result['score']
             
-            print(f"{i:2d}. {line[:70]}{'...' if len(line) > 70 else ''}")
-            print(f"    Sentiment: {label} (confidence: {score:.2f})")
+            print(f"\n{i:2d}. {line[:70]}{'...' if len(line) > 70 else ''}\n"
+                  f"    Sentiment: {label} (confidence: {score:.2f})")
             
             results.append({
                 'line_number': i,
@@ -57,8 +57,8 @@ def interactive_sentiment_analyzer():
             })
             
         except Exception as e:
-            print(f"{i:2d}. {line[:70]}{'...' if len(line) > 70 else ''}")
-            print(f"    Error: {str(e)}")
+            print(f"\n{i:2d}. {line[:70]}{'...' if len(line) > 70 else ''}\n"
+                  f"    Error: {str(e)}")
             
             results.append({
                 'line_number': i,
@@ -68,9 +68,21 @@ def interactive_sentiment_analyzer():
                 'error': str(e)
             })
     
+    await run_repl(next_line, analyze_line)
+    await batcher.close()
+    
+    if not results:
+        print("No text entered.")
+        return
+    
     # Provide summary
+    results.sort(key=lambda r: r['line_number'])
     summarize_results(results)
 
+def interactive_sentiment_analyzer():
+    """Interactive sentiment analyzer for multi-line text input"""
+    asyncio.run(interactive_sentiment_analyzer_async())
+
 def summarize_results(results):
     """Provide a summary of sentiment analysis results"""
     
@@ -1,13 +1,11 @@
-from transformers import pipeline
-import torch
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common.model_registry import get_classifier
 
 # Load the model (downloads on first run; uses GPU if available)
-device = 0 if torch.cuda.is_available() else -1  # 0 = GPU, -1 = CPU
-classifier = pipeline(
-    "sentiment-analysis",
-    model="distilbert/distilbert-base-uncased-finetuned-sst-2-english",
-    device=device  # Moves model to GPU
-)
+classifier = get_classifier("sentiment")
 
 print("Model loaded successfully!")
 
@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""
+Find stored texts similar to a query, or build an index over an embedding store
+Usage: python similar_texts.py <store_dir> "<query text>" [k]
+       python similar_texts.py <store_dir> --build-index [ivf|hnsw]
+
+Stores are written by analyze_file.py --store and by batch_website_classifier.py
+(WEBSITE_EMBEDDING_STORE). The query is encoded with the model the store was built with.
+"""
+
+import sys
+import os
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common.model_registry import get_classifier
+from common.embedding_store import EmbeddingStore, build_hnsw_index, build_ivf_index
+from common.text_embeddings import encode_texts
+
+def find_similar(store_dir, query, k=5):
+    """Print the k stored texts most similar to the query"""
+    store = EmbeddingStore(store_dir)
+    if not len(store):
+        print(f"Embedding store '{store_dir}' is empty.")
+        return []
+    
+    classifier = get_classifier(store.model or "sentiment")
+    vector = encode_texts(classifier.model, classifier.tokenizer, [query])
+    
+    start = time.perf_counter()
+    matches = store.search(vector, k=k)[0]
+    elapsed = time.perf_counter() - start
+    
+    print(f"Top {len(matches)} of {len(store)} stored texts ({type(store.index()).__name__}, {elapsed * 1000:.1f} ms)")
+    print("=" * 60)
+    for item_id, label, score, similarity, row in matches:
+        print(f"{similarity:.3f}  {label} ({score:.2f})  {store.text(row)}")
+    return matches
+
+def build_index(store_dir, kind='ivf'):
+    """Build an IVF or HNSW index for faster searches"""
+    store = EmbeddingStore(store_dir)
+    if not len(store):
+        print(f"Embedding store '{store_dir}' is empty.")
+        return
+    
+    start = time.perf_counter()
+    if kind == 'hnsw':
+        build_hnsw_index(store)
+    else:
+        build_ivf_index(store)
+    print(f"Built {kind} index over {len(store)} rows in {time.perf_counter() - start:.1f}s")
+
+if __name__ == "__main__":
+    if len(sys.argv) < 3:
+        print('Usage: python similar_texts.py <store_dir> "<query text>" [k]')
+        print("       python similar_texts.py <store_dir> --build-index [ivf|hnsw]")
+        sys.exit(1)
+    
+    store_dir = sys.argv[1]
+    if sys.argv[2] == '--build-index':
+        build_index(store_dir, sys.argv[3] if len(sys.argv) > 3 else 'ivf')
+    else:
+        k = int(sys.argv[3]) if len(sys.argv) > 3 else 5
+        find_similar(store_dir, sys.argv[2], k)
@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+"""
+Score a stream of headlines as they arrive, shedding load to a fast fallback in bursts
+Usage: python stream_sentiment.py [input_file|-] [output_file] [--deadline 0.5] [--max-queue 1000] [--rescore] [--no-shed]
+
+Lines are read from input_file, or from stdin when it is '-' or missing (for
+example `tail -f headlines.txt | python stream_sentiment.py - live.csv`), and
+scored by the sentiment model in micro-batches. When lines arrive faster than
+the model can answer within --deadline seconds, or more than --max-queue
+lines are waiting, the extra lines are scored by the lexicon fallback instead
+(common/load_shedding.py) and tagged model=fallback. Labels and scores keep
+the usual POSITIVE/NEGATIVE format.
+
+With --rescore, fallback lines are scored again by the model once the burst
+is over (and at the end of the input); the new result is written as another
+row with the same line_number, which replaces the fallback row. --no-shed
+queues every line for the model, however long it takes.
+
+Rows go to output_file as CSV (line_number, sentiment, confidence, model,
+latency, text), or are printed one per line.
+"""
+
+import asyncio
+import csv
+import os
+import sys
+import time
+from collections import Counter
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common.model_registry import get_classifier
+from common.async_repl import MicroBatcher, run_repl, sentiment_batch_fn
+from common.load_shedding import DEADLINE, MAX_QUEUE, LoadShedder
+from common.cli import pop_option
+
+MODEL_NAME = "sentiment"
+OUTPUT_FIELDS = ['line_number', 'sentiment', 'confidence', 'model', 'latency', 'text']
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(int(q * len(values)), len(values) - 1)] if values else 0.0
+
+def warm_up(classifier, batcher):
+    """Run one batch so the shedder knows the model's speed before the first burst"""
+    texts = ["Markets open higher after the earnings report"] * batcher.max_batch_size
+    start = time.perf_counter()
+    batcher.batch_fn(None, texts)
+    if batcher.shedder is not None:
+        batcher.shedder.observe(len(texts), time.perf_counter() - start)
+
+async def stream_sentiment_async(input_file=None, output_file=None, deadline=DEADLINE, max_queue=MAX_QUEUE,
+                                 rescore=False, shed=True):
+    """Score lines as they are read; returns label and model counts"""
+    classifier = get_classifier(MODEL_NAME)
+    stream = sys.stdin if input_file in (None, '-') else open(input_file, 'r', encoding='utf-8')
+    out = open(output_file, 'w', newline='', encoding='utf-8') if output_file else None
+    writer = csv.writer(out) if out else None
+    if writer:
+        writer.writerow(OUTPUT_FIELDS)
+
+    labels = Counter()
+    models = Counter()
+    latencies = {'model': [], 'fallback': []}
+    fallback_labels = {}
+    agreed = Counter()
+    lines = {}
+
+    def emit(i, text, result, model, latency, rescored=False):
+        if writer:
+            writer.writerow([i, result['label'], result['score'], model, f"{latency:.4f}", text])
+            out.flush()
+        else:
+            preview = f"{text[:60]}{'...' if len(text) > 60 else ''}"
+            tag = 'rescored' if rescored else model
+            print(f"{i:3d}. {result['label']} ({result['score']:.2f}) [{tag}] - {preview}")
+
+    def rescored(tag, result):
+        i, arrived = tag
+        text = lines.pop(i)
+        previous = fallback_labels.pop(i)
+        agreed[previous == result['label']] += 1
+        labels[previous] -= 1
+        labels[result['label']] += 1
+        emit(i, text, result, MODEL_NAME, time.monotonic() - arrived, rescored=True)
+
+    shedder = LoadShedder(deadline=deadline, max_queue=max_queue, rescore=rescore, on_rescore=rescored) if shed else None
+    batcher = MicroBatcher(sentiment_batch_fn(classifier), shedder=shedder)
+    warm_up(classifier, batcher)
+    if shedder is not None:
+        print(f"Model: {1 / shedder.seconds_per_item:.0f} lines/sec; fallback after {deadline}s "
+              f"or {max_queue} waiting lines ({os.path.basename(getattr(shedder.fallback, 'path', 'lexicon'))})",
+              file=sys.stderr)
+
+    loop = asyncio.get_running_loop()
+    state = {'count': 0}
+
+    async def next_line():
+        while True:
+            line = await loop.run_in_executor(None, stream.readline)
+            if not line:
+                return None
+            line = line.strip()
+            if line:
+                state['count'] += 1
+                return state['count'], line, time.monotonic()
+
+    async def analyze_line(request):
+        i, line, arrived = request
+        try:
+            result = await batcher.submit(line, tag=(i, arrived))
+        except Exception as e:
+            result = {'label': 'Error', 'score': 0.0}
+            print(f"{i:3d}. Error: {str(e)}", file=sys.stderr)
+        latency = time.monotonic() - arrived
+        model = result.get('model', MODEL_NAME)
+        if model == 'fallback':
+            latencies['fallback'].append(latency)
+            if rescore:
+                fallback_labels[i] = result['label']
+                lines[i] = line
+        else:
+            latencies['model'].append(latency)
+        labels[result['label']] += 1
+        models[model] += 1
+        emit(i, line, result, model, latency)
+
+    start = time.monotonic()
+    try:
+        await run_repl(next_line, analyze_line, max_pending=max_queue * 2 + batcher.max_batch_size)
+        await batcher.close()
+    finally:
+        if stream is not sys.stdin:
+            stream.close()
+        if out:
+            out.close()
+    elapsed = time.monotonic() - start
+
+    total = sum(models.values())
+    if not total:
+        print("No lines read.")
+        return None
+    print(f"\nSUMMARY:")
+    print(f"  Lines: {total} in {elapsed:.1f}s ({total / max(elapsed, 1e-9):.0f} lines/sec)")
+    for model in ('model', 'fallback'):
+        values = latencies[model]
+        if values:
+            print(f"  Scored by the {model}: {len(values)} ({len(values) / total:.1%}), latency "
+                  f"p50 {percentile(values, 0.5):.3f}s, p95 {percentile(values, 0.95):.3f}s, "
+                  f"max {max(values):.3f}s")
+    if rescore and sum(agreed.values()):
+        print(f"  Rescored by the model: {sum(agreed.values())}, fallback agreed on "
+              f"{agreed[True] / sum(agreed.values()):.1%}")
+    for label in ('POSITIVE', 'NEGATIVE'):
+        print(f"  {label.capitalize()} sentiment: {labels[label]} ({labels[label] / total * 100:.1f}%)")
+    if output_file:
+        print(f"\nResults saved to {output_file}")
+    return {'lines': total, 'labels': dict(labels), 'models': dict(models)}
+
+def stream_sentiment(input_file=None, output_file=None, deadline=DEADLINE, max_queue=MAX_QUEUE,
+                     rescore=False, shed=True):
+    """Score a stream of lines with load shedding"""
+    try:
+        return asyncio.run(stream_sentiment_async(input_file, output_file, deadline, max_queue, rescore, shed))
+    except FileNotFoundError:
+        print(f"Error: File '{input_file}' not found.")
+        return None
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    rescore = '--rescore' in args
+    shed = '--no-shed' not in args
+    args = [arg for arg in args if arg not in ('--rescore', '--no-shed')]
+    try:
+        deadline = float(pop_option(args, '--deadline', DEADLINE))
+        max_queue = int(pop_option(args, '--max-queue', MAX_QUEUE))
+    except ValueError as e:
+        print(f"Error: {str(e)}")
+        args = ['--help']
+
+    if args[:1] in (['--help'], ['-h']):
+        print("Usage: python stream_sentiment.py [input_file|-] [output_file] [--deadline 0.5] [--max-queue 1000] "
+              "[--rescore] [--no-shed]")
+        print("Example: tail -f headlines.txt | python stream_sentiment.py - live.csv --rescore")
+        sys.exit(1)
+
+    input_file = args[0] if args else None
+    output_file = args[1] if len(args) > 1 else None
+    stream_sentiment(input_file, output_file, deadline, max_queue, rescore, shed)
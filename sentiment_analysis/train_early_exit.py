@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+Train early-exit heads for the DistilBERT sentiment model on our own corpus
+Usage: python train_early_exit.py <corpus_file> [heads_file] [--epochs 5] [--max-lines 20000] [--report]
+
+Every line of <corpus_file> is run through the full model once; the [CLS]
+state after each intermediate layer is kept and one small head per layer is
+trained to reproduce the full model's output. A held-out 20% of the lines is
+then used to report, for several confidence thresholds, the average number
+of layers used, how often the early-exit label matches the full model and
+the speedup. With --report, existing heads are only evaluated on the file.
+
+Heads are written to the "exit_heads" path of the sentiment-early-exit
+entry in models.json unless [heads_file] is given.
+"""
+
+import sys
+import os
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common.model_registry import get_classifier, get_registry
+from common.early_exit import ExitHeads, layer_features, train_exit_heads
+from common.cli import pop_option, read_lines
+
+MODEL_NAME = "sentiment-early-exit"
+REPORT_THRESHOLDS = (0.8, 0.9, 0.95, 0.99)
+
+def timed_predict(classifier, texts, threshold):
+    """Return (probabilities, exit layers, seconds)"""
+    start = time.perf_counter()
+    probs, exit_layers = classifier.predict(texts, threshold)
+    return probs, exit_layers, time.perf_counter() - start
+
+def exit_report(classifier, texts, thresholds=REPORT_THRESHOLDS):
+    """Print layers used, agreement with the full model and speedup per threshold"""
+    n_layers = classifier.model.config.n_layers
+    classifier.predict(texts[:32], float('inf'))   # untimed warmup
+    # A threshold above 1 never exits early, which gives the full model's answers
+    full_probs, _, full_time = timed_predict(classifier, texts, float('inf'))
+    full_labels = full_probs.argmax(dim=-1)
+
+    print(f"Full model: {n_layers} layers, {len(texts) / full_time:.1f} lines/sec")
+    print(f"{'threshold':>9}  {'avg layers':>10}  {'agreement':>9}  {'speedup':>7}  exits per layer")
+    for threshold in thresholds:
+        probs, exit_layers, elapsed = timed_predict(classifier, texts, threshold)
+        agreement = (probs.argmax(dim=-1) == full_labels).float().mean().item()
+        exits = [int((exit_layers == layer).sum()) for layer in range(1, n_layers + 1)]
+        print(f"{threshold:>9.2f}  {exit_layers.float().mean().item():>10.2f}  {agreement:>9.1%}  "
+              f"{full_time / elapsed:>6.2f}x  {' '.join(str(n) for n in exits)}")
+
+def train(corpus_file, heads_file=None, epochs=5, max_lines=20000, holdout_fraction=0.2):
+    """Train, evaluate on held-out lines and save exit heads"""
+    try:
+        lines = read_lines(corpus_file, max_lines)
+    except FileNotFoundError:
+        print(f"Error: File '{corpus_file}' not found.")
+        return None
+
+    if not lines:
+        print("No lines found.")
+        return None
+
+    classifier = get_classifier(MODEL_NAME)
+    heads_file = heads_file or get_registry().spec(MODEL_NAME).get('exit_heads')
+    holdout_size = int(len(lines) * holdout_fraction)
+    holdout, training = lines[:holdout_size], lines[holdout_size:]
+
+    print(f"Training early-exit heads on {len(training)} lines ({len(holdout)} held out)")
+    print("=" * 60)
+
+    start = time.perf_counter()
+    features, targets = layer_features(classifier.model, classifier.tokenizer, training)
+    print(f"Collected layer states in {time.perf_counter() - start:.1f}s")
+    heads = train_exit_heads(classifier.model, features, targets, epochs)
+    heads.save(heads_file)
+    print(f"Exit heads saved to {heads_file}")
+
+    classifier.heads = heads.to(classifier.device)
+    print("\n" + "=" * 60)
+    if holdout:
+        print(f"EARLY EXIT ON {len(holdout)} HELD-OUT LINES")
+        print("=" * 60)
+        exit_report(classifier, holdout)
+    else:
+        print("EARLY EXIT ON TRAINING LINES (corpus too small for a holdout)")
+        print("=" * 60)
+        exit_report(classifier, training)
+    return heads
+
+def report(corpus_file, heads_file=None, max_lines=20000):
+    """Evaluate existing heads on a file"""
+    try:
+        lines = read_lines(corpus_file, max_lines)
+    except FileNotFoundError:
+        print(f"Error: File '{corpus_file}' not found.")
+        return
+
+    classifier = get_classifier(MODEL_NAME)
+    if heads_file:
+        classifier.heads = ExitHeads.load(heads_file, classifier.model).to(classifier.device)
+    if classifier.heads is None:
+        print("No exit heads to evaluate.")
+        return
+
+    print(f"EARLY EXIT ON {len(lines)} LINES FROM {corpus_file}")
+    print("=" * 60)
+    exit_report(classifier, lines)
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    report_only = '--report' in args
+    if report_only:
+        args.remove('--report')
+    try:
+        epochs = int(pop_option(args, '--epochs', 5))
+        max_lines = int(pop_option(args, '--max-lines', 20000))
+    except ValueError as e:
+        print(f"Error: {str(e)}")
+        args = []
+
+    if len(args) < 1:
+        print("Usage: python train_early_exit.py <corpus_file> [heads_file] [--epochs 5] [--max-lines 20000] [--report]")
+        print("Example: python train_early_exit.py sample_news.txt")
+        sys.exit(1)
+
+    heads_file = args[1] if len(args) > 1 else None
+    if report_only:
+        report(args[0], heads_file, max_lines)
+    else:
+        train(args[0], heads_file, epochs, max_lines)
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+Distill the load-shedding fallback lexicon from the DistilBERT sentiment model
+Usage: python train_fallback.py <corpus_file> [lexicon_file] [--max-lines 50000] [--min-count 3] [--report]
+
+Every line of <corpus_file> is scored once by the full model, and a logistic
+unigram/bigram lexicon (common/load_shedding.py) is fitted to its positive
+probability. A held-out 20% of the lines is then used to report how often
+the lexicon agrees with the model, next to the bundled seed lexicon, and how
+many lines per second each scores. With --report, an existing lexicon is
+only evaluated on the file.
+
+The lexicon is written to ~/.cache/bert-sentiment-tools/sentiment_lexicon.json,
+where the fallback picks it up, unless [lexicon_file] is given.
+"""
+
+import sys
+import os
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common.model_registry import get_classifier
+from common.load_shedding import SEED_LEXICON_PATH, TRAINED_LEXICON_PATH, LexiconScorer, lexicon_path, train_lexicon
+from common.cli import pop_option, read_lines
+
+MODEL_NAME = "sentiment"
+
+def model_targets(classifier, texts, batch_size=32):
+    """The model's probability of the second label for each text, and its lines/sec"""
+    positive = classifier.model.config.id2label[1]
+    start = time.perf_counter()
+    results = classifier(texts, batch_size=batch_size, truncation=True)
+    seconds = time.perf_counter() - start
+    targets = [r['score'] if r['label'] == positive else 1.0 - r['score'] for r in results]
+    return targets, len(texts) / seconds
+
+def fallback_report(scorers, texts, targets, model_speed):
+    """Print agreement with the model and speed for each lexicon"""
+    model_labels = [t >= 0.5 for t in targets]
+    print(f"{'lexicon':<10}  {'entries':>7}  {'agreement':>9}  {'lines/sec':>10}")
+    print(f"{'model':<10}  {'':>7}  {'100.0%':>9}  {model_speed:>10,.0f}")
+    repeated = texts * max(1, 200000 // max(len(texts), 1))
+    for name, scorer in scorers:
+        logits = scorer.logits(texts)
+        agreement = sum((l >= 0) == m for l, m in zip(logits.tolist(), model_labels)) / len(texts)
+        start = time.perf_counter()
+        for i in range(0, len(repeated), 10000):
+            scorer(repeated[i:i + 10000])
+        speed = len(repeated) / (time.perf_counter() - start)
+        print(f"{name:<10}  {len(scorer):>7}  {agreement:>9.1%}  {speed:>10,.0f}")
+
+def train(corpus_file, lexicon_file=None, max_lines=50000, min_count=3, holdout_fraction=0.2):
+    """Fit, evaluate on held-out lines and save the fallback lexicon"""
+    try:
+        lines = read_lines(corpus_file, max_lines)
+    except FileNotFoundError:
+        print(f"Error: File '{corpus_file}' not found.")
+        return None
+
+    if not lines:
+        print("No lines found.")
+        return None
+
+    classifier = get_classifier(MODEL_NAME)
+    lexicon_file = lexicon_file or TRAINED_LEXICON_PATH
+    holdout_size = int(len(lines) * holdout_fraction)
+    holdout, training = lines[:holdout_size], lines[holdout_size:]
+
+    print(f"Distilling the fallback lexicon from {len(training)} lines ({len(holdout)} held out)")
+    print("=" * 60)
+
+    targets, model_speed = model_targets(classifier, training)
+    print(f"Scored the training lines with the model ({model_speed:.1f} lines/sec)")
+    start = time.perf_counter()
+    labels = (classifier.model.config.id2label[0], classifier.model.config.id2label[1])
+    scorer = train_lexicon(training, targets, min_count=min_count, labels=labels)
+    print(f"Fitted {len(scorer)} unigram and bigram weights in {time.perf_counter() - start:.1f}s")
+    scorer.save(lexicon_file)
+    print(f"Lexicon saved to {lexicon_file}")
+
+    print("\n" + "=" * 60)
+    texts = holdout or training
+    print(f"FALLBACK ON {len(texts)} {'HELD-OUT' if holdout else 'TRAINING'} LINES")
+    print("=" * 60)
+    if holdout:
+        targets, model_speed = model_targets(classifier, holdout)
+    fallback_report([('seed', LexiconScorer.load(SEED_LEXICON_PATH)), ('trained', scorer)],
+                    texts, targets, model_speed)
+    return scorer
+
+def report(corpus_file, lexicon_file=None, max_lines=50000):
+    """Evaluate an existing lexicon on a file"""
+    try:
+        lines = read_lines(corpus_file, max_lines)
+    except FileNotFoundError:
+        print(f"Error: File '{corpus_file}' not found.")
+        return
+
+    path = os.path.expanduser(lexicon_file) if lexicon_file else lexicon_path()
+    if not os.path.exists(path):
+        print(f"No lexicon at {path}.")
+        return
+
+    classifier = get_classifier(MODEL_NAME)
+    print(f"FALLBACK ON {len(lines)} LINES FROM {corpus_file}")
+    print("=" * 60)
+    targets, model_speed = model_targets(classifier, lines)
+    fallback_report([('lexicon', LexiconScorer.load(path))], lines, targets, model_speed)
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    report_only = '--report' in args
+    if report_only:
+        args.remove('--report')
+    try:
+        max_lines = int(pop_option(args, '--max-lines', 50000))
+        min_count = int(pop_option(args, '--min-count', 3))
+    except ValueError as e:
+        print(f"Error: {str(e)}")
+        args = []
+
+    if len(args) < 1:
+        print("Usage: python train_fallback.py <corpus_file> [lexicon_file] [--max-lines 50000] [--min-count 3] [--report]")
+        print("Example: python train_fallback.py sample_news.txt")
+        sys.exit(1)
+
+    lexicon_file = args[1] if len(args) > 1 else None
+    if report_only:
+        report(args[0], lexicon_file, max_lines)
+    else:
+        train(args[0], lexicon_file, max_lines, min_count)
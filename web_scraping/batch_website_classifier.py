@@ -1,66 +1,85 @@
-import requests
-from bs4 import BeautifulSoup
+"""
+Classify websites by their page titles
+Usage:
+    python batch_website_classifier.py                   (URLs from urls.txt, results in classified_websites.csv)
+    python batch_website_classifier.py --archive PATH [PATH ...] [--output classified_archive.csv]
+
+--archive classifies pages from crawl archives instead of fetching them:
+WARC / WARC.gz files, saved .html files, or directories of either (see
+common/web_archive.py). Titles and meta descriptions are parsed in a process
+pool and classified in batches; the URL comes from each record.
+"""
+
 import time
-import random
-from transformers import pipeline
-import torch
-import csv
-
-# Load the zero-shot classifier
-device = 0 if torch.cuda.is_available() else -1
-classifier = pipeline(
-    "zero-shot-classification",
-    model="facebook/bart-large-mnli",
-    device=device
-)
-
-# Define website categories
-website_categories = [
-    "news", "entertainment", "shopping", "social_media", 
-    "educational", "blog", "government", "business",
-    "technology", "sports", "health", "travel"
-]
-
-# Headers to mimic a real browser
-headers = {
-    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
-    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
-    'Accept-Language': 'en-US,en;q=0.5',
-    'Accept-Encoding': 'gzip, deflate',
-    'Connection': 'keep-alive',
-    'Upgrade-Insecure-Requests': '1',
-}
-
-def scrape_title(url):
-    """Scrape the title from a given URL"""
+import os
+import sys
+from collections import Counter
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common.http_client import get_client, scrape_title
+from common.embedding_store import EmbeddingStore
+from common.text_embeddings import encode_texts
+from common.prefilter import get_prefilter
+from common.pipeline_runtime import PipelineError, Progress, Stage, print_stage_times, resolve_output_mode, run_pipeline
+from common.result_store import ResultStore, ResultWriter
+from common.web_archive import PageParser, iter_pages
+from common.website_student import (CLASSIFIER_BACKEND, ERROR_TITLES, WEBSITE_CATEGORIES, build_classification,
+                                    classify_titles, classify_website, zero_shot_classifier)
+from common.cli import pop_option
+from domain_index import RecheckPolicy, get_index
+
+# Optional embedding store: titles near-identical to past ones reuse their label
+EMBEDDING_STORE_DIR = os.environ.get('WEBSITE_EMBEDDING_STORE')
+SIMILARITY_THRESHOLD = float(os.environ.get('WEBSITE_SIMILARITY_THRESHOLD', '0.97'))
+
+# Titles not worth classifying (scrape errors, error pages, non-English); WEBSITE_PREFILTER=0 disables
+title_prefilter = get_prefilter("website-title") if os.environ.get('WEBSITE_PREFILTER', '1') != '0' else None
+
+# Concurrent page fetches, and per-URL output: auto, lines, progress or quiet
+FETCH_WORKERS = int(os.environ.get('WEBSITE_FETCH_WORKERS', '4'))
+OUTPUT_MODE = os.environ.get('WEBSITE_OUTPUT', 'auto')
+
+# (title, category) pairs per zero-shot forward pass when titles are classified in batches
+BATCH_SIZE = int(os.environ.get('WEBSITE_BATCH_SIZE', '32'))
+
+def classify_websites(titles, backend=None, classifier=None):
+    """Classify a batch of titles with one model call; one result (or error string) per title"""
+    backend = backend or CLASSIFIER_BACKEND
+    unique = sorted(set(titles), key=len)
+    if len(unique) <= 1:
+        return [classify_website(unique[0], backend, classifier)] * len(titles) if unique else []
     try:
-        # Add random delay to be respectful to servers
-        time.sleep(random.uniform(1, 3))
-        
-        response = requests.get(url, headers=headers, timeout=10)
-        response.raise_for_status()
-        
-        soup = BeautifulSoup(response.content, 'html.parser')
-        title_tag = soup.find('title')
-        
-        if title_tag:
-            return title_tag.get_text().strip()
-        else:
-            return "No title found"
-    except Exception as e:
-        return f"Error scraping title: {str(e)}"
+        results = classify_titles(unique, backend, batch_size=BATCH_SIZE, classifier=classifier)
+        if isinstance(results, dict):
+            results = [results]
+    except Exception:
+        # Retry one title at a time so a bad title only fails itself
+        return [classify_website(title, backend, classifier) for title in titles]
+    by_title = {title: build_classification(result) for title, result in zip(unique, results)}
+    return [by_title[title] for title in titles]
 
-def classify_website(title):
-    """Classify website type based on its title"""
+def classify_website_with_store(title, store, threshold=SIMILARITY_THRESHOLD):
+    """Classify a title, reusing the label of a near-identical past title"""
     try:
-        result = classifier(title, website_categories)
-        return {
-            'best_match': result['labels'][0],
-            'confidence': result['scores'][0],
-            'all_scores': dict(zip(result['labels'], result['scores']))
-        }
+        zero_shot = zero_shot_classifier('zero-shot')
+        vector = encode_texts(zero_shot.model, zero_shot.tokenizer, [title])
+        match = store.lookup_label(vector[0], threshold)
     except Exception as e:
         return f"Error classifying website: {str(e)}"
+    
+    if match:
+        item_id, label, score, similarity, row = match
+        return {
+            'best_match': label,
+            'confidence': score,
+            'all_scores': {label: score},
+            'reused_from': item_id
+        }
+    
+    classification = classify_website(title)
+    if isinstance(classification, dict):
+        store.add([title], vector, [classification['best_match']], [classification['confidence']])
+    return classification
 
 def read_urls_from_file(filename):
     """Read URLs from a text file (one URL per line)"""
@@ -72,98 +91,318 @@ def read_urls_from_file(filename):
         print(f"File {filename} not found.")
         return []
 
+# Columns of the results file (.parquet output needs pyarrow, anything else is CSV)
+RESULT_COLUMNS = [('url', 'url'), ('title', 'title'), ('category', 'label'), ('confidence', 'score'),
+                  ('skip_reason', 'skip_reason')]
+ARCHIVE_COLUMNS = [('url', 'url'), ('title', 'title'), ('description', 'description'), ('category', 'label'),
+                   ('confidence', 'score'), ('skip_reason', 'skip_reason')]
+
+def new_result_store(text_columns=('url', 'title')):
+    """Columns for processed URLs: category, confidence, every category's score and where the answer came from"""
+    return ResultStore(labels=WEBSITE_CATEGORIES + ['Skipped', 'Error'], score_labels=WEBSITE_CATEGORIES,
+                       text_columns=text_columns, code_columns=('skip_reason', 'origin'))
+
 def save_results_to_csv(results, filename):
-    """Save results to a CSV file"""
-    with open(filename, 'w', newline='', encoding='utf-8') as csvfile:
-        fieldnames = ['url', 'title', 'category', 'confidence']
-        writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-        
-        writer.writeheader()
-        for result in results:
-            if isinstance(result['classification'], dict):
-                writer.writerow({
-                    'url': result['url'],
-                    'title': result['title'],
-                    'category': result['classification']['best_match'],
-                    'confidence': result['classification']['confidence']
-                })
+    """Save results to a CSV file (or Parquet, for a .parquet filename)"""
+    writer = ResultWriter(filename, results, RESULT_COLUMNS)
+    writer.close()
+
+def fetch_stage(index=None, policy=None, prefilter=None):
+    """Pipeline stage function: answers known domains from the index, else scrapes and prefilters the title"""
+    def fetch(records):
+        for record in records:
+            match = index.lookup(record['url']) if index is not None else None
+            if match and policy.trusted(match[1]):
+                prefix, entry = match
+                record['classification'] = {
+                    'best_match': entry['category'],
+                    'confidence': entry['confidence'],
+                    'all_scores': {entry['category']: entry['confidence']},
+                    'from_index': prefix
+                }
+                continue
+            
+            # Scrape title; titles not worth a model call are skipped
+            record['title'] = scrape_title(record['url'])
+            if prefilter is not None:
+                record['skip_reason'] = prefilter.reasons([record['title']])[0] or ''
+        return records
+    return fetch
+
+def classify_stage(store=None, classifier=None, backend=None):
+    """Pipeline stage function: classifies the records' titles, a chunk per model call"""
+    def classify(records):
+        batch = []
+        for record in records:
+            if 'classification' in record:
+                continue
+            title = record['title']
+            if record['skip_reason']:
+                record['classification'] = f"Skipped ({record['skip_reason']})"
+            elif store is not None and not title.startswith(ERROR_TITLES):
+                record['classification'] = classify_website_with_store(title, store)
             else:
-                writer.writerow({
-                    'url': result['url'],
-                    'title': result['title'],
-                    'category': 'Error',
-                    'confidence': 0.0
-                })
+                batch.append(record)
+        for record, classification in zip(batch, classify_websites([r['title'] for r in batch], backend, classifier)):
+            record['classification'] = classification
+        return records
+    return classify
+
+def outcome(record):
+    """(category, confidence, all scores, origin) of a classified record; 'Skipped' or 'Error' if it has none"""
+    classification = record['classification']
+    if isinstance(classification, dict):
+        origin = 'index' if 'from_index' in classification else 'store' if 'reused_from' in classification else 'model'
+        return classification['best_match'], classification['confidence'], classification['all_scores'], origin
+    return 'Skipped' if record['skip_reason'] else 'Error', 0.0, {}, ''
+
+def learn(index, record):
+    """Add a page the model classified to the domain index (never one that failed to scrape)"""
+    classification = record['classification']
+    if record['title'].startswith(ERROR_TITLES):
+        return
+    if isinstance(classification, dict) and not {'from_index', 'reused_from'} & set(classification):
+        index.record(record['url'], classification['best_match'], classification['confidence'], record['title'])
+
+def result_sink(results, output_mode, index=None, writer=None, counts=None):
+    """Pipeline sink: prints classified records, adds them to results and the domain index, writes the file"""
+    counts = counts if counts is not None else Counter()
+    text_columns = list(results.texts)
+    
+    def write_results(records):
+        columns = {name: [] for name in ['id', 'label', 'score', 'scores', 'skip_reason', 'origin'] + text_columns}
+        for record in records:
+            i, url, classification = record['number'], record['url'], record['classification']
+            from_index = isinstance(classification, dict) and 'from_index' in classification
+            if output_mode == 'lines':
+                print(f"\n{i}. Processing: {url}")
+                if not from_index:
+                    print(f"   Title: {record['title']}")
+            
+            if from_index:
+                counts['index'] += 1
+                if output_mode == 'lines':
+                    print(f"   Category: {classification['best_match']} (confidence: {classification['confidence']:.2f}) "
+                          f"[known domain {classification['from_index']}]")
+            elif isinstance(classification, dict):
+                if output_mode == 'lines':
+                    reused = f" [reused from '{classification['reused_from']}']" if 'reused_from' in classification else ""
+                    print(f"   Category: {classification['best_match']} (confidence: {classification['confidence']:.2f}){reused}")
+            elif output_mode == 'lines':
+                print(f"   {classification}")
+            if index is not None:
+                learn(index, record)
+            
+            label, score, all_scores, origin = outcome(record)
+            counts[label] += 1
+            columns['id'].append(i)
+            columns['label'].append(label)
+            columns['score'].append(score)
+            columns['scores'].append([all_scores.get(category, float('nan')) for category in WEBSITE_CATEGORIES])
+            for name in text_columns:
+                columns[name].append(record.get(name, ''))
+            columns['skip_reason'].append(record['skip_reason'] if label == 'Skipped' else '')
+            columns['origin'].append(origin)
+        results.append(columns.pop('id'), columns.pop('label'), columns.pop('score'), columns.pop('scores'), **columns)
+        if writer:
+            writer.write()
+    return write_results
+
+def process_urls(urls, output_file=None, store_dir=EMBEDDING_STORE_DIR, index=None):
+    """Process a list of URLs
 
-def process_urls(urls, output_file=None):
-    """Process a list of URLs"""
-    results = []
+    Fetching runs on WEBSITE_FETCH_WORKERS threads, classification on one
+    inference thread and printing/CSV writing on the calling thread, all
+    overlapping (see common/pipeline_runtime.py). Returns a ResultStore in
+    input order (origin is 'model', 'store' or 'index').
+    """
+    results = new_result_store()
+    output_mode = resolve_output_mode(OUTPUT_MODE, len(urls))
+    
+    # Load the zero-shot classifier (skipped when the student backend is selected)
+    classifier = zero_shot_classifier()
+    
+    # Known domains are answered from the domain index without fetching or classifying
+    index = index if index is not None else get_index()
+    policy = RecheckPolicy.from_env()
+    
+    # The store holds BART encoder embeddings, so it only applies to the zero-shot backend
+    store = None
+    if store_dir and CLASSIFIER_BACKEND == 'zero-shot':
+        store = EmbeddingStore(store_dir, model="zero-shot")
     
     print("Website Classifier - Processing URLs")
     print("=" * 50)
     
-    for i, url in enumerate(urls, 1):
-        print(f"\n{i}. Processing: {url}")
-        
-        # Scrape title
-        title = scrape_title(url)
-        print(f"   Title: {title}")
-        
-        # Classify website type
-        classification = classify_website(title)
-        if isinstance(classification, dict):
-            print(f"   Category: {classification['best_match']} (confidence: {classification['confidence']:.2f})")
-        else:
-            print(f"   {classification}")
-        
-        results.append({
-            'url': url,
-            'title': title,
-            'classification': classification
-        })
+    try:
+        writer = ResultWriter(output_file, results, RESULT_COLUMNS) if output_file else None
+    except Exception as e:
+        print(f"Error opening output file: {str(e)}")
+        return results
+    counts = Counter()
+    
+    items = ({'number': i, 'url': url, 'title': '', 'skip_reason': ''} for i, url in enumerate(urls, 1))
+    stages = [Stage('fetch', fetch_stage(index, policy, title_prefilter), workers=FETCH_WORKERS),
+              Stage('classify', classify_stage(store, classifier))]
+    write_results = result_sink(results, output_mode, index, writer, counts)
+    start = time.monotonic()
+    progress = Progress(len(urls), unit='urls', enabled=output_mode == 'progress')
+    try:
+        # One URL per chunk, so a slow site only holds up its own fetch worker
+        run_pipeline(items, stages, write_results, chunk_size=1, queue_size=FETCH_WORKERS * 2, progress=progress)
+    except PipelineError as e:
+        print(f"Error: {str(e)}")
+    finally:
+        if writer:
+            writer.close()
+    
+    if store is not None:
+        store.flush()
+    
+    if index is not None:
+        print(f"\nDomain index: {counts['index']} of {len(urls)} URLs answered without fetching ({len(index)} prefixes known)")
+        if index.dirty:
+            index.save()
+    
+    # Connection reuse, DNS cache hits, bytes read and fetch latency of the shared HTTP client
+    if get_client().stats.requests:
+        print(f"\n{get_client().summary()}")
+    
+    # With a logit cache only new (title, category) pairs ran through the model
+    if hasattr(classifier, 'hit_rate'):
+        print(f"\nZero-shot logit cache: {classifier.hits} cached pairs, {classifier.misses} computed")
     
-    # Save to CSV if output file specified
     if output_file:
-        save_results_to_csv(results, output_file)
         print(f"\nResults saved to {output_file}")
+    print_stage_times(stages, time.monotonic() - start)
     
     return results
 
-if __name__ == "__main__":
-    # Example usage
-    print("Website Classifier - Batch Mode")
-    print("1. Create a file named 'urls.txt' with one URL per line")
-    print("2. Run this script to process all URLs")
+def process_archives(paths, output_file=None, store_dir=EMBEDDING_STORE_DIR, chunk_size=64):
+    """Classify the pages of WARC files, saved HTML files and directories of either
+
+    Records are read on the calling thread, titles and descriptions parsed in
+    a process pool (WEBSITE_PARSE_WORKERS) and each chunk of titles classified
+    with one model call. No page is fetched, and the domain index is neither
+    read nor updated. Returns a ResultStore with a description column.
+    """
+    results = new_result_store(text_columns=('url', 'title', 'description'))
+    output_mode = resolve_output_mode(OUTPUT_MODE, None)
+    classifier = zero_shot_classifier()
+    
+    store = None
+    if store_dir and CLASSIFIER_BACKEND == 'zero-shot':
+        store = EmbeddingStore(store_dir, model="zero-shot")
+    
+    print("Website Classifier - Processing Archives")
     print("=" * 50)
     
-    # Read URLs from file
-    urls = read_urls_from_file('urls.txt')
+    def prefilter(records):
+        if title_prefilter is not None:
+            for record, reason in zip(records, title_prefilter.reasons([r['title'] for r in records])):
+                record['skip_reason'] = reason or ''
+        return records
     
-    if urls:
-        # Process URLs and save results to CSV
-        results = process_urls(urls, 'classified_websites.csv')
-        
-        # Print summary
-        print("\n" + "=" * 50)
-        print("SUMMARY")
-        print("=" * 50)
-        for result in results:
-            if isinstance(result['classification'], dict):
-                print(f"{result['url']} -> {result['classification']['best_match']} ({result['classification']['confidence']:.2f})")
-            else:
-                print(f"{result['url']} -> Error in classification")
+    def parse_then_filter(records):
+        return prefilter(parser(records))
+    
+    stats = Counter()
+    parser = PageParser()
+    try:
+        writer = ResultWriter(output_file, results, ARCHIVE_COLUMNS) if output_file else None
+    except Exception as e:
+        print(f"Error opening output file: {str(e)}")
+        return results
+    counts = Counter()
+    
+    items = (dict(page, number=i, title='', description='', skip_reason='')
+             for i, page in enumerate(iter_pages(paths, stats), 1))
+    stages = [Stage('parse', parse_then_filter, workers=max(1, parser.workers)),
+              Stage('classify', classify_stage(store, classifier))]
+    write_results = result_sink(results, output_mode, writer=writer, counts=counts)
+    start = time.monotonic()
+    progress = Progress(None, unit='pages', enabled=output_mode == 'progress')
+    try:
+        run_pipeline(items, stages, write_results, chunk_size=chunk_size, queue_size=max(2, parser.workers * 2),
+                     progress=progress)
+    except PipelineError as e:
+        print(f"Error: {str(e)}")
+    finally:
+        parser.close()
+        if writer:
+            writer.close()
+    
+    if store is not None:
+        store.flush()
+    
+    print(f"\nArchives: {stats['records']} records read, {stats['pages']} HTML pages "
+          f"({stats['not_2xx']} non-2xx and {stats['not_html']} non-HTML responses left out)")
+    if counts:
+        print("Categories: " + ", ".join(f"{label} {n}" for label, n in counts.most_common()))
+    
+    if hasattr(classifier, 'hit_rate'):
+        print(f"\nZero-shot logit cache: {classifier.hits} cached pairs, {classifier.misses} computed")
+    
+    if output_file:
+        print(f"\nResults saved to {output_file}")
+    print_stage_times(stages, time.monotonic() - start)
+    
+    return results
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    if '--archive' in args:
+        try:
+            output_file = pop_option(args, '--output', 'classified_archive.csv')
+        except ValueError as e:
+            print(f"Error: {str(e)}")
+            sys.exit(1)
+        args.remove('--archive')
+        missing = [path for path in args if not os.path.exists(path)]
+        if not args or missing:
+            if missing:
+                print(f"Error: not found: {', '.join(missing)}")
+            print("Usage: python batch_website_classifier.py --archive PATH [PATH ...] [--output classified_archive.csv]")
+            print("Example: python batch_website_classifier.py --archive crawl.warc.gz saved_pages/")
+            sys.exit(1)
+        process_archives(args, output_file)
     else:
-        print("\nNo URLs found in urls.txt. Creating a sample file...")
-        sample_urls = [
-            "https://www.bbc.com/news",
-            "https://www.amazon.com",
-            "https://www.github.com",
-            "https://www.reddit.com",
-            "https://www.coursera.org"
-        ]
+        # Example usage
+        print("Website Classifier - Batch Mode")
+        print("1. Create a file named 'urls.txt' with one URL per line")
+        print("2. Run this script to process all URLs")
+        print("=" * 50)
+        
+        # Read URLs from file
+        urls = read_urls_from_file('urls.txt')
+        
+        if urls:
+            # Process URLs and save results to CSV
+            results = process_urls(urls, 'classified_websites.csv')
+        
+            # Print summary
+            print("\n" + "=" * 50)
+            print("SUMMARY")
+            print("=" * 50)
+            for result in results:
+                if result['label'] == 'Skipped':
+                    print(f"{result['url']} -> Skipped ({result['skip_reason']})")
+                elif result['label'] == 'Error':
+                    print(f"{result['url']} -> Error in classification")
+                else:
+                    print(f"{result['url']} -> {result['label']} ({result['score']:.2f})")
+        else:
+            print("\nNo URLs found in urls.txt. Creating a sample file...")
+            sample_urls = [
+                "https://www.bbc.com/news",
+                "https://www.amazon.com",
+                "https://www.github.com",
+                "https://www.reddit.com",
+                "https://www.coursera.org"
+            ]
         
-        with open('urls.txt', 'w') as f:
-            for url in sample_urls:
-                f.write(url + '\n')
+            with open('urls.txt', 'w') as f:
+                for url in sample_urls:
+                    f.write(url + '\n')
         
-        print("Created sample urls.txt file. Run this script again to process these URLs.")
\ No newline at end of file
+            print("Created sample urls.txt file. Run this script again to process these URLs.")
@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""
+Distill the zero-shot website classifier into a fast hashed n-gram student
+Usage: python distill_website_classifier.py <titles_file> [student_file]
+
+<titles_file> is a text file with one title per line, or a CSV with a 'title'
+column (e.g. classified_websites.csv). Teacher scores are cached in
+<titles_file>.teacher.csv so retraining never reruns BART on the same titles.
+Everything runs offline on CPU once the teacher model is in the local cache.
+"""
+
+import sys
+import os
+import csv
+import time
+import random
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common.model_registry import get_classifier
+from common.website_student import DEFAULT_STUDENT_PATH, ERROR_TITLES, WEBSITE_CATEGORIES, HashedNgramStudent
+
+def read_titles(filename):
+    """Read titles from a text file or from the 'title' column of a CSV"""
+    with open(filename, 'r', encoding='utf-8') as f:
+        if filename.endswith('.csv'):
+            titles = [row['title'].strip() for row in csv.DictReader(f)]
+        else:
+            titles = [line.strip() for line in f]
+
+    # Scrape errors and placeholders are not real titles
+    return list(dict.fromkeys(t for t in titles if t and not t.startswith(ERROR_TITLES)))
+
+def label_with_teacher(titles, cache_file, batch_size=16):
+    """Score titles with the zero-shot teacher, reusing cached scores"""
+    cached = {}
+    if os.path.exists(cache_file):
+        with open(cache_file, 'r', encoding='utf-8') as f:
+            for row in csv.DictReader(f):
+                cached[row['title']] = [float(row[c]) for c in WEBSITE_CATEGORIES]
+
+    missing = [t for t in titles if t not in cached]
+    print(f"Teacher scores: {len(titles) - len(missing)} cached, {len(missing)} to compute")
+
+    if missing:
+        classifier = get_classifier("zero-shot")
+        start = time.perf_counter()
+        for i in range(0, len(missing), batch_size):
+            batch = missing[i:i + batch_size]
+            results = classifier(batch, WEBSITE_CATEGORIES)
+            if isinstance(results, dict):
+                results = [results]
+            for title, result in zip(batch, results):
+                scores = dict(zip(result['labels'], result['scores']))
+                cached[title] = [scores[c] for c in WEBSITE_CATEGORIES]
+            print(f"  Labeled {min(i + batch_size, len(missing))}/{len(missing)} titles")
+        elapsed = time.perf_counter() - start
+        print(f"Teacher speed: {len(missing) / elapsed:.1f} titles/sec")
+
+        with open(cache_file, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow(['title'] + WEBSITE_CATEGORIES)
+            for title, scores in cached.items():
+                writer.writerow([title] + scores)
+
+    return np.array([cached[t] for t in titles], dtype=np.float32)
+
+def agreement_report(student, titles, teacher_scores):
+    """Print how closely the student matches the teacher"""
+    start = time.perf_counter()
+    student_scores = student.predict_scores(titles)
+    elapsed = max(time.perf_counter() - start, 1e-9)
+
+    teacher_top = teacher_scores.argmax(axis=1)
+    student_top = student_scores.argmax(axis=1)
+    top3 = np.argsort(-student_scores, axis=1)[:, :3]
+
+    top1_agreement = (teacher_top == student_top).mean()
+    top3_agreement = np.mean([t in row for t, row in zip(teacher_top, top3)])
+    confidence_gap = np.abs(teacher_scores.max(axis=1) - student_scores.max(axis=1)).mean()
+
+    print(f"Top-1 agreement with teacher: {top1_agreement * 100:.1f}%")
+    print(f"Teacher label in student top-3: {top3_agreement * 100:.1f}%")
+    print(f"Mean confidence gap: {confidence_gap:.3f}")
+    print(f"Student speed: {len(titles) / elapsed:.0f} titles/sec")
+    print("\nPer-category agreement (teacher label -> student agrees):")
+    for index, category in enumerate(WEBSITE_CATEGORIES):
+        mask = teacher_top == index
+        if mask.any():
+            print(f"  {category:15s} {mask.sum():6d} titles  {(student_top[mask] == index).mean() * 100:5.1f}%")
+
+    return top1_agreement
+
+def distill(titles_file, student_file=DEFAULT_STUDENT_PATH, holdout_fraction=0.2):
+    """Label titles with the teacher, train the student and report agreement"""
+    try:
+        titles = read_titles(titles_file)
+    except FileNotFoundError:
+        print(f"Error: File '{titles_file}' not found.")
+        return None
+
+    if not titles:
+        print("No titles found.")
+        return None
+
+    print(f"Distilling website classifier on {len(titles)} titles")
+    print("=" * 50)
+
+    teacher_scores = label_with_teacher(titles, titles_file + '.teacher.csv')
+
+    # Hold out part of the corpus to measure agreement on unseen titles
+    order = list(range(len(titles)))
+    random.Random(0).shuffle(order)
+    holdout_size = int(len(titles) * holdout_fraction)
+    holdout, train = order[:holdout_size], order[holdout_size:]
+
+    student = HashedNgramStudent(WEBSITE_CATEGORIES)
+    student.fit([titles[i] for i in train], teacher_scores[train])
+
+    print("\n" + "=" * 50)
+    if holdout:
+        print(f"AGREEMENT ON {len(holdout)} HELD-OUT TITLES")
+        print("=" * 50)
+        agreement_report(student, [titles[i] for i in holdout], teacher_scores[holdout])
+    else:
+        print("AGREEMENT ON TRAINING TITLES (corpus too small for a holdout)")
+        print("=" * 50)
+        agreement_report(student, titles, teacher_scores)
+
+    # Retrain on everything before saving
+    if holdout:
+        student = HashedNgramStudent(WEBSITE_CATEGORIES)
+        student.fit(titles, teacher_scores)
+    student.save(student_file)
+    print(f"\nStudent saved to {student_file}")
+    print("Select it with WEBSITE_CLASSIFIER_BACKEND=student")
+    return student
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Usage: python distill_website_classifier.py <titles_file> [student_file]")
+        print("Example: python distill_website_classifier.py classified_websites.csv")
+        sys.exit(1)
+
+    titles_file = sys.argv[1]
+    student_file = sys.argv[2] if len(sys.argv) > 2 else DEFAULT_STUDENT_PATH
+
+    distill(titles_file, student_file)
@@ -0,0 +1,262 @@
+#!/usr/bin/env python3
+"""
+Domain / URL-prefix classification index for the website classifiers.
+
+Every URL on a well-known site usually gets the same category, so there is
+no need to fetch and classify https://www.amazon.com/dp/... page by page.
+The index maps prefixes like "amazon.com" or "google.com/maps" to a category
+and answers lookups by longest-prefix match on the reversed host labels plus
+path segments: maps.google.com/x falls back to google.com, while
+google.com/maps/y uses the more specific google.com/maps entry.
+
+Entries come from a seed list (domain_seeds.csv, trusted until replaced)
+and from previous runs (category, confidence and time of classification).
+The index is kept in ~/.cache/bert-sentiment-tools/domain_index.json unless
+WEBSITE_DOMAIN_INDEX names another file; processes that save it at the same
+time merge their entries instead of overwriting each other's.
+A re-check policy decides which run entries are still good enough to answer
+without HTTP or model work:
+    WEBSITE_INDEX_MIN_CONFIDENCE  minimum stored confidence (default 0.5)
+    WEBSITE_INDEX_MAX_AGE_DAYS    re-check entries older than this (default 30)
+
+Usage:
+    python domain_index.py seed <seeds.csv> [index.json]       # prefix,category[,confidence]
+    python domain_index.py import <results.csv> [index.json]   # classified_websites.csv from earlier runs
+    python domain_index.py lookup <url> [index.json]
+    python domain_index.py stats [index.json]
+"""
+
+import csv
+import json
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from urllib.parse import urlsplit
+
+try:
+    import fcntl
+except ImportError:  # Windows: concurrent saves are not serialized
+    fcntl = None
+
+DEFAULT_INDEX_PATH = os.path.expanduser('~/.cache/bert-sentiment-tools/domain_index.json')
+DEFAULT_SEEDS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'domain_seeds.csv')
+SECONDS_PER_DAY = 86400
+
+# Entry fields other than the time it was stored
+ENTRY_FIELDS = ('category', 'confidence', 'source', 'title')
+
+
+def prefix_components(url_or_prefix):
+    """Reversed host labels followed by path segments, e.g. ('com', 'google', '/maps')
+
+    Accepts full URLs or bare prefixes like 'google.com/maps'. 'www.' and
+    ports are ignored, hosts are case-insensitive, paths are not.
+    """
+    value = url_or_prefix.strip()
+    if '://' not in value:
+        value = 'http://' + value
+    parts = urlsplit(value)
+    host = (parts.hostname or '').rstrip('.')
+    if host.startswith('www.'):
+        host = host[4:]
+    labels = [label for label in reversed(host.split('.')) if label]
+    segments = ['/' + segment for segment in parts.path.split('/') if segment]
+    return tuple(labels + segments)
+
+
+def prefix_key(components):
+    """Readable key for a components tuple: 'google.com/maps'"""
+    labels = [c for c in components if not c.startswith('/')]
+    segments = [c for c in components if c.startswith('/')]
+    return '.'.join(reversed(labels)) + ''.join(segments)
+
+
+class RecheckPolicy:
+    """Decides whether a stored entry can answer a lookup without re-classifying"""
+
+    def __init__(self, min_confidence=0.5, max_age_days=30):
+        self.min_confidence = min_confidence
+        self.max_age_days = max_age_days
+
+    @classmethod
+    def from_env(cls):
+        return cls(float(os.environ.get('WEBSITE_INDEX_MIN_CONFIDENCE', '0.5')),
+                   float(os.environ.get('WEBSITE_INDEX_MAX_AGE_DAYS', '30')))
+
+    def trusted(self, entry, now=None):
+        if entry.get('source') == 'seed':
+            return True
+        if entry.get('confidence', 0.0) < self.min_confidence:
+            return False
+        age = (now or time.time()) - entry.get('updated', 0)
+        return not self.max_age_days or age <= self.max_age_days * SECONDS_PER_DAY
+
+
+class DomainIndex:
+    """Longest-prefix index from reversed host + path to a website category"""
+
+    def __init__(self, path=None):
+        self.path = path
+        self.entries = {}   # prefix key -> {'category', 'confidence', 'source', 'updated', 'title'}
+        self._trie = {}
+        self.dirty = False
+        # Fetch workers look up while the writer records results
+        self._lock = threading.Lock()
+        if path and os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            for key, entry in data.get('entries', {}).items():
+                self._insert(key, entry)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def _insert(self, key, entry):
+        components = prefix_components(key)
+        if not components:
+            raise ValueError(f"Not a domain or URL prefix: '{key}'")
+        key = prefix_key(components)
+        with self._lock:
+            node = self._trie
+            for component in components:
+                node = node.setdefault(component, {})
+            node[None] = key  # None never collides with a component string
+            self.entries[key] = entry
+        return key
+
+    def lookup(self, url):
+        """Return (prefix, entry) for the longest stored prefix of url, or None"""
+        components = prefix_components(url)
+        with self._lock:
+            node = self._trie
+            found = None
+            for component in components:
+                node = node.get(component)
+                if node is None:
+                    break
+                if None in node:
+                    found = node[None]
+            return (found, self.entries[found]) if found else None
+
+    def add(self, prefix, category, confidence=1.0, source='seed', title=''):
+        """Store a category for a prefix, replacing any existing entry"""
+        entry = {
+            'category': category,
+            'confidence': round(float(confidence), 4),
+            'source': source,
+            'updated': int(time.time()),
+            'title': title
+        }
+        components = prefix_components(prefix)
+        existing = self.entries.get(prefix_key(components)) if components else None
+        if (source == 'seed' and existing is not None
+                and all(existing.get(field) == entry[field] for field in ENTRY_FIELDS)):
+            # Seeds never expire, so reloading an unchanged one is not a change
+            return prefix_key(components)
+        self.dirty = True
+        return self._insert(prefix, entry)
+
+    def record(self, url, category, confidence, title=''):
+        """Remember a classified page under its host; seed entries are left alone"""
+        components = prefix_components(url)
+        host = prefix_key(tuple(c for c in components if not c.startswith('/')))
+        existing = self.entries.get(host)
+        if existing is not None and existing.get('source') == 'seed':
+            return host
+        return self.add(host, category, confidence, source='run', title=title)
+
+    def save(self, path=None):
+        """Write the index to JSON (atomically), keeping entries other processes saved since it was read"""
+        path = path or self.path
+        if not path:
+            return
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(f"{path}.lock", 'w') as lock:
+            if fcntl is not None:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+            if os.path.exists(path):
+                with open(path, 'r', encoding='utf-8') as f:
+                    saved = json.load(f).get('entries', {})
+                for key, entry in saved.items():
+                    current = self.entries.get(key)
+                    if current is None or entry.get('updated', 0) > current.get('updated', 0):
+                        self._insert(key, entry)
+            tmp_path = f"{path}.tmp"
+            with self._lock, open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({'version': 1, 'entries': self.entries}, f, indent=1, sort_keys=True)
+            os.replace(tmp_path, path)
+        self.dirty = False
+
+    def load_seeds(self, filename):
+        """Add 'prefix,category[,confidence]' rows from a seed CSV"""
+        added = 0
+        with open(filename, 'r', newline='', encoding='utf-8') as f:
+            for row in csv.reader(f):
+                if not row or row[0].startswith('#') or row[0].strip().lower() == 'prefix':
+                    continue
+                confidence = float(row[2]) if len(row) > 2 and row[2].strip() else 1.0
+                self.add(row[0], row[1].strip(), confidence, source='seed')
+                added += 1
+        return added
+
+    def import_results(self, filename):
+        """Add hosts from a classified_websites.csv written by an earlier run"""
+        added = 0
+        with open(filename, 'r', newline='', encoding='utf-8') as f:
+            for row in csv.DictReader(f):
+                if row.get('category') in (None, '', 'Error', 'Skipped'):
+                    continue
+                self.record(row['url'], row['category'], float(row.get('confidence') or 0.0), row.get('title', ''))
+                added += 1
+        return added
+
+
+def get_index(path=None):
+    """Open the index named by WEBSITE_DOMAIN_INDEX ('0' disables it), with seeds from WEBSITE_DOMAIN_SEEDS"""
+    path = path or os.environ.get('WEBSITE_DOMAIN_INDEX', DEFAULT_INDEX_PATH)
+    if path == '0':
+        return None
+    index = DomainIndex(path)
+    seeds = os.environ.get('WEBSITE_DOMAIN_SEEDS', DEFAULT_SEEDS_PATH)
+    if seeds != '0' and os.path.exists(seeds):
+        index.load_seeds(seeds)
+    return index
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] not in ('seed', 'import', 'lookup', 'stats'):
+        print(__doc__.split('Usage:')[1].rstrip())
+        sys.exit(1)
+
+    command, args = sys.argv[1], sys.argv[2:]
+    if command in ('seed', 'import', 'lookup') and not args:
+        print(f"Usage: python domain_index.py {command} <{'url' if command == 'lookup' else 'file'}> [index.json]")
+        sys.exit(1)
+
+    index_path = (args[1] if len(args) > 1 else None) if command != 'stats' else (args[0] if args else None)
+    index = DomainIndex(index_path or os.environ.get('WEBSITE_DOMAIN_INDEX', DEFAULT_INDEX_PATH))
+
+    if command == 'seed':
+        print(f"Added {index.load_seeds(args[0])} seed prefixes")
+        index.save()
+    elif command == 'import':
+        print(f"Imported {index.import_results(args[0])} classified URLs")
+        index.save()
+    elif command == 'lookup':
+        match = index.lookup(args[0])
+        if match is None:
+            print(f"{args[0]} -> unknown")
+        else:
+            prefix, entry = match
+            state = 'trusted' if RecheckPolicy.from_env().trusted(entry) else 'needs re-check'
+            print(f"{args[0]} -> {entry['category']} ({entry['confidence']:.2f}, {entry['source']}, {state}) via {prefix}")
+
+    print(f"Index {index.path}: {len(index)} prefixes")
+    if command == 'stats':
+        policy = RecheckPolicy.from_env()
+        print(f"  Trusted: {sum(1 for e in index.entries.values() if policy.trusted(e))}")
+        print(f"  Sources: {dict(Counter(e['source'] for e in index.entries.values()))}")
+        for category, count in Counter(e['category'] for e in index.entries.values()).most_common():
+            print(f"  {category}: {count}")
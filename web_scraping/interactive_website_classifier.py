@@ -1,77 +1,37 @@
-import requests
-from bs4 import BeautifulSoup
-import time
-import random
-from transformers import pipeline
-import torch
+import asyncio
+import os
+import sys
 
-# Load the zero-shot classifier
-device = 0 if torch.cuda.is_available() else -1
-classifier = pipeline(
-    "zero-shot-classification",
-    model="facebook/bart-large-mnli",
-    device=device
-)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common.http_client import scrape_title
+from common.website_student import (CLASSIFIER_BACKEND, WEBSITE_CATEGORIES, build_classification,
+                                    classify_website, zero_shot_classifier)
+from common.async_repl import MicroBatcher, read_input, run_repl, zero_shot_batch_fn
 
-# Define website categories
-website_categories = [
-    "news", "entertainment", "shopping", "social_media", 
-    "educational", "blog", "government", "business",
-    "technology", "sports", "health", "travel"
-]
+# Load the zero-shot classifier (skipped when the student backend is selected)
+classifier = zero_shot_classifier()
 
-# Headers to mimic a real browser
-headers = {
-    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
-    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
-    'Accept-Language': 'en-US,en;q=0.5',
-    'Accept-Encoding': 'gzip, deflate',
-    'Connection': 'keep-alive',
-    'Upgrade-Insecure-Requests': '1',
-}
-
-def scrape_title(url):
-    """Scrape the title from a given URL"""
-    try:
-        # Add random delay to be respectful to servers
-        time.sleep(random.uniform(1, 3))
-        
-        response = requests.get(url, headers=headers, timeout=10)
-        response.raise_for_status()
-        
-        soup = BeautifulSoup(response.content, 'html.parser')
-        title_tag = soup.find('title')
-        
-        if title_tag:
-            return title_tag.get_text().strip()
-        else:
-            return "No title found"
-    except Exception as e:
-        return f"Error scraping title: {str(e)}"
-
-def classify_website(title):
-    """Classify website type based on its title"""
+async def classify_website_async(batcher, title):
+    """Classify website type, sharing a batch with concurrent requests"""
+    if CLASSIFIER_BACKEND == 'student':
+        # The student is cheap enough to run inline
+        return classify_website(title)
     try:
-        result = classifier(title, website_categories)
-        return {
-            'best_match': result['labels'][0],
-            'confidence': result['scores'][0],
-            'all_scores': dict(zip(result['labels'], result['scores']))
-        }
+        result = await batcher.submit(title, key=tuple(WEBSITE_CATEGORIES))
+        return build_classification(result)
     except Exception as e:
         return f"Error classifying website: {str(e)}"
 
-def main():
-    print("Interactive Website Classifier")
-    print("Enter URLs to scrape titles and classify website types")
-    print("Type 'quit' to exit")
-    print("=" * 50)
-    
+async def read_url():
+    """Prompt for the next URL; returns None to quit"""
     while True:
-        url = input("\nEnter URL: ").strip()
+        url = await read_input("\nEnter URL: ")
+        if url is None:
+            return None
+        url = url.strip()
         
         if url.lower() == 'quit':
-            break
+            return None
             
         if not url:
             continue
@@ -81,20 +41,39 @@ def main():
             url = 'https://' + url
             
         print(f"Processing: {url}")
-        
-        # Scrape title
-        title = scrape_title(url)
-        print(f"Title: {title}")
-        
-        # Classify website type
-        classification = classify_website(title)
-        if isinstance(classification, dict):
-            print(f"Category: {classification['best_match']} (confidence: {classification['confidence']:.2f})")
-            print("All scores:")
-            for category, score in list(classification['all_scores'].items())[:5]:  # Show top 5
-                print(f"  {category}: {score:.2f}")
-        else:
-            print(classification)
+        return url
+
+async def process_url(batcher, url):
+    """Scrape and classify one URL, printing the result when it completes"""
+    # Scrape title in a worker thread so other URLs keep moving
+    title = await asyncio.to_thread(scrape_title, url)
+    
+    # Classify website type
+    classification = await classify_website_async(batcher, title)
+    
+    output = [f"\nURL: {url}", f"Title: {title}"]
+    if isinstance(classification, dict):
+        output.append(f"Category: {classification['best_match']} (confidence: {classification['confidence']:.2f})")
+        output.append("All scores:")
+        for category, score in list(classification['all_scores'].items())[:5]:  # Show top 5
+            output.append(f"  {category}: {score:.2f}")
+    else:
+        output.append(classification)
+    print("\n".join(output))
+
+async def run():
+    batcher = MicroBatcher(zero_shot_batch_fn(classifier))
+    await run_repl(read_url, lambda url: process_url(batcher, url))
+    await batcher.close()
+
+def main():
+    print("Interactive Website Classifier")
+    print("Enter URLs to scrape titles and classify website types")
+    print("URLs are processed concurrently; results appear as each one completes")
+    print("Type 'quit' to exit")
+    print("=" * 50)
+    
+    asyncio.run(run())
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
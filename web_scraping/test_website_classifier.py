@@ -1,17 +1,12 @@
-import requests
-from bs4 import BeautifulSoup
-import time
-import random
-from transformers import pipeline
-import torch
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common.model_registry import get_classifier
+from common.http_client import scrape_title
 
 # Load the zero-shot classifier
-device = 0 if torch.cuda.is_available() else -1
-classifier = pipeline(
-    "zero-shot-classification",
-    model="facebook/bart-large-mnli",
-    device=device
-)
+classifier = get_classifier("zero-shot")
 
 # Define website categories
 website_categories = [
@@ -20,35 +15,6 @@ website_categories = [
     "technology", "sports", "health", "travel"
 ]
 
-# Headers to mimic a real browser
-headers = {
-    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
-    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
-    'Accept-Language': 'en-US,en;q=0.5',
-    'Accept-Encoding': 'gzip, deflate',
-    'Connection': 'keep-alive',
-    'Upgrade-Insecure-Requests': '1',
-}
-
-def scrape_title(url):
-    """Scrape the title from a given URL"""
-    try:
-        # Add random delay to be respectful to servers
-        time.sleep(random.uniform(1, 3))
-        
-        response = requests.get(url, headers=headers, timeout=10)
-        response.raise_for_status()
-        
-        soup = BeautifulSoup(response.content, 'html.parser')
-        title_tag = soup.find('title')
-        
-        if title_tag:
-            return title_tag.get_text().strip()
-        else:
-            return "No title found"
-    except Exception as e:
-        return f"Error scraping title: {str(e)}"
-
 def classify_website(title):
     """Classify website type based on its title"""
     try:
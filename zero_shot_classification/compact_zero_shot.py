@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+"""
+Build a low-memory copy of the zero-shot model and compare it with the full model
+Usage: python compact_zero_shot.py <corpus_file> [--labels LABELS] [--dtype bfloat16|float16] [--model zero-shot-compact] [--max-lines 50000] [--eval-lines 200] [--report]
+
+The checkpoint keeps only the tokens that occur in <corpus_file> and in the
+label hypotheses, stores the weights as bfloat16 (or float16) and is loaded
+memory-mapped (see common/low_memory.py). It is written to the "low_memory"
+path of the registry entry (default zero-shot-compact). <LABELS> is a
+comma-separated list or a file with one label per line; by default the
+website categories are used.
+
+A held-out sample of --eval-lines lines is left out of the vocabulary and
+classified, each in a fresh process, by the full fp32 model and by the
+compact model with float32 and with native compute. The report shows load
+time, speed, resident memory attributable to the model, how often the top
+label matches the full model and the largest score difference. Two compact
+processes are then run side by side to show how much memory they share.
+With --report, an existing checkpoint is only evaluated.
+"""
+
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common.model_registry import load_config
+from common.low_memory import DEFAULT_TEMPLATE, build_compact_model, memory_usage
+from common.website_student import WEBSITE_CATEGORIES
+from common.cli import pop_option, read_lines
+
+MODEL_NAME = "zero-shot-compact"
+
+VARIANTS = [
+    ('full fp32', 'full', None),
+    ('compact, float32 compute', 'compact', 'float32'),
+    ('compact, native compute', 'compact', 'native'),
+]
+
+def read_labels(value):
+    """Labels from a comma-separated list or a file with one label per line"""
+    if value is None:
+        return WEBSITE_CATEGORIES
+    if os.path.exists(value):
+        with open(value, 'r', encoding='utf-8') as f:
+            return [line.strip() for line in f if line.strip()]
+    return [label.strip() for label in value.split(',') if label.strip()]
+
+def compact_spec(model_name):
+    spec = load_config()['models'].get(model_name)
+    if spec is None or not spec.get('low_memory'):
+        raise ValueError(f"models.json has no '{model_name}' entry with a \"low_memory\" path")
+    return spec
+
+def measure_process(job_file):
+    """Child process: load one variant, classify the sample, wait for 'go', then report memory"""
+    with open(job_file, 'r', encoding='utf-8') as f:
+        job = json.load(f)
+    from transformers import AutoModelForSequenceClassification, AutoTokenizer, pipeline
+    from common.low_memory import load_compact_model
+    baseline = memory_usage()
+
+    start = time.perf_counter()
+    if job['kind'] == 'full':
+        model = AutoModelForSequenceClassification.from_pretrained(job['model'], revision=job.get('revision'))
+        model.eval()
+    else:
+        model = load_compact_model(job['path'], job['compute_dtype'])
+    tokenizer = AutoTokenizer.from_pretrained(job['tokenizer'])
+    classifier = pipeline('zero-shot-classification', model=model, tokenizer=tokenizer, device=-1)
+    load_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    results = classifier(job['texts'], job['labels'], hypothesis_template=job['template'])
+    seconds = time.perf_counter() - start
+
+    print(json.dumps({'ready': True}), flush=True)
+    sys.stdin.readline()
+    print(json.dumps({
+        'baseline': baseline,
+        'memory': memory_usage(),
+        'load_seconds': load_seconds,
+        'seconds': seconds,
+        'scores': [dict(zip(r['labels'], r['scores'])) for r in results]
+    }), flush=True)
+
+def run_variants(jobs):
+    """Run measuring processes side by side; returns their results in order"""
+    processes, files = [], []
+    for job in jobs:
+        with tempfile.NamedTemporaryFile('w', suffix='.json', delete=False, encoding='utf-8') as f:
+            json.dump(job, f)
+        files.append(f.name)
+        processes.append(subprocess.Popen([sys.executable, os.path.abspath(__file__), '--measure', f.name],
+                                          stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                          stderr=subprocess.DEVNULL, text=True))
+    try:
+        # Memory is read only once every process has loaded and classified
+        for process in processes:
+            for line in process.stdout:
+                if line.startswith('{"ready"'):
+                    break
+            else:
+                raise RuntimeError("measuring process failed (run with --measure to see its error)")
+        results = []
+        for process in processes:
+            process.stdin.write('go\n')
+            process.stdin.flush()
+        for process in processes:
+            results.append(json.loads(process.stdout.readline()))
+            process.wait()
+        return results
+    finally:
+        for process in processes:
+            if process.poll() is None:
+                process.kill()
+        for name in files:
+            os.remove(name)
+
+def compare(reference, scores):
+    """(top-label agreement, largest absolute score difference)"""
+    agree, delta = 0, 0.0
+    for ref, other in zip(reference, scores):
+        agree += max(ref, key=ref.get) == max(other, key=other.get)
+        delta = max(delta, max(abs(ref[label] - other[label]) for label in ref))
+    return agree / len(reference), delta
+
+def report(corpus_file, labels=None, model_name=MODEL_NAME, max_lines=50000, eval_lines=200):
+    """Compare memory, speed and accuracy of the full and the compact model"""
+    spec = compact_spec(model_name)
+    path = os.path.expanduser(spec['low_memory'])
+    if not os.path.exists(os.path.join(path, 'low_memory.json')):
+        print(f"Error: no compact checkpoint at {path}; build it first")
+        return
+    with open(os.path.join(path, 'low_memory.json'), 'r', encoding='utf-8') as f:
+        meta = json.load(f)
+    texts = read_lines(corpus_file, max_lines)[:eval_lines]
+    labels = read_labels(labels)
+    base = {'model': spec['model'], 'revision': spec.get('revision'), 'tokenizer': spec.get('tokenizer', spec['model']),
+            'path': path, 'texts': texts, 'labels': labels, 'template': meta.get('template', DEFAULT_TEMPLATE)}
+
+    print(f"Compact checkpoint {path}: {meta['dtype']}, {meta['kept_tokens']} of {meta['vocab_size']} tokens, "
+          f"{meta['weights_mb']} MB on disk")
+    print(f"Classifying {len(texts)} held-out lines against {len(labels)} labels, one process per variant\n")
+    print(f"{'variant':<26}  {'load':>6}  {'lines/s':>7}  {'model RSS':>9}  {'agreement':>9}  {'max score diff':>14}")
+    reference = None
+    for title, kind, compute_dtype in VARIANTS:
+        result = run_variants([dict(base, kind=kind, compute_dtype=compute_dtype)])[0]
+        reference = reference or result['scores']
+        agreement, delta = compare(reference, result['scores'])
+        model_mb = result['memory']['rss'] - result['baseline']['rss']
+        print(f"{title:<26}  {result['load_seconds']:>5.1f}s  {len(texts) / result['seconds']:>7.1f}  "
+              f"{model_mb:>6.0f} MB  {agreement:>9.1%}  {delta:>14.4f}")
+
+    # Mapped weights are file-backed pages: a second process reuses them instead of a private copy
+    pair = run_variants([dict(base, kind='compact', compute_dtype='float32')] * 2)
+    private = sum(r['memory']['private'] - r['baseline']['private'] for r in pair) / 2
+    shared = sum(r['memory']['shared'] for r in pair) / 2
+    print(f"\nTwo compact processes side by side: {private:.0f} MB private growth each, "
+          f"{shared:.0f} MB shared (including libraries)")
+
+def build(corpus_file, labels=None, dtype='bfloat16', model_name=MODEL_NAME, max_lines=50000, eval_lines=200):
+    """Build the compact checkpoint from the corpus, then report"""
+    spec = compact_spec(model_name)
+    lines = read_lines(corpus_file, max_lines)
+    if len(lines) <= eval_lines:
+        print(f"Error: need more than {eval_lines} distinct lines in {corpus_file} (found {len(lines)})")
+        return
+    labels = read_labels(labels)
+    path = os.path.expanduser(spec['low_memory'])
+
+    print(f"Building {dtype} checkpoint of {spec['model']} from {len(lines) - eval_lines} lines and {len(labels)} labels")
+    start = time.perf_counter()
+    meta = build_compact_model(spec['model'], path, lines[eval_lines:], labels, dtype=dtype,
+                               revision=spec.get('revision'))
+    print(f"Kept {meta['kept_tokens']} of {meta['vocab_size']} tokens; {meta['weights_mb']} MB written to {path} "
+          f"in {time.perf_counter() - start:.1f}s\n")
+    report(corpus_file, ','.join(labels), model_name, max_lines, eval_lines)
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    if args[:1] == ['--measure']:
+        measure_process(args[1])
+        sys.exit(0)
+
+    report_only = '--report' in args
+    if report_only:
+        args.remove('--report')
+    try:
+        labels = pop_option(args, '--labels')
+        dtype = pop_option(args, '--dtype', 'bfloat16')
+        model_name = pop_option(args, '--model', MODEL_NAME)
+        max_lines = int(pop_option(args, '--max-lines', 50000))
+        eval_lines = int(pop_option(args, '--eval-lines', 200))
+        if dtype not in ('bfloat16', 'float16'):
+            raise ValueError("--dtype must be bfloat16 or float16")
+    except ValueError as e:
+        print(f"Error: {str(e)}")
+        args = []
+
+    if len(args) < 1:
+        print("Usage: python compact_zero_shot.py <corpus_file> [--labels LABELS] [--dtype bfloat16|float16] "
+              "[--model zero-shot-compact] [--max-lines 50000] [--eval-lines 200] [--report]")
+        print("Example: python compact_zero_shot.py titles.txt --labels news,sports,business")
+        sys.exit(1)
+
+    try:
+        if report_only:
+            report(args[0], labels, model_name, max_lines, eval_lines)
+        else:
+            build(args[0], labels, dtype, model_name, max_lines, eval_lines)
+    except ValueError as e:
+        print(f"Error: {str(e)}")
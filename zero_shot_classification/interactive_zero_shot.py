@@ -1,45 +1,65 @@
-from transformers import pipeline
-import torch
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common.model_registry import get_classifier
+from common.async_repl import MicroBatcher, read_input, run_repl, zero_shot_batch_fn
 
 # Load the zero-shot model (downloads ~500MB on first run; uses BART/MNLI under the hood)
-device = 0 if torch.cuda.is_available() else -1  # GPU if available
-classifier = pipeline(
-    "zero-shot-classification",
-    model="facebook/bart-large-mnli",  # Top performer for this; 95%+ accuracy on MNLI benchmark
-    device=device
-)
+classifier = get_classifier("zero-shot")
 
-print("Zero-shot Classifier - Interactive Mode")
-print("Model loaded successfully!")
-print("=" * 50)
+async def read_request():
+    """Prompt for a text and its candidate labels; returns None to quit"""
+    while True:
+        # Get input text from user
+        text = await read_input("\nEnter text to classify (or 'quit' to exit): ")
+        if text is None or text.lower() == 'quit':
+            return None
+        
+        if text.strip() == '':
+            continue
+        
+        # Get candidate labels from user
+        labels_input = await read_input("Enter candidate labels separated by commas: ")
+        if labels_input is None:
+            return None
+        if labels_input.strip() == '':
+            continue
+        
+        candidate_labels = [label.strip() for label in labels_input.split(',')]
+        return text, candidate_labels
 
-while True:
-    # Get input text from user
-    text = input("\nEnter text to classify (or 'quit' to exit): ")
-    if text.lower() == 'quit':
-        break
-    
-    if text.strip() == '':
-        continue
-    
-    # Get candidate labels from user
-    labels_input = input("Enter candidate labels separated by commas: ")
-    if labels_input.strip() == '':
-        continue
+async def classify_request(batcher, request):
+    """Classify one text and print its scores as soon as they are ready"""
+    text, candidate_labels = request
     
-    candidate_labels = [label.strip() for label in labels_input.split(',')]
-    
-    # Run classification
+    # Run classification; texts with the same labels share a batch
     try:
-        result = classifier(text, candidate_labels)
-        
-        # Print results
-        print(f"\nText: '{text}'")
-        print("Best match:", result['labels'][0], f"(score: {result['scores'][0]:.2f})")
-        print("All scores:")
-        for label, score in zip(result['labels'], result['scores']):
-            print(f"  {label}: {score:.2f}")
+        result = await batcher.submit(text, key=tuple(candidate_labels))
     except Exception as e:
         print(f"Error occurred: {e}")
+        return
+    
+    # Print results
+    output = [f"\nText: '{text}'",
+              f"Best match: {result['labels'][0]} (score: {result['scores'][0]:.2f})",
+              "All scores:"]
+    for label, score in zip(result['labels'], result['scores']):
+        output.append(f"  {label}: {score:.2f}")
+    print("\n".join(output))
+
+async def main():
+    print("Zero-shot Classifier - Interactive Mode")
+    print("Model loaded successfully!")
+    print("Results are printed as soon as each text is classified")
+    print("=" * 50)
+    
+    batcher = MicroBatcher(zero_shot_batch_fn(classifier))
+    await run_repl(read_request, lambda request: classify_request(batcher, request))
+    await batcher.close()
+    
+    print("\nGoodbye!")
 
-print("\nGoodbye!")
\ No newline at end of file
+if __name__ == "__main__":
+    asyncio.run(main())
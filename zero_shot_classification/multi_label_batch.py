@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+"""
+Multi-label zero-shot classification of every line in a text file
+Usage: python multi_label_batch.py <input_file> <labels> [output_file] [options]
+
+<labels> is a comma-separated list ("quality,price,design") or a JSON file
+holding either a list of labels or an object of per-label thresholds
+({"quality": 0.6, "price": 0.5}).
+
+Options:
+    --threshold X    keep labels scoring at least X (default 0.5; per-label
+                     thresholds from a JSON labels file take precedence)
+    --top-k N        keep at most the N best labels that pass their threshold
+    --model NAME     registry model to use (default zero-shot; zero-shot-fast
+                     is a smaller NLI model for large CPU runs)
+    --chunk-size N   lines classified per call (default 256)
+
+Every label is scored independently (entailment vs contradiction), so a line
+can match any number of labels. Output is sparse: each row lists only the
+kept (label, score) pairs. Files ending in .csv get a "labels" column like
+"price:0.93;quality:0.71"; anything else is written as JSON lines.
+"""
+
+import csv
+import json
+import os
+import sys
+import time
+from collections import Counter
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common.model_registry import get_classifier
+from common.zero_shot import classify_unique, parse_labels
+from common.cli import pop_option
+
+def load_labels(spec, default_threshold):
+    """Return {label: threshold} from a comma-separated list or a JSON file"""
+    if os.path.exists(spec):
+        with open(spec, 'r', encoding='utf-8') as f:
+            labels = json.load(f)
+        if isinstance(labels, dict):
+            return {str(label): float(threshold) for label, threshold in labels.items()}
+        return {str(label): default_threshold for label in labels}
+    return {label: default_threshold for label in parse_labels(spec)}
+
+def select_labels(result, thresholds, top_k=None):
+    """Sparse [(label, score)] pairs that pass their threshold, best first"""
+    kept = [(label, score) for label, score in zip(result['labels'], result['scores'])
+            if score >= thresholds[label]]
+    return kept[:top_k] if top_k else kept
+
+def read_chunks(filename, chunk_size):
+    """Yield lists of (line_number, text) without loading the whole file"""
+    chunk = []
+    with open(filename, 'r', encoding='utf-8') as f:
+        for line_number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            chunk.append((line_number, line))
+            if len(chunk) >= chunk_size:
+                yield chunk
+                chunk = []
+    if chunk:
+        yield chunk
+
+def open_writer(output_file):
+    """Return (write_row, close) for a CSV or JSON lines output file"""
+    f = open(output_file, 'w', newline='', encoding='utf-8')
+    if output_file.lower().endswith('.csv'):
+        writer = csv.writer(f)
+        writer.writerow(['line_number', 'labels', 'text'])
+        def write_row(line_number, text, kept):
+            writer.writerow([line_number, ';'.join(f"{label}:{score:.4f}" for label, score in kept), text])
+    else:
+        def write_row(line_number, text, kept):
+            f.write(json.dumps({'line': line_number, 'labels': [[label, round(score, 4)] for label, score in kept],
+                                'text': text}, ensure_ascii=False) + '\n')
+    return write_row, f.close
+
+def classify_file(input_file, labels, output_file=None, threshold=0.5, top_k=None,
+                  model_name="zero-shot", chunk_size=256):
+    """Classify every line of input_file against all labels"""
+    try:
+        thresholds = load_labels(labels, threshold)
+    except (OSError, ValueError) as e:
+        print(f"Error reading labels: {str(e)}")
+        return None
+    if not thresholds:
+        print("Error: no labels given.")
+        return None
+    if not os.path.exists(input_file):
+        print(f"Error: File '{input_file}' not found.")
+        return None
+
+    classifier = get_classifier(model_name)
+    label_list = list(thresholds)
+
+    print(f"Multi-label classification of {input_file} with {len(label_list)} labels ({model_name})")
+    print("Thresholds: " + ", ".join(f"{label}>={t:.2f}" for label, t in thresholds.items()) +
+          (f", top {top_k}" if top_k else ""))
+    print("=" * 60)
+
+    try:
+        write_row, close = open_writer(output_file) if output_file else (None, None)
+    except Exception as e:
+        print(f"Error: {str(e)}")
+        return None
+    counts = Counter()
+    total = unlabeled = 0
+    start = time.monotonic()
+
+    try:
+        for chunk in read_chunks(input_file, chunk_size):
+            texts = [text for _, text in chunk]
+            try:
+                results = classify_unique(classifier, texts, label_list, multi_label=True)
+            except Exception as e:
+                print(f"Error classifying lines {chunk[0][0]}-{chunk[-1][0]}: {str(e)}")
+                continue
+
+            for (line_number, text), result in zip(chunk, results):
+                kept = select_labels(result, thresholds, top_k)
+                counts.update(label for label, _ in kept)
+                unlabeled += not kept
+                if write_row:
+                    write_row(line_number, text, kept)
+                elif total < 20:
+                    labels_text = ', '.join(f"{label} ({score:.2f})" for label, score in kept) or '-'
+                    print(f"{line_number:5d}. {labels_text} - {text[:60]}{'...' if len(text) > 60 else ''}")
+                total += 1
+
+            elapsed = time.monotonic() - start
+            print(f"  {total} lines, {total / elapsed * 3600:,.0f} lines/hour")
+    finally:
+        if close:
+            close()
+
+    print(f"\nSUMMARY:")
+    print(f"  Total lines: {total}")
+    print(f"  Lines without any label: {unlabeled}")
+    for label in label_list:
+        share = counts[label] / total * 100 if total else 0.0
+        print(f"  {label}: {counts[label]} ({share:.1f}%)")
+    if output_file:
+        print(f"\nResults saved to {output_file}")
+    return counts
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    try:
+        threshold = float(pop_option(args, '--threshold', 0.5))
+        top_k = pop_option(args, '--top-k')
+        top_k = int(top_k) if top_k else None
+        model_name = pop_option(args, '--model', 'zero-shot')
+        chunk_size = int(pop_option(args, '--chunk-size', 256))
+    except ValueError as e:
+        print(f"Error: {str(e)}")
+        args = []
+
+    if len(args) < 2:
+        print("Usage: python multi_label_batch.py <input_file> <labels> [output_file] "
+              "[--threshold X] [--top-k N] [--model NAME] [--chunk-size N]")
+        print('Example: python multi_label_batch.py reviews.txt "quality,price,performance,design,usability" '
+              'labels.jsonl --threshold 0.6 --top-k 3')
+        sys.exit(1)
+
+    classify_file(args[0], args[1], args[2] if len(args) > 2 else None,
+                  threshold, top_k, model_name, chunk_size)
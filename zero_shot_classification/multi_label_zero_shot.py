@@ -1,13 +1,11 @@
-from transformers import pipeline
-import torch
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common.model_registry import get_classifier
 
 # Load the zero-shot model
-device = 0 if torch.cuda.is_available() else -1  # GPU if available
-classifier = pipeline(
-    "zero-shot-classification",
-    model="facebook/bart-large-mnli",
-    device=device
-)
+classifier = get_classifier("zero-shot")
 
 print("Zero-shot Classifier - Multi-label Mode")
 print("Model loaded successfully!")
@@ -30,4 +28,5 @@ for label, score in zip(result_multi['labels'], result_multi['scores']):
     if score >= 0.1:
         print(f"  {label}: {score:.2f}")
 
-print("\nMulti-label mode is useful when text can match multiple categories simultaneously.")
\ No newline at end of file
+print("\nMulti-label mode is useful when text can match multiple categories simultaneously.")
+print("For whole files, use multi_label_batch.py (thresholds, top-k and sparse CSV/JSON lines output).")
\ No newline at end of file
@@ -1,13 +1,11 @@
-from transformers import pipeline
-import torch
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common.model_registry import get_classifier
 
 # Load the zero-shot model
-device = 0 if torch.cuda.is_available() else -1  # GPU if available
-classifier = pipeline(
-    "zero-shot-classification",
-    model="facebook/bart-large-mnli",
-    device=device
-)
+classifier = get_classifier("zero-shot")
 
 # Simple test
 text = "This is a great product!"